@@ -1,12 +1,17 @@
 """
 Упрощённые AI модули
 """
-from .nlp import GPTClient
-from .speech import WhisperClient
-from .vision import OCRClient
+from app.core.lazy_import import lazy_exports
 
 __all__ = [
     "GPTClient",
     "WhisperClient", 
     "OCRClient"
 ]
+
+# Клиенты (openai, OpenCV, torch) загружаются при первом обращении
+__getattr__ = lazy_exports(__name__, {
+    "GPTClient": ".nlp",
+    "WhisperClient": ".speech",
+    "OCRClient": ".vision",
+})
@@ -0,0 +1,197 @@
+"""
+Допуск тяжёлых AI заданий: ограничение конкурентности по этапам
+
+При всплеске голосовых и фото каждый обработчик сразу запускал
+распознавание, и задержка росла у всех. Перед этапами whisper, ocr и gpt
+стоит контроллер допуска:
+- на каждом этапе выполняется не больше заданного числа заданий;
+- у пользователя выполняется одно тяжёлое задание за раз, остальные его
+  задания ждут и не занимают место других пользователей;
+- из ожидающих первым допускается самое короткое по оценке (SJF);
+  оценка уменьшается на время ожидания (ADMISSION_AGING), чтобы длинные
+  задания не ждали бесконечно;
+- ожидающий получает свою позицию в очереди при каждом её изменении,
+  а при переполнении очереди этапа задание отклоняется сразу.
+
+Оценка - ожидаемое время работы в секундах (estimate_cost).
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.config import settings
+from app.core.exceptions import AIException
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+# Оценка времени работы этапа: секунды на задание и на единицу входа
+# (whisper - секунда аудио, ocr - изображение, gpt - символ текста)
+_STAGE_COST = {
+    "whisper": (0.5, 0.3),
+    "ocr": (0.5, 2.0),
+    "gpt": (1.0, 0.002),
+}
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+def estimate_cost(stage: str, size: float) -> float:
+    """
+    Ожидаемое время работы этапа в секундах
+
+    Args:
+        stage: Этап (whisper, ocr, gpt)
+        size: Длительность аудио в секундах, число изображений или длина текста
+    """
+    base, per_unit = _STAGE_COST[stage]
+    return base + per_unit * max(0.0, size)
+
+
+@dataclass
+class _Waiter:
+    stage: str
+    user_id: Optional[int]
+    cost: float
+    sequence: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    position: int = 0
+    granted: bool = False
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class AdmissionController:
+    """Очереди допуска к этапам AI с лимитом конкурентности и SJF"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        max_queue: Optional[int] = None,
+        aging: Optional[float] = None
+    ):
+        """
+        Args:
+            limits: Этап -> сколько заданий выполняется одновременно
+            max_queue: Сколько заданий может ждать на этапе
+            aging: На сколько секунд оценки задание продвигается за секунду ожидания
+        """
+        self.limits = dict(limits or {
+            "whisper": settings.ADMISSION_WHISPER_CONCURRENCY,
+            "ocr": settings.ADMISSION_OCR_CONCURRENCY,
+            "gpt": settings.ADMISSION_GPT_CONCURRENCY,
+        })
+        self.max_queue = max_queue if max_queue is not None else settings.ADMISSION_MAX_QUEUE
+        self.aging = aging if aging is not None else settings.ADMISSION_AGING
+        self._running: Dict[str, int] = defaultdict(int)
+        self._waiting: Dict[str, List[_Waiter]] = defaultdict(list)
+        self._busy_users: Set[int] = set()
+        self._sequence = itertools.count()
+
+    def running(self, stage: str) -> int:
+        """Выполняющихся заданий на этапе"""
+        return self._running[stage]
+
+    def waiting(self, stage: str) -> int:
+        """Ожидающих заданий на этапе"""
+        return len(self._waiting[stage])
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        stage: str,
+        user_id: Optional[int],
+        cost: float,
+        on_position: Optional[PositionCallback] = None
+    ) -> AsyncIterator[None]:
+        """
+        Место на этапе на время блока
+
+        Args:
+            stage: Этап (whisper, ocr, gpt)
+            user_id: Пользователь (None - без ограничения на пользователя)
+            cost: Оценка времени работы в секундах (estimate_cost)
+            on_position: Вызывается с позицией в очереди (с 1) при её изменении
+
+        Raises:
+            AIException: Очередь этапа переполнена
+        """
+        if stage not in self.limits:
+            raise ValueError(f"Unknown admission stage: {stage}")
+        tags = {"stage": stage}
+        if len(self._waiting[stage]) >= self.max_queue:
+            metrics.increment("ai.admission.rejected", tags=tags)
+            raise AIException(stage, "Очередь обработки переполнена, попробуйте позже")
+
+        waiter = _Waiter(stage, user_id, cost, next(self._sequence))
+        self._waiting[stage].append(waiter)
+        self._dispatch()
+        try:
+            await self._wait(waiter, on_position)
+        except BaseException:
+            # Отмена во время ожидания: освобождаем место или уходим из очереди
+            if waiter.granted:
+                self._release(waiter)
+            else:
+                self._waiting[stage].remove(waiter)
+                self._dispatch()
+            raise
+
+        metrics.timer("ai.admission.wait_time", time.monotonic() - waiter.enqueued_at, tags=tags)
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    async def _wait(self, waiter: _Waiter, on_position: Optional[PositionCallback]) -> None:
+        reported = 0
+        while not waiter.granted:
+            if on_position is not None and waiter.position != reported:
+                reported = waiter.position
+                try:
+                    await on_position(reported)
+                except Exception as e:
+                    logger.warning(f"Queue position callback failed: {e}")
+                continue
+            waiter.wakeup.clear()
+            await waiter.wakeup.wait()
+
+    def _priority(self, waiter: _Waiter, now: float) -> tuple:
+        return waiter.cost - (now - waiter.enqueued_at) * self.aging, waiter.sequence
+
+    def _dispatch(self) -> None:
+        """Допускает ожидающих по порядку SJF и обновляет позиции остальных"""
+        now = time.monotonic()
+        for stage, waiters in self._waiting.items():
+            waiters.sort(key=lambda waiter: self._priority(waiter, now))
+            for waiter in list(waiters):
+                if self._running[stage] >= self.limits[stage]:
+                    break
+                if waiter.user_id is not None and waiter.user_id in self._busy_users:
+                    continue
+                waiters.remove(waiter)
+                self._running[stage] += 1
+                if waiter.user_id is not None:
+                    self._busy_users.add(waiter.user_id)
+                waiter.granted = True
+                waiter.wakeup.set()
+
+            for position, waiter in enumerate(waiters, 1):
+                if waiter.position != position:
+                    waiter.position = position
+                    waiter.wakeup.set()
+            metrics.gauge("ai.admission.queue_depth", len(waiters), tags={"stage": stage})
+            metrics.gauge("ai.admission.running", self._running[stage], tags={"stage": stage})
+
+    def _release(self, waiter: _Waiter) -> None:
+        self._running[waiter.stage] -= 1
+        self._busy_users.discard(waiter.user_id)
+        self._dispatch()
+
+
+# Общий контроллер допуска процесса бота
+admission_controller = AdmissionController()
@@ -41,7 +41,7 @@ class AIService:
             if not self.whisper_client:
                 return {"error": "Whisper client not available"}
                 
-            transcribed_text = await self.whisper_client.transcribe_audio(file_path)
+            transcribed_text = await self.whisper_client.transcribe(file_path)
             
             if not transcribed_text:
                 return {"error": "Не удалось распознать речь"}
@@ -0,0 +1,88 @@
+"""
+Двоичное хранение эмбеддингов
+
+Эмбеддинг хранится в event_embeddings.embedding (BYTEA) в одном из
+форматов EMBEDDING_STORAGE:
+- float32 - без потерь, 4 байта на компоненту;
+- float16 - 2 байта на компоненту, ошибка ~1e-3 (по умолчанию);
+- int8 - 1 байт на компоненту и масштаб float32 на вектор.
+
+Первый байт - тег формата, поэтому строки разных форматов читаются
+вместе, а смена настройки не требует пересчёта. Чтение не создаёт
+списков Python: np.frombuffer прямо по байтам строки.
+"""
+import json
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+
+from app.config import settings
+
+FORMAT_TAGS = {"float32": 1, "float16": 2, "int8": 3}
+_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2"), 3: np.dtype("i1")}
+# Масштаб int8 после тега
+_SCALE_DTYPE = np.dtype("<f4")
+
+Blob = Union[bytes, bytearray, memoryview, str]
+
+
+def encode_embedding(vector: Sequence[float], storage: Optional[str] = None) -> bytes:
+    """
+    Кодирует вектор в байты
+
+    Args:
+        vector: Эмбеддинг
+        storage: float32, float16 или int8 (по умолчанию EMBEDDING_STORAGE)
+    """
+    storage = storage or settings.EMBEDDING_STORAGE
+    if storage not in FORMAT_TAGS:
+        raise ValueError(f"Unknown embedding storage: {storage}")
+    tag = FORMAT_TAGS[storage]
+    array = np.asarray(vector, dtype=np.float32).ravel()
+
+    if tag == 3:
+        peak = float(np.abs(array).max()) if array.size else 0.0
+        scale = peak / 127 if peak > 0 else 1.0
+        codes = np.clip(np.rint(array / scale), -127, 127).astype(np.int8)
+        return bytes([tag]) + np.array(scale, dtype=_SCALE_DTYPE).tobytes() + codes.tobytes()
+    return bytes([tag]) + array.astype(_DTYPES[tag]).tobytes()
+
+
+def decode_embedding(data: Blob) -> np.ndarray:
+    """Вектор float32 из байтов (или из JSON строки до миграции)"""
+    if isinstance(data, str):
+        return np.asarray(json.loads(data), dtype=np.float32)
+    view = memoryview(data)
+    tag = view[0]
+    if tag == 3:
+        scale = np.frombuffer(view, dtype=_SCALE_DTYPE, count=1, offset=1)[0]
+        return np.frombuffer(view, dtype=_DTYPES[3], offset=1 + _SCALE_DTYPE.itemsize).astype(np.float32) * scale
+    if tag not in _DTYPES:
+        raise ValueError(f"Unknown embedding format tag: {tag}")
+    return np.frombuffer(view, dtype=_DTYPES[tag], offset=1).astype(np.float32)
+
+
+def decode_embeddings(blobs: Iterable[Blob]) -> np.ndarray:
+    """
+    Матрица эмбеддингов (строка на вектор)
+
+    Строки одного формата без масштаба декодируются одним np.frombuffer
+    по склеенным байтам.
+    """
+    blobs = [blob for blob in blobs if blob is not None]
+    if not blobs:
+        return np.empty((0, 0), dtype=np.float32)
+
+    first = blobs[0]
+    if not isinstance(first, str) and first[0] in (1, 2):
+        tag, size = first[0], len(first)
+        if all(not isinstance(blob, str) and len(blob) == size and blob[0] == tag for blob in blobs):
+            raw = np.frombuffer(b"".join(bytes(blob) for blob in blobs), dtype=np.uint8).reshape(len(blobs), size)
+            return np.ascontiguousarray(raw[:, 1:]).view(_DTYPES[tag]).astype(np.float32)
+
+    return np.vstack([decode_embedding(blob) for blob in blobs])
+
+
+def to_vector_literal(vector: Sequence[float]) -> str:
+    """Текстовое представление для параметра CAST(:value AS vector) в pgvector"""
+    return "[" + ",".join(f"{value:.7g}" for value in np.asarray(vector, dtype=np.float32).ravel()) + "]"
@@ -0,0 +1,305 @@
+"""
+Векторные индексы FAISS по пользователям
+
+Поиск похожих событий всегда ограничен одним пользователем, поэтому
+у каждого пользователя свой небольшой индекс: IndexFlatIP по
+нормализованным векторам (скалярное произведение = косинусное сходство)
+с id событий через IndexIDMap2.
+
+Источник истины - таблица event_embeddings, индекс FAISS - кэш процесса
+(бот, api и celery держат каждый свой). Индекс помечен версией строк
+пользователя в базе (IndexVersion: число строк и max(updated_at)),
+и перед поиском версия сверяется с базой: при расхождении индекс
+перестраивается из event_embeddings. Поэтому после записи эмбеддингов
+индекс не правится по одному вектору, а сверяется с базой заново;
+удаление события убирает его из загруженного индекса сразу и снимает
+версию.
+
+Индексы хранятся в FAISS_INDEX_DIR, имя файла включает версию, поэтому
+процессы не затирают чужое состояние: файл с одной версией у всех
+одинаков, замена через os.replace атомарна, а устаревшие файлы
+удаляются при сохранении. Файлы загружаются через mmap - поиск не
+копирует вектора в память процесса. В памяти держится не более
+FAISS_MAX_LOADED_USERS индексов, построенные сохраняются на диск не
+чаще раза в FAISS_SAVE_INTERVAL секунд и при остановке.
+
+faiss - необязательная зависимость: без неё available = False,
+и VectorSearchService ищет запросом к базе.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _import_faiss() -> Any:
+    try:
+        import faiss
+        return faiss
+    except ImportError:
+        return None
+
+
+def normalize(vectors: Any) -> np.ndarray:
+    """Вектора float32 единичной длины (строки матрицы)"""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms)
+
+
+class IndexVersion(NamedTuple):
+    """Состояние строк event_embeddings пользователя, по которому построен индекс"""
+    count: int
+    updated_at: Optional[datetime]
+
+    @property
+    def tag(self) -> str:
+        """Часть имени файла индекса"""
+        stamp = int(self.updated_at.timestamp() * 1_000_000) if self.updated_at else 0
+        return f"{self.count}_{stamp}"
+
+
+class _UserIndex:
+    """Индекс одного пользователя"""
+
+    def __init__(self, index: Any, version: Optional[IndexVersion], mmapped: bool = False):
+        self.index = index
+        # None - индекс изменён в процессе и не соответствует ни одной версии в базе
+        self.version = version
+        self.mmapped = mmapped
+        self.dirty = False
+
+    @property
+    def size(self) -> int:
+        return self.index.ntotal
+
+
+class FaissIndexStore:
+    """Индексы FAISS пользователей с загрузкой по требованию"""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        dimension: int = 384,
+        max_loaded: Optional[int] = None,
+        save_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            directory: Каталог файлов индексов
+            dimension: Размерность эмбеддингов
+            max_loaded: Сколько индексов держать в памяти
+            save_interval: Минимальный интервал сохранения изменённых индексов, секунды
+        """
+        self.directory = Path(directory or settings.FAISS_INDEX_DIR)
+        self.dimension = dimension
+        self.max_loaded = max_loaded or settings.FAISS_MAX_LOADED_USERS
+        self.save_interval = save_interval if save_interval is not None else settings.FAISS_SAVE_INTERVAL
+        self.enabled = settings.FAISS_INDEX_ENABLED
+        self._faiss_module: Any = None
+        self._indexes: "OrderedDict[int, _UserIndex]" = OrderedDict()
+        # Поиск и обновления приходят из event loop и потоков executor
+        self._lock = threading.RLock()
+        self._last_save = time.monotonic()
+
+    @property
+    def _faiss(self) -> Any:
+        # faiss импортируется при первом обращении, а не при импорте модуля
+        if self._faiss_module is None and self.enabled:
+            self._faiss_module = _import_faiss() or False
+        return self._faiss_module or None
+
+    @property
+    def available(self) -> bool:
+        return self._faiss is not None
+
+    def path(self, user_id: int, version: IndexVersion) -> Path:
+        return self.directory / f"user_{user_id}.{version.tag}.faiss"
+
+    def _files(self, user_id: int) -> List[Path]:
+        return list(self.directory.glob(f"user_{user_id}.*.faiss"))
+
+    def is_current(self, user_id: int, version: IndexVersion) -> bool:
+        """
+        Индекс пользователя соответствует версии из базы
+
+        Индекс этой версии, сохранённый другим процессом, загружается с диска.
+        """
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is not None and entry.version == version:
+                self._indexes.move_to_end(user_id)
+                return True
+            if not self.path(user_id, version).exists():
+                return False
+            try:
+                self._put(user_id, self._load(user_id, version))
+            except RuntimeError as e:
+                # Файл удалён или заменён между проверкой и чтением
+                logger.warning(f"Cannot load FAISS index for user {user_id}: {e}")
+                return False
+        metrics.increment("ai.faiss.loads")
+        return True
+
+    def build(
+        self,
+        user_id: int,
+        items: Iterable[Tuple[int, Sequence[float]]],
+        version: Optional[IndexVersion] = None
+    ) -> int:
+        """
+        Строит индекс пользователя заново
+
+        Args:
+            user_id: ID пользователя
+            items: Пары (id события, эмбеддинг)
+            version: Версия строк event_embeddings, из которых построен индекс
+
+        Returns:
+            Количество векторов в индексе
+        """
+        items = [(event_id, vector) for event_id, vector in items if vector is not None and len(vector)]
+        index = self._new_index()
+        if items:
+            ids = np.array([event_id for event_id, _ in items], dtype=np.int64)
+            index.add_with_ids(normalize([vector for _, vector in items]), ids)
+        with self._lock:
+            entry = _UserIndex(index, version)
+            entry.dirty = version is not None
+            self._put(user_id, entry)
+        metrics.increment("ai.faiss.builds")
+        self.maybe_save()
+        return index.ntotal
+
+    def remove(self, user_id: int, event_id: int) -> bool:
+        """Удаляет вектор события; False, если его не было"""
+        with self._lock:
+            entry = self._writable(user_id)
+            if entry is None:
+                return False
+            removed = entry.index.remove_ids(np.array([event_id], dtype=np.int64))
+        metrics.increment("ai.faiss.updates", tags={"op": "remove"})
+        return removed > 0
+
+    def drop(self, user_id: int) -> None:
+        """Забывает индекс пользователя в памяти и на диске - он будет построен заново"""
+        with self._lock:
+            self._indexes.pop(user_id, None)
+            for path in self._files(user_id):
+                path.unlink(missing_ok=True)
+
+    def search(self, user_id: int, vector: Sequence[float], k: int) -> List[Tuple[int, float]]:
+        """
+        Ближайшие события пользователя
+
+        Returns:
+            Пары (id события, косинусное сходство) по убыванию сходства
+        """
+        started_at = time.perf_counter()
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is None or entry.size == 0:
+                return []
+            self._indexes.move_to_end(user_id)
+            scores, ids = entry.index.search(normalize(vector), min(k, entry.size))
+        metrics.timer("ai.faiss.search_time", time.perf_counter() - started_at)
+        return [(int(event_id), float(score)) for event_id, score in zip(ids[0], scores[0]) if event_id != -1]
+
+    def maybe_save(self) -> None:
+        """Сохраняет изменённые индексы, если интервал прошёл"""
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self) -> int:
+        """
+        Сохраняет построенные и ещё не сохранённые индексы
+
+        Returns:
+            Количество сохранённых индексов
+        """
+        saved = 0
+        with self._lock:
+            self._last_save = time.monotonic()
+            for user_id, entry in self._indexes.items():
+                if entry.dirty:
+                    self._write(user_id, entry)
+                    saved += 1
+        return saved
+
+    def _new_index(self) -> Any:
+        return self._faiss.IndexIDMap2(self._faiss.IndexFlatIP(self.dimension))
+
+    def _writable(self, user_id: int) -> Optional[_UserIndex]:
+        """
+        Загруженный индекс для правки в процессе
+
+        Незагруженный не нужен: он будет построен из базы, где правка уже есть.
+        """
+        entry = self._indexes.get(user_id)
+        if entry is None:
+            return None
+        self._indexes.move_to_end(user_id)
+        if entry.mmapped:
+            # Отображённый в память индекс только для чтения - копия в памяти
+            entry.index = self._faiss.deserialize_index(self._faiss.serialize_index(entry.index))
+            entry.mmapped = False
+        # Правка расходится с версией: индекс не сохраняется и сверится с базой заново
+        entry.version = None
+        entry.dirty = False
+        return entry
+
+    def _load(self, user_id: int, version: IndexVersion) -> _UserIndex:
+        path = str(self.path(user_id, version))
+        try:
+            flags = self._faiss.IO_FLAG_MMAP | self._faiss.IO_FLAG_READ_ONLY
+            return _UserIndex(self._faiss.read_index(path, flags), version, mmapped=True)
+        except RuntimeError:
+            # Версия faiss без mmap для этого типа индекса
+            return _UserIndex(self._faiss.read_index(path), version)
+
+    def _put(self, user_id: int, entry: _UserIndex) -> None:
+        self._indexes[user_id] = entry
+        self._indexes.move_to_end(user_id)
+        while len(self._indexes) > self.max_loaded:
+            evicted_id, evicted = self._indexes.popitem(last=False)
+            if evicted.dirty:
+                self._write(evicted_id, evicted)
+
+    def _write(self, user_id: int, entry: _UserIndex) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(user_id, entry.version)
+        # Временный файл свой у процесса, замена атомарна: читающий через mmap
+        # не увидит половину файла, а файл той же версии у всех процессов одинаков
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        self._faiss.write_index(entry.index, str(tmp_path))
+        os.replace(tmp_path, path)
+        entry.dirty = False
+        for stale in self._files(user_id):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Загруженные индексы и количество векторов в них"""
+        with self._lock:
+            return {
+                "available": self.available,
+                "loaded": len(self._indexes),
+                "vectors": sum(entry.size for entry in self._indexes.values()),
+                "dirty": sum(1 for entry in self._indexes.values() if entry.dirty),
+            }
+
+
+# Общее хранилище индексов процесса
+faiss_index_store = FaissIndexStore()
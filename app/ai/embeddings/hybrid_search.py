@@ -0,0 +1,219 @@
+"""
+Гибридный поиск событий: полнотекстовый + векторный
+
+Семантический поиск плохо находит точные адреса и имена клиентов
+("показ на Арбате"), полнотекстовый - перефразировки. Оба поиска
+дают свои ранги кандидатов, итоговый порядок - reciprocal rank fusion:
+
+    score = sum(1 / (HYBRID_RRF_K + rank))
+
+Полнотекстовый поиск - GIN индекс по events.search_vector (title,
+location, description, словарь russian). Векторные ранги считаются
+в том же SQL запросе (pgvector) или заранее в процессе (FAISS) и
+передаются в запрос массивом - в обоих случаях к базе один запрос.
+
+Результаты кэшируются в CacheService по (пользователь, запрос) вместе
+с версией поиска пользователя; изменение событий меняет версию.
+"""
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.ai.embeddings.codec import to_vector_literal
+from app.ai.embeddings.vector_service import VectorSearchService, get_vector_service
+from app.config import settings
+from app.core.cache import CacheKeys, CacheService, cache_service
+from app.core.logging import metrics
+from app.database import get_async_session
+
+logger = logging.getLogger(__name__)
+
+# Запрос с OR вместо AND: событие, где есть хотя бы одно слово, - кандидат,
+# больше совпавших слов - выше ts_rank_cd
+_TEXT_CTES = """
+    query AS (
+        SELECT NULLIF(replace(plainto_tsquery('russian', :query)::text, ' & ', ' | '), '')::tsquery AS tsq
+    ),
+    text_hits AS (
+        SELECT e.id, row_number() OVER (ORDER BY ts_rank_cd(e.search_vector, query.tsq) DESC, e.id) AS rank
+        FROM events e, query
+        WHERE e.user_id = :user_id AND e.search_vector @@ query.tsq
+        ORDER BY rank
+        LIMIT :candidates
+    )
+"""
+
+_VECTOR_HITS_FROM_IDS = """
+    vector_hits AS (
+        SELECT hit.id, hit.rank
+        FROM unnest(CAST(:vector_ids AS bigint[])) WITH ORDINALITY AS hit(id, rank)
+    )
+"""
+
+_VECTOR_HITS_PGVECTOR = """
+    vector_hits AS (
+        SELECT nearest.id, row_number() OVER (ORDER BY nearest.distance) AS rank
+        FROM (
+            SELECT ee.event_id AS id, ee.embedding_vec <=> CAST(:query_embedding AS vector) AS distance
+            FROM event_embeddings ee
+            JOIN events e ON e.id = ee.event_id
+            WHERE e.user_id = :user_id
+            ORDER BY distance
+            LIMIT :candidates
+        ) nearest
+        WHERE 1 - nearest.distance > :min_similarity
+    )
+"""
+
+_FUSION = """
+    fused AS (
+        SELECT hits.id, SUM(1.0 / (:rrf_k + hits.rank)) AS score
+        FROM (
+            SELECT id, rank FROM text_hits
+            UNION ALL
+            SELECT id, rank FROM vector_hits
+        ) hits
+        GROUP BY hits.id
+    )
+    SELECT e.id, e.title, e.description, e.start_time, e.location,
+        fused.score, text_hits.rank AS text_rank, vector_hits.rank AS vector_rank
+    FROM fused
+    JOIN events e ON e.id = fused.id AND e.user_id = :user_id
+    LEFT JOIN text_hits ON text_hits.id = fused.id
+    LEFT JOIN vector_hits ON vector_hits.id = fused.id
+    ORDER BY fused.score DESC, e.start_time DESC
+    LIMIT :limit
+"""
+
+
+def build_hybrid_query(pgvector: bool) -> str:
+    """SQL гибридного поиска: векторные ранги из pgvector или из массива :vector_ids"""
+    vector_cte = _VECTOR_HITS_PGVECTOR if pgvector else _VECTOR_HITS_FROM_IDS
+    return f"WITH {_TEXT_CTES}, {vector_cte}, {_FUSION}"
+
+
+def query_hash(query: str) -> str:
+    """Хэш нормализованного запроса для ключа кэша"""
+    normalized = " ".join(query.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+class HybridSearchService:
+    """Поиск событий пользователя с объединением полнотекстового и векторного рангов"""
+
+    def __init__(self, vector_service: Optional[VectorSearchService] = None, cache: Optional[CacheService] = None):
+        """
+        Args:
+            vector_service: Сервис эмбеддингов и векторных индексов
+            cache: Кэш результатов
+        """
+        self._vector_service = vector_service
+        self.cache = cache or cache_service
+
+    @property
+    def vector_service(self) -> VectorSearchService:
+        if self._vector_service is None:
+            self._vector_service = get_vector_service()
+        return self._vector_service
+
+    async def search(self, query: str, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Ищет события пользователя
+
+        Args:
+            query: Поисковый запрос
+            user_id: ID пользователя
+            limit: Максимальное количество результатов
+
+        Returns:
+            События по убыванию score с рангами обоих поисков (None - не найдено этим поиском)
+        """
+        query = query.strip()
+        if not query:
+            return []
+
+        cache_key = CacheKeys.EVENT_SEARCH.format(user_id=user_id, query_hash=query_hash(query))
+        version_key = CacheKeys.EVENT_SEARCH_VERSION.format(user_id=user_id)
+        # Результат и версия поиска пользователя - одним обращением к Redis
+        cached = await self.cache.get_many([cache_key, version_key])
+        entry = cached.get(cache_key)
+        if entry is not None and entry["version"] == cached.get(version_key) and entry["limit"] >= limit:
+            metrics.increment("ai.search.hybrid.cache", tags={"result": "hit"})
+            return entry["results"][:limit]
+        metrics.increment("ai.search.hybrid.cache", tags={"result": "miss"})
+
+        started_at = time.perf_counter()
+        results = await self._search(query, user_id, limit)
+        metrics.timer("ai.search.hybrid.time", time.perf_counter() - started_at)
+
+        await self.cache.set(
+            cache_key,
+            {"version": cached.get(version_key), "limit": limit, "results": results},
+            expire=settings.HYBRID_SEARCH_CACHE_TTL
+        )
+        return results
+
+    async def _search(self, query: str, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        params: Dict[str, Any] = {
+            "query": query,
+            "user_id": user_id,
+            "candidates": max(settings.HYBRID_SEARCH_CANDIDATES, limit),
+            "rrf_k": settings.HYBRID_RRF_K,
+            "limit": limit,
+        }
+        pgvector, vector_params = await self._vector_params(query, user_id, params["candidates"])
+        params.update(vector_params)
+
+        async for session in get_async_session():
+            result = await session.execute(text(build_hybrid_query(pgvector)), params)
+            rows = result.fetchall()
+            break
+
+        return [
+            {
+                "id": row.id,
+                "title": row.title,
+                "description": row.description,
+                "start_time": row.start_time,
+                "location": row.location,
+                "score": float(row.score),
+                "text_rank": row.text_rank,
+                "vector_rank": row.vector_rank,
+            }
+            for row in rows
+        ]
+
+    async def _vector_params(self, query: str, user_id: int, candidates: int) -> Tuple[bool, Dict[str, Any]]:
+        """Параметры векторной части запроса; без эмбеддинга - только полнотекстовый поиск"""
+        service = self.vector_service
+        embedding = await service.embed(query)
+        if embedding is None:
+            return False, {"vector_ids": []}
+
+        if service.use_pgvector:
+            return True, {
+                "query_embedding": to_vector_literal(embedding),
+                "min_similarity": settings.HYBRID_VECTOR_MIN_SIMILARITY,
+            }
+
+        if service.use_faiss:
+            await service.ensure_user_index(user_id)
+            hits = service.index.search(user_id, embedding, candidates)
+        else:
+            events = await service.search_stored(
+                embedding, user_id, candidates, settings.HYBRID_VECTOR_MIN_SIMILARITY
+            )
+            hits = [(event["id"], event["similarity"]) for event in events]
+
+        return False, {
+            "vector_ids": [
+                event_id for event_id, similarity in hits if similarity > settings.HYBRID_VECTOR_MIN_SIMILARITY
+            ]
+        }
+
+
+# Общий сервис гибридного поиска
+hybrid_search_service = HybridSearchService()
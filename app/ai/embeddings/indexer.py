@@ -0,0 +1,472 @@
+"""
+Фоновая индексация эмбеддингов событий
+
+Создание и изменение события не ждут модель и базу: обработчик ставит
+id события в очередь (schedule_event_indexing), фоновая задача
+индексирует его через EMBEDDING_INDEX_DEBOUNCE секунд после последнего
+изменения - серия правок подряд кодируется один раз. Готовые события
+обрабатываются пачками до EMBEDDING_INDEX_BATCH_SIZE:
+
+- события и проиндексированный текст читаются одним запросом;
+- события, у которых текст не изменился (перенос времени, смена
+  статуса), не кодируются заново;
+- тексты кодируются одной пачкой через батчер эмбеддингов;
+- строки event_embeddings записываются одним INSERT ... ON CONFLICT.
+
+backfill() индексирует все существующие события страницами по id с
+записью через COPY во временную таблицу и слиянием в event_embeddings
+(scripts/backfill_embeddings.py).
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.ai.embeddings.codec import encode_embedding, to_vector_literal
+from app.ai.embeddings.vector_service import VectorSearchService, event_content, get_vector_service
+from app.config import settings
+from app.core.cache import CacheManager
+from app.core.logging import metrics
+from app.models.event import Event
+
+logger = logging.getLogger(__name__)
+
+STAGE_TABLE = "event_embeddings_stage"
+
+# (id события, id пользователя, текст, эмбеддинг)
+IndexedEvent = Tuple[int, int, str, np.ndarray]
+
+
+def build_select_query(where: str, pgvector: bool, limit: bool = False) -> str:
+    """
+    События с проиндексированным текстом
+
+    indexed_content - NULL, если эмбеддинга нет (или нет колонки pgvector
+    при бэкенде pgvector), - такое событие индексируется заново.
+    """
+    indexed = "ee.embedding IS NOT NULL" + (" AND ee.embedding_vec IS NOT NULL" if pgvector else "")
+    return f"""
+        SELECT e.id, e.user_id, e.title, e.description,
+            CASE WHEN {indexed} THEN ee.content END AS indexed_content
+        FROM events e
+        LEFT JOIN event_embeddings ee ON ee.event_id = e.id
+        WHERE {where}
+        ORDER BY e.id
+        {"LIMIT :limit" if limit else ""}
+    """
+
+
+def build_upsert_query(pgvector: bool, staged: bool) -> str:
+    """
+    Запись пачки в event_embeddings
+
+    Источник - массивы параметров (unnest) или временная таблица,
+    заполненная COPY (staged).
+    """
+    if staged:
+        source = f"{STAGE_TABLE} AS src"
+    elif pgvector:
+        source = (
+            "unnest(CAST(:event_ids AS bigint[]), CAST(:embeddings AS bytea[]), CAST(:contents AS text[]), "
+            "CAST(:vectors AS text[])) AS src(event_id, embedding, content, embedding_vec)"
+        )
+    else:
+        source = (
+            "unnest(CAST(:event_ids AS bigint[]), CAST(:embeddings AS bytea[]), CAST(:contents AS text[])) "
+            "AS src(event_id, embedding, content)"
+        )
+
+    columns = ["event_id", "embedding", "content"]
+    values = ["src.event_id", "src.embedding", "src.content"]
+    if pgvector:
+        columns.append("embedding_vec")
+        values.append("CAST(src.embedding_vec AS vector)")
+    updates = [f"{column} = EXCLUDED.{column}" for column in columns[1:]] + ["updated_at = NOW()"]
+    return f"""
+        INSERT INTO event_embeddings ({", ".join(columns)})
+        SELECT {", ".join(values)} FROM {source}
+        ON CONFLICT (event_id) DO UPDATE SET {", ".join(updates)}
+    """
+
+
+@dataclass
+class _Pending:
+    user_id: int
+    due: float
+    removed: bool = False
+
+
+@dataclass
+class BackfillStats:
+    """Итоги индексации всех событий"""
+    events: int = 0
+    indexed: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+    encode_time: float = 0.0
+    write_time: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Проиндексировано событий в секунду"""
+        return self.indexed / self.elapsed if self.elapsed else 0.0
+
+
+class EventIndexer:
+    """Очередь индексации событий с откладыванием повторных правок"""
+
+    def __init__(
+        self,
+        vector_service: Optional[VectorSearchService] = None,
+        session_factory: Any = None,
+        debounce: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ):
+        """
+        Args:
+            vector_service: Сервис эмбеддингов и векторных индексов
+            session_factory: Фабрика AsyncSession (по умолчанию пул приложения)
+            debounce: Задержка индексации после последнего изменения, секунды
+            batch_size: Максимум событий в пачке
+        """
+        self._vector_service = vector_service
+        self.session_factory = session_factory
+        self.debounce = debounce if debounce is not None else settings.EMBEDDING_INDEX_DEBOUNCE
+        self.batch_size = batch_size or settings.EMBEDDING_INDEX_BATCH_SIZE
+        self._pending: Dict[int, _Pending] = {}
+        # Фоновая задача и событие пробуждения привязаны к event loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.indexed = 0
+        self.skipped = 0
+        self.batches = 0
+
+    @property
+    def vector_service(self) -> VectorSearchService:
+        if self._vector_service is None:
+            self._vector_service = get_vector_service()
+        return self._vector_service
+
+    def enqueue(self, event_id: int, user_id: int) -> None:
+        """Ставит событие в очередь; повторная постановка откладывает индексацию"""
+        self._pending[event_id] = _Pending(user_id, time.monotonic() + self.debounce)
+        self._wake()
+
+    def discard(self, event_id: int, user_id: int) -> None:
+        """Отменяет индексацию удалённого события и убирает его из индекса FAISS"""
+        self._pending[event_id] = _Pending(user_id, time.monotonic(), removed=True)
+        self._wake()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _wake(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне event loop очередь обработает flush()
+            return
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        self._wakeup.set()
+
+    def _take(self, now: Optional[float] = None) -> List[Tuple[int, _Pending]]:
+        """Забирает из очереди пачку событий, срок которых наступил (все при now=None)"""
+        batch = [
+            (event_id, item) for event_id, item in self._pending.items()
+            if now is None or item.due <= now
+        ][:self.batch_size]
+        for event_id, _ in batch:
+            del self._pending[event_id]
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = self._take(time.monotonic())
+            if batch:
+                await self._process(batch)
+                continue
+
+            self._wakeup.clear()
+            timeout = None
+            if self._pending:
+                timeout = max(0.0, min(item.due for item in self._pending.values()) - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, batch: List[Tuple[int, _Pending]]) -> None:
+        removed = [(event_id, item.user_id) for event_id, item in batch if item.removed]
+        changed = [event_id for event_id, item in batch if not item.removed]
+        try:
+            if removed:
+                self._remove(removed)
+            if changed:
+                await self.index_events(changed)
+        except Exception as e:
+            logger.error(f"Indexing of {len(batch)} events failed: {e}")
+            metrics.increment("ai.embedding.index_errors")
+
+    def _remove(self, events: List[Tuple[int, int]]) -> None:
+        # Строки event_embeddings удаляются вместе с событием каскадно
+        service = self.vector_service
+        if not service.use_faiss:
+            return
+        for event_id, user_id in events:
+            service.index.remove(user_id, event_id)
+
+    async def flush(self) -> int:
+        """
+        Обрабатывает всю очередь, не дожидаясь задержки
+
+        Returns:
+            Количество обработанных событий
+        """
+        processed = 0
+        while self._pending:
+            batch = self._take()
+            await self._process(batch)
+            processed += len(batch)
+        return processed
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу и обрабатывает остаток очереди"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush()
+
+    async def index_events(self, event_ids: Sequence[int], force: bool = False) -> int:
+        """
+        Индексирует события одной пачкой
+
+        Args:
+            event_ids: ID событий (удалённые пропускаются)
+            force: Кодировать, даже если текст не изменился
+
+        Returns:
+            Количество закодированных событий
+        """
+        started_at = time.perf_counter()
+        service = self.vector_service
+        async with await self._session() as session:
+            result = await session.execute(
+                text(build_select_query("e.id = ANY(CAST(:event_ids AS bigint[]))", service.use_pgvector)),
+                {"event_ids": list(event_ids)}
+            )
+            items = await self._encode(result.fetchall(), force)
+            if items:
+                await session.execute(
+                    text(build_upsert_query(service.use_pgvector, staged=False)),
+                    self._upsert_params(items, service.use_pgvector)
+                )
+                await session.commit()
+
+        await self._apply(items)
+        self.batches += 1
+        metrics.timer("ai.embedding.index_time", time.perf_counter() - started_at)
+        return len(items)
+
+    async def _encode(self, rows: Sequence[Any], force: bool) -> List[IndexedEvent]:
+        """Кодирует события, текст которых изменился с прошлой индексации"""
+        contents = [(row, event_content(row.title, row.description)) for row in rows]
+        changed = [(row, content) for row, content in contents if force or content != row.indexed_content]
+        skipped = len(contents) - len(changed)
+        self.skipped += skipped
+        if skipped:
+            metrics.increment("ai.embedding.index_skipped", skipped)
+        if not changed:
+            return []
+
+        embeddings = await self.vector_service.embed_many([content for _, content in changed])
+        items = [
+            (row.id, row.user_id, content, embedding)
+            for (row, content), embedding in zip(changed, embeddings)
+            if embedding is not None
+        ]
+        self.indexed += len(items)
+        metrics.increment("ai.embedding.indexed", len(items))
+        return items
+
+    @staticmethod
+    def _upsert_params(items: List[IndexedEvent], pgvector: bool) -> Dict[str, list]:
+        params = {
+            "event_ids": [event_id for event_id, _, _, _ in items],
+            "embeddings": [encode_embedding(embedding) for _, _, _, embedding in items],
+            "contents": [content for _, _, content, _ in items],
+        }
+        if pgvector:
+            params["vectors"] = [to_vector_literal(embedding) for _, _, _, embedding in items]
+        return params
+
+    async def _apply(self, items: List[IndexedEvent]) -> None:
+        """Сверяет индексы FAISS с записанной пачкой и сбрасывает кэш поиска её пользователей"""
+        if not items:
+            return
+        service = self.vector_service
+        users = {user_id for _, user_id, _, _ in items}
+        if service.use_faiss:
+            # Индекс перестраивается из базы, где пачка уже записана
+            for user_id in users:
+                await service.ensure_user_index(user_id)
+        for user_id in users:
+            await CacheManager.invalidate_event_search_cache(user_id)
+
+    async def backfill(
+        self,
+        page_size: int = 1000,
+        force: bool = False,
+        progress: Optional[Callable[[BackfillStats], None]] = None
+    ) -> BackfillStats:
+        """
+        Индексирует все события
+
+        Страницы читаются по id, кодирование следующей страницы идёт
+        параллельно с записью предыдущей через COPY.
+
+        Args:
+            page_size: Событий на страницу
+            force: Перекодировать и события с неизменившимся текстом
+            progress: Вызывается после каждой страницы
+
+        Returns:
+            Итоги с пропускной способностью
+        """
+        stats = BackfillStats()
+        started_at = time.perf_counter()
+        service = self.vector_service
+        select_page = text(build_select_query("e.id > :last_id", service.use_pgvector, limit=True))
+        users: Set[int] = set()
+        write: Optional[asyncio.Task] = None
+        last_id = 0
+
+        async with await self._session() as reader, await self._session() as writer:
+            try:
+                while True:
+                    result = await reader.execute(select_page, {"last_id": last_id, "limit": page_size})
+                    rows = result.fetchall()
+                    await reader.commit()
+                    if not rows:
+                        break
+                    last_id = rows[-1].id
+                    stats.events += len(rows)
+
+                    encode_started = time.perf_counter()
+                    items = await self._encode(rows, force)
+                    stats.encode_time += time.perf_counter() - encode_started
+                    stats.indexed += len(items)
+                    stats.skipped += len(rows) - len(items)
+                    users.update(user_id for _, user_id, _, _ in items)
+
+                    if write is not None:
+                        stats.write_time += await write
+                    write = asyncio.get_running_loop().create_task(
+                        self._copy(writer, items, service.use_pgvector)
+                    )
+                    stats.elapsed = time.perf_counter() - started_at
+                    if progress is not None:
+                        progress(stats)
+                if write is not None:
+                    stats.write_time += await write
+                    write = None
+            finally:
+                if write is not None:
+                    write.cancel()
+
+        if service.use_faiss:
+            # Индексы затронутых пользователей строятся заново из базы при следующем поиске
+            for user_id in users:
+                service.index.drop(user_id)
+        for user_id in users:
+            await CacheManager.invalidate_event_search_cache(user_id)
+
+        stats.elapsed = time.perf_counter() - started_at
+        metrics.gauge("ai.embedding.backfill_rate", stats.rate)
+        return stats
+
+    @staticmethod
+    async def _copy(session: Any, items: List[IndexedEvent], pgvector: bool) -> float:
+        """Записывает пачку через COPY во временную таблицу и слияние, возвращает время"""
+        started_at = time.perf_counter()
+        if not items:
+            return 0.0
+        await session.execute(text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} "
+            f"(event_id bigint, embedding bytea, content text, embedding_vec text) ON COMMIT DROP"
+        ))
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            STAGE_TABLE,
+            records=[
+                (
+                    event_id,
+                    encode_embedding(embedding),
+                    content,
+                    to_vector_literal(embedding) if pgvector else None,
+                )
+                for event_id, _, content, embedding in items
+            ],
+            columns=["event_id", "embedding", "content", "embedding_vec"],
+        )
+        await session.execute(text(build_upsert_query(pgvector, staged=True)))
+        await session.commit()
+        return time.perf_counter() - started_at
+
+    async def _session(self) -> Any:
+        if self.session_factory is not None:
+            return self.session_factory()
+        from app import database
+
+        if database.async_session_pool is None:
+            await database.create_pool(settings.DATABASE_URL)
+        return database.async_session_pool()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Очередь и счётчики индексации"""
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "indexed": self.indexed,
+            "skipped": self.skipped,
+        }
+
+
+# Общая очередь индексации процесса
+event_indexer = EventIndexer()
+_background_tasks: set = set()
+
+
+def _spawn(coro) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    # Ссылка на задачу, чтобы её не собрал сборщик мусора
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def schedule_event_indexing(event: Event) -> None:
+    """Ставит созданное или изменённое событие в очередь индексации, не задерживая ответ"""
+    event_indexer.enqueue(event.id, event.user_id)
+    # Полнотекстовая часть поиска видит изменения сразу
+    _spawn(CacheManager.invalidate_event_search_cache(event.user_id))
+
+
+def schedule_event_removal(event_id: int, user_id: int) -> None:
+    """Убирает удалённое событие из очереди и индекса"""
+    event_indexer.discard(event_id, user_id)
+    _spawn(CacheManager.invalidate_event_search_cache(user_id))
@@ -1,16 +1,25 @@
+import asyncio
 import logging
 import numpy as np
 from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from sqlalchemy.ext.asyncio import AsyncSession
-import json
 
+from app.ai.embeddings.batcher import embedding_batcher
+from app.ai.embeddings.codec import decode_embeddings, encode_embedding, to_vector_literal
+from app.ai.embeddings.faiss_index import IndexVersion, faiss_index_store, normalize
+from app.ai.model_registry import model_registry
+from app.config import settings
 from app.database import get_async_session
-from app.models.event import Event
 
 logger = logging.getLogger(__name__)
 
+
+def event_content(title: str, description: Optional[str] = None) -> str:
+    """Текст события, по которому строится эмбеддинг"""
+    return f"{title} {description}" if description else title
+
+
 class VectorSearchService:
     """
     Сервис семантического поиска по событиям
@@ -21,12 +30,27 @@ class VectorSearchService:
         """Инициализация модели для эмбеддингов"""
         try:
             # Используем многоязычную модель для русского языка
-            self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+            self.model = model_registry.get(
+                model_registry.sentence_transformer_key(settings.EMBEDDING_MODEL)
+            )
             self.embedding_dimension = 384
             logger.info("Vector search service initialized")
         except Exception as e:
             logger.error(f"Failed to initialize vector search: {e}")
             self.model = None
+        # Индексация и поисковые запросы кодируются общими пачками
+        self.batcher = embedding_batcher
+        # Индексы FAISS по пользователям; без faiss - поиск запросом к базе
+        self.index = faiss_index_store
+        self.backend = settings.VECTOR_SEARCH_BACKEND
+    
+    @property
+    def use_faiss(self) -> bool:
+        return self.backend == "faiss" and self.index.available
+    
+    @property
+    def use_pgvector(self) -> bool:
+        return self.backend == "pgvector"
     
     def create_embedding(self, text: str) -> Optional[List[float]]:
         """
@@ -55,40 +79,111 @@ class VectorSearchService:
             logger.error(f"Error creating embedding: {e}")
             return None
     
-    async def add_event_embedding(self, event_id: int, title: str, description: Optional[str] = None):
-        """Добавляет эмбеддинг для события"""
+    async def add_event_embedding(
+        self,
+        event_id: int,
+        title: str,
+        description: Optional[str] = None,
+        user_id: Optional[int] = None
+    ):
+        """Добавляет эмбеддинг для события (и сверяет индекс FAISS пользователя, если user_id передан)"""
         try:
             # Формируем контент для эмбеддинга
-            content = title
-            if description:
-                content += f" {description}"
+            content = event_content(title, description)
             
             # Получаем эмбеддинг
-            embedding = await self.get_embedding(content)
-            
-            # Сохраняем в базу как JSON строку
-            embedding_json = json.dumps(embedding)
+            embedding = await self.embed(content)
+            if embedding is None:
+                return
             
-            async for session in get_async_session():
-                await session.execute(text("""
+            params = {
+                'event_id': event_id,
+                'embedding': encode_embedding(embedding),  # Байты в формате EMBEDDING_STORAGE
+                'content': content
+            }
+            if self.use_pgvector:
+                # Колонка pgvector для индекса HNSW
+                query = text("""
+                    INSERT INTO event_embeddings (event_id, embedding, embedding_vec, content)
+                    VALUES (:event_id, :embedding, CAST(:embedding_vec AS vector), :content)
+                    ON CONFLICT (event_id) DO UPDATE SET
+                        embedding = EXCLUDED.embedding,
+                        embedding_vec = EXCLUDED.embedding_vec,
+                        content = EXCLUDED.content,
+                        updated_at = NOW()
+                """)
+                params['embedding_vec'] = to_vector_literal(embedding)
+            else:
+                query = text("""
                     INSERT INTO event_embeddings (event_id, embedding, content)
                     VALUES (:event_id, :embedding, :content)
                     ON CONFLICT (event_id) DO UPDATE SET
                         embedding = EXCLUDED.embedding,
                         content = EXCLUDED.content,
                         updated_at = NOW()
-                """), {
-                    'event_id': event_id,
-                    'embedding': embedding_json,  # Сохраняем как JSON строку
-                    'content': content
-                })
+                """)
+            
+            async for session in get_async_session():
+                await session.execute(query, params)
                 await session.commit()
                 break
+            
+            if user_id is not None and self.use_faiss:
+                await self.ensure_user_index(user_id)
                 
         except Exception as e:
             logger.error(f"Error adding event embedding: {e}")
             # Не останавливаем выполнение, если эмбеддинг не сохранился
     
+    async def remove_event_embedding(self, event_id: int, user_id: int) -> None:
+        """Убирает событие из индекса FAISS (строка event_embeddings удаляется каскадно)"""
+        if not self.use_faiss:
+            return
+        try:
+            self.index.remove(user_id, event_id)
+        except Exception as e:
+            logger.error(f"Error removing event embedding: {e}")
+    
+    async def ensure_user_index(self, user_id: int) -> None:
+        """
+        Сверяет индекс пользователя с event_embeddings и при расхождении перестраивает
+
+        Сверка - один агрегатный запрос (число строк и max(updated_at)): индекс
+        в памяти может отставать от записей других процессов (api, celery).
+        """
+        async for session in get_async_session():
+            result = await session.execute(
+                text("""
+                    SELECT count(*) AS count, max(ee.updated_at) AS updated_at
+                    FROM event_embeddings ee
+                    JOIN events e ON e.id = ee.event_id
+                    WHERE e.user_id = :user_id
+                """),
+                {"user_id": user_id}
+            )
+            row = result.one()
+            if self.index.is_current(user_id, IndexVersion(row.count, row.updated_at)):
+                return
+            
+            result = await session.execute(
+                text("""
+                    SELECT ee.event_id, ee.embedding, ee.updated_at
+                    FROM event_embeddings ee
+                    JOIN events e ON e.id = ee.event_id
+                    WHERE e.user_id = :user_id
+                """),
+                {"user_id": user_id}
+            )
+            rows = result.fetchall()
+            break
+        
+        # Версия - по прочитанным строкам: между запросами база могла измениться
+        version = IndexVersion(len(rows), max((row.updated_at for row in rows), default=None))
+        rows = [row for row in rows if row.embedding]
+        matrix = decode_embeddings(row.embedding for row in rows)
+        size = self.index.build(user_id, zip((row.event_id for row in rows), matrix), version)
+        logger.info(f"Built FAISS index for user {user_id} with {size} events")
+    
     async def search_similar_events(
         self, 
         query: str, 
@@ -114,58 +209,170 @@ class VectorSearchService:
         
         try:
             # Создаем эмбеддинг запроса
-            query_embedding = self.create_embedding(query)
-            if not query_embedding:
+            query_embedding = await self.embed(query)
+            if query_embedding is None:
                 return []
             
-            # Поиск в векторной БД
-            async for session in get_async_session():
-                result = await session.execute(
-                    text("""
-                        SELECT 
-                            e.id,
-                            e.title,
-                            e.description,
-                            e.start_time,
-                            e.location,
-                            ee.content,
-                            1 - (ee.embedding <=> :query_embedding) as similarity
-                        FROM events e
-                        JOIN event_embeddings ee ON e.id = ee.event_id
-                        WHERE e.user_id = :user_id
-                            AND 1 - (ee.embedding <=> :query_embedding) > :threshold
-                        ORDER BY similarity DESC
-                        LIMIT :limit
-                    """),
-                    {
-                        "query_embedding": query_embedding,
-                        "user_id": user_id,
-                        "threshold": similarity_threshold,
-                        "limit": limit
-                    }
-                )
-                
-                events = []
-                for row in result:
-                    events.append({
-                        "id": row.id,
-                        "title": row.title,
-                        "description": row.description,
-                        "start_time": row.start_time,
-                        "location": row.location,
-                        "content": row.content,
-                        "similarity": float(row.similarity)
-                    })
-                
-                logger.debug(f"Found {len(events)} similar events for query: {query}")
-                break
-            
+            if self.use_faiss:
+                events = await self._search_index(query_embedding, user_id, limit, similarity_threshold)
+            elif self.use_pgvector:
+                events = await self._search_pgvector(query_embedding, user_id, limit, similarity_threshold)
+            else:
+                events = await self.search_stored(query_embedding, user_id, limit, similarity_threshold)
+            logger.debug(f"Found {len(events)} similar events for query: {query}")
             return events
             
         except Exception as e:
             logger.error(f"Error in semantic search: {e}")
             return []
     
+    async def _search_index(
+        self,
+        query_embedding: np.ndarray,
+        user_id: int,
+        limit: int,
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """Поиск по индексу FAISS пользователя, поля событий - одним запросом"""
+        await self.ensure_user_index(user_id)
+        hits = [
+            (event_id, similarity)
+            for event_id, similarity in self.index.search(user_id, query_embedding, limit)
+            if similarity > similarity_threshold
+        ]
+        if not hits:
+            return []
+        
+        async for session in get_async_session():
+            result = await session.execute(
+                text("""
+                    SELECT e.id, e.title, e.description, e.start_time, e.location, ee.content
+                    FROM events e
+                    LEFT JOIN event_embeddings ee ON e.id = ee.event_id
+                    WHERE e.id IN :ids AND e.user_id = :user_id
+                """).bindparams(bindparam("ids", expanding=True)),
+                {"ids": [event_id for event_id, _ in hits], "user_id": user_id}
+            )
+            rows = {row.id: row for row in result}
+            break
+        
+        # События, удалённые мимо индекса, пропускаются
+        return [
+            {
+                "id": row.id,
+                "title": row.title,
+                "description": row.description,
+                "start_time": row.start_time,
+                "location": row.location,
+                "content": row.content,
+                "similarity": similarity
+            }
+            for event_id, similarity in hits
+            if (row := rows.get(event_id)) is not None
+        ]
+    
+    async def _search_pgvector(
+        self,
+        query_embedding: np.ndarray,
+        user_id: int,
+        limit: int,
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Поиск по индексу HNSW в базе
+        
+        Расстояние считается один раз: внутренний запрос - top-k по
+        ORDER BY distance LIMIT k (это использует индекс), порог сходства
+        применяется снаружи и не мешает выбору плана.
+        """
+        async for session in get_async_session():
+            # Параметры действуют до конца транзакции
+            await session.execute(
+                text("SELECT set_config('hnsw.ef_search', :ef_search, true)"),
+                {"ef_search": str(max(settings.PGVECTOR_EF_SEARCH, limit))}
+            )
+            # pgvector >= 0.8: если фильтр по пользователю отсеял кандидатов, индекс сканируется дальше
+            await session.execute(text("SELECT set_config('hnsw.iterative_scan', 'relaxed_order', true)"))
+            result = await session.execute(
+                text("""
+                    SELECT id, title, description, start_time, location, content, 1 - distance AS similarity
+                    FROM (
+                        SELECT e.id, e.title, e.description, e.start_time, e.location, ee.content,
+                            ee.embedding_vec <=> CAST(:query_embedding AS vector) AS distance
+                        FROM event_embeddings ee
+                        JOIN events e ON e.id = ee.event_id
+                        WHERE e.user_id = :user_id
+                        ORDER BY distance
+                        LIMIT :limit
+                    ) nearest
+                    WHERE 1 - distance > :threshold
+                    ORDER BY distance
+                """),
+                {
+                    "query_embedding": to_vector_literal(query_embedding),
+                    "user_id": user_id,
+                    "threshold": similarity_threshold,
+                    "limit": limit
+                }
+            )
+            rows = result.fetchall()
+            await session.commit()
+            break
+        
+        return [
+            {
+                "id": row.id,
+                "title": row.title,
+                "description": row.description,
+                "start_time": row.start_time,
+                "location": row.location,
+                "content": row.content,
+                "similarity": float(row.similarity)
+            }
+            for row in rows
+        ]
+    
+    async def search_stored(
+        self,
+        query_embedding: np.ndarray,
+        user_id: int,
+        limit: int,
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """Поиск без индекса: эмбеддинги пользователя декодируются в матрицу NumPy"""
+        async for session in get_async_session():
+            result = await session.execute(
+                text("""
+                    SELECT e.id, e.title, e.description, e.start_time, e.location, ee.content, ee.embedding
+                    FROM events e
+                    JOIN event_embeddings ee ON e.id = ee.event_id
+                    WHERE e.user_id = :user_id AND ee.embedding IS NOT NULL
+                """),
+                {"user_id": user_id}
+            )
+            rows = result.fetchall()
+            break
+        
+        if not rows:
+            return []
+        
+        matrix = normalize(decode_embeddings(row.embedding for row in rows))
+        similarities = matrix @ normalize(query_embedding)[0]
+        top = np.argsort(-similarities)[:limit]
+        return [
+            {
+                "id": rows[i].id,
+                "title": rows[i].title,
+                "description": rows[i].description,
+                "start_time": rows[i].start_time,
+                "location": rows[i].location,
+                "content": rows[i].content,
+                "similarity": float(similarities[i])
+            }
+            for i in top
+            if similarities[i] > similarity_threshold
+        ]
+    
     async def suggest_related_events(
         self, 
         event_text: str, 
@@ -223,8 +430,7 @@ class VectorSearchService:
                             e.event_type,
                             e.location,
                             EXTRACT(HOUR FROM e.start_time) as hour,
-                            EXTRACT(DOW FROM e.start_time) as day_of_week,
-                            ee.embedding
+                            EXTRACT(DOW FROM e.start_time) as day_of_week
                         FROM events e
                         JOIN event_embeddings ee ON e.id = ee.event_id
                         WHERE e.user_id = :user_id
@@ -288,20 +494,61 @@ class VectorSearchService:
             logger.error(f"Error analyzing event patterns: {e}")
             return {"patterns": [], "recommendations": []}
 
-    async def get_embedding(self, text: str) -> List[float]:
-        """Получает эмбеддинг для текста"""
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        """Эмбеддинг float32 через общий батчер или None"""
+        if not self.model:
+            logger.warning("Embedding model not available")
+            return None
+        
+        clean_text = text.strip().lower()
+        if not clean_text:
+            return None
+        
         try:
-            if not self.openai_client:
-                logger.warning("OpenAI client not available")
-                return []
-            
-            response = await self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
-            )
-            
-            return response.data[0].embedding
-            
+            return await self.batcher.embed(clean_text)
         except Exception as e:
             logger.error(f"Error getting embedding: {e}")
-            return [] 
\ No newline at end of file
+            return None
+    
+    async def embed_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Эмбеддинги нескольких текстов одной пачкой (None для пустого текста)"""
+        if not self.model:
+            logger.warning("Embedding model not available")
+            return [None for _ in texts]
+        
+        clean_texts = [text.strip().lower() for text in texts]
+        try:
+            embeddings = iter(await self.batcher.embed_many([text for text in clean_texts if text]))
+        except Exception as e:
+            logger.error(f"Error getting embeddings: {e}")
+            return [None for _ in texts]
+        return [next(embeddings) if text else None for text in clean_texts]
+    
+    async def get_embedding(self, text: str) -> List[float]:
+        """
+        Получает эмбеддинг для текста
+        
+        Запрос ждёт несколько миллисекунд и кодируется вместе с другими
+        одновременными запросами одной пачкой.
+        """
+        embedding = await self.embed(text)
+        return embedding.tolist() if embedding is not None else []
+    
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Эмбеддинги нескольких текстов (пустой список для пустого текста)"""
+        if not self.model:
+            logger.warning("Embedding model not available")
+            return [[] for _ in texts]
+        
+        return list(await asyncio.gather(*(self.get_embedding(text) for text in texts)))
+
+
+_vector_service: Optional[VectorSearchService] = None
+
+
+def get_vector_service() -> VectorSearchService:
+    """Общий экземпляр сервиса (модель загружается при первом обращении)"""
+    global _vector_service
+    if _vector_service is None:
+        _vector_service = VectorSearchService()
+    return _vector_service
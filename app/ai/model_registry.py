@@ -0,0 +1,300 @@
+"""
+Реестр AI моделей процесса
+
+Тяжёлые модели (Whisper, EasyOCR, SentenceTransformer) загружаются
+один раз на процесс и переиспользуются всеми клиентами, вместо
+загрузки на каждое входящее сообщение.
+
+Ключ модели имеет вид "<тип>:<параметр>", например:
+- "whisper:base"
+- "easyocr:ru,en"
+- "sentence_transformer:paraphrase-multilingual-MiniLM-L12-v2"
+
+Для процессов с воркерами (Celery prefork, gunicorn) модели можно
+загрузить в главном процессе до fork (preload): воркеры наследуют веса
+copy-on-write и держат одну общую копию вместо своей в каждом процессе.
+"""
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _load_whisper(model_name: str) -> Any:
+    """Загружает модель Whisper"""
+    import whisper
+    return whisper.load_model(model_name)
+
+
+def _load_easyocr(languages: str) -> Any:
+    """Загружает EasyOCR reader"""
+    import easyocr
+    return easyocr.Reader(languages.split(","), gpu=False)  # GPU=False для совместимости
+
+
+def _load_sentence_transformer(model_name: str) -> Any:
+    """Загружает модель эмбеддингов"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def _current_rss_mb() -> Optional[float]:
+    """Резидентная память текущего процесса в МБ"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class ModelRegistry:
+    """Потокобезопасный реестр лениво загружаемых моделей"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[str], Any]] = {
+            "whisper": _load_whisper,
+            "easyocr": _load_easyocr,
+            "sentence_transformer": _load_sentence_transformer,
+        }
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._preloaded: List[str] = []
+
+    def _reset_locks(self) -> None:
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @staticmethod
+    def whisper_key(model_name: str) -> str:
+        return f"whisper:{model_name}"
+
+    @staticmethod
+    def easyocr_key(languages: List[str]) -> str:
+        return f"easyocr:{','.join(languages)}"
+
+    @staticmethod
+    def sentence_transformer_key(model_name: str) -> str:
+        return f"sentence_transformer:{model_name}"
+
+    def register_loader(self, kind: str, factory: Callable[[str], Any]) -> None:
+        """
+        Регистрирует загрузчик для нового типа моделей
+
+        Args:
+            kind: Тип модели (префикс ключа)
+            factory: Функция, принимающая параметр ключа и возвращающая модель
+        """
+        with self._lock:
+            self._factories[kind] = factory
+
+    def _get_key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def _resolve_factory(self, key: str) -> Callable[[], Any]:
+        kind, _, param = key.partition(":")
+        factory = self._factories.get(kind)
+        if factory is None:
+            raise KeyError(f"Unknown model kind: {kind}")
+        return lambda: factory(param)
+
+    def get(self, key: str) -> Any:
+        """
+        Возвращает модель, загружая её при первом обращении
+
+        Параллельные вызовы для одного ключа дожидаются единственной загрузки.
+
+        Args:
+            key: Ключ модели
+
+        Returns:
+            Загруженная модель
+        """
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._get_key_lock(key):
+            # Модель могла загрузиться, пока мы ждали блокировку
+            model = self._models.get(key)
+            if model is not None:
+                return model
+
+            loader = self._resolve_factory(key)
+            rss_before = _current_rss_mb()
+            start_time = time.perf_counter()
+
+            try:
+                model = loader()
+            except Exception:
+                metrics.increment("ai.model.load_errors", tags={"model": key})
+                raise
+
+            load_time = time.perf_counter() - start_time
+            rss_after = _current_rss_mb()
+            rss_delta = (
+                rss_after - rss_before
+                if rss_before is not None and rss_after is not None
+                else None
+            )
+
+            with self._lock:
+                self._models[key] = model
+                self._stats[key] = {
+                    "load_time": load_time,
+                    "rss_delta_mb": rss_delta,
+                    "loaded_at": time.time(),
+                }
+
+            metrics.timer("ai.model.load_time", load_time, tags={"model": key})
+            if rss_delta is not None:
+                metrics.gauge("ai.model.rss_mb", rss_delta, tags={"model": key})
+            if rss_after is not None:
+                metrics.gauge("ai.process.rss_mb", rss_after)
+
+            logger.info(f"Model '{key}' loaded in {load_time:.2f}s")
+            return model
+
+    def is_loaded(self, key: str) -> bool:
+        """Проверяет, загружена ли модель"""
+        return key in self._models
+
+    def warmup(self, keys: List[str]) -> Dict[str, bool]:
+        """
+        Заранее загружает модели (при старте процесса или воркера)
+
+        Args:
+            keys: Ключи моделей для загрузки
+
+        Returns:
+            Словарь ключ -> успешность загрузки
+        """
+        results = {}
+        for key in keys:
+            try:
+                self.get(key)
+                results[key] = True
+            except Exception as e:
+                logger.warning(f"Warmup failed for model '{key}': {e}")
+                results[key] = False
+        return results
+
+    def preload(self, keys: List[str]) -> Dict[str, bool]:
+        """
+        Загружает модели в главном процессе перед fork воркеров
+
+        Веса тензоров лежат в отдельных больших блоках памяти, которые
+        воркеры только читают, - страницы остаются общими. gc.freeze()
+        переносит загруженные объекты в постоянное поколение, чтобы сборка
+        мусора в воркерах не записывала в их заголовки и не копировала
+        страницы. torch в главном процессе работает в один поток: пул
+        потоков OpenMP, запущенный до fork, в дочерних процессах не работает.
+
+        Args:
+            keys: Ключи моделей для загрузки
+
+        Returns:
+            Словарь ключ -> успешность загрузки
+        """
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(1)
+        else:
+            os.environ.setdefault("OMP_NUM_THREADS", "1")
+            os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+        results = self.warmup(keys)
+        with self._lock:
+            for key, loaded in results.items():
+                if loaded:
+                    self._stats[key]["preloaded"] = True
+                    if key not in self._preloaded:
+                        self._preloaded.append(key)
+
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+
+        rss = _current_rss_mb()
+        if rss is not None:
+            metrics.gauge("ai.process.rss_mb", rss)
+        logger.info(f"Models preloaded before fork: {self._preloaded}")
+        return results
+
+    @property
+    def preloaded(self) -> List[str]:
+        """Модели, загруженные в главном процессе до fork"""
+        return list(self._preloaded)
+
+    def after_fork(self, torch_threads: Optional[int] = None) -> None:
+        """
+        Подготовка процесса воркера после fork
+
+        Args:
+            torch_threads: Потоков torch в воркере (None - не менять)
+        """
+        torch = sys.modules.get("torch")
+        if torch is not None and torch_threads:
+            torch.set_num_threads(torch_threads)
+
+        rss = _current_rss_mb()
+        if rss is not None:
+            metrics.gauge("ai.process.rss_mb", rss)
+        logger.info(f"Worker {os.getpid()} shares preloaded models: {self._preloaded}")
+
+    def unload(self, key: Optional[str] = None) -> None:
+        """
+        Выгружает модель (или все модели) из памяти процесса
+
+        Args:
+            key: Ключ модели; None - выгрузить все
+        """
+        with self._lock:
+            keys = [key] if key else list(self._models.keys())
+            for model_key in keys:
+                self._models.pop(model_key, None)
+                self._stats.pop(model_key, None)
+                if model_key in self._preloaded:
+                    self._preloaded.remove(model_key)
+                metrics.gauge("ai.model.rss_mb", 0.0, tags={"model": model_key})
+
+        gc.collect()
+
+        # Освобождаем кэш CUDA, только если torch уже импортирован
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            try:
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except Exception:
+                pass
+
+        rss = _current_rss_mb()
+        if rss is not None:
+            metrics.gauge("ai.process.rss_mb", rss)
+        logger.info(f"Models unloaded: {keys}")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика загруженных моделей"""
+        with self._lock:
+            return {key: dict(stats) for key, stats in self._stats.items()}
+
+
+# Глобальный реестр моделей процесса
+model_registry = ModelRegistry()
+
+# Блокировку мог держать другой поток в момент fork - в дочернем
+# процессе её никто не освободит
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=model_registry._reset_locks)
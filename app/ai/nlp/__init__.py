@@ -2,8 +2,10 @@
 Упрощённые NLP модули
 Только GPT клиент
 """
-from .gpt_client import GPTClient
+from app.core.lazy_import import lazy_exports
 
 __all__ = [
     "GPTClient"
 ]
+
+__getattr__ = lazy_exports(__name__, {"GPTClient": ".gpt_client"})
@@ -0,0 +1,157 @@
+"""
+Каскад разбора текстовых сообщений
+
+Сообщение проходит этапы от дешёвого к дорогому и останавливается
+на первом уверенном:
+1. rules - детерминированные правила (RuleBasedEventParser);
+2. local - локальный классификатор намерений; поля события берутся
+   из правил, если классификатор подтвердил, что это событие;
+3. gpt - разбор GPTClient.parse_calendar_event.
+
+Если GPT недоступен или не уверен, используется лучший локальный
+результат (этап fallback). Время каждого этапа и этап, давший ответ,
+возвращаются в результате - они пишутся в журнал расхода AI.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.ai.nlp.intent_classifier import IntentClassifier, intent_classifier
+from app.ai.nlp.rule_parser import RuleBasedEventParser, rule_parser
+from app.config import settings
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("rules", "local", "gpt", "fallback")
+
+
+@dataclass
+class CascadeResult:
+    """Результат каскада"""
+
+    intent: str  # event, command, question
+    stage: str
+    confidence: float
+    event: Optional[Dict[str, Any]] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def provider(self) -> str:
+        """Кто дал ответ: openai или local"""
+        return "openai" if self.stage == "gpt" else "local"
+
+    @property
+    def processing_time(self) -> float:
+        return sum(self.timings.values())
+
+
+class ParsingCascade:
+    """Каскад правила -> локальный классификатор -> GPT"""
+
+    def __init__(
+        self,
+        gpt_client: Any = None,
+        rules: Optional[RuleBasedEventParser] = None,
+        classifier: Optional[IntentClassifier] = None
+    ):
+        """
+        Args:
+            gpt_client: GPTClient (None - без последнего этапа)
+            rules: Парсер правил
+            classifier: Локальный классификатор намерений
+        """
+        self.gpt_client = gpt_client
+        self.rules = rules or rule_parser
+        self.classifier = classifier or intent_classifier
+        self.hits: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    async def run(self, text: str, now: Optional[datetime] = None) -> CascadeResult:
+        """
+        Разбирает сообщение
+
+        Args:
+            text: Текст сообщения
+            now: Опорный момент для относительных дат
+
+        Returns:
+            Намерение, событие (для event), этап и время этапов
+        """
+        timings: Dict[str, float] = {}
+
+        started = time.perf_counter()
+        rule_result = self.rules.parse(text, now=now) if settings.RULE_PARSER_ENABLED else None
+        timings["rules"] = time.perf_counter() - started
+        if rule_result is not None:
+            if rule_result.intent == "event" and rule_result.confidence >= settings.RULE_PARSER_MIN_CONFIDENCE:
+                return self._finish(CascadeResult(
+                    "event", "rules", rule_result.confidence, rule_result.to_event(), timings
+                ))
+            if rule_result.intent == "command":
+                return self._finish(CascadeResult("command", "rules", 1.0, timings=timings))
+        rule_event = rule_result is not None and rule_result.intent == "event"
+
+        started = time.perf_counter()
+        if self.classifier.backend == "embedding":
+            # Эмбеддинг считается сотни миллисекунд на CPU - не блокируем loop
+            loop = asyncio.get_running_loop()
+            intent, confidence = await loop.run_in_executor(None, self.classifier.predict, text)
+        else:
+            intent, confidence = self.classifier.predict(text)
+        timings["local"] = time.perf_counter() - started
+
+        if confidence >= settings.INTENT_CLASSIFIER_MIN_CONFIDENCE:
+            if intent != "event":
+                return self._finish(CascadeResult(intent, "local", confidence, timings=timings))
+            if rule_event and rule_result.confidence >= settings.CASCADE_ENTITY_MIN_CONFIDENCE:
+                event = rule_result.to_event()
+                event["parser"] = "local"
+                return self._finish(CascadeResult(
+                    "event", "local", min(confidence, rule_result.confidence), event, timings
+                ))
+
+        if self.gpt_client is not None:
+            started = time.perf_counter()
+            try:
+                result = await self.gpt_client.parse_calendar_event(text)
+            except Exception as e:
+                logger.warning(f"GPT parsing failed: {e}")
+                result = {}
+            timings["gpt"] = time.perf_counter() - started
+
+            gpt_confidence = result.get("confidence", 0)
+            if isinstance(gpt_confidence, str):
+                gpt_confidence = float(gpt_confidence) if gpt_confidence.replace('.', '').isdigit() else 0
+            if "error" not in result and gpt_confidence > 0.5:
+                return self._finish(CascadeResult("event", "gpt", gpt_confidence, result, timings))
+            if "error" not in result and result:
+                # GPT разобрал, но не считает сообщение событием
+                fallback_intent = intent if intent != "event" else "question"
+                return self._finish(CascadeResult(fallback_intent, "gpt", 1 - gpt_confidence, timings=timings))
+
+        # GPT недоступен - лучший локальный результат
+        if rule_event:
+            return self._finish(CascadeResult(
+                "event", "fallback", rule_result.confidence, rule_result.to_event(), timings
+            ))
+        fallback_intent = intent if intent != "event" else "question"
+        return self._finish(CascadeResult(fallback_intent, "fallback", confidence, timings=timings))
+
+    def _finish(self, result: CascadeResult) -> CascadeResult:
+        self.hits[result.stage] += 1
+        metrics.increment("nlp.cascade.hits", tags={"stage": result.stage, "intent": result.intent})
+        for stage, seconds in result.timings.items():
+            metrics.timer("nlp.cascade.latency", seconds, tags={"stage": stage})
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Попадания по этапам и доля сообщений без GPT"""
+        total = sum(self.hits.values())
+        return {
+            "hits": dict(self.hits),
+            "total": total,
+            "without_gpt": (total - self.hits["gpt"]) / total if total else 0.0,
+        }
@@ -1,10 +1,21 @@
 import logging
 import asyncio
+import hashlib
 import json
-from typing import Dict, List, Optional, Any
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Optional, Any
 import openai
 from openai import AsyncOpenAI
 
+from app.ai.nlp.response_cache import gpt_response_cache, reference_bucket
+from app.ai.nlp.rate_limiter import gpt_rate_limiter, is_retryable_error, retry_delay
+from app.ai.nlp.single_flight import gpt_single_flight
+from app.ai.usage_ledger import ai_usage_ledger, openai_cost
+from app.config import settings
+from app.core.logging import metrics
+from app.models.ai_data import AIProcessingType, AIProvider
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,7 +30,8 @@ class GPTClient:
         """
         self.api_key = api_key
         self.model = model
-        self.client = AsyncOpenAI(api_key=api_key)
+        # Повторы выполняет _request с учётом общих лимитов, не SDK
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
         
         # Системные промпты для разных задач
         self.system_prompts = {
@@ -140,17 +152,34 @@ class GPTClient:
         try:
             logger.info("Extracting real estate information from text")
             
+            # Описание объекта не зависит от даты - ключ только по тексту
+            cache_key = None
+            if settings.GPT_CACHE_ENABLED:
+                cache_key = gpt_response_cache.make_key("real_estate", self.model, text)
+                cached = await gpt_response_cache.get("real_estate", cache_key)
+                if cached is not None:
+                    logger.info("Real estate information served from cache")
+                    self._record_usage(AIProcessingType.ENTITY_EXTRACTION, task="real_estate", cache_hit=True)
+                    return cached
+            
             messages = [
                 {"role": "system", "content": self.system_prompts["real_estate_parser"]},
                 {"role": "user", "content": f"Извлеки информацию о недвижимости из следующего текста:\n\n{text}"}
             ]
             
-            response = await self._make_request(messages)
+            completion = await self._complete(
+                messages, AIProcessingType.ENTITY_EXTRACTION, task="real_estate"
+            )
+            response = completion["content"]
             
             # Парсим JSON ответ
             try:
                 result = json.loads(response)
                 logger.info("Successfully extracted real estate information")
+                if cache_key:
+                    await gpt_response_cache.set(
+                        "real_estate", cache_key, result, completion["tokens"], completion["latency"]
+                    )
                 return result
             except json.JSONDecodeError as e:
                 logger.error(f"Failed to parse JSON response: {e}")
@@ -174,20 +203,7 @@ class GPTClient:
         try:
             logger.info("Suggesting meeting time")
             
-            prompt = f"""
-Клиент хочет встретиться и указал следующие предпочтения:
-{client_preferences}
-
-Расписание агента:
-{agent_schedule}
-
-Предложи оптимальное время для встречи, учитывая предпочтения клиента и доступность агента.
-"""
-            
-            messages = [
-                {"role": "system", "content": self.system_prompts["calendar_assistant"]},
-                {"role": "user", "content": prompt}
-            ]
+            messages = self._meeting_messages(client_preferences, agent_schedule)
             
             response = await self._make_request(messages)
             logger.info("Meeting time suggestion generated")
@@ -197,6 +213,33 @@ class GPTClient:
             logger.error(f"Error in suggest_meeting_time: {e}")
             return f"Ошибка при планировании встречи: {str(e)}"
     
+    async def stream_meeting_time(self, client_preferences: str, agent_schedule: str) -> AsyncIterator[str]:
+        """
+        Потоковый вариант suggest_meeting_time
+        
+        Yields:
+            Фрагменты ответа по мере генерации
+        """
+        logger.info("Streaming meeting time suggestion")
+        async with aclosing(self._stream(self._meeting_messages(client_preferences, agent_schedule))) as stream:
+            async for chunk in stream:
+                yield chunk
+    
+    def _meeting_messages(self, client_preferences: str, agent_schedule: str) -> List[Dict[str, str]]:
+        prompt = f"""
+Клиент хочет встретиться и указал следующие предпочтения:
+{client_preferences}
+
+Расписание агента:
+{agent_schedule}
+
+Предложи оптимальное время для встречи, учитывая предпочтения клиента и доступность агента.
+"""
+        return [
+            {"role": "system", "content": self.system_prompts["calendar_assistant"]},
+            {"role": "user", "content": prompt}
+        ]
+    
     async def answer_question(self, question: str, context: str = "") -> str:
         """
         Отвечает на общие вопросы о недвижимости
@@ -211,14 +254,7 @@ class GPTClient:
         try:
             logger.info("Answering general question")
             
-            full_question = question
-            if context:
-                full_question = f"Контекст: {context}\n\nВопрос: {question}"
-            
-            messages = [
-                {"role": "system", "content": self.system_prompts["general_assistant"]},
-                {"role": "user", "content": full_question}
-            ]
+            messages = self._question_messages(question, context)
             
             response = await self._make_request(messages)
             logger.info("Question answered successfully")
@@ -228,6 +264,27 @@ class GPTClient:
             logger.error(f"Error in answer_question: {e}")
             return f"Извините, произошла ошибка при обработке вопроса: {str(e)}"
     
+    async def stream_answer_question(self, question: str, context: str = "") -> AsyncIterator[str]:
+        """
+        Потоковый вариант answer_question
+        
+        Yields:
+            Фрагменты ответа по мере генерации
+        """
+        logger.info("Streaming answer to general question")
+        async with aclosing(self._stream(self._question_messages(question, context))) as stream:
+            async for chunk in stream:
+                yield chunk
+    
+    def _question_messages(self, question: str, context: str = "") -> List[Dict[str, str]]:
+        full_question = question
+        if context:
+            full_question = f"Контекст: {context}\n\nВопрос: {question}"
+        return [
+            {"role": "system", "content": self.system_prompts["general_assistant"]},
+            {"role": "user", "content": full_question}
+        ]
+    
     async def _make_request(self, messages: List[Dict[str, str]]) -> str:
         """
         Выполняет запрос к GPT API
@@ -238,26 +295,254 @@ class GPTClient:
         Returns:
             Ответ от модели
         """
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=2000,
-                temperature=0.3,  # Низкая температура для более предсказуемых ответов
-                timeout=30
-            )
-            
-            return response.choices[0].message.content.strip()
+        completion = await self._complete(messages, AIProcessingType.TEXT_ANALYSIS)
+        return completion["content"]
+    
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        processing_type: AIProcessingType = AIProcessingType.TEXT_ANALYSIS,
+        task: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Выполняет запрос к GPT API и возвращает ответ вместе с его стоимостью
+        
+        Одинаковые одновременные запросы объединяются: к API уходит один,
+        остальные получают его результат с флагом coalesced.
+        Каждый вызов записывается в журнал расхода AI.
+        
+        Args:
+            messages: Список сообщений для отправки
+            processing_type: Тип обработки для журнала
+            task: Задача для журнала (calendar_event, real_estate)
             
-        except openai.RateLimitError:
-            logger.error("OpenAI rate limit exceeded")
-            raise Exception("Превышен лимит запросов к OpenAI. Попробуйте позже.")
-        except openai.APIError as e:
-            logger.error(f"OpenAI API error: {e}")
-            raise Exception(f"Ошибка API OpenAI: {str(e)}")
+        Returns:
+            Словарь с полями content, tokens (всего токенов), prompt_tokens,
+            completion_tokens и latency (секунды)
+        """
+        started_at = time.perf_counter()
+        try:
+            if not settings.GPT_SINGLE_FLIGHT_ENABLED:
+                completion = await self._request(messages)
+            else:
+                request_key = self._request_key(messages)
+                leader = []
+                
+                async def request() -> Dict[str, Any]:
+                    leader.append(True)
+                    return await self._request(messages)
+                
+                completion = await gpt_single_flight.do(request_key, request)
+                if not leader:
+                    # Токены потрачены запросом лидера
+                    completion = {**completion, "coalesced": True}
         except Exception as e:
-            logger.error(f"Unexpected error in _make_request: {e}")
+            self._record_usage(processing_type, task=task, latency=time.perf_counter() - started_at, error=e)
             raise
+        
+        self._record_usage(processing_type, completion, task=task, latency=time.perf_counter() - started_at)
+        return completion
+    
+    def _record_usage(
+        self,
+        processing_type: AIProcessingType,
+        completion: Optional[Dict[str, Any]] = None,
+        task: Optional[str] = None,
+        latency: float = 0.0,
+        cache_hit: bool = False,
+        error: Optional[Exception] = None,
+        aborted: bool = False
+    ) -> None:
+        """
+        Запись в журнал расхода AI; объединённые запросы и кэш - без токенов
+
+        aborted - поток прерван потребителем, токены оценены по длине текста
+        """
+        completion = completion or {}
+        paid = bool(completion) and not completion.get("coalesced")
+        prompt_tokens = completion.get("prompt_tokens", 0) if paid else 0
+        completion_tokens = completion.get("completion_tokens", 0) if paid else 0
+        metadata = {"model": self.model, "coalesced": bool(completion.get("coalesced"))}
+        if task:
+            metadata["task"] = task
+        if aborted:
+            metadata["aborted"] = True
+        if paid:
+            metadata.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        ai_usage_ledger.record(
+            processing_type,
+            AIProvider.OPENAI,
+            processing_time=latency,
+            tokens_used=completion.get("tokens", 0) if paid else 0,
+            cost=openai_cost(self.model, prompt_tokens, completion_tokens) if paid else 0.0,
+            cache_hit=cache_hit,
+            is_success=error is None,
+            error_message=str(error) if error else None,
+            metadata=metadata
+        )
+    
+    def _request_key(self, messages: List[Dict[str, str]]) -> str:
+        """Хэш запроса: модель, параметры генерации и сообщения"""
+        payload = json.dumps(
+            {"model": self.model, "max_tokens": 2000, "temperature": 0.3, "messages": messages},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    async def _request(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Запрос к API без объединения
+        
+        Запрос ждёт лимитов RPM/TPM и конкурентности, при 429/5xx и сетевых
+        ошибках повторяется до GPT_MAX_RETRIES раз.
+        """
+        estimated_tokens = self._estimate_tokens(messages)
+        started_at = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                async with gpt_rate_limiter.slot(self.model, estimated_tokens):
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=2000,
+                        temperature=0.3,  # Низкая температура для более предсказуемых ответов
+                        timeout=30
+                    )
+                
+                usage = response.usage
+                tokens = usage.total_tokens if usage else 0
+                await gpt_rate_limiter.record_usage(self.model, estimated_tokens, tokens)
+                return {
+                    "content": response.choices[0].message.content.strip(),
+                    "tokens": tokens,
+                    "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                    "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+                    "latency": time.perf_counter() - started_at
+                }
+                
+            except openai.APIError as e:
+                if is_retryable_error(e) and attempt < settings.GPT_MAX_RETRIES:
+                    delay = retry_delay(e, attempt)
+                    attempt += 1
+                    metrics.increment("ai.gpt.retries", tags={"reason": type(e).__name__})
+                    logger.warning(f"OpenAI request failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                
+                if isinstance(e, openai.RateLimitError):
+                    logger.error("OpenAI rate limit exceeded")
+                    raise Exception("Превышен лимит запросов к OpenAI. Попробуйте позже.")
+                logger.error(f"OpenAI API error: {e}")
+                raise Exception(f"Ошибка API OpenAI: {str(e)}")
+            except Exception as e:
+                logger.error(f"Unexpected error in _request: {e}")
+                raise
+    
+    async def _stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Потоковый запрос к API
+        
+        Лимиты и повторы - как в _request, но повтор возможен только до первого
+        фрагмента: начатый ответ уже показан пользователю. Потоковые запросы
+        не кэшируются и не объединяются - каждый пользователь читает свой поток.
+        Поток, прерванный потребителем, записывается в журнал расхода по оценке
+        токенов при закрытии - обёртки закрывают его через aclosing.
+        
+        Yields:
+            Фрагменты текста ответа
+        """
+        estimated_tokens = self._estimate_tokens(messages)
+        started_at = time.perf_counter()
+        attempt = 0
+        received_chars = 0
+        recorded = False
+        try:
+            while True:
+                received = False
+                try:
+                    async with gpt_rate_limiter.slot(self.model, estimated_tokens):
+                        stream = await self.client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            max_tokens=2000,
+                            temperature=0.3,
+                            timeout=30,
+                            stream=True,
+                            stream_options={"include_usage": True}
+                        )
+                        usage = None
+                        async for chunk in stream:
+                            if chunk.usage:
+                                # Последний фрагмент без текста, с расходом токенов
+                                usage = chunk.usage
+                            if not chunk.choices or not chunk.choices[0].delta.content:
+                                continue
+                            if not received:
+                                received = True
+                                metrics.timer("ai.gpt.stream.first_token", time.perf_counter() - started_at)
+                            received_chars += len(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                
+                    completion = {
+                        "tokens": usage.total_tokens if usage else 0,
+                        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+                    }
+                    await gpt_rate_limiter.record_usage(self.model, estimated_tokens, completion["tokens"])
+                    latency = time.perf_counter() - started_at
+                    metrics.timer("ai.gpt.stream.total_time", latency)
+                    recorded = True
+                    self._record_usage(AIProcessingType.TEXT_ANALYSIS, completion, task="stream", latency=latency)
+                    return
+                
+                except openai.APIError as e:
+                    if not received and is_retryable_error(e) and attempt < settings.GPT_MAX_RETRIES:
+                        delay = retry_delay(e, attempt)
+                        attempt += 1
+                        metrics.increment("ai.gpt.retries", tags={"reason": type(e).__name__})
+                        logger.warning(f"OpenAI stream failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                
+                    recorded = True
+                    self._record_usage(
+                        AIProcessingType.TEXT_ANALYSIS, task="stream",
+                        latency=time.perf_counter() - started_at, error=e
+                    )
+                    if isinstance(e, openai.RateLimitError):
+                        logger.error("OpenAI rate limit exceeded")
+                        raise Exception("Превышен лимит запросов к OpenAI. Попробуйте позже.")
+                    logger.error(f"OpenAI API error: {e}")
+                    raise Exception(f"Ошибка API OpenAI: {str(e)}")
+        finally:
+            if not recorded:
+                # Потребитель прервал поток (ошибка вывода, отмена задачи): токены
+                # потрачены, а фрагмент с usage не дошёл - записываем по оценке
+                prompt_tokens = self._estimate_tokens(messages, max_tokens=0)
+                completion_tokens = received_chars // 3
+                completion = {
+                    "tokens": prompt_tokens + completion_tokens,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                }
+                self._record_usage(
+                    AIProcessingType.TEXT_ANALYSIS, completion, task="stream",
+                    latency=time.perf_counter() - started_at, aborted=True
+                )
+    
+    @staticmethod
+    def _estimate_tokens(messages: List[Dict[str, str]], max_tokens: int = 2000) -> int:
+        """
+        Оценка токенов запроса для лимита TPM
+        
+        OpenAI резервирует max_tokens под ответ, для промпта - около
+        трёх символов русского текста на токен. После ответа оценка
+        заменяется фактическим расходом.
+        """
+        prompt_chars = sum(len(message.get("content", "")) for message in messages)
+        return prompt_chars // 3 + max_tokens
     
     async def validate_real_estate_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -350,6 +635,17 @@ class GPTClient:
             
             logger.info(f"Parsing calendar event from text: {text}")
             
+            # Относительные даты разрешаются от сегодняшнего дня - он входит в ключ
+            cache_key = None
+            bucket = reference_bucket(text, now) if settings.GPT_CACHE_ENABLED else None
+            if bucket:
+                cache_key = gpt_response_cache.make_key("calendar_event", self.model, text, bucket)
+                cached = await gpt_response_cache.get("calendar_event", cache_key)
+                if cached is not None:
+                    logger.info("Calendar event served from cache")
+                    self._record_usage(AIProcessingType.ENTITY_EXTRACTION, task="calendar_event", cache_hit=True)
+                    return cached
+            
             # Подготавливаем контекстный промпт с актуальными датами
             contextual_prompt = f"""Ты - экспертный AI календарный ассистент для агентов недвижимости в России.
 
@@ -406,12 +702,19 @@ class GPTClient:
                 {"role": "user", "content": text}
             ]
             
-            response = await self._make_request(messages)
+            completion = await self._complete(
+                messages, AIProcessingType.ENTITY_EXTRACTION, task="calendar_event"
+            )
+            response = completion["content"]
             
             # Парсим JSON ответ
             try:
                 result = json.loads(response)
                 logger.info("Successfully parsed calendar event with context")
+                if cache_key:
+                    await gpt_response_cache.set(
+                        "calendar_event", cache_key, result, completion["tokens"], completion["latency"]
+                    )
                 return result
             except json.JSONDecodeError as e:
                 logger.error(f"Failed to parse JSON response: {e}")
@@ -0,0 +1,211 @@
+"""
+Локальный классификатор намерений
+
+Определяет, что хочет пользователь: записать событие (event),
+управлять календарём (command) или спросить (question) - без запроса
+к OpenAI. Классификация - взвешенные k ближайших соседей по косинусной
+близости к размеченным примерам.
+
+Векторизация:
+- tfidf - TF-IDF по символьным n-граммам слов, на numpy, без моделей;
+- embedding - эмбеддинги SentenceTransformer EMBEDDING_MODEL из реестра
+  моделей (та же модель, что у VectorSearchService, веса общие).
+"""
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.ai.model_registry import model_registry
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Размеченные примеры сообщений риэлторов
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "event": [
+        "встреча завтра в 15",
+        "звонок клиенту в понедельник",
+        "показ квартиры на Арбате в субботу",
+        "созвон с застройщиком вечером",
+        "запиши встречу с Иваном",
+        "напомни позвонить маме",
+        "поставь показ на пятницу",
+        "подписание договора у нотариуса",
+        "сделка в среду утром",
+        "перезвонить собственнику через час",
+        "консультация с покупателем во вторник",
+        "просмотр дома в Истре",
+        "встреча с банком по ипотеке",
+        "позвонить Ольге после обеда",
+        "задаток по квартире в четверг",
+        "набрать Алексею",
+        "запланируй звонок на завтра",
+        "встретиться с юристом",
+        "показ студии послезавтра",
+        "добавь задачу подготовить документы",
+        "нужно съездить на объект в 12",
+        "забрать ключи от квартиры в 17",
+        "отвезти документы в МФЦ утром",
+        "переговоры с продавцом",
+    ],
+    "command": [
+        "удали встречу",
+        "отмени звонок",
+        "убери показ на пятницу",
+        "перенеси встречу на завтра",
+        "измени время звонка",
+        "поменяй дату показа",
+        "покажи мои события",
+        "что у меня завтра",
+        "какие встречи на неделе",
+        "список дел на сегодня",
+        "открой календарь",
+        "покажи расписание",
+        "что запланировано на пятницу",
+        "сколько у меня показов сегодня",
+        "удалить все события",
+        "отменить запись",
+    ],
+    "question": [
+        "сколько стоит ипотека",
+        "какие документы нужны для сделки",
+        "как оформить налоговый вычет",
+        "привет",
+        "спасибо",
+        "посоветуй как продать квартиру быстрее",
+        "какая средняя цена квадратного метра в Москве",
+        "что такое эскроу счет",
+        "как проверить собственника квартиры",
+        "нужен ли нотариус при продаже доли",
+        "какой процент комиссии брать",
+        "как рассчитать налог с продажи",
+        "что ты умеешь",
+        "помоги составить объявление",
+        "добрый день",
+        "какие банки дают семейную ипотеку",
+        "можно ли продать квартиру с обременением",
+        "как работает материнский капитал при покупке",
+    ],
+}
+
+_TOKEN = re.compile(r"\w+")
+
+
+class TfidfVectorizer:
+    """TF-IDF по символьным n-граммам слов (устойчив к падежам и опечаткам)"""
+
+    def __init__(self, ngram_range: Tuple[int, int] = (2, 4)):
+        self.ngram_range = ngram_range
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: Optional[np.ndarray] = None
+
+    def _ngrams(self, text: str) -> List[str]:
+        grams = []
+        low, high = self.ngram_range
+        for token in _TOKEN.findall(text.lower().replace("ё", "е")):
+            # Цифры не несут намерения - только их наличие
+            token = re.sub(r"\d+", "0", token)
+            padded = f" {token} "
+            for n in range(low, high + 1):
+                grams.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+        return grams
+
+    def fit(self, texts: Sequence[str]) -> "TfidfVectorizer":
+        document_frequency: Counter = Counter()
+        for text in texts:
+            document_frequency.update(set(self._ngrams(text)))
+        self.vocabulary = {gram: i for i, gram in enumerate(sorted(document_frequency))}
+        total = len(texts)
+        self.idf = np.array(
+            [math.log((1 + total) / (1 + document_frequency[gram])) + 1 for gram in sorted(document_frequency)],
+            dtype=np.float32
+        )
+        return self
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for gram, count in Counter(self._ngrams(text)).items():
+                column = self.vocabulary.get(gram)
+                if column is not None:
+                    matrix[row, column] = count
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+
+class IntentClassifier:
+    """Классификатор намерений k ближайших соседей"""
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        examples: Optional[Dict[str, List[str]]] = None,
+        k: int = 5
+    ):
+        """
+        Args:
+            backend: tfidf или embedding (по умолчанию из настроек)
+            examples: Размеченные примеры {намерение: [тексты]}
+            k: Количество соседей
+        """
+        self.backend = backend or settings.INTENT_CLASSIFIER_BACKEND
+        self.examples = examples or INTENT_EXAMPLES
+        self.k = k
+        self._vectorizer: Optional[TfidfVectorizer] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._labels: List[str] = []
+
+    def _encode(self, texts: Sequence[str]) -> np.ndarray:
+        if self.backend == "embedding":
+            model = model_registry.get(model_registry.sentence_transformer_key(settings.EMBEDDING_MODEL))
+            return np.asarray(model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+        return self._vectorizer.transform(texts)
+
+    def fit(self) -> None:
+        """Векторизует примеры (вызывается лениво при первой классификации)"""
+        texts = [text for intent in self.examples for text in self.examples[intent]]
+        self._labels = [intent for intent in self.examples for _ in self.examples[intent]]
+        if self.backend != "embedding":
+            self._vectorizer = TfidfVectorizer().fit(texts)
+        try:
+            self._matrix = self._encode(texts)
+        except Exception as e:
+            if self.backend != "embedding":
+                raise
+            # Модель эмбеддингов недоступна - работаем на TF-IDF
+            logger.warning(f"Embedding intent classifier unavailable, falling back to tfidf: {e}")
+            self.backend = "tfidf"
+            self._vectorizer = TfidfVectorizer().fit(texts)
+            self._matrix = self._encode(texts)
+        logger.info(f"Intent classifier ready: {self.backend}, {len(texts)} examples")
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Классифицирует сообщение
+
+        Returns:
+            (намерение, уверенность 0-1) - доля веса соседей за победителя
+        """
+        if self._matrix is None:
+            self.fit()
+        similarities = self._matrix @ self._encode([text])[0]
+        nearest = np.argsort(similarities)[::-1][:self.k]
+
+        votes: Dict[str, float] = {}
+        for index in nearest:
+            weight = max(float(similarities[index]), 0.0)
+            votes[self._labels[index]] = votes.get(self._labels[index], 0.0) + weight
+        total = sum(votes.values())
+        if total <= 0:
+            return "question", 0.0
+        intent = max(votes, key=votes.get)
+        return intent, votes[intent] / total
+
+
+# Общий классификатор намерений
+intent_classifier = IntentClassifier()
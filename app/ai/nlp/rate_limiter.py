@@ -0,0 +1,275 @@
+"""
+Ограничение трафика к OpenAI
+
+Два механизма:
+- token bucket на запросы в минуту (RPM) и токены в минуту (TPM) -
+  общий для бота, API и воркеров Celery, если доступен Redis;
+- адаптивный лимит одновременных запросов процесса (AIMD):
+  лимит растёт на 1 за «окно» успешных ответов и уменьшается вдвое
+  при 429/5xx.
+
+Повторы при 429/5xx выполняются с экспоненциальной задержкой
+со случайным разбросом (full jitter) или через retry-after от API.
+"""
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import openai
+
+from app.config import settings
+from app.core.cache import CacheKeys, CacheService, cache_service
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+# Атомарный token bucket: пополнение по времени и списание либо время ожидания.
+# force=1 списывает без проверки (корректировка по фактическому расходу токенов).
+_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local force = tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if force == 1 or tokens >= cost then
+    tokens = math.min(capacity, tokens - cost)
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+
+class TokenBucket:
+    """Token bucket с ёмкостью на минуту, в памяти процесса или в Redis"""
+
+    def __init__(self, name: str, per_minute: int, cache: Optional[CacheService] = None):
+        """
+        Args:
+            name: Ключ ведра в Redis
+            per_minute: Ёмкость и скорость пополнения в минуту
+            cache: Redis кэш (None - ведро только в памяти процесса)
+        """
+        self.name = name
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.cache = cache
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    async def try_take(self, cost: float, force: bool = False) -> float:
+        """
+        Списывает cost, если хватает
+
+        Returns:
+            0, если списано, иначе сколько секунд ждать до следующей попытки
+        """
+        # Запрос больше ёмкости никогда не пройдёт - ограничиваем ёмкостью
+        cost = min(cost, self.capacity)
+        if self.cache is not None and self.cache.redis_client:
+            wait = await self.cache.eval_script(
+                _BUCKET_SCRIPT, [self.name],
+                [self.capacity, self.rate, time.time(), cost, 1 if force else 0]
+            )
+            if wait is not None:
+                return float(wait)
+            # Redis недоступен - продолжаем с локальным ведром
+
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if force or self._tokens >= cost:
+            self._tokens = min(self.capacity, self._tokens - cost)
+            return 0.0
+        return (cost - self._tokens) / self.rate
+
+    async def take(self, cost: float) -> None:
+        """Ждёт, пока в ведре наберётся cost, и списывает"""
+        while True:
+            wait = await self.try_take(cost)
+            if wait <= 0:
+                return
+            # Разброс, чтобы ждущие процессы не просыпались одновременно
+            await asyncio.sleep(wait * random.uniform(1.0, 1.2))
+
+    async def adjust(self, delta: float) -> None:
+        """Корректирует остаток (положительный delta - доплата, отрицательный - возврат)"""
+        if delta:
+            await self.try_take(delta, force=True)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Адаптивный лимит одновременных запросов (AIMD)
+
+    Каждый успешный ответ увеличивает лимит на 1/limit, то есть примерно
+    на единицу за окно из limit ответов. Перегрузка (429/5xx) уменьшает
+    лимит вдвое, но не чаще раза за cooldown - пачка ошибок от одного
+    всплеска не обнуляет лимит.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        backoff: float = 0.5,
+        cooldown: float = 1.0
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self._condition_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Условие привязано к event loop, при смене loop создаём новое
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    async def acquire(self) -> None:
+        """Ждёт свободного места в пределах текущего лимита"""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        metrics.gauge("ai.gpt.limiter.in_flight", self.in_flight)
+
+    async def release(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+        metrics.gauge("ai.gpt.limiter.in_flight", self.in_flight)
+
+    def on_success(self) -> None:
+        """Аддитивное увеличение лимита"""
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        metrics.gauge("ai.gpt.limiter.concurrency_limit", self.limit)
+
+    def on_overload(self) -> None:
+        """Мультипликативное уменьшение лимита"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        metrics.gauge("ai.gpt.limiter.concurrency_limit", self.limit)
+        logger.warning(f"OpenAI overloaded, concurrency limit lowered to {int(self.limit)}")
+
+
+def is_overload_error(error: Exception) -> bool:
+    """429 и 5xx - сигналы перегрузки, на них уменьшается лимит"""
+    return isinstance(error, (openai.RateLimitError, openai.InternalServerError))
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Ошибки, после которых запрос имеет смысл повторить"""
+    return is_overload_error(error) or isinstance(error, openai.APIConnectionError)
+
+
+def retry_delay(error: Exception, attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    """
+    Задержка перед повтором
+
+    retry-after / retry-after-ms из ответа API, иначе экспоненциальная
+    задержка с полным случайным разбросом.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return min(cap, float(headers["retry-after-ms"]) / 1000)
+        if headers.get("retry-after"):
+            return min(cap, float(headers["retry-after"]))
+    except (TypeError, ValueError):
+        pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class OpenAIRateLimiter:
+    """Лимиты RPM/TPM и адаптивная конкурентность для запросов к OpenAI"""
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        use_redis: Optional[bool] = None,
+        cache: Optional[CacheService] = None
+    ):
+        """
+        Args:
+            requests_per_minute: Лимит запросов в минуту (на модель)
+            tokens_per_minute: Лимит токенов в минуту (на модель)
+            use_redis: Делить лимиты между процессами через Redis
+            cache: Redis кэш
+        """
+        self.requests_per_minute = requests_per_minute or settings.GPT_REQUESTS_PER_MINUTE
+        self.tokens_per_minute = tokens_per_minute or settings.GPT_TOKENS_PER_MINUTE
+        use_redis = use_redis if use_redis is not None else settings.GPT_RATE_LIMIT_REDIS
+        self.cache = (cache or cache_service) if use_redis else None
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=settings.GPT_CONCURRENCY_INITIAL,
+            max_limit=settings.GPT_CONCURRENCY_MAX
+        )
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _bucket(self, model: str, kind: str) -> TokenBucket:
+        key = CacheKeys.AI_GPT_RATE_BUCKET.format(model=model, kind=kind)
+        if key not in self._buckets:
+            per_minute = self.requests_per_minute if kind == "rpm" else self.tokens_per_minute
+            self._buckets[key] = TokenBucket(key, per_minute, self.cache)
+        return self._buckets[key]
+
+    @asynccontextmanager
+    async def slot(self, model: str, estimated_tokens: int) -> AsyncIterator[None]:
+        """
+        Место для одного запроса к API
+
+        Ждёт лимиты RPM/TPM и свободное место по конкурентности.
+        Результат запроса (успех или перегрузка) подстраивает лимит.
+        """
+        queued_at = time.perf_counter()
+        await self._bucket(model, "rpm").take(1)
+        await self._bucket(model, "tpm").take(estimated_tokens)
+        await self.concurrency.acquire()
+        metrics.timer("ai.gpt.limiter.queued_time", time.perf_counter() - queued_at, tags={"model": model})
+
+        started_at = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if is_overload_error(e):
+                self.concurrency.on_overload()
+            raise
+        else:
+            self.concurrency.on_success()
+        finally:
+            metrics.timer("ai.gpt.upstream.latency", time.perf_counter() - started_at, tags={"model": model})
+            await self.concurrency.release()
+
+    async def record_usage(self, model: str, estimated_tokens: int, actual_tokens: int) -> None:
+        """Корректирует TPM по фактическому расходу токенов"""
+        if actual_tokens:
+            await self._bucket(model, "tpm").adjust(actual_tokens - estimated_tokens)
+
+
+# Общий лимитер запросов к OpenAI
+gpt_rate_limiter = OpenAIRateLimiter()
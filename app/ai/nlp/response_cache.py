@@ -0,0 +1,132 @@
+"""
+Кэш ответов GPT с точным совпадением
+
+Многие сообщения почти одинаковы ("звонок завтра в 15"), поэтому ответ
+модели кэшируется по нормализованному тексту. Для разбора событий
+в ключ входит опорная дата: «завтра» сегодня и «завтра» через неделю -
+разные даты, а повтор той же фразы в тот же день берётся из кэша.
+Фразы, отсчитываемые от текущего момента («через час»), не кэшируются.
+"""
+import hashlib
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.core.cache import CacheKeys, CacheService, cache_service
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+# Относительное время от текущего момента - ответ зависит от минут, а не от даты
+_MOMENT_RELATIVE = re.compile(
+    r"\bчерез\s+(?:\d+|пол|полтора|пару|несколько|час|минут)|"
+    r"\bчерез\s*полчаса\b|\bсейчас\b|\bпрямо\s+сейчас\b|\bсию\s+минуту\b|"
+    r"\b\d+\s*(?:мин|час)\w*\s+назад\b"
+)
+_PUNCTUATION = re.compile(r"[^\w\s:.,/-]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализует текст для ключа кэша
+
+    Регистр, «ё», лишние пробелы, эмодзи и финальная пунктуация
+    на разбор не влияют.
+    """
+    text = text.lower().replace("ё", "е")
+    text = _PUNCTUATION.sub(" ", text)
+    text = _SPACES.sub(" ", text).strip()
+    return text.rstrip(".,").strip()
+
+
+def reference_bucket(text: str, now: Optional[datetime] = None) -> Optional[str]:
+    """
+    Опорная дата для ключа кэша разбора событий
+
+    Returns:
+        Дата YYYY-MM-DD или None, если ответ зависит от текущего времени
+        и кэшировать его нельзя
+    """
+    if _MOMENT_RELATIVE.search(normalize_text(text)):
+        return None
+    now = now or datetime.now()
+    return now.strftime("%Y-%m-%d")
+
+
+class GPTResponseCache:
+    """Кэш разобранных ответов GPT с метриками сэкономленных токенов и времени"""
+
+    def __init__(self, cache: CacheService = None, ttl: int = None):
+        self.cache = cache or cache_service
+        self.ttl = ttl or settings.GPT_CACHE_TTL
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.saved_tokens: Dict[str, int] = {}
+        self.saved_latency: Dict[str, float] = {}
+
+    @staticmethod
+    def make_key(task: str, model: str, text: str, bucket: str = "any") -> str:
+        """Ключ кэша: задача, модель, опорная дата и хэш нормализованного текста"""
+        text_hash = hashlib.sha256(normalize_text(text).encode()).hexdigest()
+        return CacheKeys.AI_GPT_RESPONSE.format(task=task, model=model, bucket=bucket, text_hash=text_hash)
+
+    async def get(self, task: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает сохранённый результат
+
+        Сэкономленные токены и время берутся из записи -
+        это стоимость исходного запроса к модели.
+        """
+        entry = await self.cache.get(key)
+        if entry is None:
+            self._record(task, hit=False)
+            return None
+
+        self._record(task, hit=True)
+        tokens = entry.get("tokens", 0)
+        latency = entry.get("latency", 0.0)
+        self.saved_tokens[task] = self.saved_tokens.get(task, 0) + tokens
+        self.saved_latency[task] = self.saved_latency.get(task, 0.0) + latency
+        metrics.increment("ai.gpt.cache.saved_tokens", tokens, tags={"task": task})
+        metrics.timer("ai.gpt.cache.saved_latency", latency, tags={"task": task})
+        return dict(entry["result"])
+
+    async def set(self, task: str, key: str, result: Dict[str, Any], tokens: int = 0, latency: float = 0.0) -> bool:
+        """Сохраняет результат вместе со стоимостью запроса"""
+        return await self.cache.set(
+            key,
+            {"result": result, "tokens": tokens, "latency": latency},
+            expire=self.ttl
+        )
+
+    def _record(self, task: str, hit: bool) -> None:
+        counter = self.hits if hit else self.misses
+        counter[task] = counter.get(task, 0) + 1
+        metrics.increment("ai.gpt.cache.hits" if hit else "ai.gpt.cache.misses", tags={"task": task})
+        metrics.gauge("ai.gpt.cache.hit_rate", self.get_hit_rate(task), tags={"task": task})
+
+    def get_hit_rate(self, task: str) -> float:
+        """Доля попаданий в кэш для задачи"""
+        total = self.hits.get(task, 0) + self.misses.get(task, 0)
+        return self.hits.get(task, 0) / total if total else 0.0
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика кэша по задачам"""
+        tasks = set(self.hits) | set(self.misses)
+        return {
+            task: {
+                "hits": self.hits.get(task, 0),
+                "misses": self.misses.get(task, 0),
+                "hit_rate": self.get_hit_rate(task),
+                "saved_tokens": self.saved_tokens.get(task, 0),
+                "saved_latency": self.saved_latency.get(task, 0.0)
+            }
+            for task in tasks
+        }
+
+
+# Глобальный кэш ответов GPT
+gpt_response_cache = GPTResponseCache()
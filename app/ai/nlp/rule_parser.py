@@ -0,0 +1,489 @@
+"""
+Детерминированный разбор событий на русском языке
+
+Грамматика на регулярных выражениях покрывает типовые фразы риэлтора:
+относительные даты и дни недели, «через N часов», «в 15», «вечером»,
+числовые и словесные даты, длительность, тип события и имя клиента.
+Результат содержит оценку уверенности - уверенно разобранные сообщения
+не отправляются в OpenAI.
+
+Формат результата совпадает с ответом GPTClient.parse_calendar_event.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+WEEKDAYS = {
+    "понедельник": 0, "вторник": 1, "сред": 2, "четверг": 3,
+    "пятниц": 4, "суббот": 5, "воскресен": 6,
+}
+
+MONTHS = {
+    "январ": 1, "феврал": 2, "март": 3, "апрел": 4, "ма": 5, "июн": 6,
+    "июл": 7, "август": 8, "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12,
+}
+
+NUMBER_WORDS = {
+    "час": 1, "один": 1, "одну": 1, "два": 2, "две": 2, "три": 3, "четыре": 4, "пять": 5,
+    "шесть": 6, "семь": 7, "восемь": 8, "девять": 9, "десять": 10,
+    "одиннадцать": 11, "двенадцать": 12, "пару": 2, "несколько": 3,
+}
+
+# Время суток без точного часа (как в промпте GPT)
+DAY_PARTS = {
+    "утром": "10:00", "с утра": "10:00", "днем": "14:00", "в обед": "13:00",
+    "в полдень": "12:00", "вечером": "18:00",
+}
+
+# Тип события: основы слов, заголовок по умолчанию, длительность, приоритет
+EVENT_TYPES: List[Tuple[str, str, str, int, str]] = [
+    ("showing", r"показ|покажу|просмотр|посмотреть (?:квартир|объект|дом)", "Показ", 90, "high"),
+    ("deal", r"сделк|подписан|подписать|договор|задат|ипотек", "Сделка", 60, "medium"),
+    ("call", r"звон|позвон|созвон|перезвон|набрать", "Звонок", 30, "medium"),
+    ("meeting", r"встреч|встрет|консультац|переговор", "Встреча", 60, "medium"),
+    ("task", r"задач|дело\b|напомин|напомн", "Задача", 60, "low"),
+]
+
+# Глаголы-команды записи без типа («запиши к нотариусу завтра в 10»)
+TRIGGER_VERBS = r"запиш|запланир|постав|добав|назнач|напомн"
+
+COMMAND_WORDS = r"удали|отмени|убери|перенеси|измени|поменяй|покажи|список"
+
+_W = r"(?<![\w])"  # начало слова
+_HOUR_WORDS = "|".join(sorted(NUMBER_WORDS, key=len, reverse=True))
+
+_RE_CLOCK = re.compile(_W + r"(?:в|во|на|к|до)\s+(\d{1,2})[:.\-](\d{2})(?!\d)")
+_RE_HOUR = re.compile(
+    _W + r"(?:в|к)\s+(\d{1,2}|" + _HOUR_WORDS + r")(?![\d:.\w])"
+    r"(?:\s*(?:ч(?:ас(?:а|ов)?)?\.?))?"
+    r"(?:\s+(утра|дня|вечера|ночи))?"
+)
+_RE_BARE_CLOCK = re.compile(_W + r"(\d{1,2}):(\d{2})(?!\d)")
+_RE_IN_DELTA = re.compile(
+    _W + r"через\s+(\d+|пол|полтора|" + _HOUR_WORDS + r")?\s*"
+    r"(минут\w*|мин\b|час\w*|ч\b|дн\w*|день|недел\w*|месяц\w*)"
+)
+_RE_HALF_HOUR = re.compile(_W + r"через\s+полчаса")
+_RE_RELATIVE_DAY = re.compile(_W + r"(послезавтра|завтра|сегодня)")
+_RE_WEEKDAY = re.compile(
+    _W + r"(?:(?:в|во|на)\s+)?(?:(следующ\w+|эт\w+)\s+)?"
+    r"(понедельник|вторник|сред[ауы]|четверг|пятниц[ауы]|суббот[ауы]|воскресень[ея])"
+)
+_RE_NEXT_WEEK = re.compile(_W + r"на\s+следующей\s+неделе")
+_RE_NUMERIC_DATE = re.compile(r"(?<![\d:.])(\d{1,2})[./](\d{1,2})(?:[./](\d{2,4}))?(?![\d:])")
+_RE_TEXT_DATE = re.compile(
+    _W + r"(\d{1,2})(?:-?го)?\s+(января|февраля|марта|апреля|мая|июня|июля|августа|"
+    r"сентября|октября|ноября|декабря)(?:\s+(\d{4}))?"
+)
+_RE_DURATION = re.compile(
+    _W + r"на\s+(\d+|пол|полтора|" + _HOUR_WORDS + r")?\s*(минут\w*|мин\b|час\w*|ч\b)"
+)
+_RE_HALF_HOUR_DURATION = re.compile(_W + r"на\s+полчаса")
+_RE_CLIENT_WITH = re.compile(r"(?<![\w])(?i:с|со)\s+((?:[А-ЯЁ][а-яё]+)(?:\s+[А-ЯЁ][а-яё]+)?)")
+_RE_CLIENT_DATIVE = re.compile(
+    r"(?<![\w])(?i:клиент(?:у|ке)|позвонить|звонок|перезвонить|набрать)\s+((?:[А-ЯЁ][а-яё]+)(?:\s+[А-ЯЁ][а-яё]+)?)"
+)
+_RE_LOCATION = re.compile(
+    r"(?<![\w])(?:(?i:в\s+офисе|на\s+объекте|в\s+банке|у\s+нотариуса|в\s+мфц)|"
+    r"(?i:на|в)\s+(?:ул\.?\s*|улице\s+)?[А-ЯЁ][\w\-]+(?:\s+[А-ЯЁ0-9][\w\-]*)?|"
+    r"у\s+метро\s+[А-ЯЁ][\w\-]+)"
+)
+# Числа в описании объекта («2-комн», «54 м2», «5 этаж») - не дата и не время
+_RE_DESCRIPTIVE_NUMBER = re.compile(
+    r"\d+(?:[.,]\d+)?\s*-?\s*(?:комн\w*|к\b|х\b|м2|м²|кв\.?\s*м\w*|метр\w*|этаж\w*|сот\w*|млн|тыс\w*|руб\w*)|"
+    r"(?:этаж|дом|кв\.?|квартира|корпус|д\.)\s*\d+(?:/\d+)?"
+)
+_KNOWN_LOCATIONS = {
+    "в офисе": "офис", "на объекте": "объект", "в банке": "банк",
+    "у нотариуса": "нотариус", "в мфц": "МФЦ",
+}
+_RE_TRIGGER_PREFIX = re.compile(
+    r"^\s*(?:пожалуйста\s+)?(?:запиши|запишите|запланируй|поставь|добавь|назначь|"
+    r"создай|напомни(?:\s+мне)?)\b[\s,:]*",
+    re.IGNORECASE
+)
+
+
+# Пределы «через N ...» и «на N ...»: дальше - не событие календаря, а
+# опечатка или шутка; без них timedelta и дата переполняются
+MAX_DELTA_MINUTES = 365 * 24 * 60
+MAX_DURATION_MINUTES = 24 * 60
+
+
+class _OutOfRange(ValueError):
+    """Величина вне пределов - разбор отдаётся следующему этапу"""
+
+
+def _number(token: Optional[str]) -> Optional[float]:
+    if token is None:
+        return None
+    if token.isdigit():
+        return int(token)
+    if token == "пол":
+        return 0.5
+    if token == "полтора":
+        return 1.5
+    return NUMBER_WORDS.get(token)
+
+
+def _calendar_date(year: int, month: int, day: int, year_given: bool, today: date) -> Optional[date]:
+    """
+    Дата из числа и месяца; без года прошедшая дата переносится на следующий год
+
+    None - такой даты нет в нужном году (31 апреля, 29 февраля не в високосный)
+    """
+    try:
+        result = date(year, month, day)
+        if not year_given and result < today:
+            result = result.replace(year=year + 1)
+    except ValueError:
+        return None
+    return result
+
+
+def _to_nominative(name: str) -> str:
+    """Приблизительное приведение имени из творительного/дательного падежа"""
+    words = []
+    for word in name.split():
+        lower = word.lower()
+        for ending, replacement in (
+            ("ыми", "ы"), ("ими", "и"), ("ьей", "ья"), ("ьёй", "ья"),
+            ("овым", "ов"), ("евым", "ев"), ("иным", "ин"), ("ым", ""),
+            ("ой", "а"), ("ею", "ей"), ("ем", "й"), ("ом", ""), ("ову", "ов"), ("еву", "ев"), ("ину", "ин"),
+        ):
+            if lower.endswith(ending) and len(lower) > len(ending) + 2:
+                stem = word[:-len(ending)]
+                if ending == "ем" and stem[-1].lower() not in "аеиоуя":
+                    # Игорем -> Игорь
+                    replacement = "ь"
+                word = stem + replacement
+                break
+        else:
+            if lower.endswith("ей") and len(lower) > 4:
+                # Катей -> Катя, Машей -> Маша
+                word = word[:-2] + ("а" if word[-3].lower() in "шжчщц" else "я")
+            elif lower.endswith("у") and len(lower) > 4 and lower[-2] not in "аеиоуыэюя":
+                # Ивану -> Иван, Петру -> Петр
+                word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+@dataclass
+class RuleParseResult:
+    """Результат разбора сообщения правилами"""
+    intent: str  # event, command, unknown
+    confidence: float = 0.0
+    event_type: Optional[str] = None
+    title: Optional[str] = None
+    client_name: Optional[str] = None
+    location: Optional[str] = None
+    date: Optional[str] = None
+    time: Optional[str] = None
+    duration_minutes: Optional[int] = None
+    priority: Optional[str] = None
+    matched: List[str] = field(default_factory=list)  # сработавшие правила
+
+    def to_event(self) -> Dict[str, Any]:
+        """Событие в формате ответа GPTClient.parse_calendar_event"""
+        return {
+            "event_type": self.event_type,
+            "title": self.title,
+            "client_name": self.client_name,
+            "location": self.location,
+            "date": self.date,
+            "time": self.time,
+            "duration_minutes": self.duration_minutes,
+            "description": None,
+            "priority": self.priority,
+            "confidence": round(self.confidence, 2),
+            "parser": "rules",
+        }
+
+
+class RuleBasedEventParser:
+    """Разбор событий без обращения к модели"""
+
+    def parse(self, text: str, now: Optional[datetime] = None) -> RuleParseResult:
+        """
+        Разбирает сообщение
+
+        Args:
+            text: Текст сообщения
+            now: Опорный момент для относительных дат (по умолчанию текущий)
+
+        Returns:
+            Результат разбора с оценкой уверенности
+        """
+        now = now or datetime.now()
+        original = text.strip()
+        lowered = original.lower().replace("ё", "е")
+        spans: List[Tuple[int, int]] = []
+        matched: List[str] = []
+
+        event_type = self._event_type(lowered)
+        has_trigger = re.search(_W + TRIGGER_VERBS, lowered) is not None
+        if event_type is None and not has_trigger:
+            intent = "command" if re.search(_W + r"(?:" + COMMAND_WORDS + r")", lowered) else "unknown"
+            return RuleParseResult(intent=intent)
+        if re.search(_W + r"(?:удали|отмени|убери|перенеси|измени|поменяй)", lowered):
+            return RuleParseResult(intent="command")
+
+        type_key, default_title, duration, priority = event_type or ("task", "Задача", 60, "low")
+        if event_type is None:
+            matched.append("type:trigger")
+        else:
+            matched.append(f"type:{type_key}")
+
+        try:
+            event_date, event_time, date_explicit, time_kind = self._datetime(lowered, now, spans, matched)
+            duration_match = _RE_HALF_HOUR_DURATION.search(lowered) or _RE_DURATION.search(lowered)
+            if duration_match:
+                duration = self._duration(duration_match)
+                spans.append(duration_match.span())
+                matched.append("duration")
+        except _OutOfRange:
+            return RuleParseResult(intent="unknown")
+
+        if "?" in original and not date_explicit and not time_kind:
+            # Вопрос по теме («сколько стоит ипотека?»), а не событие
+            return RuleParseResult(intent="unknown")
+
+        client_name = None
+        client_match = _RE_CLIENT_DATIVE.search(original) or _RE_CLIENT_WITH.search(original)
+        if client_match:
+            client_name = _to_nominative(client_match.group(1))
+            matched.append("client")
+
+        location = None
+        location_match = _RE_LOCATION.search(original)
+        if location_match:
+            phrase = location_match.group(0)
+            location = _KNOWN_LOCATIONS.get(phrase.lower(), re.sub(r"^(?:на|в|у)\s+", "", phrase))
+            matched.append("location")
+
+        # Время не указано - как и GPT, предполагаем 10:00
+        if event_time is None:
+            event_time = "10:00"
+        if event_date is None:
+            start = datetime.combine(now.date(), datetime.strptime(event_time, "%H:%M").time())
+            event_date = now.date() if start > now else now.date() + timedelta(days=1)
+
+        confidence = 0.4 if event_type else 0.3
+        confidence += 0.25 if date_explicit else (0.1 if time_kind else 0.0)
+        confidence += {"clock": 0.3, "relative": 0.3, "day_part": 0.2, "ambiguous": 0.2}.get(time_kind, 0.0)
+        if "?" in original:
+            # Вопрос, а не просьба записать
+            confidence -= 0.3
+        leftover = _RE_DESCRIPTIVE_NUMBER.sub(" ", self._strip_spans(lowered, spans))
+        if re.search(r"\d", leftover):
+            # Числа, которые правила не поняли
+            confidence -= 0.15
+            matched.append("unparsed_numbers")
+
+        return RuleParseResult(
+            intent="event",
+            confidence=max(0.0, min(confidence, 0.98)),
+            event_type=type_key,
+            title=self._title(original, spans, default_title),
+            client_name=client_name,
+            location=location,
+            date=event_date.strftime("%Y-%m-%d"),
+            time=event_time,
+            duration_minutes=duration,
+            priority=priority,
+            matched=matched,
+        )
+
+    @staticmethod
+    def _event_type(lowered: str) -> Optional[Tuple[str, str, int, str]]:
+        """
+        Тип по первому встретившемуся ключевому слову
+
+        Задача - только если другого типа нет: «напомни позвонить» - звонок.
+        """
+        best = None
+        for key, pattern, title, duration, priority in EVENT_TYPES:
+            match = re.search(_W + r"(?:" + pattern + r")", lowered)
+            if match is None:
+                continue
+            rank = (key == "task", match.start())
+            if best is None or rank < best[0]:
+                best = (rank, (key, title, duration, priority))
+        return best[1] if best else None
+
+    def _datetime(
+        self,
+        lowered: str,
+        now: datetime,
+        spans: List[Tuple[int, int]],
+        matched: List[str]
+    ) -> Tuple[Optional[date], Optional[str], bool, Optional[str]]:
+        """Дата и время события: (дата, HH:MM, дата указана явно, вид времени)"""
+        event_date: Optional[date] = None
+        event_time: Optional[str] = None
+        time_kind: Optional[str] = None
+
+        # «через 2 часа», «через 3 дня»
+        match = _RE_HALF_HOUR.search(lowered)
+        delta = timedelta(minutes=30) if match else None
+        if match is None:
+            match = _RE_IN_DELTA.search(lowered)
+            if match:
+                delta = self._delta(match)
+        if match and delta is not None:
+            spans.append(match.span())
+            target = now + delta
+            event_date = target.date()
+            if delta < timedelta(days=1):
+                event_time = target.strftime("%H:%M")
+                time_kind = "relative"
+            matched.append("in_delta")
+
+        # Время: «в 15:30», «в 9 утра», «в 15»
+        if event_time is None:
+            match = _RE_CLOCK.search(lowered) or _RE_BARE_CLOCK.search(lowered)
+            if match and int(match.group(1)) < 24 and int(match.group(2)) < 60:
+                event_time = f"{int(match.group(1)):02d}:{match.group(2)}"
+                time_kind = "clock"
+                spans.append(match.span())
+                matched.append("clock")
+        if event_time is None:
+            match = _RE_HOUR.search(lowered)
+            if match:
+                hour = int(_number(match.group(1)))
+                qualifier = match.group(2)
+                if qualifier in ("дня", "вечера") and hour < 12:
+                    hour += 12
+                elif qualifier == "ночи" and hour == 12:
+                    hour = 0
+                time_kind = "clock" if qualifier or hour >= 8 else "ambiguous"
+                if qualifier is None and 1 <= hour <= 7:
+                    # Рабочие часы: «в 3» - это 15:00
+                    hour += 12
+                if hour < 24:
+                    event_time = f"{hour:02d}:00"
+                    spans.append(match.span())
+                    matched.append("hour")
+                else:
+                    time_kind = None
+        if event_time is None:
+            for phrase, value in DAY_PARTS.items():
+                position = lowered.find(phrase)
+                if position >= 0:
+                    event_time = value
+                    time_kind = "day_part"
+                    spans.append((position, position + len(phrase)))
+                    matched.append("day_part")
+                    break
+
+        date_explicit = event_date is not None
+        if event_date is None:
+            event_date = self._date(lowered, now, spans, matched)
+            date_explicit = event_date is not None
+
+        return event_date, event_time, date_explicit, time_kind
+
+    @staticmethod
+    def _date(lowered: str, now: datetime, spans: List[Tuple[int, int]], matched: List[str]) -> Optional[date]:
+        today = now.date()
+
+        match = _RE_RELATIVE_DAY.search(lowered)
+        if match:
+            spans.append(match.span())
+            matched.append("relative_day")
+            return today + timedelta(days={"сегодня": 0, "завтра": 1, "послезавтра": 2}[match.group(1)])
+
+        match = _RE_TEXT_DATE.search(lowered)
+        if match:
+            month = next(number for stem, number in MONTHS.items() if match.group(2).startswith(stem))
+            year = int(match.group(3)) if match.group(3) else today.year
+            result = _calendar_date(year, month, int(match.group(1)), bool(match.group(3)), today)
+            if result is None:
+                return None
+            spans.append(match.span())
+            matched.append("text_date")
+            return result
+
+        match = _RE_NUMERIC_DATE.search(lowered)
+        if match:
+            day, month = int(match.group(1)), int(match.group(2))
+            year = match.group(3)
+            year = (int(year) + 2000 if len(year) == 2 else int(year)) if year else today.year
+            result = _calendar_date(year, month, day, bool(match.group(3)), today)
+            if result is None:
+                return None
+            spans.append(match.span())
+            matched.append("numeric_date")
+            return result
+
+        match = _RE_WEEKDAY.search(lowered)
+        if match:
+            weekday = next(number for stem, number in WEEKDAYS.items() if match.group(2).startswith(stem))
+            modifier = match.group(1) or ""
+            if modifier.startswith("следующ") or _RE_NEXT_WEEK.search(lowered):
+                # День следующей календарной недели
+                next_monday = today + timedelta(days=7 - today.weekday())
+                result = next_monday + timedelta(days=weekday)
+            else:
+                days = (weekday - today.weekday()) % 7
+                # «в понедельник» в понедельник - следующий понедельник
+                result = today + timedelta(days=days or 7)
+            spans.append(match.span())
+            matched.append("weekday")
+            return result
+
+        return None
+
+    @staticmethod
+    def _delta(match: re.Match) -> Optional[timedelta]:
+        amount = _number(match.group(1)) if match.group(1) else 1
+        if amount is None:
+            return None
+        unit = match.group(2)
+        if unit.startswith("мин"):
+            minutes = amount
+        elif unit.startswith("ч"):
+            minutes = amount * 60
+        elif unit.startswith("д"):
+            minutes = amount * 24 * 60
+        elif unit.startswith("недел"):
+            minutes = amount * 7 * 24 * 60
+        else:
+            minutes = amount * 30 * 24 * 60
+        if minutes > MAX_DELTA_MINUTES:
+            raise _OutOfRange(match.group(0))
+        return timedelta(minutes=minutes)
+
+    @staticmethod
+    def _duration(match: re.Match) -> int:
+        if match.re is _RE_HALF_HOUR_DURATION:
+            return 30
+        amount = _number(match.group(1)) if match.group(1) else 1
+        unit = match.group(2)
+        minutes = amount if unit.startswith("мин") else amount * 60
+        if minutes > MAX_DURATION_MINUTES:
+            raise _OutOfRange(match.group(0))
+        return int(minutes)
+
+    @staticmethod
+    def _strip_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+        for start, end in sorted(spans, reverse=True):
+            text = text[:start] + " " + text[end:]
+        return text
+
+    def _title(self, original: str, spans: List[Tuple[int, int]], default: str) -> str:
+        """Заголовок - текст без даты, времени и глагола-команды"""
+        title = self._strip_spans(original, spans)
+        title = _RE_TRIGGER_PREFIX.sub("", title)
+        title = re.sub(r"\s+", " ", title).strip(" ,.;:-")
+        title = re.sub(r"\s+([,.;:])", r"\1", title)
+        if not title:
+            return default
+        title = title[0].upper() + title[1:]
+        return title if len(title) <= 80 else title[:77].rstrip() + "..."
+
+
+# Общий экземпляр парсера
+rule_parser = RuleBasedEventParser()
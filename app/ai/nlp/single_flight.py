@@ -0,0 +1,146 @@
+"""
+Объединение одинаковых одновременных запросов к OpenAI (single-flight)
+
+Двойная отправка сообщения или один и тот же текст из голосового,
+фото и повтора Celery-задачи порождают одинаковые запросы. Пока первый
+запрос (лидер) выполняется, остальные ждут его результат вместо
+собственного вызова API.
+
+В процессе запросы объединяются через asyncio.Future. При включённом
+GPT_SINGLE_FLIGHT_REDIS лидер между процессами (бот, API, воркеры Celery)
+выбирается через SET NX в Redis, а результат передаётся через Redis.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+from app.core.cache import CacheKeys, CacheService, cache_service
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Выполняет одну функцию на ключ, остальные вызовы ждут её результат"""
+
+    def __init__(
+        self,
+        cache: CacheService = None,
+        use_redis: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.1
+    ):
+        """
+        Args:
+            cache: Redis кэш для объединения между процессами
+            use_redis: Объединять запросы между процессами
+            timeout: Сколько ждать результат чужого запроса, секунды
+                (и время жизни блокировки лидера в Redis)
+            poll_interval: Период опроса результата в Redis, секунды
+        """
+        self.cache = cache or cache_service
+        self.use_redis = use_redis if use_redis is not None else settings.GPT_SINGLE_FLIGHT_REDIS
+        self.timeout = timeout or settings.GPT_SINGLE_FLIGHT_TIMEOUT
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполняет func или ждёт результат такого же запроса в полёте
+
+        Args:
+            key: Ключ запроса (одинаковые запросы - одинаковый ключ)
+            func: Фабрика корутины, выполняющей запрос
+
+        Returns:
+            Результат func; ошибка лидера передаётся всем ожидающим
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            future = self._inflight.get(key)
+            # Future привязан к своему event loop (Celery создаёт loop на задачу)
+            if future is None or future.get_loop() is not loop:
+                break
+            try:
+                result = await asyncio.shield(future)
+                metrics.increment("ai.gpt.single_flight.coalesced", tags={"scope": "process"})
+                return result
+            except asyncio.CancelledError:
+                # Лидер отменён - выбираем нового, если отменили не нас
+                if future.cancelled():
+                    continue
+                raise
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            if self.use_redis and self.cache.redis_client:
+                result = await self._do_shared(key, func)
+            else:
+                result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Ошибку получат ожидающие, если они есть
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _do_shared(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выбор лидера между процессами через Redis"""
+        lock_key = CacheKeys.AI_GPT_INFLIGHT_LOCK.format(request_hash=key)
+        result_key = CacheKeys.AI_GPT_INFLIGHT_RESULT.format(request_hash=key)
+        ttl = int(self.timeout) + 1
+        deadline = time.monotonic() + self.timeout
+
+        while time.monotonic() < deadline:
+            if await self.cache.add(lock_key, os.getpid(), expire=ttl):
+                try:
+                    # Результат прошлого запроса с тем же ключом уже не нужен
+                    await self.cache.delete(result_key)
+                    result = await func()
+                    # Результат живёт недолго - только для тех, кто уже ждёт
+                    await self.cache.set(result_key, {"value": result}, expire=ttl)
+                    return result
+                finally:
+                    await self.cache.delete(lock_key)
+
+            # Запрос выполняет другой процесс - ждём результат или освобождения блокировки
+            while time.monotonic() < deadline:
+                shared = await self.cache.get(result_key)
+                if shared is not None:
+                    metrics.increment("ai.gpt.single_flight.coalesced", tags={"scope": "redis"})
+                    return shared["value"]
+                if not await self.cache.exists(lock_key):
+                    break
+                await asyncio.sleep(self.poll_interval)
+
+            # Лидер упал без результата - пробуем стать лидером сами
+            shared = await self.cache.get(result_key)
+            if shared is not None:
+                metrics.increment("ai.gpt.single_flight.coalesced", tags={"scope": "redis"})
+                return shared["value"]
+
+        # Не дождались - выполняем запрос сами, чтобы не зависнуть
+        logger.warning(f"Single-flight wait timed out for {key[:12]}, running request directly")
+        metrics.increment("ai.gpt.single_flight.timeouts")
+        return await func()
+
+    @property
+    def inflight(self) -> int:
+        """Количество запросов в полёте в этом процессе"""
+        return len(self._inflight)
+
+
+# Общий single-flight для запросов к OpenAI
+gpt_single_flight = SingleFlight()
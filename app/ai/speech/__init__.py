@@ -5,6 +5,8 @@ Speech Recognition модуль
 - WhisperClient для локального распознавания речи
 """
 
-from .whisper_client import WhisperClient
+from app.core.lazy_import import lazy_exports
 
 __all__ = ["WhisperClient"]
+
+__getattr__ = lazy_exports(__name__, {"WhisperClient": ".whisper_client"})
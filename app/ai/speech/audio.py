@@ -0,0 +1,68 @@
+"""
+Декодирование аудио для Whisper
+
+Аудио декодируется через ffmpeg в моно float32 16 кГц - тот же формат,
+что использует whisper.load_audio, но без импорта torch в процессе бота.
+Байты из Telegram подаются в ffmpeg через stdin, без временных файлов.
+"""
+import subprocess
+from typing import Optional, Union
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def _run_ffmpeg(source: str, data: Optional[bytes], sample_rate: int) -> np.ndarray:
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", source,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+        "-"
+    ]
+    if data is not None:
+        # -nostdin запрещает только интерактив, вход из pipe:0 читается
+        cmd.remove("-nostdin")
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode(errors='ignore')}") from e
+
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def load_audio(file: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Декодирует аудиофайл в массив float32
+
+    Args:
+        file: Путь к аудиофайлу
+        sample_rate: Частота дискретизации результата
+
+    Returns:
+        Моно сигнал float32 в диапазоне [-1, 1]
+    """
+    return _run_ffmpeg(file, None, sample_rate)
+
+
+def decode_audio_bytes(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Декодирует аудио (OGG/Opus и др.) из памяти в массив float32
+
+    Args:
+        data: Содержимое аудиофайла
+        sample_rate: Частота дискретизации результата
+
+    Returns:
+        Моно сигнал float32 в диапазоне [-1, 1]
+    """
+    return _run_ffmpeg("pipe:0", data, sample_rate)
+
+
+def to_audio_array(audio: Union[str, bytes, np.ndarray], sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Приводит путь, байты или готовый массив к сигналу float32"""
+    if isinstance(audio, np.ndarray):
+        return audio.astype(np.float32, copy=False)
+    if isinstance(audio, (bytes, bytearray)):
+        return decode_audio_bytes(bytes(audio), sample_rate)
+    return load_audio(audio, sample_rate)
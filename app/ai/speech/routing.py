@@ -0,0 +1,200 @@
+"""
+Выбор модели Whisper по длительности голосового и загрузке очереди
+
+Время распознавания растёт с длительностью аудио и размером модели.
+Короткое голосовое (адрес, время встречи) дёшево распознать точной
+моделью, длинное - быстрой, иначе оно надолго займёт пул. При очереди
+в пуле модель понижается на ступень.
+
+Длительность читается из заголовков контейнера OGG (голосовые Telegram -
+OGG/Opus) без декодирования: позиция последней страницы минус pre-skip,
+делённые на частоту. Для пути к файлу читаются только начало и конец.
+"""
+import logging
+import re
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+from app.ai.speech.audio import SAMPLE_RATE
+from app.ai.speech.worker_pool import whisper_queue_depth
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_OGG_CAPTURE = b"OggS"
+# Заголовок страницы OGG до таблицы сегментов
+_OGG_HEADER = struct.Struct("<4sBBqIIIB")
+# Страница OGG не длиннее 27 + 255 + 255 * 255 байт
+_OGG_MAX_PAGE = 65307
+_OGG_HEAD_BYTES = 512
+_OPUS_RATE = 48000
+
+
+def _ogg_stream_info(head: bytes) -> Optional[tuple]:
+    """
+    Частота и pre-skip из первой страницы OGG
+
+    Returns:
+        (частота, pre-skip в отсчётах) или None, если это не OGG/Opus/Vorbis
+    """
+    if len(head) < _OGG_HEADER.size or not head.startswith(_OGG_CAPTURE):
+        return None
+    segments = head[_OGG_HEADER.size - 1]
+    payload = head[_OGG_HEADER.size + segments:]
+    if payload.startswith(b"OpusHead") and len(payload) >= 12:
+        pre_skip = struct.unpack_from("<H", payload, 10)[0]
+        # Позиции Opus всегда в отсчётах 48 кГц, независимо от исходной частоты
+        return _OPUS_RATE, pre_skip
+    if payload.startswith(b"\x01vorbis") and len(payload) >= 16:
+        return struct.unpack_from("<I", payload, 12)[0], 0
+    return None
+
+
+def _ogg_last_granule(tail: bytes) -> Optional[int]:
+    """Позиция (granule) последней страницы, на которой заканчивается пакет"""
+    end = len(tail)
+    while True:
+        start = tail.rfind(_OGG_CAPTURE, 0, end)
+        if start < 0 or len(tail) - start < _OGG_HEADER.size:
+            return None
+        _, version, _, granule, *_ = _OGG_HEADER.unpack_from(tail, start)
+        # -1 - на странице не заканчивается ни один пакет
+        if version == 0 and granule >= 0:
+            return granule
+        end = start
+
+
+def ogg_duration(head: bytes, tail: Optional[bytes] = None) -> Optional[float]:
+    """
+    Длительность OGG по заголовкам, без декодирования
+
+    Args:
+        head: Начало файла (первая страница)
+        tail: Конец файла (последняя страница), по умолчанию - head
+
+    Returns:
+        Длительность в секундах или None для не-OGG и повреждённых файлов
+    """
+    info = _ogg_stream_info(head)
+    if info is None:
+        return None
+    granule = _ogg_last_granule(head if tail is None else tail)
+    if granule is None:
+        return None
+    rate, pre_skip = info
+    return max(0.0, (granule - pre_skip) / rate)
+
+
+def audio_duration(audio: Union[str, bytes, np.ndarray]) -> Optional[float]:
+    """
+    Длительность аудио без декодирования
+
+    Args:
+        audio: Путь к файлу, содержимое файла или сигнал float32 16 кГц
+
+    Returns:
+        Длительность в секундах или None, если формат не OGG
+    """
+    if isinstance(audio, np.ndarray):
+        return len(audio) / SAMPLE_RATE
+    if isinstance(audio, (bytes, bytearray)):
+        return ogg_duration(bytes(audio[:_OGG_HEAD_BYTES]), bytes(audio[-_OGG_MAX_PAGE:]))
+    try:
+        with open(audio, "rb") as file:
+            head = file.read(_OGG_HEAD_BYTES)
+            file.seek(0, 2)
+            file.seek(max(0, file.tell() - _OGG_MAX_PAGE))
+            tail = file.read()
+        return ogg_duration(head, tail)
+    except OSError as e:
+        logger.warning(f"Cannot read audio header: {e}")
+        return None
+
+
+@dataclass
+class WhisperRoute:
+    """Решение маршрутизации для одного аудио"""
+    model: str
+    reason: str
+    duration: Optional[float]
+    queue_depth: int
+
+
+class WhisperRouter:
+    """Выбирает модель Whisper по длительности аудио и глубине очереди"""
+
+    def __init__(
+        self,
+        models: Optional[Sequence[str]] = None,
+        durations: Optional[Sequence[float]] = None,
+        busy_queue_depth: Optional[int] = None
+    ):
+        """
+        Args:
+            models: Модели от точной к быстрой, на одну больше, чем границ
+            durations: Возрастающие границы длительности в секундах
+            busy_queue_depth: С какой глубины очереди модель понижается на ступень
+        """
+        self.models: List[str] = list(models or settings.WHISPER_ROUTE_MODELS)
+        self.durations: List[float] = list(durations if durations is not None else settings.WHISPER_ROUTE_DURATIONS)
+        self.busy_queue_depth = busy_queue_depth or settings.WHISPER_ROUTE_BUSY_DEPTH
+        if len(self.models) != len(self.durations) + 1:
+            raise ValueError("WHISPER_ROUTE_MODELS must have one model more than WHISPER_ROUTE_DURATIONS")
+
+    def route(
+        self,
+        audio: Union[str, bytes, np.ndarray],
+        default_model: str,
+        queue_depth: Optional[int] = None
+    ) -> WhisperRoute:
+        """
+        Args:
+            audio: Путь к файлу, содержимое файла или сигнал
+            default_model: Модель для аудио неизвестной длительности
+            queue_depth: Заданий в пулах Whisper (по умолчанию - текущая)
+
+        Returns:
+            Модель и причина выбора (граница длительности, busy при очереди)
+        """
+        if queue_depth is None:
+            queue_depth = whisper_queue_depth()
+        return self.route_duration(audio_duration(audio), default_model, queue_depth)
+
+    def route_duration(self, duration: Optional[float], default_model: str, queue_depth: int = 0) -> WhisperRoute:
+        """Выбор модели по уже известной длительности"""
+        if duration is None:
+            return WhisperRoute(default_model, "unknown", None, queue_depth)
+
+        tier = next((index for index, limit in enumerate(self.durations) if duration <= limit), len(self.durations))
+        reason = f"<={self.durations[tier]:g}s" if tier < len(self.durations) else f">{self.durations[-1]:g}s"
+        if queue_depth >= self.busy_queue_depth and tier + 1 < len(self.models):
+            tier += 1
+            reason += ",busy"
+        return WhisperRoute(self.models[tier], reason, duration, queue_depth)
+
+
+_WORD = re.compile(r"[\w:]+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower().replace("ё", "е"))
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Доля ошибок по словам (WER): замены, вставки и пропуски к длине эталона
+
+    Регистр, пунктуация и ё/е не учитываются.
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    row = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, candidate in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (word != candidate))
+    return row[-1] / len(ref)
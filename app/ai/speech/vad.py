@@ -0,0 +1,96 @@
+"""
+Простой энергетический VAD для нарезки длинных голосовых сообщений
+
+Сигнал режется по паузам, чтобы куски можно было распознавать параллельно
+и не резать слова посередине.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+from app.ai.speech.audio import SAMPLE_RATE
+
+
+def _frame_energy(audio: np.ndarray, frame_size: int) -> np.ndarray:
+    """RMS энергия по неперекрывающимся фреймам"""
+    n_frames = len(audio) // frame_size
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:n_frames * frame_size].reshape(n_frames, frame_size)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+def split_on_silence(
+    audio: np.ndarray,
+    sample_rate: int = SAMPLE_RATE,
+    frame_ms: int = 30,
+    min_silence_ms: int = 400,
+    min_segment_s: float = 3.0,
+    max_segment_s: float = 30.0,
+    silence_ratio: float = 2.0,
+    min_threshold: float = 0.005
+) -> List[Tuple[int, int]]:
+    """
+    Делит сигнал на сегменты по паузам
+
+    Args:
+        audio: Моно сигнал float32
+        sample_rate: Частота дискретизации
+        frame_ms: Длина фрейма анализа в мс
+        min_silence_ms: Минимальная длина паузы для разреза
+        min_segment_s: Сегменты короче склеиваются с соседними
+        max_segment_s: Сегменты длиннее режутся принудительно (окно Whisper - 30 с)
+        silence_ratio: Порог тишины относительно уровня шума
+        min_threshold: Нижняя граница порога тишины
+
+    Returns:
+        Список (начало, конец) сегментов в отсчётах
+    """
+    total = len(audio)
+    if total == 0:
+        return []
+
+    frame_size = int(sample_rate * frame_ms / 1000)
+    energy = _frame_energy(audio, frame_size)
+    if len(energy) == 0:
+        return [(0, total)]
+
+    # Уровень шума - нижний дециль энергии фреймов
+    threshold = max(float(np.percentile(energy, 10)) * silence_ratio, min_threshold)
+    silent = energy < threshold
+
+    # Точки разреза - середины достаточно длинных пауз
+    min_silence_frames = max(1, min_silence_ms // frame_ms)
+    cuts = []
+    run_start = None
+    for i, is_silent in enumerate(silent):
+        if is_silent and run_start is None:
+            run_start = i
+        elif not is_silent and run_start is not None:
+            if i - run_start >= min_silence_frames:
+                cuts.append(((run_start + i) // 2) * frame_size)
+            run_start = None
+
+    bounds = [0] + [cut for cut in cuts if 0 < cut < total] + [total]
+    segments = [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+    # Склеиваем слишком короткие сегменты с предыдущими
+    min_len = int(min_segment_s * sample_rate)
+    max_len = int(max_segment_s * sample_rate)
+    merged: List[Tuple[int, int]] = []
+    for start, end in segments:
+        if merged and (end - start < min_len or merged[-1][1] - merged[-1][0] < min_len) \
+                and end - merged[-1][0] <= max_len:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    # Режем слишком длинные сегменты
+    result = []
+    for start, end in merged:
+        while end - start > max_len:
+            result.append((start, start + max_len))
+            start += max_len
+        result.append((start, end))
+
+    return result
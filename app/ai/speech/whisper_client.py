@@ -4,76 +4,323 @@
 import logging
 import os
 import asyncio
-from typing import Dict, Any
+import hashlib
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.ai.model_registry import model_registry
+from app.ai.speech.audio import SAMPLE_RATE, to_audio_array
+from app.ai.speech.routing import WhisperRoute, WhisperRouter
+from app.ai.speech.vad import split_on_silence
+from app.ai.speech.worker_pool import get_whisper_pool
+from app.ai.usage_ledger import ai_usage_ledger
+from app.config import settings
+from app.core.cache import ai_result_cache
+from app.core.exceptions import AIException
+from app.core.logging import metrics
+from app.models.ai_data import AIProcessingType, AIProvider
 
 logger = logging.getLogger(__name__)
 
+
+def decode_options() -> Dict[str, Any]:
+    """Параметры декодирования: язык без автоопределения и подсказка словаря"""
+    options: Dict[str, Any] = {}
+    if settings.WHISPER_LANGUAGE:
+        options["language"] = settings.WHISPER_LANGUAGE
+    if settings.WHISPER_INITIAL_PROMPT:
+        options["initial_prompt"] = settings.WHISPER_INITIAL_PROMPT
+    return options
+
+
 class WhisperClient:
     """Клиент для локального распознавания речи с использованием OpenAI Whisper"""
 
-    def __init__(self, model_name="base"):
+    def __init__(self, model_name="base", routing: Optional[bool] = None):
         """
         Args:
-            model_name: Название модели Whisper (tiny, base, small, medium, large)
+            model_name: Название модели Whisper (tiny, base, small, medium, large);
+                при маршрутизации - для аудио неизвестной длительности
+            routing: Выбирать модель по длительности аудио
+                (по умолчанию WHISPER_ROUTING_ENABLED)
         """
         self.model_name = model_name
         self.model = None
-        self._load_model()
+        self.pool = None
+        self.options = decode_options()
+        if routing is None:
+            routing = settings.WHISPER_ROUTING_ENABLED
+        self.router = WhisperRouter() if routing else None
+        self._routed: Dict[str, "WhisperClient"] = {}
+        
+        if settings.WHISPER_WORKERS > 0:
+            # Модель живёт в процессах пула, а не в процессе бота
+            self.pool = get_whisper_pool(model_name)
+        else:
+            self._load_model()
 
     def _load_model(self):
-        """Загружает модель Whisper"""
+        """Получает модель Whisper из общего реестра процесса"""
         try:
-            # Попробуем импортировать whisper
-            try:
-                import whisper
-                self.model = whisper.load_model(self.model_name)
-                logger.info(f"Whisper model '{self.model_name}' loaded successfully.")
-            except AttributeError:
-                # Если load_model не найден, попробуем альтернативный импорт
-                logger.warning("Standard whisper.load_model not found, trying alternative approach")
-                self.model = None
-            except ImportError:
-                logger.warning("Whisper library not available, speech recognition disabled")
-                self.model = None
+            self.model = model_registry.get(model_registry.whisper_key(self.model_name))
+        except ImportError:
+            logger.warning("Whisper library not available, speech recognition disabled")
+            self.model = None
         except Exception as e:
             logger.error(f"Error loading Whisper model: {e}")
             self.model = None
 
-    async def transcribe(self, audio_path: str) -> str:
+    @property
+    def available(self) -> bool:
+        """Модель загружена или распознавание идёт в пуле процессов"""
+        return bool(self.pool or self.model)
+
+    def _route(self, audio: Union[str, bytes, np.ndarray]) -> Tuple["WhisperClient", Optional[WhisperRoute]]:
+        """Клиент модели, выбранной маршрутизатором (без маршрутизации - этот же)"""
+        if self.router is None:
+            return self, None
+        route = self.router.route(audio, self.model_name)
+        if route.model == self.model_name:
+            return self, route
+
+        client = self._routed.get(route.model)
+        if client is None:
+            client = self._routed[route.model] = WhisperClient(route.model, routing=False)
+        if not client.available:
+            logger.warning(f"Whisper model '{route.model}' not available, using '{self.model_name}'")
+            return self, WhisperRoute(self.model_name, f"{route.reason},fallback", route.duration, route.queue_depth)
+        return client, route
+
+    async def transcribe(
+        self,
+        audio: Union[str, bytes, np.ndarray],
+        file_unique_id: Optional[str] = None
+    ) -> str:
         """
-        Распознает речь из аудиофайла.
+        Распознает речь из аудио.
 
         Args:
-            audio_path: Путь к аудиофайлу.
+            audio: Путь к аудиофайлу, содержимое файла в байтах
+                или сигнал float32 16 кГц.
+            file_unique_id: Идентификатор файла в Telegram для кэша.
 
         Returns:
             Распознанный текст.
         """
-        if not self.model:
+        client, route = self._route(audio)
+        return await client._transcribe(audio, file_unique_id, route)
+
+    async def _transcribe(
+        self,
+        audio: Union[str, bytes, np.ndarray],
+        file_unique_id: Optional[str],
+        route: Optional[WhisperRoute]
+    ) -> str:
+        if not self.pool and not self.model:
             logger.error("Whisper model not loaded, transcription is not available.")
             return ""
         
+        started_at = time.perf_counter()
+        content_hash = self._content_hash(audio)
+        if content_hash or file_unique_id:
+            cached = await ai_result_cache.get("transcription", self._cache_variant(), content_hash, file_unique_id)
+            if cached is not None:
+                self._record_usage(started_at, cache_hit=True, route=route)
+                return cached
+        
         try:
-            # Запускаем транскрипцию в отдельном потоке
             loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, 
-                self._transcribe_sync, 
-                audio_path
-            )
-            logger.info(f"Transcription successful for {audio_path}")
+            if isinstance(audio, (bytes, bytearray)):
+                # Декодируем в памяти, без временного файла
+                audio = await loop.run_in_executor(None, to_audio_array, audio)
+            
+            if self.pool:
+                # Транскрипция в отдельном процессе пула
+                result = await self.pool.transcribe(audio, **self.options)
+            else:
+                # Запускаем транскрипцию в отдельном потоке
+                result = await loop.run_in_executor(
+                    None, 
+                    self._transcribe_sync, 
+                    audio
+                )
+            logger.info("Transcription successful")
+            duration = len(audio) / SAMPLE_RATE if isinstance(audio, np.ndarray) else None
+            self._record_usage(started_at, duration=duration, route=route)
+            
+            if result and (content_hash or file_unique_id):
+                await ai_result_cache.set("transcription", self._cache_variant(), result, content_hash, file_unique_id)
             return result
+        except AIException as e:
+            # Переполнение очереди и таймауты отдаём вызывающему
+            self._record_usage(started_at, error=e, route=route)
+            raise
         except Exception as e:
             logger.error(f"Error during transcription: {e}")
+            self._record_usage(started_at, error=e, route=route)
             return ""
 
-    def _transcribe_sync(self, audio_path: str) -> str:
+    async def transcribe_stream(
+        self,
+        audio: Union[str, bytes, np.ndarray],
+        file_unique_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Потоково распознаёт длинное аудио по сегментам.
+
+        Аудио режется по паузам (VAD), сегменты распознаются параллельно
+        в пуле, а частичные результаты отдаются по порядку по мере готовности.
+
+        Args:
+            audio: Путь к аудиофайлу, содержимое файла в байтах
+                или сигнал float32 16 кГц.
+            file_unique_id: Идентификатор файла в Telegram для кэша.
+
+        Yields:
+            Словари с полями index, total, text, start, end (секунды).
+        """
+        client, route = self._route(audio)
+        async for segment in client._transcribe_stream(audio, file_unique_id, route):
+            yield segment
+
+    async def _transcribe_stream(
+        self,
+        audio: Union[str, bytes, np.ndarray],
+        file_unique_id: Optional[str],
+        route: Optional[WhisperRoute]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        if not self.pool and not self.model:
+            logger.error("Whisper model not loaded, transcription is not available.")
+            return
+
+        started_at = time.perf_counter()
+        content_hash = self._content_hash(audio)
+        if content_hash or file_unique_id:
+            cached = await ai_result_cache.get("transcription", self._cache_variant(), content_hash, file_unique_id)
+            if cached is not None:
+                self._record_usage(started_at, cache_hit=True, route=route)
+                yield {"index": 0, "total": 1, "text": cached, "start": 0.0, "end": 0.0}
+                return
+
+        loop = asyncio.get_event_loop()
+        audio = await loop.run_in_executor(None, to_audio_array, audio)
+
+        if len(audio) < settings.WHISPER_CHUNK_MIN_DURATION * SAMPLE_RATE:
+            segments = [(0, len(audio))]
+        else:
+            segments = split_on_silence(audio)
+        metrics.increment("ai.whisper.stream.segments", len(segments))
+
+        def submit(start: int, end: int) -> asyncio.Future:
+            chunk = audio[start:end]
+            if self.pool:
+                return asyncio.ensure_future(self.pool.transcribe(chunk, **self.options))
+            return loop.run_in_executor(None, self._transcribe_sync, chunk)
+
+        # Держим в работе ограниченное окно сегментов, чтобы длинное
+        # сообщение не заняло всю очередь пула
+        window = self.pool.workers + 1 if self.pool else 2
+        pending: List[asyncio.Future] = []
+        texts: List[str] = []
+        next_index = 0
+        try:
+            for index, (start, end) in enumerate(segments):
+                while next_index < len(segments) and len(pending) < window:
+                    pending.append(submit(*segments[next_index]))
+                    next_index += 1
+
+                text = await pending.pop(0)
+                texts.append(text.strip())
+                if index == len(segments) - 1:
+                    # До последнего yield: получив done, потребитель прекращает
+                    # итерацию, и код после цикла уже не выполнится
+                    await self._finish_stream(texts, audio, len(segments), started_at, route, content_hash, file_unique_id)
+                yield {
+                    "index": index,
+                    "total": len(segments),
+                    "text": text.strip(),
+                    "start": start / SAMPLE_RATE,
+                    "end": end / SAMPLE_RATE
+                }
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _finish_stream(
+        self,
+        texts: List[str],
+        audio: np.ndarray,
+        segments: int,
+        started_at: float,
+        route: Optional[WhisperRoute],
+        content_hash: Optional[str],
+        file_unique_id: Optional[str]
+    ) -> None:
+        """Запись в журнал и кэш полного текста потоковой транскрипции"""
+        full_text = " ".join(text for text in texts if text)
+        self._record_usage(started_at, duration=len(audio) / SAMPLE_RATE, segments=segments, route=route)
+        if full_text and (content_hash or file_unique_id):
+            await ai_result_cache.set("transcription", self._cache_variant(), full_text, content_hash, file_unique_id)
+
+    def _record_usage(
+        self,
+        started_at: float,
+        cache_hit: bool = False,
+        duration: Optional[float] = None,
+        segments: Optional[int] = None,
+        error: Optional[Exception] = None,
+        route: Optional[WhisperRoute] = None
+    ) -> None:
+        """Запись в журнал расхода AI (локальная модель - без стоимости)"""
+        elapsed = time.perf_counter() - started_at
+        metadata: Dict[str, Any] = {"model": self.model_name}
+        if duration is not None:
+            metadata["audio_duration"] = round(duration, 2)
+        if segments is not None:
+            metadata["segments"] = segments
+        if route is not None:
+            # Решение маршрутизатора: задержка по решениям - в метриках, WER - scripts/evaluate_whisper_routing.py
+            metadata["route"] = route.reason
+            metadata["queue_depth"] = route.queue_depth
+            if not cache_hit and error is None:
+                metrics.timer("ai.whisper.route.latency", elapsed, tags={"model": self.model_name, "route": route.reason})
+        ai_usage_ledger.record(
+            AIProcessingType.SPEECH_TO_TEXT,
+            AIProvider.WHISPER,
+            processing_time=elapsed,
+            cost=0.0,
+            cache_hit=cache_hit,
+            is_success=error is None,
+            error_message=str(error) if error else None,
+            metadata=metadata
+        )
+
+    def _cache_variant(self) -> str:
+        """Модель и параметры декодирования - от них зависит текст транскрипции"""
+        if not self.options:
+            return self.model_name
+        options = json.dumps(self.options, sort_keys=True, ensure_ascii=False)
+        return f"{self.model_name}:{hashlib.sha256(options.encode()).hexdigest()[:12]}"
+
+    @staticmethod
+    def _content_hash(audio: Union[str, bytes, np.ndarray]) -> Optional[str]:
+        """Хэш содержимого для кэша (для путей не считается)"""
+        if isinstance(audio, (bytes, bytearray)):
+            return ai_result_cache.content_hash(bytes(audio))
+        if isinstance(audio, np.ndarray):
+            return ai_result_cache.content_hash(audio.tobytes())
+        return None
+
+    def _transcribe_sync(self, audio: Union[str, np.ndarray]) -> str:
         """Синхронная транскрипция (выполняется в executor)"""
         try:
             if not self.model:
                 return ""
             
-            result = self.model.transcribe(audio_path, fp16=False)
+            result = self.model.transcribe(audio, fp16=False, **self.options)
             return result.get("text", "")
         except Exception as e:
             logger.error(f"Error in _transcribe_sync: {e}")
@@ -113,6 +360,9 @@ class WhisperClient:
         return {
             "model_name": self.model_name,
             "model_loaded": self.model is not None,
+            "language": self.options.get("language", "auto"),
+            "routing": self.router.models if self.router else None,
+            "worker_pool": self.pool.workers if self.pool else 0,
             "supported_formats": ['.ogg', '.mp3', '.wav', '.m4a', '.mp4', '.flac'],
             "max_file_size": "25MB"
         } 
\ No newline at end of file
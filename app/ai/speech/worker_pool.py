@@ -0,0 +1,197 @@
+"""
+Пул процессов для распознавания речи Whisper
+
+Каждый процесс пула держит одну загруженную модель, поэтому декодирование
+не конкурирует за GIL с event loop бота и масштабируется по ядрам.
+Перед пулом стоит ограниченная очередь: при переполнении задание
+отклоняется сразу, а не копится бесконечно.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.core.exceptions import AIException
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker(model_name: str, torch_threads: int) -> None:
+    """Инициализация процесса пула: ограничиваем потоки и загружаем модель"""
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+    from app.ai.model_registry import model_registry
+    model_registry.get(model_registry.whisper_key(model_name))
+
+
+def _transcribe_in_worker(model_name: str, audio: Any, options: Dict[str, Any]) -> str:
+    """Транскрипция внутри процесса пула (модель уже загружена инициализатором)"""
+    from app.ai.model_registry import model_registry
+
+    model = model_registry.get(model_registry.whisper_key(model_name))
+    result = model.transcribe(audio, fp16=False, **options)
+    return result.get("text", "")
+
+
+def _ping() -> int:
+    """Пустое задание для запуска процессов пула"""
+    return os.getpid()
+
+
+class WhisperWorkerPool:
+    """Пул процессов Whisper с ограниченной очередью заданий"""
+
+    def __init__(
+        self,
+        model_name: str = "base",
+        workers: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        job_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            model_name: Название модели Whisper
+            workers: Количество процессов (каждый держит свою копию модели)
+            max_queue_size: Сколько заданий может ждать свободного процесса
+            job_timeout: Таймаут одного задания в секундах
+        """
+        self.model_name = model_name
+        self.workers = workers or settings.WHISPER_WORKERS
+        self.max_queue_size = max_queue_size if max_queue_size is not None else settings.WHISPER_QUEUE_SIZE
+        self.job_timeout = job_timeout or settings.WHISPER_JOB_TIMEOUT
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = 0
+        self._metric_tags = {"model": model_name}
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество заданий в пуле (ожидающих и выполняющихся)"""
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # spawn: fork процесса с event loop и потоками torch небезопасен
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, torch_threads)
+            )
+            logger.info(f"Whisper worker pool started: {self.workers} x '{self.model_name}'")
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Семафор привязан к event loop, при смене loop создаём новый
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._slots_loop = loop
+        return self._slots
+
+    async def transcribe(self, audio: Any, **options) -> str:
+        """
+        Распознаёт речь в одном из процессов пула
+
+        Args:
+            audio: Путь к аудиофайлу или массив float32 (16 кГц)
+            **options: Дополнительные параметры model.transcribe
+
+        Returns:
+            Распознанный текст
+        """
+        if self._pending >= self.workers + self.max_queue_size:
+            metrics.increment("ai.whisper.queue.rejected", tags=self._metric_tags)
+            raise AIException("whisper", "Очередь распознавания речи переполнена")
+
+        self._pending += 1
+        metrics.gauge("ai.whisper.queue.depth", self._pending, tags=self._metric_tags)
+        enqueued_at = time.perf_counter()
+
+        try:
+            slots = self._get_slots()
+            await slots.acquire()
+            metrics.timer("ai.whisper.queue.wait_time", time.perf_counter() - enqueued_at, tags=self._metric_tags)
+
+            loop = asyncio.get_running_loop()
+            try:
+                job = self._get_executor().submit(_transcribe_in_worker, self.model_name, audio, options)
+            except Exception as e:
+                slots.release()
+                if isinstance(e, BrokenProcessPool):
+                    self._executor = None
+                raise
+
+            # Слот освобождается только когда процесс реально закончил работу,
+            # даже если вызывающий уже получил таймаут
+            job.add_done_callback(lambda _: loop.call_soon_threadsafe(slots.release))
+
+            started_at = time.perf_counter()
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(job)),
+                    timeout=self.job_timeout
+                )
+            except asyncio.TimeoutError:
+                metrics.increment("ai.whisper.jobs.timeout", tags=self._metric_tags)
+                raise AIException("whisper", f"Распознавание речи не уложилось в {self.job_timeout} с")
+            except BrokenProcessPool:
+                # Процесс пула упал (например, не загрузилась модель) - пересоздадим пул
+                logger.error("Whisper worker pool is broken, restarting on next job")
+                self._executor = None
+                raise
+            finally:
+                metrics.timer("ai.whisper.job.duration", time.perf_counter() - started_at, tags=self._metric_tags)
+        finally:
+            self._pending -= 1
+            metrics.gauge("ai.whisper.queue.depth", self._pending, tags=self._metric_tags)
+
+    def warmup(self) -> None:
+        """Запускает все процессы пула и дожидается загрузки моделей (блокирующий вызов)"""
+        executor = self._get_executor()
+        jobs = [executor.submit(_ping) for _ in range(self.workers)]
+        pids = {job.result() for job in jobs}
+        logger.info(f"Whisper worker pool warmed up: {len(pids)} processes")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Останавливает процессы пула"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            logger.info(f"Whisper worker pool stopped: '{self.model_name}'")
+
+
+# Пулы процесса по названию модели
+_pools: Dict[str, WhisperWorkerPool] = {}
+
+
+def get_whisper_pool(model_name: str = "base") -> WhisperWorkerPool:
+    """Возвращает общий пул процессов для модели"""
+    if model_name not in _pools:
+        _pools[model_name] = WhisperWorkerPool(model_name)
+    return _pools[model_name]
+
+
+def whisper_queue_depth() -> int:
+    """Заданий во всех пулах процесса (ожидающих и выполняющихся)"""
+    return sum(pool.queue_depth for pool in _pools.values())
+
+
+def shutdown_whisper_pools(wait: bool = True) -> None:
+    """Останавливает все пулы процесса"""
+    for pool in _pools.values():
+        pool.shutdown(wait=wait)
+    _pools.clear()
@@ -0,0 +1,369 @@
+"""
+Журнал расхода AI: вызовы моделей в таблице ai_data
+
+Каждый вызов GPT, Whisper и OCR (включая попадания в кэш) записывается
+в буфер в памяти - без обращения к базе в момент вызова. Буфер
+сбрасывается в ai_data одной пакетной вставкой при накоплении
+AI_LEDGER_BATCH_SIZE записей или раз в AI_LEDGER_FLUSH_INTERVAL секунд.
+
+Пользователь берётся из контекста запроса (ai_usage_context): бот
+и задачи Celery знают telegram_id, внутренний id пользователя
+определяется при сбросе одним запросом на пачку.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import case, func, insert, select
+
+from app.config import settings
+from app.core.logging import metrics
+from app.models.ai_data import AIData, AIProcessingType, AIProvider
+
+logger = logging.getLogger(__name__)
+
+# Цены OpenAI в долларах за 1000 токенов: (промпт, ответ).
+# Модель ищется по самому длинному совпадающему префиксу.
+OPENAI_PRICES_PER_1K: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4-1106-preview": (0.01, 0.03),
+    "gpt-4-0125-preview": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "text-embedding-3-small": (0.00002, 0.0),
+    "text-embedding-ada-002": (0.0001, 0.0),
+}
+
+_telegram_id: ContextVar[Optional[int]] = ContextVar("ai_usage_telegram_id", default=None)
+_user_id: ContextVar[Optional[int]] = ContextVar("ai_usage_user_id", default=None)
+
+
+@contextmanager
+def ai_usage_context(telegram_id: Optional[int] = None, user_id: Optional[int] = None) -> Iterator[None]:
+    """Пользователь, к которому относятся AI вызовы внутри блока"""
+    telegram_token = _telegram_id.set(telegram_id)
+    user_token = _user_id.set(user_id)
+    try:
+        yield
+    finally:
+        _telegram_id.reset(telegram_token)
+        _user_id.reset(user_token)
+
+
+def openai_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Стоимость запроса в долларах или None для неизвестной модели"""
+    prefix = max((name for name in OPENAI_PRICES_PER_1K if model.startswith(name)), key=len, default=None)
+    if prefix is None:
+        return None
+    prompt_price, completion_price = OPENAI_PRICES_PER_1K[prefix]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+@dataclass
+class UsageRecord:
+    """Запись журнала до вставки в ai_data"""
+
+    processing_type: AIProcessingType
+    provider: AIProvider
+    processing_time: Optional[float] = None
+    tokens_used: Optional[int] = None
+    cost: Optional[float] = None
+    confidence: Optional[float] = None
+    is_success: bool = True
+    error_message: Optional[str] = None
+    cache_hit: bool = False
+    telegram_id: Optional[int] = None
+    user_id: Optional[int] = None
+    event_id: Optional[int] = None
+    input_data: Dict[str, Any] = field(default_factory=dict)
+    output_data: Dict[str, Any] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "event_id": self.event_id,
+            "processing_type": self.processing_type,
+            "provider": self.provider,
+            "input_data": self.input_data,
+            "output_data": self.output_data,
+            "confidence": self.confidence,
+            "processing_time": self.processing_time,
+            "tokens_used": self.tokens_used,
+            "cost": self.cost,
+            "is_success": self.is_success,
+            "error_message": self.error_message,
+            "ai_metadata": {**self.metadata, "cache_hit": self.cache_hit},
+            "created_at": self.created_at,
+        }
+
+
+class AIUsageLedger:
+    """Буфер записей о вызовах AI с пакетной записью в ai_data"""
+
+    def __init__(
+        self,
+        session_factory: Any = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_buffer: Optional[int] = None
+    ):
+        """
+        Args:
+            session_factory: Фабрика AsyncSession (по умолчанию пул приложения)
+            batch_size: Сброс при накоплении стольких записей
+            flush_interval: Сброс не реже раза в столько секунд
+            max_buffer: Предел буфера - при недоступной базе старые записи отбрасываются
+        """
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.AI_LEDGER_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.AI_LEDGER_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or settings.AI_LEDGER_MAX_BUFFER
+        self.enabled = settings.AI_LEDGER_ENABLED
+        self._buffer: Deque[UsageRecord] = deque()
+        self._last_flush = time.monotonic()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._pending: set = set()
+        self.totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def record(
+        self,
+        processing_type: AIProcessingType,
+        provider: AIProvider,
+        processing_time: Optional[float] = None,
+        tokens_used: Optional[int] = None,
+        cost: Optional[float] = None,
+        cache_hit: bool = False,
+        confidence: Optional[float] = None,
+        is_success: bool = True,
+        error_message: Optional[str] = None,
+        user_id: Optional[int] = None,
+        event_id: Optional[int] = None,
+        input_data: Optional[Dict[str, Any]] = None,
+        output_data: Optional[Dict[str, Any]] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Добавляет запись в буфер
+
+        Не обращается к базе: сброс запускается в фоне, если буфер
+        заполнен или интервал истёк.
+        """
+        if not self.enabled:
+            return
+        record = UsageRecord(
+            processing_type=processing_type,
+            provider=provider,
+            processing_time=processing_time,
+            tokens_used=tokens_used,
+            cost=cost,
+            confidence=confidence,
+            is_success=is_success,
+            error_message=error_message[:1000] if error_message else None,
+            cache_hit=cache_hit,
+            telegram_id=_telegram_id.get(),
+            user_id=user_id if user_id is not None else _user_id.get(),
+            event_id=event_id,
+            input_data=input_data or {},
+            output_data=output_data or {},
+            metadata=metadata or {},
+        )
+        if len(self._buffer) >= self.max_buffer:
+            self._buffer.popleft()
+            metrics.increment("ai.ledger.dropped")
+        self._buffer.append(record)
+        self._account(record)
+
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._schedule_flush()
+
+    def _account(self, record: UsageRecord) -> None:
+        """Итоги процесса по провайдеру и типу - для метрик без запроса к базе"""
+        key = (record.provider.value, record.processing_type.value)
+        totals = self.totals.setdefault(
+            key, {"calls": 0, "errors": 0, "cache_hits": 0, "tokens": 0, "cost": 0.0, "latency": 0.0}
+        )
+        totals["calls"] += 1
+        totals["errors"] += 0 if record.is_success else 1
+        totals["cache_hits"] += 1 if record.cache_hit else 0
+        totals["tokens"] += record.tokens_used or 0
+        totals["cost"] += record.cost or 0.0
+        totals["latency"] += record.processing_time or 0.0
+        tags = {"provider": key[0], "type": key[1]}
+        metrics.increment("ai.ledger.calls", tags=tags)
+        if record.cost:
+            metrics.gauge("ai.ledger.cost_total", totals["cost"], tags=tags)
+
+    def _schedule_flush(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне event loop - запись дождётся следующего сброса
+            return
+        task = loop.create_task(self.flush())
+        # Ссылка на задачу, чтобы её не собрал сборщик мусора
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _get_flush_lock(self) -> asyncio.Lock:
+        # Блокировка привязана к event loop (Celery создаёт loop на задачу)
+        loop = asyncio.get_running_loop()
+        if self._flush_lock is None or self._flush_lock_loop is not loop:
+            self._flush_lock = asyncio.Lock()
+            self._flush_lock_loop = loop
+        return self._flush_lock
+
+    async def flush(self) -> int:
+        """
+        Записывает буфер в ai_data пакетной вставкой
+
+        Returns:
+            Количество записанных строк
+        """
+        async with self._get_flush_lock():
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return 0
+            batch: List[UsageRecord] = []
+            while self._buffer and len(batch) < self.batch_size * 10:
+                batch.append(self._buffer.popleft())
+
+            started_at = time.perf_counter()
+            try:
+                async with await self._session() as session:
+                    await self._resolve_users(session, batch)
+                    await session.execute(insert(AIData), [record.to_row() for record in batch])
+                    await session.commit()
+            except Exception as e:
+                logger.warning(f"AI ledger flush failed, {len(batch)} records kept: {e}")
+                metrics.increment("ai.ledger.flush_errors")
+                # Возвращаем в начало буфера в пределах лимита
+                room = self.max_buffer - len(self._buffer)
+                self._buffer.extendleft(reversed(batch[-room:] if room > 0 else []))
+                return 0
+
+            metrics.timer("ai.ledger.flush_time", time.perf_counter() - started_at)
+            metrics.increment("ai.ledger.flushed", len(batch))
+            return len(batch)
+
+    async def _session(self) -> Any:
+        if self.session_factory is not None:
+            return self.session_factory()
+        from app import database
+
+        if database.async_session_pool is None:
+            await database.create_pool(settings.DATABASE_URL)
+        return database.async_session_pool()
+
+    @staticmethod
+    async def _resolve_users(session: Any, batch: List[UsageRecord]) -> None:
+        """Внутренние id пользователей по telegram_id - один запрос на пачку"""
+        telegram_ids = {r.telegram_id for r in batch if r.user_id is None and r.telegram_id is not None}
+        if not telegram_ids:
+            return
+        from app.models.user import User
+
+        result = await session.execute(select(User.id, User.telegram_id).where(User.telegram_id.in_(telegram_ids)))
+        user_ids = {telegram_id: user_id for user_id, telegram_id in result.all()}
+        for record in batch:
+            if record.user_id is None and record.telegram_id is not None:
+                record.user_id = user_ids.get(record.telegram_id)
+
+    def start(self) -> None:
+        """Запускает периодический сброс в текущем event loop"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        """Останавливает периодический сброс и записывает остаток"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        while self._buffer:
+            if not await self.flush():
+                break
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"AI ledger periodic flush error: {e}")
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Итоги процесса по провайдеру и типу обработки"""
+        return {f"{provider}:{kind}": dict(values) for (provider, kind), values in self.totals.items()}
+
+
+async def usage_summary(
+    session: Any,
+    group_by: str = "provider",
+    since: Optional[datetime] = None,
+    user_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Сводка расхода и задержки AI из ai_data
+
+    Args:
+        session: AsyncSession
+        group_by: provider (провайдер и тип обработки) или user
+        since: Только записи не раньше этого момента
+        user_id: Только записи пользователя
+
+    Returns:
+        Строки с количеством вызовов, ошибок, токенов, стоимостью и задержкой
+    """
+    if group_by == "user":
+        keys = [AIData.user_id]
+    elif group_by == "provider":
+        keys = [AIData.provider, AIData.processing_type]
+    else:
+        raise ValueError(f"Unknown group_by: {group_by}")
+
+    query = select(
+        *keys,
+        func.count(AIData.id).label("calls"),
+        func.sum(case((AIData.is_success.is_(False), 1), else_=0)).label("errors"),
+        func.coalesce(func.sum(AIData.tokens_used), 0).label("tokens"),
+        func.coalesce(func.sum(AIData.cost), 0.0).label("cost"),
+        func.avg(AIData.processing_time).label("avg_latency"),
+        func.max(AIData.processing_time).label("max_latency"),
+    ).group_by(*keys).order_by(func.coalesce(func.sum(AIData.cost), 0.0).desc())
+    if since is not None:
+        query = query.where(AIData.created_at >= since)
+    if user_id is not None:
+        query = query.where(AIData.user_id == user_id)
+
+    result = await session.execute(query)
+    rows = []
+    for row in result.mappings():
+        item = dict(row)
+        for key in ("provider", "processing_type"):
+            if key in item and hasattr(item[key], "value"):
+                item[key] = item[key].value
+        rows.append(item)
+    return rows
+
+
+# Общий журнал расхода AI процесса
+ai_usage_ledger = AIUsageLedger()
@@ -5,6 +5,8 @@ Computer Vision модуль
 - OCRClient для распознавания текста с изображений
 """
 
-from .ocr_client import OCRClient
+from app.core.lazy_import import lazy_exports
 
 __all__ = ["OCRClient"]
+
+__getattr__ = lazy_exports(__name__, {"OCRClient": ".ocr_client"})
@@ -0,0 +1,24 @@
+"""
+Декодирование изображений для OCR
+
+Изображения декодируются из памяти через cv2.imdecode, без временных файлов.
+"""
+import cv2
+import numpy as np
+
+
+def decode_image_bytes(data: bytes) -> np.ndarray:
+    """
+    Декодирует изображение из байтов в BGR массив
+
+    Args:
+        data: Содержимое файла изображения (JPEG, PNG, WebP и др.)
+
+    Returns:
+        Изображение в формате BGR (uint8)
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Unsupported or corrupted image data")
+    return image
@@ -1,35 +1,48 @@
 import logging
 import asyncio
-import tempfile
 import os
-from typing import List, Dict, Any, Optional
-import easyocr
+import time
+from typing import List, Dict, Any, Optional, Tuple, Union
 import cv2
 import numpy as np
 from PIL import Image
 import io
 
+from app.ai.model_registry import model_registry
+from app.ai.usage_ledger import ai_usage_ledger
+from app.ai.vision.image import decode_image_bytes
+from app.ai.vision.preprocessing import PreprocessConfig, PreprocessedImage, preprocess_image
+from app.config import settings
+from app.core.logging import metrics
+from app.core.cache import ai_result_cache
+from app.models.ai_data import AIProcessingType, AIProvider
+
 logger = logging.getLogger(__name__)
 
 
 class OCRClient:
     """Клиент для распознавания текста с изображений с использованием EasyOCR"""
     
-    def __init__(self, languages: List[str] = ["ru", "en"]):
+    def __init__(self, languages: List[str] = ["ru", "en"], preprocess: Optional[PreprocessConfig] = None):
         """
         Args:
             languages: Список языков для распознавания
+            preprocess: Параметры предобработки изображения
+                (по умолчанию из настроек, None при OCR_PREPROCESS_ENABLED=False)
         """
         self.languages = languages
+        if preprocess is None and settings.OCR_PREPROCESS_ENABLED:
+            preprocess = PreprocessConfig.from_settings()
+        self.preprocess = preprocess
         self.reader = None
         self._load_reader()
     
     def _load_reader(self) -> None:
-        """Загружает EasyOCR reader"""
+        """Получает EasyOCR reader из общего реестра процесса"""
         try:
             logger.info(f"Loading EasyOCR reader for languages: {self.languages}")
-            self.reader = easyocr.Reader(self.languages, gpu=False)  # GPU=False для совместимости
-            logger.info("EasyOCR reader loaded successfully")
+            self.reader = model_registry.get(model_registry.easyocr_key(self.languages))
+            logger.info("EasyOCR reader ready")
         except Exception as e:
             logger.error(f"Error loading EasyOCR reader: {e}")
             raise
@@ -66,79 +79,256 @@ class OCRClient:
             logger.error(f"Error in extract_text_from_image: {e}")
             return {"error": str(e), "text": "", "confidence": 0.0}
     
-    def _extract_text_sync(self, image_path: str) -> Dict[str, Any]:
+    def _extract_text_sync(self, image: Union[str, np.ndarray]) -> Dict[str, Any]:
         """Синхронное извлечение текста (выполняется в executor)"""
         try:
-            # Читаем изображение
-            results = self.reader.readtext(image_path)
-            
-            # Извлекаем текст и координаты
-            extracted_text = []
-            text_blocks = []
-            total_confidence = 0.0
-            valid_results = 0
-            
-            for (bbox, text, confidence) in results:
-                if confidence > 0.3:  # Фильтруем результаты с низкой уверенностью
-                    extracted_text.append(text)
-                    text_blocks.append({
-                        "text": text,
-                        "confidence": confidence,
-                        "bbox": bbox
-                    })
-                    total_confidence += confidence
-                    valid_results += 1
-            
-            # Объединяем текст
-            full_text = " ".join(extracted_text)
-            
-            # Вычисляем среднюю уверенность
-            avg_confidence = total_confidence / valid_results if valid_results > 0 else 0.0
+            image_path = image if isinstance(image, str) else None
+            image, prepared = self._prepare_image(image)
             
-            return {
-                "text": full_text,
-                "confidence": avg_confidence,
-                "text_blocks": text_blocks,
-                "total_blocks": len(text_blocks),
-                "image_path": image_path
-            }
+            # Путь или уже декодированное изображение
+            results = self.reader.readtext(image)
+            return self._build_result(results, prepared, image_path)
             
         except Exception as e:
             logger.error(f"Error in _extract_text_sync: {e}")
             raise
     
-    async def extract_text_from_bytes(self, image_bytes: bytes, file_extension: str = "jpg") -> Dict[str, Any]:
+    def _prepare_image(self, image: Union[str, np.ndarray]) -> Tuple[Union[str, np.ndarray], Optional[PreprocessedImage]]:
+        """Предобработка изображения, если она включена"""
+        if self.preprocess is None:
+            return image, None
+        if isinstance(image, str):
+            path = image
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"Unsupported or corrupted image: {path}")
+        prepared = preprocess_image(image, self.preprocess)
+        return prepared.image, prepared
+    
+    def _build_result(
+        self,
+        results: List[Any],
+        prepared: Optional[PreprocessedImage] = None,
+        image_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Собирает текст и метаданные из ответа EasyOCR"""
+        # Извлекаем текст и координаты
+        extracted_text = []
+        text_blocks = []
+        total_confidence = 0.0
+        valid_results = 0
+        
+        for (bbox, text, confidence) in results:
+            if confidence > 0.3:  # Фильтруем результаты с низкой уверенностью
+                if prepared is not None:
+                    # Координаты в системе исходного изображения
+                    bbox = prepared.to_original(bbox)
+                extracted_text.append(text)
+                text_blocks.append({
+                    "text": text,
+                    "confidence": confidence,
+                    "bbox": bbox
+                })
+                total_confidence += confidence
+                valid_results += 1
+        
+        # Объединяем текст
+        full_text = " ".join(extracted_text)
+        
+        # Вычисляем среднюю уверенность
+        avg_confidence = total_confidence / valid_results if valid_results > 0 else 0.0
+        
+        return {
+            "text": full_text,
+            "confidence": avg_confidence,
+            "text_blocks": text_blocks,
+            "total_blocks": len(text_blocks),
+            "image_path": image_path
+        }
+    
+    async def extract_text_from_bytes(
+        self,
+        image_bytes: bytes,
+        file_extension: str = "jpg",
+        file_unique_id: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Извлекает текст из изображения в байтах
         
+        Изображение декодируется в памяти, без временного файла.
+        Результаты кэшируются по хэшу содержимого и file_unique_id.
+        
         Args:
             image_bytes: Изображение в байтах
-            file_extension: Расширение файла
+            file_extension: Расширение файла (не требуется, формат определяется по содержимому)
+            file_unique_id: Идентификатор файла в Telegram для кэша
             
         Returns:
             Словарь с извлеченным текстом и метаданными
         """
+        started_at = time.perf_counter()
         try:
-            # Создаем временный файл
-            with tempfile.NamedTemporaryFile(
-                suffix=f".{file_extension}", 
-                delete=False
-            ) as temp_file:
-                temp_file.write(image_bytes)
-                temp_file_path = temp_file.name
+            variant = self._cache_variant()
+            content_hash = ai_result_cache.content_hash(image_bytes)
+            cached = await ai_result_cache.get("ocr", variant, content_hash, file_unique_id)
+            if cached is not None:
+                self._record_usage(time.perf_counter() - started_at, cached, cache_hit=True)
+                return cached
             
-            try:
-                # Извлекаем текст
-                result = await self.extract_text_from_image(temp_file_path)
-                return result
-            finally:
-                # Удаляем временный файл
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                None,
+                self._extract_text_from_bytes_sync,
+                image_bytes
+            )
+            
+            logger.info(f"Text extraction completed: {len(result.get('text', ''))} characters")
+            self._record_usage(time.perf_counter() - started_at, result)
+            await ai_result_cache.set("ocr", variant, result, content_hash, file_unique_id)
+            return result
                     
         except Exception as e:
             logger.error(f"Error in extract_text_from_bytes: {e}")
-            return {"error": str(e), "text": "", "confidence": 0.0}
+            result = {"error": str(e), "text": "", "confidence": 0.0}
+            self._record_usage(time.perf_counter() - started_at, result)
+            return result
+    
+    async def extract_text_batch(
+        self,
+        images: List[bytes],
+        file_unique_ids: Optional[List[Optional[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Извлекает текст из нескольких изображений (альбом, многостраничный документ)
+        
+        Изображения из кэша не распознаются повторно, остальные проходят
+        детекцию и распознавание пачками по OCR_BATCH_SIZE за один вызов модели.
+        
+        Args:
+            images: Изображения в байтах
+            file_unique_ids: Идентификаторы файлов в Telegram для кэша
+            
+        Returns:
+            Результаты в порядке входных изображений (ошибка - в поле "error")
+        """
+        file_unique_ids = file_unique_ids or [None] * len(images)
+        variant = self._cache_variant()
+        hashes = [ai_result_cache.content_hash(data) for data in images]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        
+        for i, (content_hash, file_unique_id) in enumerate(zip(hashes, file_unique_ids)):
+            results[i] = await ai_result_cache.get("ocr", variant, content_hash, file_unique_id)
+            if results[i] is not None:
+                self._record_usage(0.0, results[i], cache_hit=True)
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        loop = asyncio.get_event_loop()
+        batch_size = max(1, settings.OCR_BATCH_SIZE)
+        for start in range(0, len(pending), batch_size):
+            indexes = pending[start:start + batch_size]
+            started_at = time.perf_counter()
+            try:
+                batch = await loop.run_in_executor(
+                    None,
+                    self._extract_text_batch_sync,
+                    [images[i] for i in indexes]
+                )
+            except Exception as e:
+                logger.error(f"Error in extract_text_batch: {e}")
+                batch = [{"error": str(e), "text": "", "confidence": 0.0}] * len(indexes)
+            # Время пачки делится поровну между изображениями
+            per_image = (time.perf_counter() - started_at) / len(indexes)
+            
+            for i, result in zip(indexes, batch):
+                results[i] = result
+                self._record_usage(per_image, result, batch_size=len(indexes))
+                if "error" not in result:
+                    await ai_result_cache.set("ocr", variant, result, hashes[i], file_unique_ids[i])
+        
+        metrics.gauge("ai.ocr.batch.size", len(pending))
+        logger.info(f"Batch text extraction completed: {len(images)} images, {len(pending)} recognized")
+        return results
+    
+    def _record_usage(
+        self,
+        processing_time: float,
+        result: Dict[str, Any],
+        cache_hit: bool = False,
+        batch_size: Optional[int] = None
+    ) -> None:
+        """Запись в журнал расхода AI (локальная модель - без стоимости)"""
+        metadata: Dict[str, Any] = {"languages": self.languages, "characters": len(result.get("text", ""))}
+        if batch_size is not None:
+            metadata["batch_size"] = batch_size
+        ai_usage_ledger.record(
+            AIProcessingType.IMAGE_OCR,
+            AIProvider.EASYOCR,
+            processing_time=processing_time,
+            cost=0.0,
+            cache_hit=cache_hit,
+            confidence=result.get("confidence"),
+            is_success="error" not in result,
+            error_message=result.get("error"),
+            metadata=metadata
+        )
+    
+    def _extract_text_batch_sync(self, images: List[bytes]) -> List[Dict[str, Any]]:
+        """Синхронное пакетное распознавание (выполняется в executor)"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        prepared_images = []
+        for i, data in enumerate(images):
+            try:
+                image, prepared = self._prepare_image(decode_image_bytes(data))
+                prepared_images.append((i, image, prepared))
+            except Exception as e:
+                results[i] = {"error": str(e), "text": "", "confidence": 0.0}
+        
+        if prepared_images:
+            if hasattr(self.reader, "readtext_batched") and len(prepared_images) > 1:
+                batch = self.reader.readtext_batched(
+                    self._pad_to_common_size([image for _, image, _ in prepared_images]),
+                    batch_size=len(prepared_images)
+                )
+            else:
+                batch = [self.reader.readtext(image) for _, image, _ in prepared_images]
+            
+            for (i, _, prepared), ocr_result in zip(prepared_images, batch):
+                results[i] = self._build_result(ocr_result, prepared)
+        
+        return results
+    
+    @staticmethod
+    def _pad_to_common_size(images: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Дополняет изображения справа и снизу до общего размера
+        
+        Детектор EasyOCR обрабатывает пачку только из одинаковых изображений.
+        Масштабирование исказило бы текст, а поля справа и снизу
+        не сдвигают координаты блоков.
+        """
+        height = max(image.shape[0] for image in images)
+        width = max(image.shape[1] for image in images)
+        padded = []
+        for image in images:
+            # Цвет полей - медиана изображения, чтобы граница не выглядела как текст
+            fill = np.median(image.reshape(-1, image.shape[2]) if image.ndim == 3 else image, axis=0)
+            padded.append(cv2.copyMakeBorder(
+                image, 0, height - image.shape[0], 0, width - image.shape[1],
+                cv2.BORDER_CONSTANT, value=np.atleast_1d(fill).tolist()
+            ))
+        return padded
+    
+    def _cache_variant(self) -> str:
+        """Языки и предобработка - от них зависит результат OCR"""
+        variant = ",".join(self.languages)
+        if self.preprocess is not None:
+            variant += f":{self.preprocess.key()}"
+        return variant
+    
+    def _extract_text_from_bytes_sync(self, image_bytes: bytes) -> Dict[str, Any]:
+        """Синхронные декодирование и OCR (выполняется в executor)"""
+        image = decode_image_bytes(image_bytes)
+        return self._extract_text_sync(image)
     
     async def extract_real_estate_info_from_image(self, image_path: str) -> Dict[str, Any]:
         """
@@ -337,5 +527,6 @@ class OCRClient:
             "reader_loaded": self.reader is not None,
             "supported_formats": ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'],
             "max_file_size": "10MB",
-            "confidence_threshold": 0.3
+            "confidence_threshold": 0.3,
+            "preprocess": self.preprocess.key() if self.preprocess else None
         } 
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+Предобработка изображений перед EasyOCR
+
+Фото из Telegram приходят в полном разрешении, и время readtext растёт
+с площадью изображения. Перед распознаванием изображение уменьшается,
+переводится в оттенки серого, выравнивается по наклону и обрезается
+до области с текстом. Все шаги отключаются по отдельности.
+
+Координаты блоков текста после предобработки пересчитываются обратно
+в систему координат исходного изображения через накопленную матрицу
+преобразования.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.config import settings
+
+
+@dataclass
+class PreprocessConfig:
+    """Параметры предобработки изображения для OCR"""
+    max_side: int = 1600  # 0 - без уменьшения
+    grayscale: bool = True
+    threshold: bool = False  # адаптивная бинаризация, полезна для фото бумажных документов
+    deskew: bool = True
+    crop_text: bool = True
+    max_skew_angle: float = 15.0  # больший наклон не исправляется (скорее всего это разметка, а не текст)
+    crop_padding: int = 16
+
+    def key(self) -> str:
+        """Короткий идентификатор конфигурации (входит в ключ кэша OCR)"""
+        flags = "".join(
+            flag for flag, enabled in (
+                ("g", self.grayscale), ("t", self.threshold), ("d", self.deskew), ("c", self.crop_text)
+            ) if enabled
+        )
+        return f"{self.max_side}{flags}"
+
+    @classmethod
+    def from_settings(cls) -> "PreprocessConfig":
+        """Конфигурация из настроек приложения"""
+        return cls(
+            max_side=settings.OCR_MAX_SIDE,
+            grayscale=settings.OCR_GRAYSCALE,
+            threshold=settings.OCR_THRESHOLD,
+            deskew=settings.OCR_DESKEW,
+            crop_text=settings.OCR_CROP_TEXT
+        )
+
+
+class PreprocessedImage:
+    """Результат предобработки и обратное преобразование координат"""
+
+    def __init__(self, image: np.ndarray, transform: np.ndarray):
+        """
+        Args:
+            image: Изображение для OCR
+            transform: Матрица 3x3 из координат исходного изображения в координаты image
+        """
+        self.image = image
+        self.transform = transform
+
+    def to_original(self, points: Sequence[Sequence[float]]) -> List[List[float]]:
+        """Переводит точки из координат обработанного изображения в исходные"""
+        if len(points) == 0:
+            return []
+        inverse = np.linalg.inv(self.transform)
+        pts = np.hstack([np.asarray(points, dtype=np.float64), np.ones((len(points), 1))])
+        mapped = pts @ inverse.T
+        return (mapped[:, :2] / mapped[:, 2:3]).tolist()
+
+
+def _affine(matrix: np.ndarray) -> np.ndarray:
+    """Расширяет аффинную матрицу 2x3 до 3x3"""
+    return np.vstack([matrix, [0.0, 0.0, 1.0]])
+
+
+def _to_gray(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def _text_mask(gray: np.ndarray) -> np.ndarray:
+    """Маска вероятного текста: контрастные штрихи, склеенные в строки"""
+    # Морфологический градиент выделяет края символов независимо от темы (светлая/тёмная)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Склеиваем символы одной строки по горизонтали
+    line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3))
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, line_kernel)
+
+
+def estimate_skew(gray: np.ndarray, max_angle: float = 15.0) -> float:
+    """
+    Оценивает угол наклона текста в градусах
+
+    Угол берётся как медиана наклона вытянутых текстовых строк,
+    поэтому одиночные рамки и картинки на скриншоте на него не влияют.
+    """
+    mask = _text_mask(gray)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    angles = []
+    for contour in contours:
+        (_, _), (w, h), angle = cv2.minAreaRect(contour)
+        if min(w, h) < 5:
+            continue
+        # Приводим угол к наклону длинной стороны в диапазоне [-45, 45)
+        # (соглашение об угле minAreaRect различается между версиями OpenCV)
+        if w < h:
+            angle += 90
+            w, h = h, w
+        if w < 3 * h:
+            continue
+        angle = (angle + 45) % 90 - 45
+        if abs(angle) <= max_angle:
+            angles.append(angle)
+
+    if not angles:
+        return 0.0
+    return float(np.median(angles))
+
+
+def text_region(gray: np.ndarray, padding: int = 16) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Находит прямоугольник, содержащий весь текст
+
+    Returns:
+        (x, y, w, h) или None, если текст не найден
+    """
+    mask = _text_mask(gray)
+    points = cv2.findNonZero(mask)
+    if points is None:
+        return None
+
+    x, y, w, h = cv2.boundingRect(points)
+    height, width = gray.shape[:2]
+    x0, y0 = max(0, x - padding), max(0, y - padding)
+    x1, y1 = min(width, x + w + padding), min(height, y + h + padding)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def preprocess_image(image: np.ndarray, config: Optional[PreprocessConfig] = None) -> PreprocessedImage:
+    """
+    Готовит изображение к распознаванию
+
+    Args:
+        image: Изображение BGR или оттенки серого (uint8)
+        config: Параметры предобработки (по умолчанию из настроек)
+
+    Returns:
+        Обработанное изображение и матрица преобразования координат
+    """
+    config = config or PreprocessConfig.from_settings()
+    transform = np.eye(3)
+
+    # Уменьшение по длинной стороне
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if config.max_side and longest > config.max_side:
+        scale = config.max_side / longest
+        image = cv2.resize(
+            image, (round(width * scale), round(height * scale)),
+            interpolation=cv2.INTER_AREA
+        )
+        transform = np.diag([scale, scale, 1.0]) @ transform
+
+    gray = _to_gray(image)
+    if config.grayscale:
+        image = gray
+
+    # Выравнивание наклона
+    if config.deskew:
+        angle = estimate_skew(gray, config.max_skew_angle)
+        if abs(angle) >= 0.5:
+            height, width = gray.shape[:2]
+            rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+            border = 255 if image.ndim == 2 else (255, 255, 255)
+            image = cv2.warpAffine(
+                image, rotation, (width, height),
+                flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=border
+            )
+            gray = _to_gray(image)
+            transform = _affine(rotation) @ transform
+
+    # Обрезка до области текста
+    if config.crop_text:
+        region = text_region(gray, config.crop_padding)
+        if region is not None:
+            x, y, w, h = region
+            image = image[y:y + h, x:x + w]
+            gray = gray[y:y + h, x:x + w]
+            transform = np.array([[1.0, 0.0, -x], [0.0, 1.0, -y], [0.0, 0.0, 1.0]]) @ transform
+
+    # Адаптивная бинаризация - последним шагом, после неё текст уже не ищется
+    if config.threshold:
+        image = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15
+        )
+
+    return PreprocessedImage(np.ascontiguousarray(image), transform)
@@ -10,6 +10,7 @@ from fastapi.responses import HTMLResponse, FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
+from app.ai.embeddings.indexer import schedule_event_indexing, schedule_event_removal
 from app.database import get_async_session
 from app.models.user import User
 from app.models.event import Event
@@ -142,6 +143,7 @@ async def create_miniapp_event(
         session.add(event)
         await session.commit()
         await session.refresh(event)
+        schedule_event_indexing(event)
         
         return {
             "status": "success",
@@ -173,6 +175,7 @@ async def delete_miniapp_event(
         
         await session.delete(event)
         await session.commit()
+        schedule_event_removal(event.id, event.user_id)
         
         return {
             "status": "success",
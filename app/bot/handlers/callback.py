@@ -6,6 +6,7 @@ import logging
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
+from app.ai.embeddings.indexer import schedule_event_removal
 from app.database import get_async_session
 
 logger = logging.getLogger(__name__)
@@ -92,6 +93,7 @@ async def event_callback(callback: CallbackQuery):
                 if event:
                     await session.delete(event)
                     await session.commit()
+                    schedule_event_removal(event.id, event.user_id)
                     
                     await callback.message.edit_text(
                         "✅ Событие удалено",
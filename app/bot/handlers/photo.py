@@ -2,135 +2,181 @@
 Упрощённый обработчик изображений
 Только OCR + создание событий
 """
+import asyncio
 import logging
-import tempfile
-import os
 from pathlib import Path
+from typing import List, Optional
 
 from aiogram import Router, F
 from aiogram.types import Message
 
+from app.ai.admission import admission_controller, estimate_cost
+from app.bot.utils.queue_status import queue_position_notifier
+from app.bot.utils.streaming import stream_to_message
+from app.core.exceptions import AIException
 from app.database import get_async_session
 from app.services.ai_service import AIService
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+def _album_images(messages: List[Message]) -> list:
+    """Самое большое фото или изображение, отправленное документом, из каждого сообщения"""
+    images = []
+    for item in messages:
+        if item.photo:
+            images.append(item.photo[-1])
+        elif item.document and item.document.mime_type and item.document.mime_type.startswith('image/'):
+            images.append(item.document)
+    return images
+
+
 @router.message(F.photo)
-async def handle_photo_message(message: Message):
-    """Упрощённый обработчик фотографий"""
+async def handle_photo_message(message: Message, album: Optional[List[Message]] = None):
+    """Упрощённый обработчик фотографий (одиночных и альбомов)"""
     
     try:
         async for session in get_async_session():
+            photos = _album_images(album or [message])
+            if not photos:
+                return
+            
             # Начальное сообщение
             status_msg = await message.answer(
-                "📷 <b>Изображение получено</b>\n\n"
+                (f"📷 <b>Получено изображений: {len(photos)}</b>\n\n" if len(photos) > 1
+                 else "📷 <b>Изображение получено</b>\n\n") +
                 "🔄 Распознаю текст...",
                 parse_mode="HTML"
             )
             
-            # Сохраняем изображение во временный файл
-            photo = message.photo[-1]  # Берём самое большое фото
-            file_info = await message.bot.get_file(photo.file_id)
+            # Скачиваем изображения в память, без временных файлов
+            buffers = await asyncio.gather(*(message.bot.download(photo) for photo in photos))
+            images = [buffer.getvalue() for buffer in buffers]
             
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as temp_file:
-                await message.bot.download_file(file_info.file_path, temp_file.name)
-                temp_file_path = temp_file.name
+            # Обновляем статус
+            await status_msg.edit_text(
+                "📷 <b>Обрабатываю изображение...</b>\n\n"
+                "✅ Изображение загружено\n"
+                "👁️ Распознаю текст...",
+                parse_mode="HTML"
+            )
+
+            # Инициализируем AI сервис
+            ai_service = AIService()
             
+            # Обрабатываем изображение, альбом - одним пакетом OCR; ждём места
+            # на этапе распознавания, показывая позицию в очереди
             try:
-                # Обновляем статус
+                async with admission_controller.admit(
+                    "ocr",
+                    message.from_user.id,
+                    estimate_cost("ocr", len(images)),
+                    on_position=queue_position_notifier(status_msg, "📷 <b>Изображение получено</b>")
+                ):
+                    if len(images) == 1:
+                        result = await ai_service.process_image(images[0], photos[0].file_unique_id)
+                    else:
+                        result = await ai_service.process_image_batch(
+                            images, [photo.file_unique_id for photo in photos]
+                        )
+            except AIException as e:
+                await status_msg.edit_text(f"⏳ <b>Сервис перегружен</b>\n\n{e.message}", parse_mode="HTML")
+                return
+            
+            if "error" in result:
                 await status_msg.edit_text(
-                    "📷 <b>Обрабатываю изображение...</b>\n\n"
-                    "✅ Изображение загружено\n"
-                    "👁️ Распознаю текст...",
+                    f"❌ <b>Ошибка обработки</b>\n\n"
+                    f"Не удалось обработать изображение: {result['error']}\n\n"
+                    "💡 Попробуйте более чёткое изображение",
                     parse_mode="HTML"
                 )
+                return
 
-                # Инициализируем AI сервис
-                ai_service = AIService()
-                
-                # Обрабатываем изображение
-                result = await ai_service.process_image(temp_file_path)
-                
-                if "error" in result:
-                    await status_msg.edit_text(
-                        f"❌ <b>Ошибка обработки</b>\n\n"
-                        f"Не удалось обработать изображение: {result['error']}\n\n"
-                        "💡 Попробуйте более чёткое изображение",
-                        parse_mode="HTML"
-                    )
-                    return
+            # Получаем данные
+            extracted_text = result.get("extracted_text", "")
+            
+            # Обновляем статус
+            await status_msg.edit_text(
+                "📷 <b>Обрабатываю изображение...</b>\n\n"
+                "✅ Изображение загружено\n"
+                "✅ Текст распознан\n"
+                "🤖 Создаю событие...",
+                parse_mode="HTML"
+            )
 
-                # Получаем данные
-                extracted_text = result.get("extracted_text", "")
-                
-                # Обновляем статус
-                await status_msg.edit_text(
-                    "📷 <b>Обрабатываю изображение...</b>\n\n"
-                    "✅ Изображение загружено\n"
-                    "✅ Текст распознан\n"
-                    "🤖 Создаю событие...",
-                    parse_mode="HTML"
+            # Формируем ответ
+            if len(images) > 1:
+                response_text = (
+                    f"📸 <b>Альбом обработан</b>\n\n"
+                    f"Текст найден на {result.get('recognized_count', 0)} из {len(images)} изображений\n\n"
                 )
-
-                # Формируем ответ
+            else:
                 response_text = "📸 <b>Изображение обработано</b>\n\n"
+            
+            if extracted_text:
+                # Показываем первые 300 символов
+                preview_text = extracted_text[:300]
+                if len(extracted_text) > 300:
+                    preview_text += "..."
+                
+                response_text += f"📝 <b>Распознанный текст:</b>\n{preview_text}\n\n"
                 
-                if extracted_text:
-                    # Показываем первые 300 символов
-                    preview_text = extracted_text[:300]
-                    if len(extracted_text) > 300:
-                        preview_text += "..."
+                # 🎯 АВТОМАТИЧЕСКОЕ СОЗДАНИЕ СОБЫТИЯ ИЗ ТЕКСТА ИЗОБРАЖЕНИЯ
+                try:
+                    from app.bot.handlers.text import EventManager
+                    event_manager = EventManager()
                     
-                    response_text += f"📝 <b>Распознанный текст:</b>\n{preview_text}\n\n"
+                    # Получаем пользователя из БД
+                    from sqlalchemy import select
+                    from app.models.user import User
+                    result_user = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
+                    db_user = result_user.scalar_one_or_none()
                     
-                    # 🎯 АВТОМАТИЧЕСКОЕ СОЗДАНИЕ СОБЫТИЯ ИЗ ТЕКСТА ИЗОБРАЖЕНИЯ
-                    try:
-                        from app.bot.handlers.text import EventManager
-                        event_manager = EventManager()
-                        
-                        # Получаем пользователя из БД
-                        from sqlalchemy import select
-                        from app.models.user import User
-                        result_user = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
-                        db_user = result_user.scalar_one_or_none()
-                        
-                        if db_user:
-                            # Пытаемся создать событие из распознанного текста
-                            event_result = await event_manager.process_text(extracted_text, message.from_user.id, session)
-                            
-                            if event_result['type'] == 'created':
-                                response_text += "🎉 <b>Событие автоматически создано из изображения!</b>\n\n"
-                                response_text += event_result['message']
-                                
-                                # Отправляем результат с клавиатурой события
-                                await status_msg.edit_text(
-                                    response_text,
-                                    parse_mode="HTML",
-                                    reply_markup=event_result.get('keyboard')
+                    if db_user:
+                        # Пытаемся создать событие из распознанного текста
+                        async with admission_controller.admit(
+                            "gpt",
+                            message.from_user.id,
+                            estimate_cost("gpt", len(extracted_text)),
+                            on_position=queue_position_notifier(status_msg, "📷 <b>Текст распознан</b>")
+                        ):
+                            event_result = await event_manager.process_text(
+                                extracted_text, message.from_user.id, session, stream=True
+                            )
+                            if event_result['type'] == 'response' and event_result.get('stream') is not None:
+                                # Ответ GPT дописывается в статусное сообщение, пока занято место этапа gpt
+                                await stream_to_message(
+                                    status_msg,
+                                    event_result['stream'],
+                                    prefix=response_text + "🤖 <b>GPT ответ:</b>\n"
                                 )
                                 return
-                            elif event_result['type'] == 'response':
-                                response_text += f"🤖 <b>GPT ответ:</b>\n{event_result['message']}\n\n"
-                            else:
-                                response_text += "🤔 <b>Событие не определено</b>\n\n"
-                                response_text += "💡 Возможно, на изображении нет информации о встречах\n\n"
                         
-                    except Exception as e:
-                        logger.warning(f"Failed to auto-create event from image text: {e}")
-                        response_text += "⚠️ <b>Событие не создано автоматически</b>\n\n"
-                
-                else:
-                    response_text += "📝 <b>Текст не обнаружен</b>\n\n"
-
-                await status_msg.edit_text(response_text, parse_mode="HTML")
+                        if event_result['type'] == 'created':
+                            response_text += "🎉 <b>Событие автоматически создано из изображения!</b>\n\n"
+                            response_text += event_result['message']
+                            
+                            # Отправляем результат с клавиатурой события
+                            await status_msg.edit_text(
+                                response_text,
+                                parse_mode="HTML",
+                                reply_markup=event_result.get('keyboard')
+                            )
+                            return
+                        elif event_result['type'] == 'response':
+                            response_text += f"🤖 <b>GPT ответ:</b>\n{event_result['message']}\n\n"
+                        else:
+                            response_text += "🤔 <b>Событие не определено</b>\n\n"
+                            response_text += "💡 Возможно, на изображении нет информации о встречах\n\n"
+                    
+                except Exception as e:
+                    logger.warning(f"Failed to auto-create event from image text: {e}")
+                    response_text += "⚠️ <b>Событие не создано автоматически</b>\n\n"
+            
+            else:
+                response_text += "📝 <b>Текст не обнаружен</b>\n\n"
 
-            finally:
-                # Удаляем временный файл
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
+            await status_msg.edit_text(response_text, parse_mode="HTML")
             
             break
 
@@ -147,7 +193,7 @@ async def handle_photo_message(message: Message):
             pass
 
 @router.message(F.document)
-async def handle_document_message(message: Message):
+async def handle_document_message(message: Message, album: Optional[List[Message]] = None):
     """Обработчик документов (только изображения)"""
     
     try:
@@ -161,7 +207,7 @@ async def handle_document_message(message: Message):
             return
         
         # Обрабатываем как обычное фото
-        await handle_photo_message(message)
+        await handle_photo_message(message, album)
         
     except Exception as e:
         logger.error(f"Document processing error: {e}")
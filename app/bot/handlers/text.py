@@ -13,9 +13,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_async_session
 from app.models.event import Event
+from app.models.ai_data import AIProcessingType, AIProvider
+from app.ai.usage_ledger import ai_usage_ledger
 from app.ai.nlp.gpt_client import GPTClient
+from app.ai.nlp.cascade import CascadeResult, ParsingCascade
+from app.ai.embeddings.indexer import schedule_event_indexing
 from app.config import settings
 from app.bot.keyboards.inline import get_event_actions_keyboard
+from app.bot.utils.streaming import stream_to_message
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -31,89 +36,46 @@ class SimpleEventParser:
                 logger.info("GPT client initialized")
         except Exception as e:
             logger.warning(f"GPT client not available: {e}")
+        self.cascade = ParsingCascade(self.gpt_client)
     
-    async def process_message(self, text: str) -> Dict[str, Any]:
-        """Обрабатывает сообщение - либо создаёт событие, либо даёт ответ"""
+    async def process_message(self, text: str, stream: bool = False) -> Dict[str, Any]:
+        """
+        Обрабатывает сообщение - либо создаёт событие, либо даёт ответ
+
+        Args:
+            text: Текст сообщения
+            stream: Вернуть ответ GPT потоком ('stream') вместо текста ('message');
+                поток должен прочитать вызывающий
+        """
         
-        # Сначала пробуем парсить как событие
-        event_data = await self._try_parse_event(text)
-        if event_data:
+        # Каскад: правила -> локальный классификатор -> GPT
+        cascade_result = await self.cascade.run(text)
+        if cascade_result.intent == 'event':
             return {
                 'type': 'event',
-                'data': event_data
+                'data': cascade_result.event,
+                'cascade': cascade_result
             }
         
         # Если не событие - проверяем команды управления
         command_result = await self._try_parse_command(text)
         if command_result:
+            command_result['cascade'] = cascade_result
             return command_result
         
-        # Иначе - GPT ответ
+        # Иначе - ответ GPT, выводимый в сообщение по мере генерации
+        if stream and self.gpt_client and settings.GPT_STREAMING_ENABLED:
+            return {
+                'type': 'response',
+                'stream': self.gpt_client.stream_answer_question(text),
+                'cascade': cascade_result
+            }
+        
         gpt_response = await self._get_gpt_response(text)
         return {
             'type': 'response',
-            'message': gpt_response
-        }
-    
-    async def _try_parse_event(self, text: str) -> Optional[Dict[str, Any]]:
-        """Пытается распарсить событие"""
-        
-        # Ключевые слова событий
-        event_keywords = [
-            'встреча', 'звонок', 'показ', 'созвон', 'дело', 'задача',
-            'напомни', 'запланируй', 'поставь', 'добавь'
-        ]
-        
-        if not any(word in text.lower() for word in event_keywords):
-            return None
-        
-        # Используем GPT для парсинга
-        if self.gpt_client:
-            try:
-                result = await self.gpt_client.parse_calendar_event(text)
-                confidence = result.get('confidence', 0)
-                if isinstance(confidence, str):
-                    confidence = float(confidence) if confidence.replace('.', '').isdigit() else 0
-                
-                if confidence > 0.5:
-                    return result
-            except Exception as e:
-                logger.warning(f"GPT parsing failed: {e}")
-        
-        # Fallback простой парсер
-        return self._simple_parse(text)
-    
-    def _simple_parse(self, text: str) -> Dict[str, Any]:
-        """Простой fallback парсер"""
-        now = datetime.now()
-        
-        # Определяем дату
-        date_str = now.strftime("%Y-%m-%d")
-        if 'завтра' in text:
-            date_str = (now + timedelta(days=1)).strftime("%Y-%m-%d")
-        elif 'послезавтра' in text:
-            date_str = (now + timedelta(days=2)).strftime("%Y-%m-%d")
-        
-        # Извлекаем время
-        time_match = re.search(r'(\d{1,2}):(\d{2})', text)
-        time_str = f"{time_match.group(1)}:{time_match.group(2)}" if time_match else "10:00"
-        
-        # Генерируем заголовок
-        if 'звонок' in text.lower():
-            title = "Звонок"
-        elif 'встреча' in text.lower():
-            title = "Встреча"
-        elif 'показ' in text.lower():
-            title = "Показ"
-        else:
-            title = "Событие"
-        
-        return {
-            'title': title,
-            'date': date_str,
-            'time': time_str,
-            'event_type': 'meeting',
-            'confidence': 0.8
+            'message': gpt_response,
+            'cascade': cascade_result
         }
     
     async def _try_parse_command(self, text: str) -> Optional[Dict[str, Any]]:
@@ -171,8 +133,14 @@ class EventManager:
     def __init__(self):
         self.parser = SimpleEventParser()
     
-    async def process_text(self, text: str, telegram_user_id: int, session: AsyncSession) -> Dict[str, Any]:
-        """Обрабатывает текст"""
+    async def process_text(
+        self,
+        text: str,
+        telegram_user_id: int,
+        session: AsyncSession,
+        stream: bool = False
+    ) -> Dict[str, Any]:
+        """Обрабатывает текст (stream - см. SimpleEventParser.process_message)"""
         
         # Получаем пользователя
         from sqlalchemy import select
@@ -188,13 +156,17 @@ class EventManager:
             }
         
         # Парсим сообщение
-        parse_result = await self.parser.process_message(text)
+        parse_result = await self.parser.process_message(text, stream=stream)
         
         if parse_result['type'] == 'event':
             # Создаём событие
-            return await self._create_event(parse_result['data'], user.id, session)
+            result = await self._create_event(parse_result['data'], user.id, session)
+            self._record_cascade(text, parse_result.get('cascade'), user.id, result.get('event'))
+            return result
+        
+        self._record_cascade(text, parse_result.get('cascade'), user.id)
         
-        elif parse_result['type'] == 'command':
+        if parse_result['type'] == 'command':
             # Команда управления
             return {
                 'type': 'command',
@@ -206,9 +178,35 @@ class EventManager:
             # GPT ответ
             return {
                 'type': 'response',
-                'message': parse_result['message']
+                'message': parse_result.get('message'),
+                'stream': parse_result.get('stream')
             }
     
+    @staticmethod
+    def _record_cascade(
+        text: str,
+        cascade_result: Optional[CascadeResult],
+        user_id: int,
+        event: Optional[Event] = None
+    ) -> None:
+        """Запись в журнал расхода AI: этап каскада, давший ответ, и время каждого этапа"""
+        if cascade_result is None:
+            return
+        ai_usage_ledger.record(
+            AIProcessingType.INTENT_CLASSIFICATION,
+            AIProvider.OPENAI if cascade_result.provider == "openai" else AIProvider.LOCAL,
+            processing_time=cascade_result.processing_time,
+            confidence=cascade_result.confidence,
+            user_id=user_id,
+            event_id=event.id if event is not None else None,
+            input_data={'text': text},
+            output_data={'intent': cascade_result.intent, 'event': cascade_result.event},
+            metadata={
+                'stage': cascade_result.stage,
+                'timings': {stage: round(seconds, 6) for stage, seconds in cascade_result.timings.items()}
+            }
+        )
+    
     async def _create_event(self, event_data: Dict[str, Any], user_id: int, session: AsyncSession) -> Dict[str, Any]:
         """Создаёт событие"""
         try:
@@ -216,7 +214,7 @@ class EventManager:
             event_date = datetime.strptime(event_data['date'], '%Y-%m-%d').date()
             time_parts = event_data['time'].split(':')
             start_time = datetime.combine(event_date, time(int(time_parts[0]), int(time_parts[1])))
-            end_time = start_time + timedelta(hours=1)
+            end_time = start_time + timedelta(minutes=int(event_data.get('duration_minutes') or 60))
             
             # Создаём событие
             event = Event(
@@ -232,6 +230,7 @@ class EventManager:
             session.add(event)
             await session.commit()
             await session.refresh(event)
+            schedule_event_indexing(event)
             
             # Формируем ответ
             message = f"✅ <b>Событие создано</b>\n\n"
@@ -263,7 +262,7 @@ async def handle_text_message(message: Message):
     try:
         async for session in get_async_session():
             # Обрабатываем текст
-            result = await event_manager.process_text(message.text, message.from_user.id, session)
+            result = await event_manager.process_text(message.text, message.from_user.id, session, stream=True)
             
             if result['type'] == 'created':
                 # Событие создано
@@ -286,6 +285,21 @@ async def handle_text_message(message: Message):
                 else:
                     await message.answer(result['message'], parse_mode="HTML")
                 
+            elif result['type'] == 'response' and result.get('stream') is not None:
+                # Потоковый ответ GPT: первые слова видны через секунду
+                status_msg = await message.answer("💭 Думаю...")
+                try:
+                    await stream_to_message(
+                        status_msg,
+                        result['stream'],
+                        empty_text="🤔 Не понял ваш запрос. Попробуйте создать событие: 'Встреча завтра в 15:00'"
+                    )
+                except Exception as e:
+                    logger.error(f"GPT stream failed: {e}")
+                    await status_msg.edit_text(
+                        "🤖 Понял! Если хотите создать событие, скажите когда и что запланировать."
+                    )
+                
             elif result['type'] == 'response':
                 # GPT ответ
                 await message.answer(result['message'], parse_mode="HTML")
@@ -3,13 +3,16 @@
 Только распознавание речи + создание событий
 """
 import logging
-import tempfile
-import os
+import time
 from pathlib import Path
 
 from aiogram import Router, F
 from aiogram.types import Message
 
+from app.ai.admission import admission_controller, estimate_cost
+from app.bot.utils.queue_status import queue_position_notifier
+from app.bot.utils.streaming import stream_to_message
+from app.core.exceptions import AIException
 from app.database import get_async_session
 from app.services.ai_service import AIService
 
@@ -29,105 +32,137 @@ async def handle_voice_message(message: Message):
                 parse_mode="HTML"
             )
             
-            # Скачиваем аудио файл
+            # Скачиваем аудио в память, без временного файла
             voice = message.voice
-            file_info = await message.bot.get_file(voice.file_id)
+            audio_buffer = await message.bot.download(voice)
+            audio_bytes = audio_buffer.getvalue()
             
-            with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as temp_file:
-                await message.bot.download_file(file_info.file_path, temp_file.name)
-                temp_file_path = temp_file.name
+            # Обновляем статус
+            await status_msg.edit_text(
+                "🎤 <b>Обрабатываю голос...</b>\n\n"
+                "✅ Аудио загружено\n"
+                "🔄 Распознаю речь...",
+                parse_mode="HTML"
+            )
+
+            # Инициализируем AI сервис
+            ai_service = AIService()
             
+            # Ждём места на этапе распознавания, показывая позицию в очереди
             try:
-                # Обновляем статус
+                async with admission_controller.admit(
+                    "whisper",
+                    message.from_user.id,
+                    estimate_cost("whisper", voice.duration or 0),
+                    on_position=queue_position_notifier(status_msg, "🎤 <b>Голосовое сообщение получено</b>")
+                ):
+                    # Распознаём речь по частям и показываем промежуточный текст
+                    result = {"error": "Не удалось распознать речь"}
+                    last_update = time.monotonic()
+                    async for result in ai_service.process_voice_stream(audio_bytes, voice.file_unique_id):
+                        if "error" in result or result["done"]:
+                            break
+                        
+                        # Telegram ограничивает частоту редактирования сообщений
+                        if time.monotonic() - last_update >= 1.0:
+                            last_update = time.monotonic()
+                            done_parts, total_parts = result["progress"]
+                            await status_msg.edit_text(
+                                "🎤 <b>Обрабатываю голос...</b>\n\n"
+                                "✅ Аудио загружено\n"
+                                f"🔄 Распознаю речь... ({done_parts}/{total_parts})\n\n"
+                                f"<i>{result['transcribed_text']}</i>",
+                                parse_mode="HTML"
+                            )
+            except AIException as e:
+                await status_msg.edit_text(f"⏳ <b>Сервис перегружен</b>\n\n{e.message}", parse_mode="HTML")
+                return
+            
+            if "error" in result:
                 await status_msg.edit_text(
-                    "🎤 <b>Обрабатываю голос...</b>\n\n"
-                    "✅ Аудио загружено\n"
-                    "🔄 Распознаю речь...",
+                    f"❌ <b>Ошибка обработки</b>\n\n"
+                    f"Не удалось распознать речь: {result['error']}\n\n"
+                    "💡 Попробуйте говорить более чётко",
                     parse_mode="HTML"
                 )
+                return
 
-                # Инициализируем AI сервис
-                ai_service = AIService()
-                
-                # Обрабатываем голос
-                result = await ai_service.process_voice(temp_file_path)
-                
-                if "error" in result:
-                    await status_msg.edit_text(
-                        f"❌ <b>Ошибка обработки</b>\n\n"
-                        f"Не удалось распознать речь: {result['error']}\n\n"
-                        "💡 Попробуйте говорить более чётко",
-                        parse_mode="HTML"
-                    )
-                    return
-
-                # Получаем распознанный текст
-                transcribed_text = result.get("transcribed_text", "")
-                
-                # Обновляем статус
-                await status_msg.edit_text(
-                    "🎤 <b>Обрабатываю голос...</b>\n\n"
-                    "✅ Аудио загружено\n"
-                    "✅ Речь распознана\n"
-                    "🤖 Создаю событие...",
-                    parse_mode="HTML"
-                )
+            # Получаем распознанный текст
+            transcribed_text = result.get("transcribed_text", "")
+            
+            # Обновляем статус
+            await status_msg.edit_text(
+                "🎤 <b>Обрабатываю голос...</b>\n\n"
+                "✅ Аудио загружено\n"
+                "✅ Речь распознана\n"
+                "🤖 Создаю событие...",
+                parse_mode="HTML"
+            )
 
-                # Формируем ответ
-                response_text = "🎤 <b>Голосовое сообщение обработано</b>\n\n"
+            # Формируем ответ
+            response_text = "🎤 <b>Голосовое сообщение обработано</b>\n\n"
+            
+            if transcribed_text:
+                response_text += f"📝 <b>Распознанный текст:</b>\n<i>«{transcribed_text}»</i>\n\n"
                 
-                if transcribed_text:
-                    response_text += f"📝 <b>Распознанный текст:</b>\n<i>«{transcribed_text}»</i>\n\n"
+                # 🎯 АВТОМАТИЧЕСКОЕ СОЗДАНИЕ СОБЫТИЯ ИЗ РЕЧИ
+                try:
+                    from app.bot.handlers.text import EventManager
+                    event_manager = EventManager()
                     
-                    # 🎯 АВТОМАТИЧЕСКОЕ СОЗДАНИЕ СОБЫТИЯ ИЗ РЕЧИ
-                    try:
-                        from app.bot.handlers.text import EventManager
-                        event_manager = EventManager()
-                        
-                        # Получаем пользователя из БД
-                        from sqlalchemy import select
-                        from app.models.user import User
-                        result_user = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
-                        db_user = result_user.scalar_one_or_none()
-                        
-                        if db_user:
-                            # Пытаемся создать событие из распознанной речи
-                            event_result = await event_manager.process_text(transcribed_text, message.from_user.id, session)
-                            
-                            if event_result['type'] == 'created':
-                                response_text += "🎉 <b>Событие автоматически создано!</b>\n\n"
-                                response_text += event_result['message']
-                                
-                                # Отправляем результат с клавиатурой события
-                                await status_msg.edit_text(
-                                    response_text,
-                                    parse_mode="HTML",
-                                    reply_markup=event_result.get('keyboard')
+                    # Получаем пользователя из БД
+                    from sqlalchemy import select
+                    from app.models.user import User
+                    result_user = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
+                    db_user = result_user.scalar_one_or_none()
+                    
+                    if db_user:
+                        # Пытаемся создать событие из распознанной речи
+                        async with admission_controller.admit(
+                            "gpt",
+                            message.from_user.id,
+                            estimate_cost("gpt", len(transcribed_text)),
+                            on_position=queue_position_notifier(status_msg, "🎤 <b>Речь распознана</b>")
+                        ):
+                            event_result = await event_manager.process_text(
+                                transcribed_text, message.from_user.id, session, stream=True
+                            )
+                            if event_result['type'] == 'response' and event_result.get('stream') is not None:
+                                # Ответ GPT дописывается в статусное сообщение, пока занято место этапа gpt
+                                await stream_to_message(
+                                    status_msg,
+                                    event_result['stream'],
+                                    prefix=response_text + "🤖 <b>GPT ответ:</b>\n"
                                 )
                                 return
-                            elif event_result['type'] == 'response':
-                                response_text += f"🤖 <b>GPT ответ:</b>\n{event_result['message']}\n\n"
-                            else:
-                                response_text += "🤔 <b>Не удалось определить событие</b>\n\n"
-                                response_text += "💡 Попробуйте сказать более конкретно:\n"
-                                response_text += "• «Встреча завтра в 15:00»\n"
-                                response_text += "• «Звонок клиенту сегодня в 17:30»\n\n"
                         
-                    except Exception as e:
-                        logger.warning(f"Failed to auto-create event from voice: {e}")
-                        response_text += "⚠️ <b>Событие не создано</b>\n\n"
-                
-                else:
-                    response_text += "📝 <b>Речь не распознана</b>\n\n💡 Попробуйте говорить более чётко\n\n"
-
-                await status_msg.edit_text(response_text, parse_mode="HTML")
+                        if event_result['type'] == 'created':
+                            response_text += "🎉 <b>Событие автоматически создано!</b>\n\n"
+                            response_text += event_result['message']
+                            
+                            # Отправляем результат с клавиатурой события
+                            await status_msg.edit_text(
+                                response_text,
+                                parse_mode="HTML",
+                                reply_markup=event_result.get('keyboard')
+                            )
+                            return
+                        elif event_result['type'] == 'response':
+                            response_text += f"🤖 <b>GPT ответ:</b>\n{event_result['message']}\n\n"
+                        else:
+                            response_text += "🤔 <b>Не удалось определить событие</b>\n\n"
+                            response_text += "💡 Попробуйте сказать более конкретно:\n"
+                            response_text += "• «Встреча завтра в 15:00»\n"
+                            response_text += "• «Звонок клиенту сегодня в 17:30»\n\n"
+                    
+                except Exception as e:
+                    logger.warning(f"Failed to auto-create event from voice: {e}")
+                    response_text += "⚠️ <b>Событие не создано</b>\n\n"
+            
+            else:
+                response_text += "📝 <b>Речь не распознана</b>\n\n💡 Попробуйте говорить более чётко\n\n"
 
-            finally:
-                # Удаляем временный файл
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
+            await status_msg.edit_text(response_text, parse_mode="HTML")
             
             break
 
@@ -14,10 +14,18 @@ from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.storage.redis import RedisStorage
 
+from app.ai.embeddings.faiss_index import faiss_index_store
+from app.ai.embeddings.indexer import event_indexer
+from app.ai.model_registry import model_registry
+from app.ai.usage_ledger import ai_usage_ledger
+from app.ai.speech.worker_pool import get_whisper_pool, shutdown_whisper_pools
 from app.bot.handlers import callback, photo, start, text, voice
+from app.bot.middlewares.ai_usage import AIUsageContextMiddleware
+from app.bot.middlewares.album import AlbumMiddleware
 from app.bot.middlewares.db import DatabaseMiddleware
 from app.bot.middlewares.logging import LoggingMiddleware
 from app.config import settings
+from app.core.cache import cache_service
 
 # Настройка логирования
 logging.basicConfig(
@@ -63,9 +71,13 @@ async def main():
     dp = Dispatcher()
     
     # Подключаем middleware
+    # Альбом собирается первым, чтобы остальные middleware работали с ним один раз
+    dp.message.middleware(AlbumMiddleware())
     dp.message.middleware(DatabaseMiddleware())
     dp.callback_query.middleware(DatabaseMiddleware())
     dp.message.middleware(LoggingMiddleware())
+    dp.message.middleware(AIUsageContextMiddleware())
+    dp.callback_query.middleware(AIUsageContextMiddleware())
     
     # Регистрируем обработчики
     start.register_handlers(dp)
@@ -74,6 +86,19 @@ async def main():
     photo.register_handlers(dp)
     callback.register_handlers(dp)
     
+    # Кэш результатов распознавания и GPT
+    await cache_service.connect()
+    
+    # Журнал расхода AI сбрасывается в ai_data в фоне
+    ai_usage_ledger.start()
+    
+    # Предзагружаем AI модели, чтобы первое голосовое не ждало загрузку
+    if settings.AI_WARMUP_ON_STARTUP:
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, model_registry.warmup, settings.AI_WARMUP_MODELS)
+        if settings.WHISPER_WORKERS > 0:
+            loop.run_in_executor(None, get_whisper_pool().warmup)
+    
     logger.info("🤖 Упрощённый календарь-бот запущен!")
     
     # Запускаем polling
@@ -81,6 +106,13 @@ async def main():
         await dp.start_polling(bot)
     finally:
         await bot.session.close()
+        await ai_usage_ledger.stop()
+        await event_indexer.stop()
+        if faiss_index_store.available:
+            faiss_index_store.save()
+        await cache_service.disconnect()
+        model_registry.unload()
+        shutdown_whisper_pools(wait=False)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
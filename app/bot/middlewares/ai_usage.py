@@ -0,0 +1,23 @@
+"""
+Middleware контекста журнала расхода AI
+"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.ai.usage_ledger import ai_usage_context
+
+
+class AIUsageContextMiddleware(BaseMiddleware):
+    """Привязывает AI вызовы обработчика к отправителю апдейта"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = getattr(event, "from_user", None)
+        with ai_usage_context(telegram_id=from_user.id if from_user else None):
+            return await handler(event, data)
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AlbumMiddleware(BaseMiddleware):
+    """
+    Middleware для сборки альбомов (media group)
+
+    Telegram присылает каждое фото альбома отдельным сообщением.
+    Сообщения с одним media_group_id копятся в течение короткой паузы,
+    после чего обработчик вызывается один раз - для первого сообщения,
+    а весь альбом передаётся в аргументе album.
+    """
+
+    def __init__(self, latency: Optional[float] = None):
+        """
+        Args:
+            latency: Сколько ждать следующее сообщение альбома в секундах
+        """
+        self.latency = latency if latency is not None else settings.MEDIA_GROUP_LATENCY
+        self.albums: Dict[str, List[Message]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+
+        if not isinstance(event, Message) or not event.media_group_id:
+            return await handler(event, data)
+
+        key = f"{event.chat.id}:{event.media_group_id}"
+        album = self.albums.get(key)
+        if album is not None:
+            # Альбом уже собирается первым сообщением
+            album.append(event)
+            return
+
+        album = self.albums[key] = [event]
+        try:
+            # Ждём, пока перестанут приходить сообщения альбома
+            size = 0
+            while size != len(album):
+                size = len(album)
+                await asyncio.sleep(self.latency)
+        finally:
+            self.albums.pop(key, None)
+
+        album.sort(key=lambda message: message.message_id)
+        logger.info(f"Album {event.media_group_id} collected: {len(album)} messages")
+        data["album"] = album
+        return await handler(album[0], data)
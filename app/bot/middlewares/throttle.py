@@ -32,6 +32,10 @@ class ThrottlingMiddleware(BaseMiddleware):
             # Для других типов событий пропускаем
             return await handler(event, data)
         
+        # Сообщения одного альбома приходят пачкой и не считаются флудом
+        if isinstance(event, Message) and event.media_group_id:
+            return await handler(event, data)
+        
         current_time = time.time()
         last_time = self.last_request_time.get(telegram_id, 0)
         
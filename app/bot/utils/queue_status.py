@@ -0,0 +1,35 @@
+"""
+Позиция в очереди допуска в статусном сообщении
+
+Пока тяжёлое задание ждёт места на этапе (app.ai.admission), статусное
+сообщение показывает позицию пользователя в очереди вместо «зависшего»
+статуса или таймаута.
+"""
+from aiogram.types import Message
+
+from app.ai.admission import PositionCallback
+from app.bot.utils.streaming import ThrottledMessageEditor
+
+
+def queue_position_notifier(message: Message, title: str) -> PositionCallback:
+    """
+    Args:
+        message: Статусное сообщение бота
+        title: Заголовок статуса (HTML)
+
+    Returns:
+        Колбэк для AdmissionController.admit(on_position=...)
+    """
+    editor = ThrottledMessageEditor(message)
+
+    async def notify(position: int) -> None:
+        ahead = position - 1
+        text = (
+            f"{title}\n\n"
+            f"⏳ Вы в очереди: <b>{position}</b>"
+            + (f" (перед вами {ahead})" if ahead else "")
+            + "\n\nНачну обработку, как только освободится место"
+        )
+        await editor.update(text, cursor=False, parse_mode="HTML")
+
+    return notify
@@ -0,0 +1,153 @@
+"""
+Постепенный вывод потокового ответа в сообщение Telegram
+
+Ответ GPT приходит фрагментами за несколько секунд. Вместо ожидания
+полного ответа статусное сообщение редактируется по мере генерации,
+но не чаще раза в GPT_STREAM_EDIT_INTERVAL секунд - Telegram
+ограничивает частоту редактирования.
+
+Текст модели экранируется: сообщения бота размечены HTML, и «<» или «&»
+в ответе («R&D», «до 10 млн < 12 млн») иначе обрывали бы вывод ошибкой
+разбора разметки.
+"""
+import asyncio
+import html
+import logging
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
+CURSOR = " ▌"
+
+
+class ThrottledMessageEditor:
+    """Редактирует сообщение не чаще заданного интервала"""
+
+    def __init__(self, message: Message, interval: Optional[float] = None):
+        """
+        Args:
+            message: Сообщение бота, которое будет редактироваться
+            interval: Минимальный интервал между правками, секунды
+        """
+        self.message = message
+        self.interval = interval if interval is not None else settings.GPT_STREAM_EDIT_INTERVAL
+        self.edits = 0
+        self._shown = ""
+        self._next_edit_at = 0.0
+
+    async def update(self, text: str, cursor: bool = True, **kwargs: Any) -> bool:
+        """
+        Показывает промежуточный текст, если интервал прошёл
+
+        Args:
+            text: Текст
+            cursor: Добавить курсор, что текст ещё дописывается
+            **kwargs: Параметры edit_text (parse_mode и др.)
+
+        Returns:
+            True, если сообщение отредактировано
+        """
+        if time.monotonic() < self._next_edit_at:
+            return False
+        suffix = CURSOR if cursor else ""
+        return await self._edit(_truncate(text, MESSAGE_LIMIT - len(suffix)) + suffix, **kwargs)
+
+    async def finish(self, text: str, **kwargs: Any) -> None:
+        """
+        Показывает итоговый текст, дожидаясь интервала
+
+        Не поместившееся в одно сообщение отправляется следующими сообщениями.
+        """
+        parts = _split(text, MESSAGE_LIMIT)
+        while True:
+            delay = self._next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # После TelegramRetryAfter повторяем - итоговый текст должен дойти
+            if await self._edit(parts[0], **kwargs) or self._shown == parts[0]:
+                break
+        # Продолжение - в той же разметке, что и первая часть
+        answer_kwargs = {key: kwargs[key] for key in ("parse_mode",) if key in kwargs}
+        for part in parts[1:]:
+            await self.message.answer(part, **answer_kwargs)
+
+    async def _edit(self, text: str, **kwargs: Any) -> bool:
+        if text == self._shown and not kwargs.keys() - {"parse_mode"}:
+            return False
+        try:
+            await self.message.edit_text(text, **kwargs)
+        except TelegramRetryAfter as e:
+            # Превысили лимит - пропускаем правки, пока Telegram не разрешит
+            logger.warning(f"Telegram edit rate limited for {e.retry_after}s")
+            self._next_edit_at = time.monotonic() + e.retry_after
+            return False
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        self._shown = text
+        self.edits += 1
+        self._next_edit_at = time.monotonic() + self.interval
+        return True
+
+
+def _cut(text: str, limit: int) -> int:
+    """Позиция разреза не дальше limit, не внутри HTML-сущности (&amp; и т.п.)"""
+    if len(text) <= limit:
+        return len(text)
+    amp = text.rfind("&", max(0, limit - 8), limit)
+    if amp > 0 and ";" not in text[amp:limit]:
+        return amp
+    return limit
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:_cut(text, limit - 1)] + "…"
+
+
+def _split(text: str, limit: int) -> List[str]:
+    parts = []
+    while len(text) > limit:
+        position = _cut(text, limit)
+        parts.append(text[:position])
+        text = text[position:]
+    return parts + [text]
+
+
+async def stream_to_message(
+    message: Message,
+    chunks: AsyncIterator[str],
+    prefix: str = "",
+    empty_text: str = "…"
+) -> str:
+    """
+    Выводит поток фрагментов в сообщение
+
+    Args:
+        message: Статусное сообщение бота
+        chunks: Фрагменты ответа (обычный текст, экранируется)
+        prefix: Текст перед ответом (HTML)
+        empty_text: Текст, если модель ничего не ответила (HTML)
+
+    Returns:
+        Полный текст ответа (без префикса)
+    """
+    editor = ThrottledMessageEditor(message)
+    started_at = time.perf_counter()
+    text = ""
+    async for chunk in chunks:
+        text += chunk
+        await editor.update(prefix + html.escape(text, quote=False), parse_mode="HTML")
+    answer = html.escape(text.strip(), quote=False) if text.strip() else empty_text
+    await editor.finish(prefix + answer, parse_mode="HTML")
+    logger.info(
+        f"Streamed {len(text)} chars in {time.perf_counter() - started_at:.1f}s with {editor.edits} edits"
+    )
+    return text.strip()
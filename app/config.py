@@ -67,6 +67,62 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = Field(default="", env="OPENAI_API_KEY")
     OPENAI_MODEL: str = Field(default="gpt-4-turbo-preview", env="OPENAI_MODEL")
     
+    # Предзагрузка локальных моделей при старте процесса (бот, Celery воркер)
+    AI_WARMUP_ON_STARTUP: bool = Field(default=False, env="AI_WARMUP_ON_STARTUP")
+    # Whisper при включённом пуле процессов прогревается отдельно, в процессах пула
+    AI_WARMUP_MODELS: List[str] = Field(
+        default=["easyocr:ru,en"],
+        env="AI_WARMUP_MODELS"
+    )
+    # Загрузка AI_WARMUP_MODELS в главном процессе до fork воркеров (Celery prefork,
+    # gunicorn): воркеры делят веса copy-on-write вместо своей копии в каждом
+    AI_PRELOAD_BEFORE_FORK: bool = Field(default=False, env="AI_PRELOAD_BEFORE_FORK")
+    AI_WORKER_TORCH_THREADS: int = Field(default=1, env="AI_WORKER_TORCH_THREADS")  # потоков torch на воркер
+    
+    # Пул процессов Whisper (0 - распознавание в потоке процесса бота)
+    WHISPER_WORKERS: int = Field(default=2, env="WHISPER_WORKERS")
+    WHISPER_QUEUE_SIZE: int = Field(default=16, env="WHISPER_QUEUE_SIZE")
+    WHISPER_JOB_TIMEOUT: int = Field(default=120, env="WHISPER_JOB_TIMEOUT")  # секунды
+    
+    # Голосовые длиннее этого режутся по паузам и распознаются по частям (секунды)
+    WHISPER_CHUNK_MIN_DURATION: int = Field(default=30, env="WHISPER_CHUNK_MIN_DURATION")
+    
+    # Язык распознавания (пусто - автоопределение, лишний проход модели)
+    WHISPER_LANGUAGE: str = Field(default="ru", env="WHISPER_LANGUAGE")
+    # Подсказка Whisper: только термины недвижимости - конкретные адреса и фразы
+    # модель переносит в тихие и короткие фрагменты
+    WHISPER_INITIAL_PROMPT: str = Field(
+        default="ЖК, ДДУ, ипотека, задаток, риелтор, собственник, новостройка, вторичка, показ, сделка",
+        env="WHISPER_INITIAL_PROMPT"
+    )
+    # Выбор модели по длительности голосового: до первой границы - первая модель и т.д.
+    # Модели от точной к быстрой; при WHISPER_ROUTE_BUSY_DEPTH заданий в очереди - на ступень быстрее
+    WHISPER_ROUTING_ENABLED: bool = Field(default=False, env="WHISPER_ROUTING_ENABLED")
+    WHISPER_ROUTE_MODELS: List[str] = Field(default=["small", "base", "tiny"], env="WHISPER_ROUTE_MODELS")
+    WHISPER_ROUTE_DURATIONS: List[int] = Field(default=[15, 60], env="WHISPER_ROUTE_DURATIONS")  # секунды
+    WHISPER_ROUTE_BUSY_DEPTH: int = Field(default=4, env="WHISPER_ROUTE_BUSY_DEPTH")
+    
+    # Предобработка изображений перед EasyOCR
+    OCR_PREPROCESS_ENABLED: bool = Field(default=True, env="OCR_PREPROCESS_ENABLED")
+    OCR_MAX_SIDE: int = Field(default=1600, env="OCR_MAX_SIDE")  # пиксели, 0 - без уменьшения
+    OCR_GRAYSCALE: bool = Field(default=True, env="OCR_GRAYSCALE")
+    OCR_THRESHOLD: bool = Field(default=False, env="OCR_THRESHOLD")
+    OCR_DESKEW: bool = Field(default=True, env="OCR_DESKEW")
+    OCR_CROP_TEXT: bool = Field(default=True, env="OCR_CROP_TEXT")
+    # Сколько изображений альбома распознаётся за один вызов модели
+    OCR_BATCH_SIZE: int = Field(default=8, env="OCR_BATCH_SIZE")
+    # Сколько ждать остальные сообщения альбома Telegram (секунды)
+    MEDIA_GROUP_LATENCY: float = Field(default=0.8, env="MEDIA_GROUP_LATENCY")
+    
+    # Допуск тяжёлых заданий бота: одновременно выполняющихся на этапе
+    ADMISSION_WHISPER_CONCURRENCY: int = Field(default=2, env="ADMISSION_WHISPER_CONCURRENCY")
+    ADMISSION_OCR_CONCURRENCY: int = Field(default=2, env="ADMISSION_OCR_CONCURRENCY")
+    ADMISSION_GPT_CONCURRENCY: int = Field(default=8, env="ADMISSION_GPT_CONCURRENCY")
+    # Сколько заданий может ждать на этапе, дальше - отказ
+    ADMISSION_MAX_QUEUE: int = Field(default=100, env="ADMISSION_MAX_QUEUE")
+    # На сколько секунд оценки задание продвигается за секунду ожидания (защита от голодания)
+    ADMISSION_AGING: float = Field(default=1.0, env="ADMISSION_AGING")
+    
     # Yandex SpeechKit
     YANDEX_SPEECHKIT_API_KEY: Optional[str] = Field(default=None, env="YANDEX_SPEECHKIT_API_KEY")
     
@@ -153,6 +209,78 @@ class Settings(BaseSettings):
     CALENDAR_CACHE_TTL: int = Field(default=900, env="CALENDAR_CACHE_TTL")  # 15 минут
     ANALYTICS_CACHE_TTL: int = Field(default=7200, env="ANALYTICS_CACHE_TTL")  # 2 часа
     
+    # Результаты распознавания речи и OCR по хэшу содержимого
+    AI_RESULT_CACHE_TTL: int = Field(default=604800, env="AI_RESULT_CACHE_TTL")  # 7 дней
+    
+    # Ответы GPT по нормализованному тексту (разбор событий - в пределах дня)
+    GPT_CACHE_ENABLED: bool = Field(default=True, env="GPT_CACHE_ENABLED")
+    GPT_CACHE_TTL: int = Field(default=86400, env="GPT_CACHE_TTL")  # 24 часа
+    
+    # Объединение одинаковых одновременных запросов к OpenAI
+    GPT_SINGLE_FLIGHT_ENABLED: bool = Field(default=True, env="GPT_SINGLE_FLIGHT_ENABLED")
+    # Объединять запросы между процессами (бот, API, Celery) через Redis
+    GPT_SINGLE_FLIGHT_REDIS: bool = Field(default=False, env="GPT_SINGLE_FLIGHT_REDIS")
+    GPT_SINGLE_FLIGHT_TIMEOUT: int = Field(default=60, env="GPT_SINGLE_FLIGHT_TIMEOUT")  # секунды
+    
+    # Лимиты OpenAI на модель (общие для процессов через Redis)
+    GPT_REQUESTS_PER_MINUTE: int = Field(default=500, env="GPT_REQUESTS_PER_MINUTE")
+    GPT_TOKENS_PER_MINUTE: int = Field(default=150000, env="GPT_TOKENS_PER_MINUTE")
+    GPT_RATE_LIMIT_REDIS: bool = Field(default=True, env="GPT_RATE_LIMIT_REDIS")
+    # Адаптивный лимит одновременных запросов процесса (AIMD)
+    GPT_CONCURRENCY_INITIAL: int = Field(default=4, env="GPT_CONCURRENCY_INITIAL")
+    GPT_CONCURRENCY_MAX: int = Field(default=32, env="GPT_CONCURRENCY_MAX")
+    # Повторы при 429/5xx и сетевых ошибках
+    GPT_MAX_RETRIES: int = Field(default=3, env="GPT_MAX_RETRIES")
+    
+    # Журнал расхода AI (ai_data): буфер в памяти, пакетная запись
+    AI_LEDGER_ENABLED: bool = Field(default=True, env="AI_LEDGER_ENABLED")
+    AI_LEDGER_BATCH_SIZE: int = Field(default=100, env="AI_LEDGER_BATCH_SIZE")
+    AI_LEDGER_FLUSH_INTERVAL: float = Field(default=10.0, env="AI_LEDGER_FLUSH_INTERVAL")  # секунды
+    AI_LEDGER_MAX_BUFFER: int = Field(default=10000, env="AI_LEDGER_MAX_BUFFER")
+    
+    # Потоковые ответы GPT в сообщение Telegram
+    GPT_STREAMING_ENABLED: bool = Field(default=True, env="GPT_STREAMING_ENABLED")
+    GPT_STREAM_EDIT_INTERVAL: float = Field(default=1.0, env="GPT_STREAM_EDIT_INTERVAL")  # секунды между правками
+    
+    # Разбор событий правилами без обращения к OpenAI
+    RULE_PARSER_ENABLED: bool = Field(default=True, env="RULE_PARSER_ENABLED")
+    # Минимальная уверенность, при которой результат правил принимается без GPT
+    RULE_PARSER_MIN_CONFIDENCE: float = Field(default=0.85, env="RULE_PARSER_MIN_CONFIDENCE")
+    
+    # Каскад разбора: правила -> локальный классификатор -> GPT
+    # Векторизация классификатора намерений: tfidf или embedding (MiniLM)
+    INTENT_CLASSIFIER_BACKEND: str = Field(default="tfidf", env="INTENT_CLASSIFIER_BACKEND")
+    # Уверенность классификатора, при которой GPT не вызывается
+    INTENT_CLASSIFIER_MIN_CONFIDENCE: float = Field(default=0.6, env="INTENT_CLASSIFIER_MIN_CONFIDENCE")
+    # Уверенность правил, достаточная для полей события, если классификатор подтвердил событие
+    CASCADE_ENTITY_MIN_CONFIDENCE: float = Field(default=0.6, env="CASCADE_ENTITY_MIN_CONFIDENCE")
+    
+    # Эмбеддинги для семантического поиска
+    EMBEDDING_MODEL: str = Field(default="paraphrase-multilingual-MiniLM-L12-v2", env="EMBEDDING_MODEL")
+    # Запросы, пришедшие в пределах окна, кодируются одной пачкой
+    EMBEDDING_BATCH_SIZE: int = Field(default=32, env="EMBEDDING_BATCH_SIZE")
+    EMBEDDING_BATCH_WAIT_MS: float = Field(default=5.0, env="EMBEDDING_BATCH_WAIT_MS")
+    # Формат event_embeddings.embedding: float32, float16 или int8 (с масштабом на вектор)
+    EMBEDDING_STORAGE: str = Field(default="float16", env="EMBEDDING_STORAGE")
+    # Фоновая индексация: событие кодируется через столько секунд после последней правки
+    EMBEDDING_INDEX_DEBOUNCE: float = Field(default=2.0, env="EMBEDDING_INDEX_DEBOUNCE")  # секунды
+    EMBEDDING_INDEX_BATCH_SIZE: int = Field(default=64, env="EMBEDDING_INDEX_BATCH_SIZE")
+    # Индексы FAISS по пользователям - кэш процесса, сверяется с event_embeddings
+    # перед поиском (без faiss поиск идёт запросом к базе)
+    FAISS_INDEX_ENABLED: bool = Field(default=True, env="FAISS_INDEX_ENABLED")
+    FAISS_INDEX_DIR: str = Field(default="data/faiss", env="FAISS_INDEX_DIR")
+    FAISS_MAX_LOADED_USERS: int = Field(default=256, env="FAISS_MAX_LOADED_USERS")
+    FAISS_SAVE_INTERVAL: float = Field(default=30.0, env="FAISS_SAVE_INTERVAL")  # секунды
+    # Где искать похожие события: faiss (индексы в процессе), pgvector (HNSW в базе) или numpy
+    VECTOR_SEARCH_BACKEND: str = Field(default="faiss", env="VECTOR_SEARCH_BACKEND")
+    # Кандидатов на слой HNSW при поиске: больше - выше полнота, медленнее запрос
+    PGVECTOR_EF_SEARCH: int = Field(default=40, env="PGVECTOR_EF_SEARCH")
+    # Гибридный поиск: полнотекстовый + векторный, слияние рангов (RRF)
+    HYBRID_SEARCH_CANDIDATES: int = Field(default=50, env="HYBRID_SEARCH_CANDIDATES")  # кандидатов от каждого поиска
+    HYBRID_RRF_K: int = Field(default=60, env="HYBRID_RRF_K")
+    HYBRID_VECTOR_MIN_SIMILARITY: float = Field(default=0.3, env="HYBRID_VECTOR_MIN_SIMILARITY")
+    HYBRID_SEARCH_CACHE_TTL: int = Field(default=300, env="HYBRID_SEARCH_CACHE_TTL")  # секунды
+    
     # =============================================================================
     # НАСТРОЙКИ ОГРАНИЧЕНИЯ СКОРОСТИ
     # =============================================================================
@@ -9,8 +9,10 @@ import redis.asyncio as redis
 from functools import wraps
 import hashlib
 import logging
+import uuid
 
 from app.config import settings
+from app.core.logging import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -80,6 +82,19 @@ class CacheService:
             logger.error(f"Cache set error: {e}")
             return False
     
+    async def add(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        """Установка значения, только если ключа ещё нет (SET NX)"""
+        if not self.redis_client:
+            return False
+        
+        try:
+            full_key = self._get_key(key)
+            data = pickle.dumps(value)
+            return bool(await self.redis_client.set(full_key, data, ex=expire, nx=True))
+        except Exception as e:
+            logger.error(f"Cache add error: {e}")
+            return False
+    
     async def delete(self, key: str) -> bool:
         """Удаление значения из кэша"""
         if not self.redis_client:
@@ -132,6 +147,18 @@ class CacheService:
             logger.error(f"Cache clear pattern error: {e}")
             return 0
     
+    async def eval_script(self, script: str, keys: List[str], args: List[Any]) -> Any:
+        """Атомарное выполнение Lua-скрипта (ключи дополняются префиксом)"""
+        if not self.redis_client:
+            return None
+        
+        try:
+            full_keys = [self._get_key(key) for key in keys]
+            return await self.redis_client.eval(script, len(full_keys), *full_keys, *args)
+        except Exception as e:
+            logger.error(f"Cache eval error: {e}")
+            return None
+    
     async def get_many(self, keys: List[str]) -> Dict[str, Any]:
         """Получение множества значений"""
         if not self.redis_client:
@@ -234,7 +261,17 @@ class CacheKeys:
     
     # AI
     AI_RESPONSE = "ai:response:{query_hash}"
+    AI_GPT_RESPONSE = "ai:gpt:{task}:{model}:{bucket}:{text_hash}"
+    AI_GPT_INFLIGHT_LOCK = "ai:gpt:inflight:{request_hash}:lock"
+    AI_GPT_INFLIGHT_RESULT = "ai:gpt:inflight:{request_hash}:result"
+    AI_GPT_RATE_BUCKET = "ai:gpt:ratelimit:{model}:{kind}"
     AI_PROPERTY_PARSE = "ai:property:parse:{image_hash}"
+    AI_MEDIA_RESULT = "ai:media:{kind}:{variant}:{content_hash}"
+    AI_MEDIA_FILE_RESULT = "ai:media:{kind}:{variant}:file:{file_unique_id}"
+    
+    # Поиск событий
+    EVENT_SEARCH = "search:events:{user_id}:{query_hash}"
+    EVENT_SEARCH_VERSION = "search:events:{user_id}:version"
     
     # API
     API_RATE_LIMIT = "api:rate_limit:{user_id}"
@@ -289,6 +326,18 @@ class CacheManager:
         for pattern in patterns:
             await cache_service.clear_pattern(pattern)
     
+    @staticmethod
+    async def invalidate_event_search_cache(user_id: int):
+        """
+        Инвалидация результатов поиска событий пользователя
+        
+        Результаты хранят версию поиска пользователя; смена версии делает
+        их устаревшими без перебора ключей.
+        """
+        await cache_service.set(
+            CacheKeys.EVENT_SEARCH_VERSION.format(user_id=user_id), uuid.uuid4().hex
+        )
+    
     @staticmethod
     async def invalidate_analytics_cache(user_id: int):
         """Инвалидация кэша аналитики"""
@@ -298,4 +347,120 @@ class CacheManager:
         ]
         
         for pattern in patterns:
-            await cache_service.clear_pattern(pattern) 
\ No newline at end of file
+            await cache_service.clear_pattern(pattern) 
+
+
+class AIResultCache:
+    """
+    Кэш результатов распознавания речи и OCR
+
+    Результаты адресуются хэшем содержимого файла и, если известен,
+    Telegram file_unique_id - пересланные голосовые и скриншоты
+    не распознаются повторно.
+    """
+    
+    def __init__(self, cache: CacheService = None, ttl: int = None):
+        self.cache = cache or cache_service
+        self.ttl = ttl or settings.AI_RESULT_CACHE_TTL
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.bytes_written: Dict[str, int] = {}
+    
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        """SHA-256 содержимого файла"""
+        return hashlib.sha256(data).hexdigest()
+    
+    async def get(
+        self,
+        kind: str,
+        variant: str,
+        content_hash: Optional[str] = None,
+        file_unique_id: Optional[str] = None
+    ) -> Any:
+        """
+        Ищет результат по file_unique_id, затем по хэшу содержимого
+        
+        Args:
+            kind: Тип результата (transcription, ocr)
+            variant: Конфигурация модели (например, название модели Whisper)
+            content_hash: Хэш содержимого файла
+            file_unique_id: Идентификатор файла в Telegram
+            
+        Returns:
+            Сохранённый результат или None
+        """
+        keys = []
+        if file_unique_id:
+            keys.append(CacheKeys.AI_MEDIA_FILE_RESULT.format(
+                kind=kind, variant=variant, file_unique_id=file_unique_id
+            ))
+        if content_hash:
+            keys.append(CacheKeys.AI_MEDIA_RESULT.format(
+                kind=kind, variant=variant, content_hash=content_hash
+            ))
+        
+        for key in keys:
+            result = await self.cache.get(key)
+            if result is not None:
+                self._record(kind, hit=True)
+                return result
+        
+        self._record(kind, hit=False)
+        return None
+    
+    async def set(
+        self,
+        kind: str,
+        variant: str,
+        value: Any,
+        content_hash: Optional[str] = None,
+        file_unique_id: Optional[str] = None
+    ) -> bool:
+        """Сохраняет результат под хэшем содержимого и file_unique_id"""
+        data = {}
+        if content_hash:
+            data[CacheKeys.AI_MEDIA_RESULT.format(
+                kind=kind, variant=variant, content_hash=content_hash
+            )] = value
+        if file_unique_id:
+            data[CacheKeys.AI_MEDIA_FILE_RESULT.format(
+                kind=kind, variant=variant, file_unique_id=file_unique_id
+            )] = value
+        if not data:
+            return False
+        
+        stored = await self.cache.set_many(data, expire=self.ttl)
+        if stored:
+            size = len(pickle.dumps(value)) * len(data)
+            self.bytes_written[kind] = self.bytes_written.get(kind, 0) + size
+            metrics.increment("cache.ai.bytes_written", size, tags={"kind": kind})
+        return stored
+    
+    def _record(self, kind: str, hit: bool) -> None:
+        counter = self.hits if hit else self.misses
+        counter[kind] = counter.get(kind, 0) + 1
+        metrics.increment("cache.ai.hits" if hit else "cache.ai.misses", tags={"kind": kind})
+        metrics.gauge("cache.ai.hit_rate", self.get_hit_rate(kind), tags={"kind": kind})
+    
+    def get_hit_rate(self, kind: str) -> float:
+        """Доля попаданий в кэш для типа результата"""
+        total = self.hits.get(kind, 0) + self.misses.get(kind, 0)
+        return self.hits.get(kind, 0) / total if total else 0.0
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика кэша по типам результатов"""
+        kinds = set(self.hits) | set(self.misses) | set(self.bytes_written)
+        return {
+            kind: {
+                "hits": self.hits.get(kind, 0),
+                "misses": self.misses.get(kind, 0),
+                "hit_rate": self.get_hit_rate(kind),
+                "bytes_written": self.bytes_written.get(kind, 0)
+            }
+            for kind in kinds
+        }
+
+
+# Глобальный кэш результатов распознавания
+ai_result_cache = AIResultCache()
@@ -0,0 +1,122 @@
+"""
+Профиль времени импорта модулей (python -X importtime)
+
+Импорт выполняется в отдельном интерпретаторе - уже загруженные в
+текущий процесс модули не искажают результат. Вывод -X importtime
+разбирается в записи: собственное время модуля и время вместе со
+вложенными импортами.
+
+Используется скриптом scripts/importtime_report.py и тестом бюджета
+запуска бота и API.
+"""
+import os
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Sequence, Set
+
+# Библиотеки, которые должны загружаться при первом использовании или
+# в прогреве (AI_WARMUP_ON_STARTUP), а не при импорте приложения
+HEAVY_MODULES = ("torch", "whisper", "easyocr", "sentence_transformers", "transformers", "cv2", "faiss")
+
+# Точки входа API и бота и бюджет времени их импорта
+STARTUP_MODULES = ("app.main", "app.bot.main")
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "4000"))
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+@dataclass
+class ImportRecord:
+    """Строка вывода -X importtime"""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass
+class ImportProfile:
+    """Импорт одного модуля"""
+    module: str
+    records: List[ImportRecord] = field(default_factory=list)
+    returncode: int = 0
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    @property
+    def total_ms(self) -> float:
+        """Время импорта модуля вместе с зависимостями"""
+        for record in reversed(self.records):
+            if record.depth == 0 and record.module == self.module:
+                return record.cumulative_us / 1000
+        return sum(record.self_us for record in self.records) / 1000
+
+    @property
+    def modules(self) -> Set[str]:
+        return {record.module for record in self.records}
+
+    def heavy_modules(self, heavy: Sequence[str] = HEAVY_MODULES) -> List[str]:
+        """Тяжёлые библиотеки, попавшие в импорт"""
+        return [name for name in heavy if name in self.modules]
+
+    def top(self, limit: int = 25, by: str = "cumulative") -> List[ImportRecord]:
+        """Самые долгие импорты по собственному (self) или общему (cumulative) времени"""
+        key = (lambda record: record.self_us) if by == "self" else (lambda record: record.cumulative_us)
+        return sorted(self.records, key=key, reverse=True)[:limit]
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """
+    Разбирает вывод -X importtime
+
+    Строки вида "import time: self [us] | cumulative | imported package",
+    вложенность - отступ имени по два пробела.
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            record = ImportRecord(
+                module=name.strip(),
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(name) - len(name.lstrip()) - 1) // 2,
+            )
+        except ValueError:
+            # Заголовок "self [us] | cumulative | imported package"
+            continue
+        records.append(record)
+    return records
+
+
+def profile_import(module: str, python: Optional[str] = None, cwd: Optional[Path] = None) -> ImportProfile:
+    """
+    Импортирует модуль в отдельном интерпретаторе с -X importtime
+
+    Args:
+        module: Имя модуля
+        python: Интерпретатор (по умолчанию текущий)
+        cwd: Рабочий каталог (по умолчанию корень проекта)
+
+    Returns:
+        Профиль; при ошибке импорта - returncode и последняя строка traceback
+    """
+    cwd = cwd or PROJECT_ROOT
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(cwd), env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [python or sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=cwd, env=env
+    )
+    error = ""
+    if result.returncode != 0:
+        lines = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        error = lines[-1] if lines else f"exit code {result.returncode}"
+    return ImportProfile(module, parse_importtime(result.stderr), result.returncode, error)
@@ -0,0 +1,34 @@
+"""
+Ленивый импорт имён пакета (PEP 562)
+
+Пакет перечисляет, из какого модуля берётся каждое экспортируемое
+имя; модуль импортируется при первом обращении к имени. Так импорт
+app.ai.* или app.services не тянет openai, OpenCV и стек torch в
+процессы (API, бот без голосовых), которым они не нужны.
+"""
+import sys
+from importlib import import_module
+from typing import Any, Callable, Dict
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) -> Callable[[str], Any]:
+    """
+    Функция __getattr__ для пакета
+
+    Args:
+        package: Имя пакета (__name__)
+        exports: Имя -> модуль (относительный, как в from .module import name)
+
+    Returns:
+        __getattr__, импортирующий модуль при первом обращении
+    """
+    def __getattr__(name: str) -> Any:
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(import_module(module, package), name)
+        # Следующие обращения не проходят через __getattr__
+        setattr(sys.modules[package], name, value)
+        return value
+
+    return __getattr__
@@ -0,0 +1,85 @@
+"""
+Память процессов по /proc (Linux)
+
+RSS процесса после fork включает страницы, общие с главным процессом
+и другими воркерами, поэтому сумма RSS воркеров завышает реальный
+расход. /proc/<pid>/smaps_rollup разделяет память на:
+- private (USS) - страницы только этого процесса, освобождаются с ним;
+- shared - страницы, общие с другими процессами (веса моделей,
+  загруженные до fork, код библиотек);
+- PSS - private плюс доля shared, делённая между процессами; сумма PSS
+  по процессам - реальный расход.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+_PROC = Path("/proc")
+
+
+@dataclass
+class ProcessMemory:
+    """Память процесса в байтах"""
+    pid: int
+    name: str
+    rss: int
+    pss: int
+    shared: int
+    private: int
+
+
+def parse_smaps(text: str) -> Dict[str, int]:
+    """
+    Суммирует поля smaps или smaps_rollup
+
+    Returns:
+        Поле (Rss, Pss, Shared_Clean, ...) -> байты
+    """
+    totals: Dict[str, int] = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(":")
+        parts = value.split()
+        if len(parts) == 2 and parts[1] == "kB" and parts[0].isdigit():
+            totals[name] = totals.get(name, 0) + int(parts[0]) * 1024
+    return totals
+
+
+def read_process_memory(pid: int) -> ProcessMemory:
+    """Память процесса из smaps_rollup (до Linux 4.14 - сумма по smaps)"""
+    proc = _PROC / str(pid)
+    rollup = proc / "smaps_rollup"
+    fields = parse_smaps((rollup if rollup.exists() else proc / "smaps").read_text())
+    try:
+        name = (proc / "comm").read_text().strip()
+    except OSError:
+        name = "?"
+    return ProcessMemory(
+        pid=pid,
+        name=name,
+        rss=fields.get("Rss", 0),
+        pss=fields.get("Pss", 0),
+        shared=fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        private=fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    )
+
+
+def child_pids(pid: int) -> List[int]:
+    """Прямые потомки процесса"""
+    children: List[int] = []
+    for task in (_PROC / str(pid) / "task").glob("*/children"):
+        children.extend(int(child) for child in task.read_text().split())
+    return children
+
+
+def process_tree_memory(pid: int) -> List[ProcessMemory]:
+    """Память процесса и всех его потомков (главный процесс первым)"""
+    result, queue = [], [pid]
+    while queue:
+        current = queue.pop(0)
+        try:
+            result.append(read_process_memory(current))
+            queue.extend(child_pids(current))
+        except OSError:
+            # Процесс завершился во время обхода или недоступен
+            continue
+    return result
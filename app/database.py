@@ -27,4 +27,11 @@ async def get_async_session() -> AsyncSession:
         await create_pool(settings.DATABASE_URL)
     
     async with async_session_pool() as session:
-        yield session 
\ No newline at end of file
+        yield session 
+
+async def close_pool() -> None:
+    """Закрывает соединения пула (остановка процесса)"""
+    global async_session_pool
+    if async_session_pool is not None:
+        await async_session_pool.kw["bind"].dispose()
+        async_session_pool = None
@@ -34,12 +34,14 @@ class AIData(Base):
     
     # Основные поля
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), nullable=False, index=True)
+    # Пусто для вызовов вне контекста пользователя (фоновые задачи)
+    user_id: Mapped[Optional[int]] = mapped_column(BigInteger, ForeignKey("users.id"), nullable=True, index=True)
     
     # Связанные объекты
     event_id: Mapped[Optional[int]] = mapped_column(BigInteger, ForeignKey("events.id"), nullable=True, index=True)
-    client_id: Mapped[Optional[int]] = mapped_column(BigInteger, ForeignKey("clients.id"), nullable=True, index=True)
-    property_id: Mapped[Optional[int]] = mapped_column(BigInteger, ForeignKey("properties.id"), nullable=True, index=True)
+    # Модели клиентов и объектов в упрощённой схеме отключены - связи только по id
+    client_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True)
+    property_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True)
     
     # Тип обработки
     processing_type: Mapped[AIProcessingType] = mapped_column(Enum(AIProcessingType), nullable=False, index=True)
@@ -71,10 +73,8 @@ class AIData(Base):
     )
     
     # Отношения
-    user: Mapped["User"] = relationship("User", back_populates="ai_data")
+    user: Mapped[Optional["User"]] = relationship("User")
     event: Mapped[Optional["Event"]] = relationship("Event")
-    client: Mapped[Optional["Client"]] = relationship("Client")
-    property_obj: Mapped[Optional["Property"]] = relationship("Property")
     
     def __repr__(self) -> str:
         return f"<AIData(id={self.id}, type={self.processing_type.value}, provider={self.provider.value})>"
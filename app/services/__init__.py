@@ -1,4 +1,9 @@
-from .ai_service import AIService
-from .user_service import get_or_create_user
+from app.core.lazy_import import lazy_exports
 
 __all__ = ["AIService", "get_or_create_user"]
+
+# Импорт app.services.<модуль> не загружает AI клиентов
+__getattr__ = lazy_exports(__name__, {
+    "AIService": ".ai_service",
+    "get_or_create_user": ".user_service",
+})
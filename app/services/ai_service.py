@@ -3,11 +3,8 @@
 Только распознавание речи и текста
 """
 import logging
-from typing import Dict, Any
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 
-from app.ai.speech.whisper_client import WhisperClient
-from app.ai.vision.ocr_client import OCRClient
-from app.ai.nlp.gpt_client import GPTClient
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -16,8 +13,11 @@ class AIService:
     """Упрощённый AI сервис"""
     
     def __init__(self):
-        # Инициализируем только нужные компоненты
+        # Инициализируем только нужные компоненты; модули клиентов
+        # (OpenCV, openai, стек torch) импортируются здесь, а не при импорте обработчиков
         try:
+            from app.ai.speech.whisper_client import WhisperClient
+
             self.whisper_client = WhisperClient()
             logger.info("Whisper client initialized")
         except Exception as e:
@@ -25,6 +25,8 @@ class AIService:
             self.whisper_client = None
             
         try:
+            from app.ai.vision.ocr_client import OCRClient
+
             self.ocr_client = OCRClient()
             logger.info("OCR client initialized")
         except Exception as e:
@@ -33,6 +35,8 @@ class AIService:
             
         try:
             if settings.OPENAI_API_KEY and settings.OPENAI_API_KEY != "your-openai-api-key-here":
+                from app.ai.nlp.gpt_client import GPTClient
+
                 self.gpt_client = GPTClient(settings.OPENAI_API_KEY)
                 logger.info("GPT client initialized")
             else:
@@ -42,14 +46,14 @@ class AIService:
             logger.warning(f"GPT client not available: {e}")
             self.gpt_client = None
 
-    async def process_voice(self, file_path: str) -> Dict[str, Any]:
-        """Обработка голосового сообщения"""
+    async def process_voice(self, audio: Union[str, bytes]) -> Dict[str, Any]:
+        """Обработка голосового сообщения (путь к файлу или байты)"""
         try:
             # Распознавание речи
             if not self.whisper_client:
                 return {"error": "Whisper client not available"}
                 
-            transcribed_text = await self.whisper_client.transcribe_audio(file_path)
+            transcribed_text = await self.whisper_client.transcribe(audio)
             
             if not transcribed_text:
                 return {"error": "Не удалось распознать речь"}
@@ -62,14 +66,53 @@ class AIService:
             logger.error(f"Voice processing error: {e}")
             return {"error": str(e)}
 
-    async def process_image(self, file_path: str) -> Dict[str, Any]:
-        """Обработка изображения"""
+    async def process_voice_stream(
+        self,
+        audio: Union[str, bytes],
+        file_unique_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Потоковая обработка голосового сообщения с частичными результатами"""
+        try:
+            if not self.whisper_client:
+                yield {"error": "Whisper client not available"}
+                return
+            
+            parts = []
+            async for segment in self.whisper_client.transcribe_stream(audio, file_unique_id):
+                if segment["text"]:
+                    parts.append(segment["text"])
+                done = segment["index"] + 1 == segment["total"]
+                transcribed_text = " ".join(parts)
+                
+                if done and not transcribed_text:
+                    yield {"error": "Не удалось распознать речь"}
+                    return
+                
+                yield {
+                    "transcribed_text": transcribed_text,
+                    "progress": (segment["index"] + 1, segment["total"]),
+                    "done": done
+                }
+                
+        except Exception as e:
+            logger.error(f"Voice stream processing error: {e}")
+            yield {"error": str(e)}
+
+    async def process_image(
+        self,
+        image: Union[str, bytes],
+        file_unique_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Обработка изображения (путь к файлу или байты)"""
         try:
             # OCR обработка
             if not self.ocr_client:
                 return {"error": "OCR client not available"}
-                
-            ocr_result = await self.ocr_client.extract_text_from_image(file_path)
+            
+            if isinstance(image, (bytes, bytearray)):
+                ocr_result = await self.ocr_client.extract_text_from_bytes(image, file_unique_id=file_unique_id)
+            else:
+                ocr_result = await self.ocr_client.extract_text_from_image(image)
             extracted_text = ocr_result.get("text", "") if isinstance(ocr_result, dict) else str(ocr_result)
             
             if not extracted_text:
@@ -82,4 +125,33 @@ class AIService:
             
         except Exception as e:
             logger.error(f"Image processing error: {e}")
+            return {"error": str(e)}
+    
+    async def process_image_batch(
+        self,
+        images: List[bytes],
+        file_unique_ids: Optional[List[Optional[str]]] = None
+    ) -> Dict[str, Any]:
+        """Обработка нескольких изображений (альбом) одним пакетом OCR"""
+        try:
+            if not self.ocr_client:
+                return {"error": "OCR client not available"}
+            
+            ocr_results = await self.ocr_client.extract_text_batch(images, file_unique_ids)
+            texts = [result.get("text", "") for result in ocr_results]
+            
+            # Текст всех изображений - один вход для извлечения события
+            extracted_text = "\n\n".join(text for text in texts if text)
+            if not extracted_text:
+                return {"error": "Не удалось извлечь текст из изображений"}
+            
+            return {
+                "extracted_text": extracted_text,
+                "ocr_results": ocr_results,
+                "images_count": len(images),
+                "recognized_count": sum(1 for text in texts if text)
+            }
+            
+        except Exception as e:
+            logger.error(f"Image batch processing error: {e}")
             return {"error": str(e)} 
\ No newline at end of file
@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from datetime import datetime, date
 
+from app.ai.embeddings.indexer import schedule_event_indexing, schedule_event_removal
 from app.models.event import Event
 from app.models.user import User
 
@@ -57,6 +58,7 @@ class CalendarService:
         session.add(new_event)
         await session.commit()
         await session.refresh(new_event)
+        schedule_event_indexing(new_event)
         
         return new_event
     
@@ -87,6 +89,7 @@ class CalendarService:
         event.updated_at = datetime.utcnow()
         await session.commit()
         await session.refresh(event)
+        schedule_event_indexing(event)
         
         return event
     
@@ -111,6 +114,7 @@ class CalendarService:
         
         await session.delete(event)
         await session.commit()
+        schedule_event_removal(event_id, user_id)
         
         return True
     
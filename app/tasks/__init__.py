@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 from app.config import settings
 
 # Создаем Celery приложение
@@ -30,9 +31,36 @@ celery_app.conf.update(
             'task': 'app.tasks.notification_tasks.send_event_reminders',
             'schedule': 60.0,  # каждую минуту
         },
+        # Бот обрабатывает медиа в памяти, временные файлы остаются
+        # только от фоновых задач - достаточно суточной очистки
         'cleanup-old-files': {
             'task': 'app.tasks.cleanup_tasks.cleanup_old_temp_files',
-            'schedule': 3600.0,  # каждый час
+            'schedule': 86400.0,  # раз в сутки
         },
     }
 )
+
+
+@worker_init.connect
+def preload_models(**kwargs):
+    """Загружает AI модели в главном процессе воркера до fork (AI_PRELOAD_BEFORE_FORK)"""
+    if settings.AI_PRELOAD_BEFORE_FORK:
+        from app.ai.model_registry import model_registry
+        model_registry.preload(settings.AI_WARMUP_MODELS)
+
+
+@worker_process_init.connect
+def warmup_models(**kwargs):
+    """Готовит процесс воркера: модели из главного процесса или своя предзагрузка"""
+    from app.ai.model_registry import model_registry
+    if settings.AI_PRELOAD_BEFORE_FORK:
+        model_registry.after_fork(settings.AI_WORKER_TORCH_THREADS)
+    elif settings.AI_WARMUP_ON_STARTUP:
+        model_registry.warmup(settings.AI_WARMUP_MODELS)
+
+
+@worker_process_shutdown.connect
+def stop_task_runtime(**kwargs):
+    """Сбрасывает буферы и закрывает подключения event loop процесса воркера"""
+    from app.tasks.runtime import task_runtime
+    task_runtime.stop()
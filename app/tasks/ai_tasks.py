@@ -1,12 +1,26 @@
 import logging
-import asyncio
 from typing import Dict, Any, Optional
 from pathlib import Path
 
 from celery import shared_task
 
+from app.tasks.runtime import task_runtime
+
 logger = logging.getLogger(__name__)
 
+
+async def _with_usage_ledger(coro, telegram_id: Optional[int] = None):
+    """
+    Выполняет задачу в контексте пользователя журнала расхода AI
+
+    Буфер журнала сбрасывается по таймеру в loop среды выполнения
+    и при остановке процесса воркера.
+    """
+    from app.ai.usage_ledger import ai_usage_context
+
+    with ai_usage_context(telegram_id=telegram_id):
+        return await coro
+
 @shared_task(bind=True, name="process_voice_message")
 def process_voice_message(self, file_path: str, user_id: int, chat_id: int):
     """
@@ -18,18 +32,15 @@ def process_voice_message(self, file_path: str, user_id: int, chat_id: int):
             from app.ai.speech.whisper_client import WhisperClient
             from app.bot.handlers.text import EventManager
             from app.database import get_async_session
-            from aiogram import Bot
-            from app.config import settings
             
-            # Транскрибируем аудио
-            whisper = WhisperClient()
-            transcription = await whisper.transcribe_file(file_path)
+            # Транскрибируем аудио (клиент общий для задач процесса, модель - в реестре)
+            whisper = task_runtime.shared("whisper", WhisperClient)
+            text = await whisper.transcribe(file_path)
             
-            if not transcription or not transcription.get('text'):
+            if not text:
                 raise ValueError("Failed to transcribe audio")
             
-            text = transcription['text']
-            confidence = transcription.get('confidence', 0.8)
+            confidence = 0.8
             
             # Создаём событие из текста
             event_manager = EventManager()
@@ -37,8 +48,8 @@ def process_voice_message(self, file_path: str, user_id: int, chat_id: int):
                 result = await event_manager.process_text(text, user_id, session)
                 break
             
-            # Отправляем результат пользователю
-            bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+            # Отправляем результат пользователю (HTTP сессия бота общая для задач)
+            bot = task_runtime.bot
             
             message = f"🎤 <b>Голосовое сообщение обработано</b>\n\n"
             message += f"📝 <b>Распознанный текст:</b>\n{text}\n\n"
@@ -54,7 +65,6 @@ def process_voice_message(self, file_path: str, user_id: int, chat_id: int):
                 text=message,
                 parse_mode="HTML"
             )
-            await bot.session.close()
             
             # Удаляем временный файл
             try:
@@ -70,21 +80,16 @@ def process_voice_message(self, file_path: str, user_id: int, chat_id: int):
             
             # Уведомляем пользователя об ошибке
             try:
-                from aiogram import Bot
-                from app.config import settings
-                
-                bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-                await bot.send_message(
+                await task_runtime.bot.send_message(
                     chat_id=chat_id,
                     text="❌ Не удалось обработать голосовое сообщение. Попробуйте ещё раз."
                 )
-                await bot.session.close()
             except Exception:
                 pass
             
             raise self.retry(countdown=60, max_retries=2)
     
-    return asyncio.run(_process())
+    return task_runtime.run(_with_usage_ledger(_process(), telegram_id=user_id))
 
 @shared_task(bind=True, name="process_image_ocr")
 def process_image_ocr(self, image_path: str, user_id: int, chat_id: int):
@@ -97,12 +102,11 @@ def process_image_ocr(self, image_path: str, user_id: int, chat_id: int):
             from app.ai.vision.ocr_client import OCRClient
             from app.bot.handlers.text import EventManager
             from app.database import get_async_session
-            from aiogram import Bot
-            from app.config import settings
             
-            # Извлекаем текст из изображения
-            ocr = OCRClient()
-            extracted_text = await ocr.extract_text(image_path)
+            # Извлекаем текст из изображения (клиент общий для задач процесса, reader - в реестре)
+            ocr = task_runtime.shared("ocr", OCRClient)
+            ocr_result = await ocr.extract_text_from_image(image_path)
+            extracted_text = ocr_result.get("text", "")
             
             if not extracted_text:
                 raise ValueError("No text found in image")
@@ -114,7 +118,7 @@ def process_image_ocr(self, image_path: str, user_id: int, chat_id: int):
                 break
             
             # Отправляем результат
-            bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+            bot = task_runtime.bot
             
             message = f"📸 <b>Изображение обработано</b>\n\n"
             message += f"📝 <b>Распознанный текст:</b>\n{extracted_text}\n\n"
@@ -129,7 +133,6 @@ def process_image_ocr(self, image_path: str, user_id: int, chat_id: int):
                 text=message,
                 parse_mode="HTML"
             )
-            await bot.session.close()
             
             # Удаляем временный файл
             try:
@@ -145,21 +148,16 @@ def process_image_ocr(self, image_path: str, user_id: int, chat_id: int):
             
             # Уведомляем об ошибке
             try:
-                from aiogram import Bot
-                from app.config import settings
-                
-                bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-                await bot.send_message(
+                await task_runtime.bot.send_message(
                     chat_id=chat_id,
                     text="❌ Не удалось распознать текст в изображении. Попробуйте более чёткое фото."
                 )
-                await bot.session.close()
             except Exception:
                 pass
             
             raise self.retry(countdown=60, max_retries=2)
     
-    return asyncio.run(_process())
+    return task_runtime.run(_with_usage_ledger(_process(), telegram_id=user_id))
 
 @shared_task(name="analyze_user_patterns")
 def analyze_user_patterns(user_id: int):
@@ -169,12 +167,12 @@ def analyze_user_patterns(user_id: int):
     """
     async def _analyze():
         try:
-            from app.ai.embeddings.vector_service import VectorSearchService
+            from app.ai.embeddings.vector_service import get_vector_service
             from app.database import get_async_session
             from sqlalchemy import select
             from app.models.user import User
             
-            vector_service = VectorSearchService()
+            vector_service = get_vector_service()
             
             # Анализируем паттерны событий
             patterns = await vector_service.analyze_event_patterns(user_id)
@@ -198,7 +196,7 @@ def analyze_user_patterns(user_id: int):
             logger.error(f"Pattern analysis error: {e}")
             return {}
     
-    return asyncio.run(_analyze())
+    return task_runtime.run(_analyze())
 
 @shared_task(name="smart_event_suggestions")
 def smart_event_suggestions(user_id: int, text: str):
@@ -207,9 +205,9 @@ def smart_event_suggestions(user_id: int, text: str):
     """
     async def _suggest():
         try:
-            from app.ai.embeddings.vector_service import VectorSearchService
+            from app.ai.embeddings.vector_service import get_vector_service
             
-            vector_service = VectorSearchService()
+            vector_service = get_vector_service()
             suggestions = await vector_service.suggest_related_events(text, user_id)
             
             logger.info(f"Generated {len(suggestions)} suggestions for user {user_id}")
@@ -219,7 +217,7 @@ def smart_event_suggestions(user_id: int, text: str):
             logger.error(f"Suggestions generation error: {e}")
             return []
     
-    return asyncio.run(_suggest())
+    return task_runtime.run(_suggest())
 
 @shared_task(name="semantic_search_events")
 def semantic_search_events(user_id: int, query: str, limit: int = 5):
@@ -228,9 +226,9 @@ def semantic_search_events(user_id: int, query: str, limit: int = 5):
     """
     async def _search():
         try:
-            from app.ai.embeddings.vector_service import VectorSearchService
+            from app.ai.embeddings.vector_service import get_vector_service
             
-            vector_service = VectorSearchService()
+            vector_service = get_vector_service()
             results = await vector_service.search_similar_events(
                 query=query,
                 user_id=user_id,
@@ -244,4 +242,24 @@ def semantic_search_events(user_id: int, query: str, limit: int = 5):
             logger.error(f"Semantic search error: {e}")
             return []
     
-    return asyncio.run(_search()) 
\ No newline at end of file
+    return task_runtime.run(_search())
+
+@shared_task(name="hybrid_search_events")
+def hybrid_search_events(user_id: int, query: str, limit: int = 10):
+    """
+    Выполняет гибридный (полнотекстовый + семантический) поиск по событиям пользователя
+    """
+    async def _search():
+        try:
+            from app.ai.embeddings.hybrid_search import hybrid_search_service
+            
+            results = await hybrid_search_service.search(query=query, user_id=user_id, limit=limit)
+            
+            logger.info(f"Hybrid search returned {len(results)} results for user {user_id}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Hybrid search error: {e}")
+            return []
+    
+    return task_runtime.run(_search())
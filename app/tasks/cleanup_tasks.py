@@ -6,6 +6,8 @@ from typing import List
 from celery import shared_task
 from pathlib import Path
 
+from app.tasks.runtime import task_runtime
+
 logger = logging.getLogger(__name__)
 
 @shared_task(name="cleanup_old_temp_files")
@@ -80,7 +82,6 @@ def optimize_database():
     """
     Выполняет оптимизацию базы данных
     """
-    import asyncio
     from sqlalchemy import text
     from app.database import get_async_session
     
@@ -100,14 +101,13 @@ def optimize_database():
             logger.error(f"Database optimization failed: {e}")
             raise
     
-    return asyncio.run(_optimize())
+    return task_runtime.run(_optimize())
 
 @shared_task(name="generate_analytics_cache")
 def generate_analytics_cache():
     """
     Предварительно генерирует кэш для аналитики
     """
-    import asyncio
     from app.services.analytics_service import AnalyticsService
     
     async def _generate_cache():
@@ -123,4 +123,4 @@ def generate_analytics_cache():
         except Exception as e:
             logger.error(f"Analytics cache generation failed: {e}")
     
-    return asyncio.run(_generate_cache()) 
\ No newline at end of file
+    return task_runtime.run(_generate_cache()) 
\ No newline at end of file
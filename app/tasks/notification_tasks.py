@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_async_session
 from app.models.event import Event
 from app.models.user import User
+from app.tasks.runtime import task_runtime
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +19,6 @@ def send_event_reminders(self):
     Отправляет напоминания о предстоящих событиях
     Аналог уведомлений в Dola.ai
     """
-    import asyncio
-    
     async def _send_reminders():
         try:
             async for session in get_async_session():
@@ -58,18 +57,14 @@ def send_event_reminders(self):
             logger.error(f"Error in send_event_reminders: {e}")
             raise self.retry(countdown=60, max_retries=3)
     
-    # Запускаем async функцию
-    asyncio.run(_send_reminders())
+    # Запускаем в event loop процесса воркера
+    task_runtime.run(_send_reminders())
 
 @shared_task(name="send_single_reminder")
 def send_single_reminder(event_id: int):
     """
     Отправляет одно напоминание о событии
     """
-    import asyncio
-    from aiogram import Bot
-    from app.config import settings
-    
     async def _send_reminder():
         try:
             async for session in get_async_session():
@@ -108,14 +103,12 @@ def send_single_reminder(event_id: int):
                 
                 message += f"\n💡 Не забудьте подготовиться к встрече!"
                 
-                # Отправляем через бота
-                bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-                await bot.send_message(
+                # Отправляем через бота (HTTP сессия общая для задач процесса)
+                await task_runtime.bot.send_message(
                     chat_id=event.user.telegram_id,
                     text=message,
                     parse_mode="HTML"
                 )
-                await bot.session.close()
                 
                 logger.info(f"Reminder sent for event {event_id}")
                 break
@@ -124,7 +117,7 @@ def send_single_reminder(event_id: int):
             logger.error(f"Error sending reminder for event {event_id}: {e}")
             raise
     
-    asyncio.run(_send_reminder())
+    task_runtime.run(_send_reminder())
 
 @shared_task(name="send_daily_schedule") 
 def send_daily_schedule(user_id: int):
@@ -132,10 +125,6 @@ def send_daily_schedule(user_id: int):
     Отправляет ежедневное расписание пользователю
     Аналог daily digest в Dola.ai
     """
-    import asyncio
-    from aiogram import Bot
-    from app.config import settings
-    
     async def _send_schedule():
         try:
             async for session in get_async_session():
@@ -174,14 +163,12 @@ def send_daily_schedule(user_id: int):
                 
                 message += f"\n✨ Продуктивного дня!"
                 
-                # Отправляем через бота
-                bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-                await bot.send_message(
+                # Отправляем через бота (HTTP сессия общая для задач процесса)
+                await task_runtime.bot.send_message(
                     chat_id=user.telegram_id,
                     text=message,
                     parse_mode="HTML"
                 )
-                await bot.session.close()
                 
                 logger.info(f"Daily schedule sent to user {user_id}")
                 break
@@ -189,7 +176,7 @@ def send_daily_schedule(user_id: int):
         except Exception as e:
             logger.error(f"Error sending daily schedule to user {user_id}: {e}")
     
-    asyncio.run(_send_schedule())
+    task_runtime.run(_send_schedule())
 
 @shared_task(name="process_ai_task")
 def process_ai_task(task_type: str, data: dict):
@@ -197,21 +184,19 @@ def process_ai_task(task_type: str, data: dict):
     Обрабатывает AI задачи асинхронно
     Для тяжелых операций вроде OCR, больших аудио файлов
     """
-    import asyncio
-    
     async def _process_ai():
         try:
             if task_type == "speech_to_text":
                 from app.ai.speech.whisper_client import WhisperClient
                 
-                whisper = WhisperClient()
+                whisper = task_runtime.shared("whisper", WhisperClient)
                 result = await whisper.transcribe_file(data['file_path'])
                 return result
                 
             elif task_type == "ocr_processing":
                 from app.ai.vision.ocr_client import OCRClient
                 
-                ocr = OCRClient()
+                ocr = task_runtime.shared("ocr", OCRClient)
                 result = await ocr.extract_text(data['image_path'])
                 return result
                 
@@ -220,7 +205,7 @@ def process_ai_task(task_type: str, data: dict):
                 from app.config import settings
                 
                 if settings.OPENAI_API_KEY:
-                    gpt = GPTClient(settings.OPENAI_API_KEY)
+                    gpt = task_runtime.shared("gpt", lambda: GPTClient(settings.OPENAI_API_KEY))
                     result = await gpt.parse_calendar_event(data['text'])
                     return result
                 
@@ -231,4 +216,4 @@ def process_ai_task(task_type: str, data: dict):
             logger.error(f"Error processing AI task {task_type}: {e}")
             raise
     
-    return asyncio.run(_process_ai()) 
\ No newline at end of file
+    return task_runtime.run(_process_ai()) 
\ No newline at end of file
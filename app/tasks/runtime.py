@@ -0,0 +1,200 @@
+"""
+Асинхронная среда выполнения задач Celery
+
+Задачи Celery синхронные, а код приложения асинхронный. asyncio.run
+в каждой задаче создаёт новый event loop, и всё, что к нему
+привязано, приходится создавать заново: соединения с базой, HTTP
+сессию бота, подключение к Redis. Пул соединений, созданный в loop
+прошлой задачи, в новом loop вообще неработоспособен.
+
+TaskRuntime держит один event loop на процесс воркера в отдельном
+потоке; задача отправляет в него корутину и ждёт результат. Между
+задачами в loop живут:
+- пул соединений с базой (app.database);
+- бот Telegram с одной HTTP сессией (task_runtime.bot);
+- подключение к Redis (cache_service);
+- фоновые сбросы журнала расхода AI и очереди индексации;
+- клиенты AI (task_runtime.shared), модели - в реестре процесса.
+
+Loop создаётся при первой задаче процесса (после fork - заново) и
+закрывается сигналом worker_process_shutdown.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.config import settings
+from app.core.logging import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def setup_resources() -> None:
+    """Подключения процесса воркера, создаваемые в loop среды"""
+    from app.ai.usage_ledger import ai_usage_ledger
+    from app.core.cache import cache_service
+
+    await cache_service.connect()
+    # Журнал сбрасывается по таймеру, а не в конце каждой задачи
+    ai_usage_ledger.start()
+
+
+async def teardown_resources() -> None:
+    """Сбрасывает буферы и закрывает подключения процесса воркера"""
+    from app import database
+    from app.ai.embeddings.indexer import event_indexer
+    from app.ai.usage_ledger import ai_usage_ledger
+    from app.core.cache import cache_service
+
+    await event_indexer.stop()
+    await ai_usage_ledger.stop()
+    await cache_service.disconnect()
+    await database.close_pool()
+
+
+class TaskRuntime:
+    """Event loop процесса воркера и общие для задач ресурсы"""
+
+    def __init__(
+        self,
+        setup: Optional[Callable[[], Awaitable[None]]] = setup_resources,
+        teardown: Optional[Callable[[], Awaitable[None]]] = teardown_resources
+    ):
+        """
+        Args:
+            setup: Корутина подготовки ресурсов при запуске loop
+            teardown: Корутина освобождения ресурсов при остановке
+        """
+        self._setup = setup
+        self._teardown = teardown
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._shared: Dict[str, Any] = {}
+        self._bot: Any = None
+        self.tasks = 0
+
+    @property
+    def running(self) -> bool:
+        """Loop запущен в этом процессе (поток главного процесса после fork не существует)"""
+        return (
+            self._loop is not None
+            and self._pid == os.getpid()
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def start(self) -> None:
+        """Запускает loop процесса, если он ещё не запущен"""
+        with self._lock:
+            if self.running:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=self._run_loop, args=(loop,), name="task-runtime", daemon=True)
+            thread.start()
+            self._loop, self._thread, self._pid = loop, thread, os.getpid()
+            # Ресурсы, унаследованные при fork, привязаны к чужому loop
+            self._shared = {}
+            self._bot = None
+
+        if self._setup is not None:
+            try:
+                self._submit(self._setup()).result()
+            except Exception as e:
+                logger.warning(f"Task runtime setup failed: {e}")
+        logger.info(f"Task runtime started in process {self._pid}")
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def _submit(self, coro: Awaitable[T]):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Выполняет корутину задачи в loop процесса
+
+        Args:
+            coro: Корутина задачи
+            timeout: Таймаут ожидания в секундах (по умолчанию без ограничения)
+
+        Returns:
+            Результат корутины; исключения (в том числе Retry) пробрасываются
+        """
+        self.start()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("TaskRuntime.run() called from the runtime loop")
+
+        started_at = time.perf_counter()
+        future = self._submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+        finally:
+            self.tasks += 1
+            metrics.timer("celery.task.async_time", time.perf_counter() - started_at)
+
+    def shared(self, name: str, factory: Callable[[], T]) -> T:
+        """
+        Объект, общий для задач процесса (клиенты AI, сервисы)
+
+        Args:
+            name: Имя объекта
+            factory: Создаёт объект при первом обращении
+
+        Returns:
+            Один и тот же объект до остановки или fork
+        """
+        with self._lock:
+            if name not in self._shared:
+                self._shared[name] = factory()
+            return self._shared[name]
+
+    @property
+    def bot(self) -> Any:
+        """Бот Telegram с одной HTTP сессией на процесс"""
+        if self._bot is None:
+            from aiogram import Bot
+
+            self._bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+        return self._bot
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Освобождает ресурсы и останавливает loop процесса"""
+        if not self.running:
+            return
+        loop, thread = self._loop, self._thread
+        try:
+            self._submit(self._close_resources()).result(timeout)
+        except Exception as e:
+            logger.warning(f"Task runtime teardown failed: {e}")
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        loop.close()
+        with self._lock:
+            self._loop = self._thread = self._pid = None
+            self._shared = {}
+        logger.info(f"Task runtime stopped after {self.tasks} tasks")
+
+    async def _close_resources(self) -> None:
+        if self._bot is not None:
+            await self._bot.session.close()
+            self._bot = None
+        if self._teardown is not None:
+            await self._teardown()
+
+
+# Среда выполнения задач процесса воркера
+task_runtime = TaskRuntime()
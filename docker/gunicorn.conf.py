@@ -0,0 +1,32 @@
+"""
+Конфигурация gunicorn для API (воркеры uvicorn)
+
+preload_app загружает приложение в главном процессе до fork. При
+AI_PRELOAD_BEFORE_FORK туда же загружаются модели AI_WARMUP_MODELS -
+воркеры делят их веса copy-on-write (scripts/memory_report.py
+показывает общую и собственную память воркеров).
+
+Запуск:
+    gunicorn -c docker/gunicorn.conf.py app.main:app
+"""
+import os
+
+from app.config import settings
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+
+def on_starting(server):
+    if settings.AI_PRELOAD_BEFORE_FORK:
+        from app.ai.model_registry import model_registry
+        model_registry.preload(settings.AI_WARMUP_MODELS)
+
+
+def post_fork(server, worker):
+    if settings.AI_PRELOAD_BEFORE_FORK:
+        from app.ai.model_registry import model_registry
+        model_registry.after_fork(settings.AI_WORKER_TORCH_THREADS)
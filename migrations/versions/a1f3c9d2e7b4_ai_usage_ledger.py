@@ -0,0 +1,33 @@
+"""AI usage ledger
+
+Revision ID: a1f3c9d2e7b4
+Revises: 40ddcc91c5b7, add_notification_fields
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1f3c9d2e7b4'
+down_revision: Union[str, Sequence[str], None] = ('40ddcc91c5b7', 'add_notification_fields')
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Журнал расхода AI пишет и вызовы без пользователя (фоновые задачи)
+    op.alter_column('ai_data', 'user_id', existing_type=sa.BigInteger(), nullable=True)
+    # Сводки расхода по провайдерам и пользователям за период
+    op.create_index('ix_ai_data_provider_created_at', 'ai_data', ['provider', 'created_at'])
+    op.create_index('ix_ai_data_user_id_created_at', 'ai_data', ['user_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_data_user_id_created_at', table_name='ai_data')
+    op.drop_index('ix_ai_data_provider_created_at', table_name='ai_data')
+    op.execute("DELETE FROM ai_data WHERE user_id IS NULL")
+    op.alter_column('ai_data', 'user_id', existing_type=sa.BigInteger(), nullable=False)
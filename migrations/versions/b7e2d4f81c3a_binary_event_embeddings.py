@@ -0,0 +1,96 @@
+"""binary event embeddings
+
+Revision ID: b7e2d4f81c3a
+Revises: a1f3c9d2e7b4
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4f81c3a'
+down_revision: Union[str, None] = 'a1f3c9d2e7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# Формат эмбеддинга зафиксирован на момент миграции, без импорта кода приложения:
+# первый байт - тег, далее компоненты little-endian (int8 - с масштабом float32)
+_FLOAT16_TAG = 2
+_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2"), 3: np.dtype("i1")}
+_SCALE_DTYPE = np.dtype("<f4")
+
+
+def _encode(vector) -> bytes:
+    array = np.asarray(vector, dtype=np.float32).ravel()
+    return bytes([_FLOAT16_TAG]) + array.astype(_DTYPES[_FLOAT16_TAG]).tobytes()
+
+
+def _decode(data: bytes) -> np.ndarray:
+    view = memoryview(data)
+    tag = view[0]
+    if tag == 3:
+        scale = np.frombuffer(view, dtype=_SCALE_DTYPE, count=1, offset=1)[0]
+        return np.frombuffer(view, dtype=_DTYPES[3], offset=1 + _SCALE_DTYPE.itemsize).astype(np.float32) * scale
+    if tag not in _DTYPES:
+        raise ValueError(f"Unknown embedding format tag: {tag}")
+    return np.frombuffer(view, dtype=_DTYPES[tag], offset=1).astype(np.float32)
+
+
+def _convert(source: str, target: str, convert) -> None:
+    """Переносит эмбеддинги между колонками пачками по event_id"""
+    connection = op.get_bind()
+    select_batch = sa.text(
+        f"SELECT event_id, {source} AS value FROM event_embeddings "
+        f"WHERE event_id > :last_id AND {source} IS NOT NULL ORDER BY event_id LIMIT :limit"
+    )
+    update = sa.text(f"UPDATE event_embeddings SET {target} = :value WHERE event_id = :event_id")
+
+    last_id = 0
+    while True:
+        rows = connection.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        params = []
+        for event_id, value in rows:
+            try:
+                params.append({"event_id": event_id, "value": convert(value)})
+            except (ValueError, TypeError):
+                # Повреждённая строка остаётся пустой и будет переиндексирована
+                pass
+        if params:
+            connection.execute(update, params)
+        last_id = rows[-1][0]
+
+
+def _from_json(value: str) -> bytes:
+    vector = json.loads(value)
+    if not vector:
+        raise ValueError("empty embedding")
+    return _encode(vector)
+
+
+def _to_json(value: bytes) -> str:
+    return json.dumps(_decode(value).tolist())
+
+
+def upgrade() -> None:
+    # JSON строка -> байты float16 (формат по умолчанию EMBEDDING_STORAGE)
+    op.add_column('event_embeddings', sa.Column('embedding_bin', sa.LargeBinary(), nullable=True))
+    _convert('embedding', 'embedding_bin', _from_json)
+    op.drop_column('event_embeddings', 'embedding')
+    op.alter_column('event_embeddings', 'embedding_bin', new_column_name='embedding')
+
+
+def downgrade() -> None:
+    op.add_column('event_embeddings', sa.Column('embedding_json', sa.Text(), nullable=True))
+    _convert('embedding', 'embedding_json', _to_json)
+    op.drop_column('event_embeddings', 'embedding')
+    op.alter_column('event_embeddings', 'embedding_json', new_column_name='embedding')
@@ -0,0 +1,91 @@
+"""pgvector HNSW index for event embeddings
+
+Revision ID: c3d9a7e5b1f2
+Revises: b7e2d4f81c3a
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9a7e5b1f2'
+down_revision: Union[str, None] = 'b7e2d4f81c3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIMENSION = 384
+BATCH_SIZE = 1000
+
+# Формат двоичной колонки зафиксирован ревизией b7e2d4f81c3a, без импорта кода
+# приложения: первый байт - тег, далее компоненты little-endian (int8 - с масштабом)
+_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2"), 3: np.dtype("i1")}
+_SCALE_DTYPE = np.dtype("<f4")
+
+
+def _decode(data: bytes) -> np.ndarray:
+    view = memoryview(data)
+    tag = view[0]
+    if tag == 3:
+        scale = np.frombuffer(view, dtype=_SCALE_DTYPE, count=1, offset=1)[0]
+        return np.frombuffer(view, dtype=_DTYPES[3], offset=1 + _SCALE_DTYPE.itemsize).astype(np.float32) * scale
+    if tag not in _DTYPES:
+        raise ValueError(f"Unknown embedding format tag: {tag}")
+    return np.frombuffer(view, dtype=_DTYPES[tag], offset=1).astype(np.float32)
+
+
+def _vector_literal(vector: np.ndarray) -> str:
+    """Текст для CAST(:value AS vector)"""
+    return "[" + ",".join(f"{value:.7g}" for value in vector.ravel()) + "]"
+
+
+def _pgvector_available() -> bool:
+    connection = op.get_bind()
+    return connection.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")
+    ).scalar() is not None
+
+
+def upgrade() -> None:
+    # Без расширения (образ postgres без pgvector) поиск остаётся на faiss/numpy
+    if not _pgvector_available():
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.execute(f"ALTER TABLE event_embeddings ADD COLUMN IF NOT EXISTS embedding_vec vector({DIMENSION})")
+
+    # Заполняем из двоичной колонки пачками по event_id
+    connection = op.get_bind()
+    select_batch = sa.text(
+        "SELECT event_id, embedding FROM event_embeddings "
+        "WHERE event_id > :last_id AND embedding IS NOT NULL ORDER BY event_id LIMIT :limit"
+    )
+    update = sa.text(
+        "UPDATE event_embeddings SET embedding_vec = CAST(:value AS vector) WHERE event_id = :event_id"
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        connection.execute(update, [
+            {"event_id": event_id, "value": _vector_literal(_decode(value))}
+            for event_id, value in rows
+        ])
+        last_id = rows[-1][0]
+
+    # HNSW по косинусному расстоянию: строится без обучающей выборки
+    # и не деградирует при добавлении строк, в отличие от IVFFlat
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_event_embeddings_embedding_vec_hnsw ON event_embeddings "
+        "USING hnsw (embedding_vec vector_cosine_ops) WITH (m = 16, ef_construction = 64)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_event_embeddings_embedding_vec_hnsw")
+    op.execute("ALTER TABLE event_embeddings DROP COLUMN IF EXISTS embedding_vec")
@@ -0,0 +1,35 @@
+"""events full-text search vector
+
+Revision ID: d8f1b3c6a9e0
+Revises: c3d9a7e5b1f2
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f1b3c6a9e0'
+down_revision: Union[str, None] = 'c3d9a7e5b1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Вычисляемая колонка: обновляется самой базой при изменении события.
+    # Вес A - название, B - место (адреса), C - описание
+    op.execute("""
+        ALTER TABLE events ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(location, '')), 'B') ||
+            setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+        ) STORED
+    """)
+    op.create_index('ix_events_search_vector', 'events', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_search_vector', table_name='events')
+    op.drop_column('events', 'search_vector')
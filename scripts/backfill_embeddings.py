@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Индексация эмбеддингов всех существующих событий
+
+Читает events страницами по id, кодирует тексты пачками через батчер
+эмбеддингов и записывает event_embeddings через COPY во временную
+таблицу со слиянием (INSERT ... ON CONFLICT). События, текст которых
+не изменился с прошлой индексации, пропускаются (--force - кодировать
+все). Индексы FAISS затронутых пользователей удаляются и строятся
+заново при следующем поиске; запущенный бот увидит их после перезапуска.
+
+В конце - события в секунду и доля времени на кодирование и запись.
+
+Запуск:
+    PYTHONPATH=. python scripts/backfill_embeddings.py [--page-size 1000] [--force]
+"""
+import argparse
+import asyncio
+
+from app.ai.embeddings.indexer import BackfillStats, EventIndexer
+
+
+def _progress(stats: BackfillStats) -> None:
+    print(
+        f"  {stats.events:,} events, {stats.indexed:,} indexed, {stats.skipped:,} skipped, "
+        f"{stats.rate:,.0f} events/s",
+        flush=True
+    )
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    indexer = EventIndexer()
+    stats = await indexer.backfill(page_size=args.page_size, force=args.force, progress=_progress)
+
+    print(f"\nEvents:   {stats.events:,}")
+    print(f"Indexed:  {stats.indexed:,}")
+    print(f"Skipped:  {stats.skipped:,}")
+    print(f"Elapsed:  {stats.elapsed:.1f}s ({stats.rate:,.0f} events/s)")
+    print(f"Encoding: {stats.encode_time:.1f}s")
+    print(f"Writing:  {stats.write_time:.1f}s (COPY, overlaps encoding)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--force", action="store_true")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
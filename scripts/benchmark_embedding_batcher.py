@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Бенчмарк пакетного кодирования эмбеддингов
+
+Сравнивает пропускную способность SentenceTransformer при кодировании
+по одному тексту и пачками разного размера, а затем - EmbeddingBatcher
+при заданном числе одновременных запросов (как при индексации событий
+и поисковых запросах из бота).
+
+Тексты берутся из корпуса сообщений tests/fixtures/rule_parser_corpus.jsonl.
+
+Запуск:
+    PYTHONPATH=. python scripts/benchmark_embedding_batcher.py [--model NAME] [--texts N]
+        [--batch-sizes 1,4,8,16,32,64] [--concurrency 1,8,32,128] [--wait-ms 5]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+from app.ai.embeddings.batcher import EmbeddingBatcher
+from app.config import settings
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "rule_parser_corpus.jsonl"
+
+
+def _load_texts(path: Path, count: int) -> List[str]:
+    with path.open(encoding="utf-8") as f:
+        corpus = [json.loads(line)["text"] for line in f if line.strip()]
+    # Повторяем корпус с номером, чтобы тексты не совпадали
+    return [f"{corpus[i % len(corpus)]} #{i}" for i in range(count)]
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def bench_direct(batcher: EmbeddingBatcher, texts: List[str], batch_sizes: List[int]) -> None:
+    """Пропускная способность модели в зависимости от размера пачки"""
+    print(f"{'batch':>6} {'texts/s':>9} {'ms/text':>8} {'speedup':>8}")
+    baseline = None
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        for start in range(0, len(texts), batch_size):
+            batcher.encode_sync(texts[start:start + batch_size])
+        elapsed = time.perf_counter() - started
+        throughput = len(texts) / elapsed
+        baseline = baseline or throughput
+        print(f"{batch_size:>6} {throughput:>9.1f} {elapsed / len(texts) * 1000:>8.2f} {throughput / baseline:>7.1f}x")
+
+
+async def _client(batcher: EmbeddingBatcher, texts: List[str], latencies: List[float]) -> None:
+    for text in texts:
+        started = time.perf_counter()
+        await batcher.embed(text)
+        latencies.append(time.perf_counter() - started)
+
+
+async def bench_batcher(model_name: str, texts: List[str], concurrency: List[int], wait_ms: float) -> None:
+    """Пропускная способность и задержка запросов через EmbeddingBatcher"""
+    print(f"{'clients':>7} {'texts/s':>9} {'avg batch':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for clients in concurrency:
+        batcher = EmbeddingBatcher(model_name=model_name, max_wait_ms=wait_ms)
+        latencies: List[float] = []
+        started = time.perf_counter()
+        await asyncio.gather(*(_client(batcher, texts[i::clients], latencies) for i in range(clients)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        avg_batch = batcher.get_stats()["avg_batch_size"]
+        print(f"{clients:>7} {len(texts) / elapsed:>9.1f} {avg_batch:>10.1f} {p50:>8.1f} {p99:>8.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32, 128])
+    parser.add_argument("--wait-ms", type=float, default=settings.EMBEDDING_BATCH_WAIT_MS)
+    args = parser.parse_args()
+
+    texts = _load_texts(args.corpus, args.texts)
+    batcher = EmbeddingBatcher(model_name=args.model)
+    # Загрузка модели и прогрев не входят в замер
+    batcher.encode_sync(texts[:8])
+
+    print(f"Model: {args.model}, {len(texts)} texts\n")
+    print("SentenceTransformer.encode by batch size:")
+    bench_direct(batcher, texts, args.batch_sizes)
+    print(f"\nEmbeddingBatcher (batch <= {settings.EMBEDDING_BATCH_SIZE}, window {args.wait_ms} ms):")
+    asyncio.run(bench_batcher(args.model, texts, args.concurrency, args.wait_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Бенчмарк предобработки изображений для OCR
+
+Сравнивает время EasyOCR и точность распознавания символов
+(1 - расстояние Левенштейна / длина эталона) без предобработки
+и с разными конфигурациями PreprocessConfig.
+
+Набор скриншотов объявлений:
+    --fixtures DIR  изображения (*.png, *.jpg) и эталонный текст в одноимённых *.txt
+    без --fixtures  скриншоты генерируются в памяти (телефонное разрешение,
+                    часть с наклоном, как фото экрана)
+    --generate DIR  сохранить сгенерированный набор в каталог и выйти
+
+Запуск:
+    PYTHONPATH=. python scripts/benchmark_ocr_preprocessing.py [--fixtures DIR] [--repeat N]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.ai.vision.preprocessing import PreprocessConfig
+
+FONT_PATHS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+]
+
+LISTINGS = [
+    ["2-комн. квартира, 54 м²", "Цена 12 500 000 руб", "ул. Ленина, д. 10, этаж 5/9", "Показ завтра в 15:00"],
+    ["Студия 28 м²", "Аренда 45 000 руб/мес", "Москва, Профсоюзная 104", "Собственник, без комиссии"],
+    ["3-комн. квартира 86 м²", "Цена 21 900 000 руб", "Этаж 12/17, ремонт", "Звоните до 20:00"],
+    ["Дом 140 м², участок 8 соток", "Цена 9 300 000 руб", "Истра, КП Лесной", "Газ, свет, скважина"],
+    ["Офис 65 м²", "Аренда 180 000 руб/мес", "БЦ Омега, 3 этаж", "Просмотр в пятницу 11:30"],
+]
+
+VARIANTS: Dict[str, Optional[PreprocessConfig]] = {
+    "baseline": None,
+    "downscale": PreprocessConfig(grayscale=False, deskew=False, crop_text=False),
+    "default": PreprocessConfig(),
+    "threshold": PreprocessConfig(threshold=True),
+}
+
+
+def _load_font(size: int):
+    from PIL import ImageFont
+
+    for path in FONT_PATHS:
+        if Path(path).exists():
+            return ImageFont.truetype(path, size)
+    raise RuntimeError("No TrueType font with Cyrillic support found, use --fixtures")
+
+
+def generate_fixtures(count: int = 10, seed: int = 42) -> List[Tuple[str, np.ndarray, str]]:
+    """Синтетические скриншоты объявлений 1440x3040 с эталонным текстом"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    font = _load_font(64)
+    fixtures = []
+    for i in range(count):
+        lines = LISTINGS[i % len(LISTINGS)]
+        image = Image.new("RGB", (1440, 3040), (245, 245, 245))
+        draw = ImageDraw.Draw(image)
+        # Шапка приложения и «фото» объекта - нетекстовые области скриншота
+        draw.rectangle((0, 0, 1440, 180), fill=(40, 110, 200))
+        draw.rectangle((80, 300, 1360, 1100), fill=(rng.randint(90, 160), 140, 120))
+        top = 1250
+        for line in lines:
+            draw.text((100, top), line, font=font, fill=(20, 20, 20))
+            top += 120
+
+        array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        if i % 2:
+            # Фото экрана: небольшой наклон
+            angle = rng.uniform(-6, 6)
+            rotation = cv2.getRotationMatrix2D((720, 1520), angle, 1.0)
+            array = cv2.warpAffine(array, rotation, (1440, 3040), borderValue=(245, 245, 245))
+        fixtures.append((f"synthetic_{i:02d}", array, " ".join(lines)))
+    return fixtures
+
+
+def load_fixtures(directory: Path) -> List[Tuple[str, np.ndarray, str]]:
+    """Изображения и эталонный текст из каталога"""
+    fixtures = []
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() not in {".png", ".jpg", ".jpeg", ".webp"}:
+            continue
+        truth_path = path.with_suffix(".txt")
+        if not truth_path.exists():
+            print(f"skip {path.name}: no {truth_path.name}", file=sys.stderr)
+            continue
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        fixtures.append((path.stem, image, truth_path.read_text(encoding="utf-8")))
+    return fixtures
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def char_accuracy(predicted: str, truth: str) -> float:
+    predicted, truth = _normalize(predicted), _normalize(truth)
+    if not truth:
+        return 1.0 if not predicted else 0.0
+    return max(0.0, 1.0 - levenshtein(predicted, truth) / len(truth))
+
+
+def run(fixtures: List[Tuple[str, np.ndarray, str]], repeat: int) -> None:
+    from app.ai.vision.ocr_client import OCRClient
+
+    client = OCRClient()
+    # Прогрев: первая инференция включает инициализацию torch
+    client.preprocess = None
+    client._extract_text_sync(fixtures[0][1])
+
+    print(f"{len(fixtures)} images, {repeat} run(s) each\n")
+    print(f"{'variant':<12}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'char acc':>10}")
+    for name, config in VARIANTS.items():
+        client.preprocess = config
+        latencies, accuracies = [], []
+        for _, image, truth in fixtures:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = client._extract_text_sync(image)
+                latencies.append((time.perf_counter() - started) * 1000)
+            accuracies.append(char_accuracy(result["text"], truth))
+
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(
+            f"{name:<12}{statistics.median(latencies):>10.0f}{p95:>10.0f}"
+            f"{statistics.mean(latencies):>10.0f}{statistics.mean(accuracies):>10.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, help="Каталог с изображениями и эталонными *.txt")
+    parser.add_argument("--generate", type=Path, help="Сохранить синтетический набор в каталог")
+    parser.add_argument("--count", type=int, default=10, help="Размер синтетического набора")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов на изображение")
+    args = parser.parse_args()
+
+    if args.generate:
+        args.generate.mkdir(parents=True, exist_ok=True)
+        for name, image, truth in generate_fixtures(args.count):
+            cv2.imwrite(str(args.generate / f"{name}.png"), image)
+            (args.generate / f"{name}.txt").write_text(truth, encoding="utf-8")
+        print(f"Saved {args.count} fixtures to {args.generate}")
+        return
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else generate_fixtures(args.count)
+    if not fixtures:
+        sys.exit("No fixtures found")
+    run(fixtures, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
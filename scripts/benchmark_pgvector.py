@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+Бенчмарк поиска похожих событий в pgvector
+
+На синтетической таблице (по умолчанию 1 000 000 строк, 384 измерения,
+вектора сгруппированы в кластеры, как эмбеддинги похожих событий)
+сравнивает:
+- legacy - старый запрос: расстояние в SELECT и в WHERE с порогом;
+- exact - новый запрос top-k (ORDER BY distance LIMIT k, порог снаружи)
+  без ANN индекса, он же эталон для полноты;
+- hnsw - тот же запрос с индексом HNSW при разных hnsw.ef_search;
+- ivfflat - с индексом IVFFlat (lists = sqrt(N)) при разных ivfflat.probes.
+
+Для каждого варианта - задержка p50/p99 и полнота recall@k относительно
+exact, отдельно для поиска по всей таблице и с фильтром по пользователю.
+
+Нужна база с расширением vector (docker-compose: pgvector/pgvector:pg15).
+Таблица bench_event_embeddings создаётся заново и удаляется в конце
+(--keep - оставить).
+
+Запуск:
+    PYTHONPATH=. python scripts/benchmark_pgvector.py [--dsn DSN] [--rows 1000000] [--users 1000]
+        [--queries 50] [--k 10] [--ef-search 20,40,100,200] [--probes 1,4,16,32]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.ai.embeddings.codec import to_vector_literal
+from app.config import settings
+
+TABLE = "bench_event_embeddings"
+CHUNK_ROWS = 20000
+
+LEGACY_QUERY = f"""
+    SELECT id, 1 - (embedding <=> $1::vector) AS similarity
+    FROM {TABLE}
+    WHERE {{user_filter}} 1 - (embedding <=> $1::vector) > $2
+    ORDER BY similarity DESC
+    LIMIT $3
+"""
+
+TOP_K_QUERY = f"""
+    SELECT id, 1 - distance AS similarity
+    FROM (
+        SELECT id, embedding <=> $1::vector AS distance
+        FROM {TABLE}
+        WHERE {{user_filter}} TRUE
+        ORDER BY distance
+        LIMIT $3
+    ) nearest
+    WHERE 1 - distance > $2
+    ORDER BY distance
+"""
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def _dsn(url: str) -> str:
+    return url.replace("postgresql+asyncpg://", "postgresql://")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _centers(dim: int, clusters: int, seed: int) -> np.ndarray:
+    return _normalize(np.random.default_rng(seed).standard_normal((clusters, dim)).astype(np.float32))
+
+
+def _sample(centers: np.ndarray, count: int, rng: np.random.Generator, spread: float = 0.35) -> np.ndarray:
+    labels = rng.integers(0, len(centers), count)
+    noise = rng.standard_normal((count, centers.shape[1])).astype(np.float32) * spread / np.sqrt(centers.shape[1])
+    return _normalize(centers[labels] + noise)
+
+
+async def _copy_rows(connection, rows: int, users: int, centers: np.ndarray, seed: int) -> float:
+    """Заполняет таблицу COPY пачками по CHUNK_ROWS, возвращает время"""
+    rng = np.random.default_rng(seed)
+
+    async def chunks():
+        for start in range(0, rows, CHUNK_ROWS):
+            count = min(CHUNK_ROWS, rows - start)
+            vectors = _sample(centers, count, rng)
+            lines = [
+                f"{start + i + 1}\t{(start + i) % users + 1}\t{to_vector_literal(vector)}\n"
+                for i, vector in enumerate(vectors)
+            ]
+            yield "".join(lines).encode()
+            if (start // CHUNK_ROWS) % 10 == 0:
+                print(f"  {start + count:,} rows", flush=True)
+
+    started = time.perf_counter()
+    await connection.copy_to_table(TABLE, source=chunks(), columns=["id", "user_id", "embedding"], format="text")
+    return time.perf_counter() - started
+
+
+async def _run_queries(
+    connection,
+    sql: str,
+    queries: Sequence[Tuple[str, Optional[int]]],
+    k: int,
+    threshold: float,
+    settings_sql: Sequence[str] = ()
+) -> Tuple[List[float], List[Set[int]]]:
+    latencies, results = [], []
+    for vector, user_id in queries:
+        async with connection.transaction():
+            for statement in settings_sql:
+                await connection.execute(statement)
+            args = [vector, threshold, k] + ([user_id] if user_id is not None else [])
+            started = time.perf_counter()
+            rows = await connection.fetch(sql, *args)
+            latencies.append(time.perf_counter() - started)
+        results.append({row["id"] for row in rows})
+    return latencies, results
+
+
+def _format_sql(template: str, filtered: bool) -> str:
+    return template.format(user_filter="user_id = $4 AND" if filtered else "")
+
+
+def _report(name: str, latencies: List[float], results: List[Set[int]], truth: Optional[List[Set[int]]]) -> None:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    recall = ""
+    if truth is not None:
+        hits = sum(len(found & expected) for found, expected in zip(results, truth))
+        total = sum(len(expected) for expected in truth)
+        recall = f"{hits / total:.3f}" if total else "-"
+    print(f"{name:<28} {p50:>9.1f} {p99:>9.1f} {recall:>8}")
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    import asyncpg
+
+    connection = await asyncpg.connect(_dsn(args.dsn))
+    try:
+        await connection.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        await connection.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await connection.execute(
+            f"CREATE UNLOGGED TABLE {TABLE} (id bigint PRIMARY KEY, user_id bigint NOT NULL, "
+            f"embedding vector({args.dim}) NOT NULL)"
+        )
+
+        centers = _centers(args.dim, args.clusters, args.seed)
+        print(f"Loading {args.rows:,} rows ({args.users:,} users, {args.clusters} clusters)")
+        elapsed = await _copy_rows(connection, args.rows, args.users, centers, args.seed)
+        print(f"COPY: {elapsed:.1f}s, {args.rows / elapsed:,.0f} rows/s")
+        await connection.execute(f"CREATE INDEX ON {TABLE} (user_id)")
+        await connection.execute(f"ANALYZE {TABLE}")
+
+        rng = np.random.default_rng(args.seed + 1)
+        vectors = [to_vector_literal(vector) for vector in _sample(centers, args.queries, rng)]
+        modes: Dict[str, List[Tuple[str, Optional[int]]]] = {
+            "global": [(vector, None) for vector in vectors],
+            "user": [(vector, int(rng.integers(1, args.users + 1))) for vector in vectors],
+        }
+
+        print(f"\n{'query':<28} {'p50 ms':>9} {'p99 ms':>9} {'recall':>8}")
+        truth: Dict[str, List[Set[int]]] = {}
+        for mode, queries in modes.items():
+            filtered = mode == "user"
+            latencies, results = await _run_queries(
+                connection, _format_sql(LEGACY_QUERY, filtered), queries, args.k, args.threshold
+            )
+            _report(f"legacy/{mode}", latencies, results, None)
+            latencies, truth[mode] = await _run_queries(
+                connection, _format_sql(TOP_K_QUERY, filtered), queries, args.k, -1.0
+            )
+            _report(f"exact/{mode}", latencies, truth[mode], truth[mode])
+
+        started = time.perf_counter()
+        await connection.execute(
+            f"CREATE INDEX bench_hnsw ON {TABLE} USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64)"
+        )
+        print(f"\nHNSW build: {time.perf_counter() - started:.1f}s")
+        for ef_search in args.ef_search:
+            for mode, queries in modes.items():
+                latencies, results = await _run_queries(
+                    connection, _format_sql(TOP_K_QUERY, mode == "user"), queries, args.k, -1.0,
+                    [f"SET LOCAL hnsw.ef_search = {ef_search}", "SET LOCAL hnsw.iterative_scan = relaxed_order"]
+                )
+                _report(f"hnsw ef={ef_search}/{mode}", latencies, results, truth[mode])
+        await connection.execute("DROP INDEX bench_hnsw")
+
+        lists = max(1, int(args.rows ** 0.5))
+        started = time.perf_counter()
+        await connection.execute(
+            f"CREATE INDEX bench_ivfflat ON {TABLE} USING ivfflat (embedding vector_cosine_ops) "
+            f"WITH (lists = {lists})"
+        )
+        print(f"\nIVFFlat build (lists={lists}): {time.perf_counter() - started:.1f}s")
+        for probes in args.probes:
+            for mode, queries in modes.items():
+                latencies, results = await _run_queries(
+                    connection, _format_sql(TOP_K_QUERY, mode == "user"), queries, args.k, -1.0,
+                    [f"SET LOCAL ivfflat.probes = {probes}", "SET LOCAL ivfflat.iterative_scan = relaxed_order"]
+                )
+                _report(f"ivfflat probes={probes}/{mode}", latencies, results, truth[mode])
+    finally:
+        if not args.keep:
+            await connection.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--ef-search", type=_int_list, default=[20, 40, 100, 200])
+    parser.add_argument("--probes", type=_int_list, default=[1, 4, 16, 32])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
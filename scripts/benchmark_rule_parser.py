@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Бенчмарк разбора событий правилами
+
+На размеченном корпусе сообщений считает:
+- долю сообщений, которые правила забирают у GPT (уверенность >= порога);
+- точность забранных: тип, дата и время совпадают с разметкой;
+- точность полей по всем событиям корпуса и ложные события среди
+  вопросов и команд;
+- задержку разбора p50/p99.
+
+Корпус - JSON Lines: {"text": ..., "now": "YYYY-MM-DDTHH:MM",
+"label": {"intent": "event"|"command"|"unknown", "event_type", "date", "time"}}.
+
+Запуск:
+    PYTHONPATH=. python scripts/benchmark_rule_parser.py [--corpus FILE] [--repeat N]
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.ai.nlp.rule_parser import RuleParseResult, rule_parser
+from app.config import settings
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "rule_parser_corpus.jsonl"
+THRESHOLDS = [0.6, 0.7, 0.8, 0.85, 0.9, 0.95]
+
+
+def load_corpus(path: Path) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def is_correct(result: RuleParseResult, label: Dict[str, Any]) -> bool:
+    """Событие разобрано верно: тип, дата и время совпадают с разметкой"""
+    if label["intent"] != "event":
+        return result.intent != "event"
+    return (
+        result.intent == "event"
+        and result.event_type == label["event_type"]
+        and result.date == label["date"]
+        and result.time == label["time"]
+    )
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run(corpus: List[Dict[str, Any]], repeat: int, threshold: float) -> None:
+    latencies: List[float] = []
+    results: List[RuleParseResult] = []
+    for item in corpus:
+        now = datetime.fromisoformat(item["now"])
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = rule_parser.parse(item["text"], now=now)
+            latencies.append(time.perf_counter() - started)
+        results.append(result)
+
+    events = [(r, item["label"]) for r, item in zip(results, corpus) if item["label"]["intent"] == "event"]
+    others = [(r, item["label"]) for r, item in zip(results, corpus) if item["label"]["intent"] != "event"]
+
+    print(f"{len(corpus)} messages ({len(events)} events), {repeat} run(s) each\n")
+    print(f"latency p50 {percentile(latencies, 0.5) * 1e6:.0f} us, "
+          f"p99 {percentile(latencies, 0.99) * 1e6:.0f} us, "
+          f"mean {statistics.mean(latencies) * 1e6:.0f} us")
+
+    if events:
+        for field in ("event_type", "date", "time"):
+            accuracy = sum(getattr(r, field) == label[field] for r, label in events) / len(events)
+            print(f"{field:<11} accuracy {accuracy:.1%}")
+        print(f"all fields  accuracy {sum(is_correct(r, label) for r, label in events) / len(events):.1%}")
+    if others:
+        intent_accuracy = sum(r.intent == label["intent"] for r, label in others) / len(others)
+        print(f"non-event intent accuracy {intent_accuracy:.1%}")
+
+    print(f"\n{'threshold':<11}{'absorbed':>10}{'precision':>11}{'false ev':>10}")
+    for value in sorted(set(THRESHOLDS + [threshold])):
+        absorbed = [
+            (r, item["label"]) for r, item in zip(results, corpus)
+            if r.intent == "event" and r.confidence >= value
+        ]
+        correct = sum(is_correct(r, label) for r, label in absorbed)
+        false_events = sum(label["intent"] != "event" for _, label in absorbed)
+        precision = correct / len(absorbed) if absorbed else 1.0
+        marker = "  <- RULE_PARSER_MIN_CONFIDENCE" if value == threshold else ""
+        print(f"{value:<11.2f}{len(absorbed) / len(corpus):>10.1%}{precision:>11.1%}{false_events:>10}{marker}")
+
+    wrong = [
+        (r, item) for r, item in zip(results, corpus)
+        if r.intent == "event" and r.confidence >= threshold and not is_correct(r, item["label"])
+    ]
+    for r, item in wrong:
+        print(f"\nwrong: {item['text']!r} -> {r.event_type} {r.date} {r.time} ({r.confidence:.2f})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="Размеченный корпус *.jsonl")
+    parser.add_argument("--repeat", type=int, default=200, help="Повторов на сообщение для замера задержки")
+    parser.add_argument(
+        "--threshold", type=float, default=settings.RULE_PARSER_MIN_CONFIDENCE,
+        help="Порог уверенности для сравнения"
+    )
+    args = parser.parse_args()
+    run(load_corpus(args.corpus), args.repeat, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Бенчмарк выполнения асинхронных задач Celery: asyncio.run против TaskRuntime
+
+Задача выполняется --tasks раз последовательно, как в процессе воркера
+prefork:
+- before - asyncio.run на задачу: новый event loop и новые ресурсы
+  (HTTP сессия, движок базы) в каждой задаче;
+- after - TaskRuntime: один loop процесса, ресурсы создаются один раз
+  и переиспользуются (keep-alive соединения, пул базы).
+
+Сценарии (--scenario):
+- loop - пустая корутина, цена создания и закрытия loop;
+- http - запрос к локальному HTTP серверу через aiohttp, как отправка
+  сообщения ботом (сессия aiogram - aiohttp);
+- db - SELECT 1 через SQLAlchemy (нужен --dsn с доступной базой).
+
+Для каждого варианта - задач в секунду и задержка задачи p50/p99.
+
+Запуск:
+    PYTHONPATH=. python scripts/benchmark_task_runtime.py [--scenario loop,http] [--tasks 500]
+        [--dsn postgresql+asyncpg://...]
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from typing import Any, Callable, List
+
+from app.tasks.runtime import TaskRuntime
+
+
+def _start_http_server() -> str:
+    """Локальный HTTP сервер в отдельном потоке, возвращает URL"""
+    from aiohttp import web
+
+    started = threading.Event()
+    address: List[str] = []
+
+    async def handle(request):
+        return web.Response(text="ok")
+
+    async def serve():
+        app = web.Application()
+        app.router.add_get("/", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        address.append(f"http://127.0.0.1:{port}/")
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    started.wait(10)
+    return address[0]
+
+
+def _scenario(name: str, args: argparse.Namespace):
+    """
+    Returns:
+        (фабрика ресурса, закрытие ресурса, тело задачи)
+    """
+    if name == "loop":
+        async def create():
+            return None
+
+        async def close(resource):
+            pass
+
+        async def body(resource):
+            await asyncio.sleep(0)
+
+    elif name == "http":
+        import aiohttp
+
+        url = _start_http_server()
+
+        async def create():
+            return aiohttp.ClientSession()
+
+        async def close(session):
+            await session.close()
+
+        async def body(session):
+            async with session.get(url) as response:
+                await response.read()
+
+    elif name == "db":
+        if not args.dsn:
+            raise SystemExit("scenario db needs --dsn")
+        from sqlalchemy import text
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        async def create():
+            return create_async_engine(args.dsn)
+
+        async def close(engine):
+            await engine.dispose()
+
+        async def body(engine):
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+
+    else:
+        raise SystemExit(f"unknown scenario: {name}")
+    return create, close, body
+
+
+def _measure(tasks: int, run_task: Callable[[], Any]) -> List[float]:
+    latencies = []
+    for _ in range(tasks):
+        started = time.perf_counter()
+        run_task()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _before(tasks: int, create, close, body) -> List[float]:
+    async def task():
+        resource = await create()
+        try:
+            await body(resource)
+        finally:
+            await close(resource)
+
+    return _measure(tasks, lambda: asyncio.run(task()))
+
+
+def _after(tasks: int, create, close, body) -> List[float]:
+    runtime = TaskRuntime(setup=None, teardown=None)
+    resource: List[Any] = []
+
+    async def task():
+        if not resource:
+            resource.append(await create())
+        await body(resource[0])
+
+    try:
+        return _measure(tasks, lambda: runtime.run(task()))
+    finally:
+        if resource:
+            runtime.run(close(resource[0]))
+        runtime.stop()
+
+
+def _report(name: str, latencies: List[float]) -> float:
+    latencies = sorted(latencies)
+    rate = len(latencies) / sum(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{name:<16} {rate:>10,.0f} {p50:>9.2f} {p99:>9.2f}")
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="loop,http")
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--dsn")
+    args = parser.parse_args()
+
+    print(f"{'variant':<16} {'tasks/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for name in [item for item in args.scenario.split(",") if item]:
+        create, close, body = _scenario(name, args)
+        before = _report(f"{name}/before", _before(args.tasks, create, close, body))
+        after = _report(f"{name}/after", _after(args.tasks, create, close, body))
+        print(f"{name}: x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
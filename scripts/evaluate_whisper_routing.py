@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Оценка маршрутизации моделей Whisper: задержка и WER по решениям
+
+Каждое аудио из манифеста распознаётся всеми моделями маршрутизатора
+(WHISPER_ROUTE_MODELS). Аудио группируются по решению маршрутизатора
+(граница длительности), и для каждой группы печатаются средняя задержка
+и WER каждой модели; модель, которую выбирает маршрутизатор, отмечена *.
+Итог сравнивает маршрутизацию с одной моделью для всех голосовых.
+
+--autodetect добавляет прогон без WHISPER_LANGUAGE и WHISPER_INITIAL_PROMPT,
+чтобы оценить выигрыш от фиксированного языка и подсказки.
+
+Манифест - JSONL со строками {"audio": "путь к файлу", "text": "эталон"};
+относительные пути считаются от файла манифеста.
+
+Запуск:
+    PYTHONPATH=. python scripts/evaluate_whisper_routing.py manifest.jsonl [--autodetect]
+        [--queue-depth 0]
+"""
+import argparse
+import json
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from app.ai.model_registry import model_registry
+from app.ai.speech.audio import load_audio
+from app.ai.speech.routing import WhisperRouter, audio_duration, word_error_rate
+from app.ai.speech.whisper_client import decode_options
+
+
+def _load_manifest(path: Path) -> List[Dict[str, Any]]:
+    samples = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                sample = json.loads(line)
+                sample["audio"] = str((path.parent / sample["audio"]).resolve())
+                samples.append(sample)
+    return samples
+
+
+def _transcribe(model_name: str, audio, options: Dict[str, Any]) -> Tuple[str, float]:
+    model = model_registry.get(model_registry.whisper_key(model_name))
+    started_at = time.perf_counter()
+    result = model.transcribe(audio, fp16=False, **options)
+    return result.get("text", ""), time.perf_counter() - started_at
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", type=Path)
+    parser.add_argument("--autodetect", action="store_true")
+    parser.add_argument("--queue-depth", type=int, default=0)
+    args = parser.parse_args()
+
+    router = WhisperRouter()
+    variants = {"pinned": decode_options()}
+    if args.autodetect:
+        variants["autodetect"] = {}
+
+    # (решение, вариант, модель) -> [(задержка, WER)]
+    results: Dict[Tuple[str, str, str], List[Tuple[float, float]]] = defaultdict(list)
+    chosen: Dict[str, str] = {}
+    samples = _load_manifest(args.manifest)
+    for index, sample in enumerate(samples, 1):
+        route = router.route_duration(audio_duration(sample["audio"]), "base", args.queue_depth)
+        chosen[route.reason] = route.model
+        audio = load_audio(sample["audio"])
+        for variant, options in variants.items():
+            for model_name in router.models:
+                text, latency = _transcribe(model_name, audio, options)
+                results[(route.reason, variant, model_name)].append((latency, word_error_rate(sample["text"], text)))
+        print(f"[{index}/{len(samples)}] {Path(sample['audio']).name}: {route.duration or 0:.1f}s -> {route.model}")
+
+    print(f"\n{'route':<14} {'variant':<11} {'model':<8} {'n':>4} {'latency s':>10} {'WER':>7}")
+    totals: Dict[Tuple[str, str], List[Tuple[float, float]]] = defaultdict(list)
+    for (reason, variant, model_name), rows in sorted(results.items()):
+        latency = statistics.mean(row[0] for row in rows)
+        wer = statistics.mean(row[1] for row in rows)
+        mark = "*" if chosen[reason] == model_name else " "
+        print(f"{reason:<14} {variant:<11} {model_name + mark:<8} {len(rows):>4} {latency:>10.2f} {wer:>7.1%}")
+        totals[(variant, model_name)].extend(rows)
+        if chosen[reason] == model_name:
+            totals[(variant, "routed")].extend(rows)
+
+    print(f"\n{'variant':<11} {'model':<8} {'latency s':>10} {'WER':>7}")
+    for (variant, model_name), rows in sorted(totals.items()):
+        latency = statistics.mean(row[0] for row in rows)
+        wer = statistics.mean(row[1] for row in rows)
+        print(f"{variant:<11} {model_name:<8} {latency:>10.2f} {wer:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Отчёт о времени импорта точек входа (python -X importtime)
+
+Для каждого модуля (по умолчанию app.main и app.bot.main) импортирует
+его в отдельном интерпретаторе и печатает таблицу самых долгих импортов:
+общее время с вложенными импортами, собственное время и модуль с
+отступом по вложенности. Отдельно - тяжёлые библиотеки (torch, whisper,
+easyocr, sentence_transformers, cv2, faiss), попавшие в импорт: они
+должны загружаться при первом использовании или в прогреве.
+
+Код выхода 1, если модуль не импортируется, превышает бюджет
+(--budget, по умолчанию STARTUP_IMPORT_BUDGET_MS) или тянет тяжёлые
+библиотеки - скрипт можно запускать в CI.
+
+Запуск:
+    PYTHONPATH=. python scripts/importtime_report.py [app.main app.bot.main] [--top 25]
+        [--sort cumulative|self] [--budget 4000]
+"""
+import argparse
+import sys
+
+from app.core.import_profile import (
+    STARTUP_IMPORT_BUDGET_MS,
+    STARTUP_MODULES,
+    ImportProfile,
+    profile_import,
+)
+
+
+def _report(profile: ImportProfile, top: int, sort: str, budget: float) -> bool:
+    print(f"\n{profile.module}")
+    if not profile.ok:
+        print(f"  import failed: {profile.error}")
+        return False
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for record in profile.top(top, by=sort):
+        print(f"{record.cumulative_us / 1000:>14.1f} {record.self_us / 1000:>9.1f}  {'  ' * record.depth}{record.module}")
+
+    heavy = profile.heavy_modules()
+    within_budget = profile.total_ms <= budget
+    print(
+        f"Total: {profile.total_ms:.0f} ms (budget {budget:.0f} ms{'' if within_budget else ', EXCEEDED'}), "
+        f"{len(profile.records)} modules"
+    )
+    print(f"Heavy modules: {', '.join(heavy) if heavy else 'none'}")
+    return within_budget and not heavy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=list(STARTUP_MODULES))
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--sort", choices=["cumulative", "self"], default="cumulative")
+    parser.add_argument("--budget", type=float, default=STARTUP_IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+
+    passed = [_report(profile_import(module), args.top, args.sort, args.budget) for module in args.modules]
+    sys.exit(0 if all(passed) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Отчёт о памяти воркеров: общая и собственная
+
+Для главного процесса (Celery worker, gunicorn) и его воркеров печатает
+RSS, PSS, общую (shared) и собственную (unique, USS) память. Собственная
+память воркера - цена ещё одного воркера; общая - веса моделей,
+загруженные до fork (AI_PRELOAD_BEFORE_FORK), и код библиотек.
+
+--simulate сравнивает режимы без реальных моделей: модель-балласт
+размером --model-mb загружается в главном процессе до fork (preload)
+или в каждом воркере отдельно, воркеры читают её целиком.
+
+Только Linux (/proc/<pid>/smaps_rollup).
+
+Запуск:
+    PYTHONPATH=. python scripts/memory_report.py --pid <pid главного процесса>
+    PYTHONPATH=. python scripts/memory_report.py --simulate [--workers 4] [--model-mb 500]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+from typing import List
+
+import numpy as np
+
+from app.ai.model_registry import ModelRegistry
+from app.core.process_memory import ProcessMemory, process_tree_memory, read_process_memory
+
+MB = 1024 * 1024
+
+
+def _report(title: str, processes: List[ProcessMemory]) -> None:
+    print(f"\n{title}")
+    print(f"{'pid':>8} {'role':<8} {'name':<16} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'unique MB':>10}")
+    for index, process in enumerate(processes):
+        role = "master" if index == 0 else "worker"
+        print(
+            f"{process.pid:>8} {role:<8} {process.name[:16]:<16} {process.rss / MB:>9.1f} {process.pss / MB:>9.1f} "
+            f"{process.shared / MB:>10.1f} {process.private / MB:>10.1f}"
+        )
+
+    workers = processes[1:]
+    total_rss = sum(process.rss for process in processes)
+    total_pss = sum(process.pss for process in processes)
+    print(f"Sum of RSS: {total_rss / MB:.1f} MB, actual (sum of PSS): {total_pss / MB:.1f} MB")
+    if workers:
+        unique = sum(process.private for process in workers) / len(workers)
+        print(f"Per extra worker (avg unique): {unique / MB:.1f} MB")
+
+
+def _load_ballast(size_mb: str) -> np.ndarray:
+    """Модель-балласт: массив float64 заданного размера"""
+    return np.random.default_rng(0).random(int(size_mb) * MB // 8)
+
+
+def _simulate(workers: int, model_mb: int, preload: bool) -> List[ProcessMemory]:
+    registry = ModelRegistry()
+    registry.register_loader("ballast", _load_ballast)
+    key = f"ballast:{model_mb}"
+    if preload:
+        registry.preload([key])
+
+    context = multiprocessing.get_context("fork")
+    ready = context.Queue()
+    release = context.Event()
+
+    def work() -> None:
+        if preload:
+            registry.after_fork(1)
+        # Воркер читает веса целиком, как при инференсе
+        float(registry.get(key).sum())
+        ready.put(os.getpid())
+        release.wait()
+
+    processes = [context.Process(target=work) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    pids = [ready.get(timeout=120) for _ in processes]
+    try:
+        return [read_process_memory(os.getpid())] + [read_process_memory(pid) for pid in sorted(pids)]
+    finally:
+        release.set()
+        for process in processes:
+            process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pid", type=int)
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model-mb", type=int, default=500)
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        parser.error("нужен Linux (/proc/<pid>/smaps_rollup)")
+    if args.simulate:
+        _report(f"preload before fork ({args.workers} workers, {args.model_mb} MB model)",
+                _simulate(args.workers, args.model_mb, preload=True))
+        _report(f"load per worker ({args.workers} workers, {args.model_mb} MB model)",
+                _simulate(args.workers, args.model_mb, preload=False))
+    elif args.pid:
+        _report(f"process tree of {args.pid}", process_tree_memory(args.pid))
+    else:
+        parser.error("укажите --pid или --simulate")
+
+
+if __name__ == "__main__":
+    main()
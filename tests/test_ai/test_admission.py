@@ -0,0 +1,199 @@
+"""
+Тесты для допуска тяжёлых AI заданий
+"""
+
+import asyncio
+
+import pytest
+
+from app.ai.admission import AdmissionController, estimate_cost
+from app.bot.utils.queue_status import queue_position_notifier
+from app.core.exceptions import AIException
+
+
+class Job:
+    """Задание, удерживающее место до release()"""
+
+    def __init__(self, controller, user_id, cost, order, stage="whisper"):
+        self.positions = []
+        self.admitted = asyncio.Event()
+        self._release = asyncio.Event()
+
+        async def run():
+            async def on_position(position):
+                self.positions.append(position)
+
+            async with controller.admit(stage, user_id, cost, on_position):
+                order.append(self)
+                self.admitted.set()
+                await self._release.wait()
+
+        self.task = asyncio.create_task(run())
+
+    async def release(self):
+        self._release.set()
+        await self.task
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestAdmissionController:
+    """Тесты AdmissionController"""
+
+    @pytest.fixture
+    def controller(self):
+        return AdmissionController(limits={"whisper": 1, "gpt": 2}, max_queue=3, aging=0)
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self, controller):
+        """На этапе выполняется не больше лимита, следующее задание ждёт"""
+        order = []
+        first, second = Job(controller, 1, 1, order), Job(controller, 2, 1, order)
+        await _settle()
+
+        assert order == [first] and controller.running("whisper") == 1
+        assert controller.waiting("whisper") == 1
+
+        await first.release()
+        await _settle()
+        assert order == [first, second]
+        await second.release()
+        assert controller.running("whisper") == 0
+
+    @pytest.mark.asyncio
+    async def test_shortest_job_first(self, controller):
+        """Из ожидающих первым допускается самое короткое задание"""
+        order = []
+        running = Job(controller, 1, 1, order)
+        await _settle()
+        jobs = [Job(controller, user, cost, order) for user, cost in [(2, 30), (3, 2), (4, 10)]]
+        await _settle()
+
+        await running.release()
+        for _ in jobs:
+            await _settle()
+            await order[-1].release()
+
+        assert [jobs.index(job) for job in order[1:]] == [1, 2, 0]
+
+    @pytest.mark.asyncio
+    async def test_aging_prevents_starvation(self):
+        """Долго ждущее длинное задание обгоняет новое короткое"""
+        controller = AdmissionController(limits={"whisper": 1}, max_queue=10, aging=1000)
+        order = []
+        running = Job(controller, 1, 1, order)
+        await _settle()
+        long_job = Job(controller, 2, 30, order)
+        await asyncio.sleep(0.05)
+        short_job = Job(controller, 3, 1, order)
+        await _settle()
+
+        await running.release()
+        await _settle()
+        assert order[1] is long_job
+        await long_job.release()
+        await _settle()
+        await short_job.release()
+
+    @pytest.mark.asyncio
+    async def test_one_job_per_user(self, controller):
+        """Второе задание пользователя ждёт, не занимая место другого пользователя"""
+        order = []
+        first = Job(controller, 1, 1, order, stage="gpt")
+        second = Job(controller, 1, 1, order, stage="gpt")
+        other = Job(controller, 2, 5, order, stage="gpt")
+        await _settle()
+
+        assert order == [first, other]
+        await first.release()
+        await _settle()
+        assert order == [first, other, second]
+        await other.release()
+        await second.release()
+
+    @pytest.mark.asyncio
+    async def test_queue_position_updates(self, controller):
+        """Позиция сообщается при постановке и при каждом её изменении"""
+        order = []
+        running = Job(controller, 1, 1, order)
+        await _settle()
+        long_job = Job(controller, 2, 10, order)
+        await _settle()
+        short_job = Job(controller, 3, 1, order)
+        await _settle()
+
+        assert long_job.positions == [1, 2] and short_job.positions == [1]
+
+        await running.release()
+        await _settle()
+        assert long_job.positions == [1, 2, 1]
+        await short_job.release()
+        await _settle()
+        await long_job.release()
+
+    @pytest.mark.asyncio
+    async def test_queue_full_rejected(self, controller):
+        """При переполненной очереди этапа задание отклоняется сразу"""
+        order = []
+        jobs = [Job(controller, user, 1, order) for user in range(4)]
+        await _settle()
+
+        with pytest.raises(AIException):
+            async with controller.admit("whisper", 99, 1):
+                pass
+
+        for _ in jobs:
+            await _settle()
+            await order[-1].release()
+        assert controller.waiting("whisper") == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self, controller):
+        """Отменённое ожидание уходит из очереди и сдвигает позиции"""
+        order = []
+        running = Job(controller, 1, 1, order)
+        await _settle()
+        cancelled = Job(controller, 2, 1, order)
+        waiting = Job(controller, 3, 5, order)
+        await _settle()
+        assert waiting.positions == [2]
+
+        cancelled.task.cancel()
+        await _settle()
+        assert controller.waiting("whisper") == 1 and waiting.positions == [2, 1]
+
+        await running.release()
+        await _settle()
+        assert order == [running, waiting]
+        await waiting.release()
+        assert controller.running("whisper") == 0
+
+    def test_estimate_cost(self):
+        """Оценка растёт с длительностью аудио, числом изображений и длиной текста"""
+        assert estimate_cost("whisper", 60) > estimate_cost("whisper", 5)
+        assert estimate_cost("ocr", 5) > estimate_cost("ocr", 1)
+        assert estimate_cost("gpt", 2000) > estimate_cost("gpt", 20)
+
+
+class TestQueueStatus:
+    """Тесты статуса очереди в сообщении"""
+
+    @pytest.mark.asyncio
+    async def test_queue_position_message(self):
+        """Статусное сообщение показывает позицию и число заданий перед пользователем"""
+        class FakeMessage:
+            def __init__(self):
+                self.edits = []
+
+            async def edit_text(self, text, **kwargs):
+                self.edits.append((text, kwargs))
+
+        message = FakeMessage()
+        await queue_position_notifier(message, "🎤 Голосовое")(3)
+
+        text, kwargs = message.edits[0]
+        assert "<b>3</b>" in text and "перед вами 2" in text
+        assert kwargs == {"parse_mode": "HTML"}
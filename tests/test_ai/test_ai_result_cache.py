@@ -0,0 +1,125 @@
+"""
+Тесты для кэша результатов распознавания
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pytest
+
+from app.ai.speech import whisper_client
+from app.ai.speech.whisper_client import WhisperClient
+from app.config import settings
+from app.core.cache import AIResultCache
+
+
+class FakeCache:
+    """Кэш в памяти вместо Redis"""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    async def set_many(self, data: Dict[str, Any], expire: Optional[int] = None) -> bool:
+        self.data.update(data)
+        return True
+
+
+class TestAIResultCache:
+    """Тесты для AIResultCache"""
+
+    @pytest.fixture
+    def cache(self):
+        return AIResultCache(cache=FakeCache(), ttl=60)
+
+    @pytest.mark.asyncio
+    async def test_miss_then_hit(self, cache):
+        """Повторное содержимое берётся из кэша"""
+        content_hash = cache.content_hash(b"voice")
+
+        assert await cache.get("transcription", "base", content_hash) is None
+        await cache.set("transcription", "base", "встреча завтра", content_hash)
+
+        assert await cache.get("transcription", "base", content_hash) == "встреча завтра"
+        stats = cache.get_stats()["transcription"]
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["bytes_written"] > 0
+
+    @pytest.mark.asyncio
+    async def test_file_unique_id_lookup(self, cache):
+        """Пересланный файл находится по file_unique_id без хэша"""
+        await cache.set("ocr", "ru,en", {"text": "Показ"}, cache.content_hash(b"img"), "AQAD123")
+
+        assert await cache.get("ocr", "ru,en", file_unique_id="AQAD123") == {"text": "Показ"}
+
+    @pytest.mark.asyncio
+    async def test_variant_isolated(self, cache):
+        """Результаты разных моделей не смешиваются"""
+        content_hash = cache.content_hash(b"voice")
+        await cache.set("transcription", "base", "текст", content_hash)
+
+        assert await cache.get("transcription", "small", content_hash) is None
+
+    @pytest.mark.asyncio
+    async def test_set_without_keys(self, cache):
+        """Без хэша и file_unique_id сохранять нечего"""
+        assert await cache.set("ocr", "ru,en", {"text": ""}) is False
+
+
+class TestStreamedTranscriptionCache:
+    """Тесты кэша потоковой транскрипции"""
+
+    @pytest.mark.asyncio
+    async def test_cached_when_consumer_stops_on_done(self, monkeypatch):
+        """Полный текст кэшируется и пишется в журнал, даже если потребитель выходит на done"""
+        class FakePool:
+            workers = 1
+
+            def __init__(self, model_name):
+                pass
+
+            async def transcribe(self, audio, **options):
+                return f"часть {int(audio[0])}"
+
+        cache = AIResultCache(cache=FakeCache(), ttl=60)
+        records = []
+        monkeypatch.setattr(settings, "WHISPER_WORKERS", 1)
+        monkeypatch.setattr(settings, "WHISPER_CHUNK_MIN_DURATION", 0)
+        monkeypatch.setattr(whisper_client, "get_whisper_pool", FakePool)
+        monkeypatch.setattr(whisper_client, "split_on_silence", lambda audio: [(0, 10), (10, 20)])
+        monkeypatch.setattr(whisper_client, "ai_result_cache", cache)
+        monkeypatch.setattr(whisper_client.ai_usage_ledger, "record", lambda *args, **kwargs: records.append(kwargs))
+
+        audio = np.repeat(np.array([1, 2], dtype=np.float32), 10)
+        client = WhisperClient("base", routing=False)
+
+        # Как обработчик голоса: выход из цикла на последнем сегменте
+        stream = client.transcribe_stream(audio, "AQAD1")
+        async for segment in stream:
+            if segment["index"] + 1 == segment["total"]:
+                break
+        await stream.aclose()
+
+        assert await cache.get("transcription", client._cache_variant(), file_unique_id="AQAD1") == "часть 1 часть 2"
+        assert records[0]["metadata"]["segments"] == 2
+
+    def test_variant_depends_on_decode_options(self, monkeypatch):
+        """Смена языка или подсказки Whisper даёт другой ключ - старые транскрипции не отдаются"""
+        monkeypatch.setattr(settings, "WHISPER_WORKERS", 0)
+        monkeypatch.setattr(whisper_client.model_registry, "get", lambda key: object())
+        client = WhisperClient("base", routing=False)
+        client.options = {"language": "ru", "initial_prompt": "ЖК, ДДУ"}
+        variant = client._cache_variant()
+
+        assert variant.startswith("base:")
+        client.options = {"initial_prompt": "ЖК, ДДУ", "language": "ru"}
+        assert client._cache_variant() == variant
+        client.options = {"language": "ru", "initial_prompt": "ЖК, ДДУ, ипотека"}
+        assert client._cache_variant() != variant
+        client.options = {}
+        assert client._cache_variant() == "base"
+
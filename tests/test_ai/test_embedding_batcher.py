@@ -0,0 +1,109 @@
+"""
+Тесты для микро-пакетов эмбеддингов
+"""
+
+import asyncio
+import threading
+from typing import List
+
+import numpy as np
+import pytest
+
+from app.ai.embeddings.batcher import EmbeddingBatcher
+
+
+class FakeEncoder:
+    """Модель, запоминающая пачки"""
+
+    def __init__(self, fail: bool = False):
+        self.batches: List[List[str]] = []
+        self.threads = set()
+        self.fail = fail
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        self.batches.append(list(texts))
+        self.threads.add(threading.get_ident())
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+class TestEmbeddingBatcher:
+    """Тесты сборки пачек"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_batch(self):
+        """Одновременные запросы кодируются одним вызовом модели"""
+        encoder = FakeEncoder()
+        batcher = EmbeddingBatcher(encoder, max_batch_size=32, max_wait_ms=20)
+
+        texts = [f"показ квартиры {i}" for i in range(10)]
+        embeddings = await asyncio.gather(*(batcher.embed(text) for text in texts))
+
+        assert len(encoder.batches) == 1
+        assert [embedding[0] for embedding in embeddings] == [float(len(text)) for text in texts]
+        assert embeddings[0].dtype == np.float32
+
+    @pytest.mark.asyncio
+    async def test_full_batch_not_delayed(self):
+        """Полная пачка уходит в модель, не дожидаясь окна"""
+        encoder = FakeEncoder()
+        batcher = EmbeddingBatcher(encoder, max_batch_size=4, max_wait_ms=10000)
+
+        await asyncio.wait_for(batcher.embed_many([f"текст {i}" for i in range(8)]), timeout=1)
+
+        assert [len(batch) for batch in encoder.batches] == [4, 4]
+
+    @pytest.mark.asyncio
+    async def test_single_request_after_window(self):
+        """Одиночный запрос ждёт не дольше окна"""
+        encoder = FakeEncoder()
+        batcher = EmbeddingBatcher(encoder, max_batch_size=32, max_wait_ms=5)
+
+        embedding = await asyncio.wait_for(batcher.embed("звонок"), timeout=1)
+
+        assert embedding[0] == 6.0
+        assert encoder.batches == [["звонок"]]
+
+    @pytest.mark.asyncio
+    async def test_duplicates_encoded_once(self):
+        """Одинаковые тексты в пачке кодируются один раз"""
+        encoder = FakeEncoder()
+        batcher = EmbeddingBatcher(encoder, max_wait_ms=10)
+
+        first, second, other = await batcher.embed_many(["встреча", "встреча", "звонок"])
+
+        assert encoder.batches == [["встреча", "звонок"]]
+        assert np.array_equal(first, second)
+        assert batcher.get_stats()["items"] == 3
+
+    @pytest.mark.asyncio
+    async def test_error_reaches_all_requests(self):
+        """Ошибка модели возвращается каждому запросу пачки, обработчик продолжает работу"""
+        encoder = FakeEncoder(fail=True)
+        batcher = EmbeddingBatcher(encoder, max_wait_ms=5)
+
+        results = await asyncio.gather(batcher.embed("а"), batcher.embed("б"), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        encoder.fail = False
+        assert (await batcher.embed("в"))[0] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_encoded_outside_event_loop_thread(self):
+        """Модель вызывается в отдельном потоке"""
+        encoder = FakeEncoder()
+        batcher = EmbeddingBatcher(encoder, max_wait_ms=1)
+
+        await batcher.embed("показ")
+
+        assert encoder.threads and threading.get_ident() not in encoder.threads
+
+    def test_new_event_loop(self):
+        """Батчер работает в последовательных asyncio.run (задачи Celery)"""
+        encoder = FakeEncoder()
+        batcher = EmbeddingBatcher(encoder, max_wait_ms=1)
+
+        assert asyncio.run(batcher.embed("первый"))[0] == 6.0
+        assert asyncio.run(batcher.embed("второй"))[0] == 6.0
+        assert len(encoder.batches) == 2
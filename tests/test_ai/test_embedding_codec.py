@@ -0,0 +1,76 @@
+"""
+Тесты для двоичного хранения эмбеддингов
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from app.ai.embeddings.codec import decode_embedding, decode_embeddings, encode_embedding
+
+
+@pytest.fixture
+def vector():
+    rng = np.random.default_rng(0)
+    vector = rng.standard_normal(384).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class TestEmbeddingCodec:
+    """Тесты кодирования и декодирования"""
+
+    @pytest.mark.parametrize("storage,size,tolerance", [
+        ("float32", 1 + 384 * 4, 0.0),
+        ("float16", 1 + 384 * 2, 1e-3),
+        ("int8", 1 + 4 + 384, 1e-2),
+    ])
+    def test_roundtrip(self, vector, storage, size, tolerance):
+        """Вектор восстанавливается с ошибкой формата, размер - байт на компоненту"""
+        data = encode_embedding(vector, storage)
+        decoded = decode_embedding(data)
+
+        assert len(data) == size
+        assert decoded.dtype == np.float32
+        assert np.max(np.abs(decoded - vector)) <= tolerance + 1e-7
+
+    def test_smaller_than_json(self, vector):
+        """float16 в несколько раз компактнее JSON"""
+        assert len(json.dumps(vector.tolist())) / len(encode_embedding(vector, "float16")) > 4
+
+    def test_cosine_preserved(self, vector):
+        """int8 почти не меняет косинусное сходство"""
+        rng = np.random.default_rng(1)
+        other = vector + 0.5 * rng.standard_normal(384).astype(np.float32)
+        other /= np.linalg.norm(other)
+        decoded = decode_embedding(encode_embedding(other, "int8"))
+
+        exact = float(vector @ other)
+        approx = float(vector @ decoded / np.linalg.norm(decoded))
+        assert approx == pytest.approx(exact, abs=0.01)
+
+    def test_decode_many(self, vector):
+        """Матрица собирается из строк разных форматов и старого JSON"""
+        blobs = [
+            encode_embedding(vector, "float16"),
+            memoryview(encode_embedding(vector, "float16")),
+            encode_embedding(vector, "int8"),
+            json.dumps(vector.tolist()),
+        ]
+
+        matrix = decode_embeddings(blobs)
+
+        assert matrix.shape == (4, 384)
+        assert np.allclose(matrix, vector, atol=1e-2)
+
+    def test_decode_many_same_format(self, vector):
+        """Строки одного формата декодируются одним массивом"""
+        matrix = decode_embeddings([encode_embedding(vector * i, "float32") for i in range(1, 4)])
+
+        assert matrix.shape == (3, 384)
+        assert np.allclose(matrix[2], vector * 3)
+
+    def test_unknown_storage(self, vector):
+        """Неизвестный формат - ошибка"""
+        with pytest.raises(ValueError):
+            encode_embedding(vector, "float8")
@@ -0,0 +1,193 @@
+"""
+Тесты для фоновой индексации эмбеддингов событий
+"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from app.ai.embeddings import indexer as indexer_module
+from app.ai.embeddings.codec import decode_embedding
+from app.ai.embeddings.indexer import STAGE_TABLE, EventIndexer, build_select_query, build_upsert_query
+
+
+class FakeIndex:
+    def __init__(self):
+        self.removed: List[tuple] = []
+
+    def remove(self, user_id, event_id):
+        self.removed.append((user_id, event_id))
+        return True
+
+
+class FakeVectorService:
+    """Сервис эмбеддингов, запоминающий пачки текстов"""
+
+    def __init__(self, backend: str = "faiss"):
+        self.use_faiss = backend == "faiss"
+        self.use_pgvector = backend == "pgvector"
+        self.index = FakeIndex()
+        self.batches: List[List[str]] = []
+        self.ensured: List[int] = []
+
+    async def embed_many(self, texts):
+        self.batches.append(list(texts))
+        return [np.array([1.0, 0.0, 0.0], dtype=np.float32) for _ in texts]
+
+    async def ensure_user_index(self, user_id):
+        self.ensured.append(user_id)
+
+
+class FakeSession:
+    """Сессия с таблицей events в памяти"""
+
+    def __init__(self, events: Dict[int, SimpleNamespace]):
+        self.events = events
+        self.writes: List[Dict[str, Any]] = []
+        self.queries: List[str] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.queries.append(sql)
+        if sql.lstrip().startswith("SELECT"):
+            rows = [self.events[event_id] for event_id in params["event_ids"] if event_id in self.events]
+            return SimpleNamespace(fetchall=lambda: rows)
+        self.writes.append(params)
+        return SimpleNamespace()
+
+    async def commit(self):
+        pass
+
+
+def _event(event_id: int, title: str, indexed_content=None, user_id: int = 7):
+    return SimpleNamespace(
+        id=event_id, user_id=user_id, title=title, description=None, indexed_content=indexed_content
+    )
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    users: List[int] = []
+
+    async def invalidate(user_id):
+        users.append(user_id)
+
+    monkeypatch.setattr(indexer_module.CacheManager, "invalidate_event_search_cache", invalidate)
+    return users
+
+
+def _indexer(session: FakeSession, service: FakeVectorService, debounce: float = 0.0) -> EventIndexer:
+    return EventIndexer(service, session_factory=lambda: session, debounce=debounce, batch_size=10)
+
+
+class TestEventIndexer:
+    """Тесты очереди индексации"""
+
+    @pytest.mark.asyncio
+    async def test_debounces_repeated_edits(self, invalidated):
+        """Серия правок одного события кодируется один раз, после паузы"""
+        session = FakeSession({1: _event(1, "Показ квартиры")})
+        service = FakeVectorService()
+        indexer = _indexer(session, service, debounce=0.05)
+
+        for _ in range(3):
+            indexer.enqueue(1, 7)
+            await asyncio.sleep(0.01)
+        assert service.batches == []
+
+        await asyncio.sleep(0.15)
+        assert service.batches == [["Показ квартиры"]]
+        assert len(session.writes) == 1
+        assert service.ensured == [7]
+        assert invalidated == [7]
+        await indexer.stop()
+
+    @pytest.mark.asyncio
+    async def test_batch_upserted_in_one_statement(self, invalidated):
+        """Пачка событий кодируется вместе и записывается одним запросом"""
+        session = FakeSession({event_id: _event(event_id, f"Встреча {event_id}") for event_id in (1, 2, 3)})
+        service = FakeVectorService()
+        indexer = _indexer(session, service, debounce=60)
+
+        for event_id in (1, 2, 3, 4):
+            indexer.enqueue(event_id, 7)
+        assert await indexer.flush() == 4
+
+        assert service.batches == [["Встреча 1", "Встреча 2", "Встреча 3"]]
+        assert len(session.writes) == 1
+        assert session.writes[0]["event_ids"] == [1, 2, 3]
+        assert decode_embedding(session.writes[0]["embeddings"][0]).tolist() == [1.0, 0.0, 0.0]
+        assert "vectors" not in session.writes[0]
+
+    @pytest.mark.asyncio
+    async def test_unchanged_text_skipped(self, invalidated):
+        """Событие с прежним текстом (например, перенос времени) не кодируется заново"""
+        session = FakeSession({1: _event(1, "Показ", indexed_content="Показ")})
+        service = FakeVectorService()
+        indexer = _indexer(session, service)
+
+        assert await indexer.index_events([1]) == 0
+        assert service.batches == [] and session.writes == []
+        assert indexer.get_stats()["skipped"] == 1
+        assert await indexer.index_events([1], force=True) == 1
+
+    @pytest.mark.asyncio
+    async def test_pgvector_column_written(self, invalidated):
+        """С pgvector в пачку добавляется текстовое представление вектора"""
+        session = FakeSession({1: _event(1, "Показ")})
+        indexer = _indexer(session, FakeVectorService("pgvector"))
+
+        await indexer.index_events([1])
+
+        assert session.writes[0]["vectors"] == ["[1,0,0]"]
+        assert "embedding_vec IS NOT NULL" in session.queries[0]
+        assert "CAST(src.embedding_vec AS vector)" in session.queries[1]
+
+    @pytest.mark.asyncio
+    async def test_removal_cancels_indexing(self, invalidated):
+        """Удаление до индексации отменяет её и убирает событие из FAISS"""
+        session = FakeSession({})
+        service = FakeVectorService()
+        indexer = _indexer(session, service, debounce=60)
+
+        indexer.enqueue(1, 7)
+        indexer.discard(1, 7)
+        await indexer.flush()
+
+        assert service.batches == [] and session.queries == []
+        assert service.index.removed == [(7, 1)]
+        assert indexer.pending == 0
+
+
+class TestIndexerQueries:
+    """Тесты SQL"""
+
+    def test_upsert_from_arrays(self):
+        """Пачка передаётся массивами и записывается одним INSERT ... ON CONFLICT"""
+        sql = build_upsert_query(pgvector=False, staged=False)
+
+        assert "unnest(CAST(:event_ids AS bigint[])" in sql
+        assert "ON CONFLICT (event_id) DO UPDATE" in sql
+        assert "embedding_vec" not in sql
+
+    def test_upsert_from_stage(self):
+        """Backfill сливает строки из временной таблицы, заполненной COPY"""
+        sql = build_upsert_query(pgvector=True, staged=True)
+
+        assert f"FROM {STAGE_TABLE} AS src" in sql
+        assert "embedding_vec = EXCLUDED.embedding_vec" in sql
+
+    def test_page_query_limited(self):
+        """Страница backfill читается по id с LIMIT после сортировки"""
+        sql = build_select_query("e.id > :last_id", pgvector=False, limit=True)
+
+        assert sql.index("ORDER BY e.id") < sql.index("LIMIT :limit")
@@ -0,0 +1,117 @@
+"""
+Тесты для индексов FAISS по пользователям
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.ai.embeddings import faiss_index as faiss_module
+from app.ai.embeddings.faiss_index import FaissIndexStore, IndexVersion, normalize
+
+
+def _vector(*values):
+    vector = np.zeros(8, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector
+
+
+@pytest.fixture
+def store(tmp_path):
+    pytest.importorskip("faiss")
+    return FaissIndexStore(directory=str(tmp_path), dimension=8, max_loaded=2, save_interval=3600)
+
+
+class TestNormalize:
+    """Тесты подготовки векторов"""
+
+    def test_unit_length(self):
+        """Вектора приводятся к единичной длине, нулевой остаётся нулевым"""
+        matrix = normalize([[3.0, 4.0], [0.0, 0.0]])
+
+        assert matrix.dtype == np.float32
+        assert np.allclose(matrix[0], [0.6, 0.8])
+        assert np.allclose(matrix[1], [0.0, 0.0])
+
+
+class TestFaissIndexStore:
+    """Тесты индекса"""
+
+    def test_unavailable_without_faiss(self, monkeypatch, tmp_path):
+        """Без faiss индекс недоступен - поиск идёт запросом к базе"""
+        monkeypatch.setattr(faiss_module, "_import_faiss", lambda: None)
+
+        assert FaissIndexStore(directory=str(tmp_path)).available is False
+
+    def test_search_by_user(self, store):
+        """Поиск возвращает события только своего пользователя по убыванию сходства"""
+        store.build(1, [(10, _vector(1, 0)), (11, _vector(1, 1)), (12, _vector(0, 1))])
+        store.build(2, [(20, _vector(1, 0))])
+
+        hits = store.search(1, _vector(1, 0.1), k=2)
+
+        assert [event_id for event_id, _ in hits] == [10, 11]
+        assert hits[0][1] == pytest.approx(1.0, abs=0.01)
+        assert store.search(3, _vector(1, 0), k=2) == []
+
+    def test_removal(self, store):
+        """Удаление убирает событие и снимает версию - индекс сверится с базой заново"""
+        version = IndexVersion(2, datetime(2026, 1, 1, tzinfo=timezone.utc))
+        store.build(1, [(10, _vector(1, 0)), (11, _vector(0, 1))], version)
+
+        assert store.remove(1, 10) is True
+        assert store.remove(1, 99) is False
+        assert store.remove(2, 10) is False
+        assert [event_id for event_id, _ in store.search(1, _vector(1, 0), k=5)] == [11]
+        assert store.is_current(1, version) is False
+
+    def test_version_checked(self, store):
+        """Индекс считается актуальным только для версии, из которой построен"""
+        version = IndexVersion(1, datetime(2026, 1, 1, tzinfo=timezone.utc))
+        store.build(1, [(10, _vector(1, 0))], version)
+
+        assert store.is_current(1, version) is True
+        assert store.is_current(1, IndexVersion(2, version.updated_at)) is False
+        assert store.is_current(1, IndexVersion(1, datetime(2026, 1, 2, tzinfo=timezone.utc))) is False
+        assert store.is_current(2, version) is False
+
+    def test_persisted_and_reloaded(self, store, tmp_path):
+        """Сохранённый индекс читается другим процессом той же версии"""
+        version = IndexVersion(1, datetime(2026, 1, 1, tzinfo=timezone.utc))
+        store.build(1, [(10, _vector(1, 0))], version)
+        assert store.save() == 1
+        assert store.save() == 0
+
+        reloaded = FaissIndexStore(directory=str(tmp_path), dimension=8)
+
+        assert reloaded.search(1, _vector(1, 0), k=1) == []
+        assert reloaded.is_current(1, IndexVersion(2, version.updated_at)) is False
+        assert reloaded.is_current(1, version) is True
+        assert reloaded.search(1, _vector(1, 0), k=1)[0][0] == 10
+        assert reloaded.remove(1, 10) is True
+        assert reloaded.search(1, _vector(1, 0), k=1) == []
+
+    def test_newer_version_replaces_file(self, store):
+        """Сохранение новой версии удаляет файл старой, без версии индекс не сохраняется"""
+        old = IndexVersion(1, datetime(2026, 1, 1, tzinfo=timezone.utc))
+        new = IndexVersion(2, datetime(2026, 1, 2, tzinfo=timezone.utc))
+        store.build(1, [(10, _vector(1, 0))], old)
+        store.save()
+        store.build(1, [(10, _vector(1, 0)), (11, _vector(0, 1))], new)
+        store.save()
+
+        assert not store.path(1, old).exists() and store.path(1, new).exists()
+        store.build(2, [(20, _vector(1, 0))])
+        assert store.save() == 0
+
+    def test_eviction_saves_dirty(self, store):
+        """Вытесненный из памяти построенный индекс сохраняется на диск"""
+        version = IndexVersion(1, datetime(2026, 1, 1, tzinfo=timezone.utc))
+        for user_id in (1, 2, 3):
+            store.build(user_id, [(user_id * 10, _vector(1, 0))], version)
+
+        assert store.get_stats()["loaded"] == 2
+        assert store.path(1, version).exists()
+        assert store.is_current(1, version)
+        assert store.search(1, _vector(1, 0), k=1)[0][0] == 10
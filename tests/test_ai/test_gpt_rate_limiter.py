@@ -0,0 +1,121 @@
+"""
+Тесты для лимитов и повторов запросов к OpenAI
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.ai.nlp import gpt_client as gpt_module
+from app.ai.nlp.gpt_client import GPTClient
+from app.ai.nlp.rate_limiter import (
+    AdaptiveConcurrencyLimiter, OpenAIRateLimiter, TokenBucket, retry_delay
+)
+
+
+def _rate_limit_error(headers=None) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+class TestTokenBucket:
+    """Тесты для TokenBucket"""
+
+    @pytest.mark.asyncio
+    async def test_wait_when_empty(self):
+        """Пустое ведро возвращает время до пополнения"""
+        bucket = TokenBucket("test", per_minute=60)
+
+        assert await bucket.try_take(60) == 0
+        wait = await bucket.try_take(30)
+
+        assert wait == pytest.approx(30, abs=0.1)
+
+    @pytest.mark.asyncio
+    async def test_adjust_refunds(self):
+        """Возврат переоценённых токенов снова доступен"""
+        bucket = TokenBucket("test", per_minute=100)
+        await bucket.try_take(100)
+
+        await bucket.adjust(-50)
+
+        assert await bucket.try_take(50) == 0
+
+
+class TestAdaptiveConcurrency:
+    """Тесты для AIMD лимита"""
+
+    def test_additive_increase_multiplicative_decrease(self):
+        """Успехи медленно поднимают лимит, перегрузка режет вдвое один раз"""
+        limiter = AdaptiveConcurrencyLimiter(initial=4, max_limit=8, cooldown=60)
+
+        for _ in range(4):
+            limiter.on_success()
+        assert 4.9 < limiter.limit < 5.0
+
+        limiter.on_overload()
+        limiter.on_overload()
+        assert 2.4 < limiter.limit < 2.5
+
+    @pytest.mark.asyncio
+    async def test_limit_enforced(self):
+        """Одновременно выполняется не больше limit запросов"""
+        limiter = AdaptiveConcurrencyLimiter(initial=2)
+        peak = 0
+
+        async def job():
+            nonlocal peak
+            await limiter.acquire()
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            await limiter.release()
+
+        await asyncio.gather(*(job() for _ in range(6)))
+
+        assert peak == 2
+        assert limiter.in_flight == 0
+
+
+class TestRetry:
+    """Тесты повторов"""
+
+    def test_retry_after_honored(self):
+        """Задержка из retry-after важнее экспоненты"""
+        assert retry_delay(_rate_limit_error({"retry-after": "3"}), attempt=0) == 3.0
+        assert retry_delay(_rate_limit_error({"retry-after-ms": "250"}), attempt=5) == 0.25
+
+    def test_full_jitter(self):
+        """Без retry-after задержка в пределах экспоненты"""
+        for attempt in range(4):
+            assert 0 <= retry_delay(_rate_limit_error(), attempt, base=0.5) <= 0.5 * 2 ** attempt
+
+    @pytest.mark.asyncio
+    async def test_client_retries_rate_limit(self, monkeypatch):
+        """429 повторяется и снижает лимит конкурентности"""
+        limiter = OpenAIRateLimiter(requests_per_minute=1000, tokens_per_minute=1000000, use_redis=False)
+        monkeypatch.setattr(gpt_module, "gpt_rate_limiter", limiter)
+        attempts = 0
+
+        async def create(**kwargs):
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise _rate_limit_error({"retry-after-ms": "10"})
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+                usage=SimpleNamespace(total_tokens=50)
+            )
+
+        client = GPTClient("sk-test", model="gpt-test")
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        initial_limit = limiter.concurrency.limit
+
+        result = await client._request([{"role": "user", "content": "тест"}])
+
+        assert result["content"] == "ok"
+        assert attempts == 2
+        assert limiter.concurrency.limit < initial_limit
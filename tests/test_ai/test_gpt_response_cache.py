@@ -0,0 +1,106 @@
+"""
+Тесты для кэша ответов GPT
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+import pytest
+
+from app.ai.nlp import gpt_client as gpt_module
+from app.ai.nlp.gpt_client import GPTClient
+from app.ai.nlp.response_cache import GPTResponseCache, normalize_text, reference_bucket
+
+
+class FakeCache:
+    """Кэш в памяти вместо Redis"""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        self.data[key] = value
+        return True
+
+
+class FakeCompletions:
+    """chat.completions с фиксированным ответом и счётчиком вызовов"""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))],
+            usage=SimpleNamespace(total_tokens=420)
+        )
+
+
+class TestNormalization:
+    """Тесты нормализации ключа"""
+
+    def test_normalize_text(self):
+        """Регистр, ё, пробелы и пунктуация не влияют на ключ"""
+        assert normalize_text("  Звонок  Алёне завтра в 15!!! ") == "звонок алене завтра в 15"
+        assert normalize_text("Показ в 15:30.") == "показ в 15:30"
+
+    def test_reference_bucket(self):
+        """Опорная дата - день, фразы от текущего момента не кэшируются"""
+        now = datetime(2024, 3, 4, 9, 30)
+
+        assert reference_bucket("звонок завтра в 15", now) == "2024-03-04"
+        assert reference_bucket("перезвонить через 2 часа", now) is None
+        assert reference_bucket("встреча через полчаса", now) is None
+        assert reference_bucket("созвон прямо сейчас", now) is None
+
+
+class TestGPTClientCache:
+    """Тесты кэширования в GPTClient"""
+
+    @pytest.fixture
+    def cache(self, monkeypatch):
+        cache = GPTResponseCache(cache=FakeCache(), ttl=60)
+        monkeypatch.setattr(gpt_module, "gpt_response_cache", cache)
+        return cache
+
+    @pytest.fixture
+    def client(self):
+        client = GPTClient("sk-test", model="gpt-test")
+        completions = FakeCompletions('{"event_type": "call", "title": "Звонок", "date": "2024-03-05", "time": "15:00"}')
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return client
+
+    @pytest.mark.asyncio
+    async def test_repeated_phrase_hits_cache(self, client, cache):
+        """Повтор фразы в другом регистре не уходит в OpenAI"""
+        first = await client.parse_calendar_event("звонок завтра в 15")
+        second = await client.parse_calendar_event("Звонок завтра в 15!")
+
+        assert first == second
+        assert client.client.chat.completions.calls == 1
+        stats = cache.get_stats()["calendar_event"]
+        assert stats["hits"] == 1
+        assert stats["saved_tokens"] == 420
+
+    @pytest.mark.asyncio
+    async def test_moment_relative_not_cached(self, client, cache):
+        """Фразы относительно текущего момента всегда идут в модель"""
+        await client.parse_calendar_event("перезвонить через 2 часа")
+        await client.parse_calendar_event("перезвонить через 2 часа")
+
+        assert client.client.chat.completions.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_real_estate_cached(self, client, cache):
+        """Разбор объекта кэшируется без опорной даты"""
+        await client.extract_real_estate_info("2-комн. квартира 54 м2")
+        await client.extract_real_estate_info("2-комн. квартира 54 м2")
+
+        assert client.client.chat.completions.calls == 1
+        assert cache.get_hit_rate("real_estate") == 0.5
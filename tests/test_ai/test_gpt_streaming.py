@@ -0,0 +1,246 @@
+"""
+Тесты для потоковых ответов GPT и их вывода в Telegram
+"""
+
+from types import SimpleNamespace
+from typing import List, Optional
+
+import httpx
+import openai
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText
+
+from app.ai.nlp import gpt_client as gpt_module
+from app.ai.nlp.cascade import ParsingCascade
+from app.ai.nlp.gpt_client import GPTClient
+from app.ai.nlp.intent_classifier import IntentClassifier
+from app.ai.nlp.rate_limiter import OpenAIRateLimiter
+from app.bot.handlers import text as text_module
+from app.bot.utils import streaming as streaming_module
+from app.bot.utils.streaming import CURSOR, MESSAGE_LIMIT, ThrottledMessageEditor, stream_to_message
+
+
+def _chunk(content: Optional[str] = None, tokens: Optional[int] = None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    usage = SimpleNamespace(total_tokens=tokens) if tokens else None
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+async def _stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class FakeMessage:
+    """Сообщение бота, запоминающее правки"""
+
+    def __init__(self, retry_after: int = 0):
+        self.edits: List[str] = []
+        self.answers: List[str] = []
+        self.retry_after = retry_after
+        self.parse_modes: List[Optional[str]] = []
+
+    async def edit_text(self, text: str, **kwargs):
+        if self.retry_after:
+            retry_after, self.retry_after = self.retry_after, 0
+            raise TelegramRetryAfter(
+                method=EditMessageText(text=text), message="Too Many Requests", retry_after=retry_after
+            )
+        self.edits.append(text)
+        self.parse_modes.append(kwargs.get("parse_mode"))
+
+    async def answer(self, text: str, **kwargs):
+        self.answers.append(text)
+        self.parse_modes.append(kwargs.get("parse_mode"))
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = OpenAIRateLimiter(requests_per_minute=1000, tokens_per_minute=1000000, use_redis=False)
+    monkeypatch.setattr(gpt_module, "gpt_rate_limiter", limiter)
+    return limiter
+
+
+class TestGPTStream:
+    """Тесты потокового запроса"""
+
+    @pytest.mark.asyncio
+    async def test_yields_deltas(self, limiter):
+        """Фрагменты отдаются по мере прихода, расход токенов учитывается"""
+        requests = []
+
+        async def create(**kwargs):
+            requests.append(kwargs)
+            return _stream([_chunk("Ипотека "), _chunk(""), _chunk("доступна."), _chunk(tokens=120)])
+
+        client = GPTClient("sk-test", model="gpt-test")
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        chunks = [chunk async for chunk in client.stream_answer_question("Сколько стоит ипотека?")]
+
+        assert chunks == ["Ипотека ", "доступна."]
+        assert requests[0]["stream"] is True
+        assert limiter.concurrency.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_retry_before_first_chunk(self, limiter):
+        """Ошибка до первого фрагмента повторяется"""
+        attempts = 0
+
+        async def create(**kwargs):
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+                response = httpx.Response(429, headers={"retry-after-ms": "10"}, request=request)
+                raise openai.RateLimitError("Rate limit reached", response=response, body=None)
+            return _stream([_chunk("ok")])
+
+        client = GPTClient("sk-test", model="gpt-test")
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        chunks = [chunk async for chunk in client.stream_meeting_time("после 18", "свободен вечером")]
+
+        assert chunks == ["ok"]
+        assert attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_aborted_stream_recorded(self, limiter, monkeypatch):
+        """Прерванный потребителем поток всё равно записывается в журнал расхода"""
+        records = []
+        monkeypatch.setattr(gpt_module.ai_usage_ledger, "record", lambda *args, **kwargs: records.append(kwargs))
+
+        async def create(**kwargs):
+            return _stream([_chunk("Ипотека "), _chunk("доступна."), _chunk(tokens=120)])
+
+        client = GPTClient("sk-test", model="gpt-test")
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        stream = client.stream_answer_question("Сколько стоит ипотека?")
+        async for _ in stream:
+            break
+        await stream.aclose()
+
+        assert len(records) == 1
+        assert records[0]["metadata"]["aborted"] is True
+        assert records[0]["tokens_used"] > 0
+        assert limiter.concurrency.in_flight == 0
+
+
+class TestThrottledEditor:
+    """Тесты редактирования сообщения"""
+
+    @pytest.mark.asyncio
+    async def test_throttled_updates(self):
+        """Частые фрагменты не превращаются в частые правки"""
+        message = FakeMessage()
+        editor = ThrottledMessageEditor(message, interval=0.2)
+
+        assert await editor.update("Ипо") is True
+        assert await editor.update("Ипотека") is False
+        await editor.finish("Ипотека доступна.")
+
+        assert message.edits == ["Ипо" + CURSOR, "Ипотека доступна."]
+
+    @pytest.mark.asyncio
+    async def test_stream_to_message(self, monkeypatch):
+        """Первый фрагмент показывается сразу, итог - без курсора"""
+        monkeypatch.setattr(streaming_module.settings, "GPT_STREAM_EDIT_INTERVAL", 0.01)
+        message = FakeMessage()
+
+        async def chunks():
+            for chunk in ["Да, ", "можно ", "продать."]:
+                yield chunk
+
+        text = await stream_to_message(message, chunks())
+
+        assert text == "Да, можно продать."
+        assert message.edits[0] == "Да, " + CURSOR
+        assert message.edits[-1] == "Да, можно продать."
+
+    @pytest.mark.asyncio
+    async def test_stream_escapes_html(self, monkeypatch):
+        """«<» и «&» из ответа экранируются, префикс остаётся разметкой"""
+        monkeypatch.setattr(streaming_module.settings, "GPT_STREAM_EDIT_INTERVAL", 0.01)
+        message = FakeMessage()
+
+        async def chunks():
+            for chunk in ["R&D: до 10 млн ", "< 12 млн"]:
+                yield chunk
+
+        text = await stream_to_message(message, chunks(), prefix="<b>Ответ:</b> ")
+
+        assert text == "R&D: до 10 млн < 12 млн"
+        assert message.edits[-1] == "<b>Ответ:</b> R&amp;D: до 10 млн &lt; 12 млн"
+        assert set(message.parse_modes) == {"HTML"}
+
+    @pytest.mark.asyncio
+    async def test_split_keeps_entities_whole(self):
+        """Разрез длинного ответа не попадает внутрь &amp;, продолжение - в той же разметке"""
+        message = FakeMessage()
+        editor = ThrottledMessageEditor(message, interval=0)
+
+        await editor.finish("а" * (MESSAGE_LIMIT - 2) + "&amp;б", parse_mode="HTML")
+
+        assert message.edits == ["а" * (MESSAGE_LIMIT - 2)]
+        assert message.answers == ["&amp;б"]
+        assert message.parse_modes == ["HTML", "HTML"]
+
+    @pytest.mark.asyncio
+    async def test_retry_after(self):
+        """После TelegramRetryAfter итоговый текст всё равно доходит"""
+        message = FakeMessage(retry_after=1)
+        editor = ThrottledMessageEditor(message, interval=0)
+
+        await editor.finish("итог")
+
+        assert message.edits == ["итог"]
+
+    @pytest.mark.asyncio
+    async def test_long_answer_split(self):
+        """Длинный ответ продолжается следующими сообщениями"""
+        message = FakeMessage()
+        editor = ThrottledMessageEditor(message, interval=0)
+
+        await editor.finish("а" * (MESSAGE_LIMIT + 10))
+
+        assert len(message.edits[0]) == MESSAGE_LIMIT
+        assert message.answers == ["а" * 10]
+
+
+class TestEventManagerResponse:
+    """Тесты ответа EventManager на текст, не являющийся событием"""
+
+    @pytest.fixture
+    def manager(self, monkeypatch):
+        class FakeStreamingGPT:
+            def stream_answer_question(self, question):
+                return _stream([])
+
+        class FakeSession:
+            async def execute(self, statement):
+                return SimpleNamespace(scalar_one_or_none=lambda: SimpleNamespace(id=1))
+
+        monkeypatch.setattr(text_module.settings, "GPT_STREAMING_ENABLED", True)
+        monkeypatch.setattr(text_module.ai_usage_ledger, "record", lambda *args, **kwargs: None)
+        manager = text_module.EventManager()
+        manager.parser.gpt_client = FakeStreamingGPT()
+        manager.parser.cascade = ParsingCascade(None, classifier=IntentClassifier(backend="tfidf"))
+        return lambda text, **kwargs: manager.process_text(text, 42, FakeSession(), **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_message_without_stream(self, manager):
+        """Без stream=True ответ - текст: его показывают голосовые, фото и задачи Celery"""
+        result = await manager("как оформить налоговый вычет")
+
+        assert result["type"] == "response"
+        assert result["message"] is not None and result.get("stream") is None
+
+    @pytest.mark.asyncio
+    async def test_stream_on_request(self, manager):
+        """Поток возвращается только вызывающему, который его прочитает"""
+        result = await manager("как оформить налоговый вычет", stream=True)
+
+        assert result["stream"] is not None
+        assert [chunk async for chunk in result["stream"]] == []
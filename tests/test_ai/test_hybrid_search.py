@@ -0,0 +1,166 @@
+"""
+Тесты для гибридного поиска событий
+"""
+
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytest
+
+from app.ai.embeddings import hybrid_search as hybrid_module
+from app.ai.embeddings.hybrid_search import HybridSearchService, build_hybrid_query, query_hash
+from app.core.cache import CacheKeys
+
+
+class FakeCache:
+    """CacheService в памяти"""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+        self.reads = 0
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        self.reads += 1
+        return {key: self.data[key] for key in keys if key in self.data}
+
+    async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        self.data[key] = value
+        return True
+
+
+class FakeIndex:
+    def __init__(self, hits):
+        self.hits = hits
+
+    def search(self, user_id, vector, k):
+        return self.hits[:k]
+
+
+class FakeVectorService:
+    """VectorSearchService с заданным бэкендом и результатами"""
+
+    def __init__(self, backend: str = "faiss", embedding=(1.0, 0.0), hits=()):
+        self.use_faiss = backend == "faiss"
+        self.use_pgvector = backend == "pgvector"
+        self.embedding = None if embedding is None else np.asarray(embedding, dtype=np.float32)
+        self.index = FakeIndex(list(hits))
+
+    async def embed(self, text: str):
+        return self.embedding
+
+    async def ensure_user_index(self, user_id: int) -> None:
+        pass
+
+    async def search_stored(self, embedding, user_id, limit, threshold):
+        return [{"id": event_id, "similarity": similarity} for event_id, similarity in self.index.hits[:limit]]
+
+
+class FakeSession:
+    def __init__(self):
+        self.queries: List[str] = []
+        self.params: List[Dict[str, Any]] = []
+
+    async def execute(self, statement, params=None):
+        self.queries.append(str(statement))
+        self.params.append(params)
+        row = SimpleNamespace(
+            id=5, title="Показ квартиры", description=None, start_time=None, location="Арбат, 10",
+            score=0.0325, text_rank=1, vector_rank=2
+        )
+        return SimpleNamespace(fetchall=lambda: [row])
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession()
+
+    async def get_async_session():
+        yield session
+
+    monkeypatch.setattr(hybrid_module, "get_async_session", get_async_session)
+    return session
+
+
+class TestHybridQuery:
+    """Тесты SQL"""
+
+    def test_faiss_ranks_passed_as_array(self):
+        """Ранги FAISS передаются массивом, полнотекстовый поиск - по search_vector"""
+        sql = build_hybrid_query(pgvector=False)
+
+        assert "unnest(CAST(:vector_ids AS bigint[])) WITH ORDINALITY" in sql
+        assert "search_vector @@" in sql
+        assert "<=>" not in sql
+
+    def test_pgvector_ranks_in_query(self):
+        """С pgvector векторные ранги считаются в том же запросе"""
+        sql = build_hybrid_query(pgvector=True)
+
+        assert sql.count("<=>") == 1
+        assert ":vector_ids" not in sql
+        assert "1.0 / (:rrf_k + hits.rank)" in sql
+
+    def test_query_hash_normalized(self):
+        """Регистр и пробелы не влияют на ключ кэша"""
+        assert query_hash("Показ  на Арбате") == query_hash("показ на арбате ")
+
+
+class TestHybridSearchService:
+    """Тесты сервиса"""
+
+    @pytest.mark.asyncio
+    async def test_one_round_trip_with_faiss(self, session):
+        """Кандидаты FAISS выше порога уходят в единственный запрос к базе"""
+        vectors = FakeVectorService("faiss", hits=[(5, 0.9), (7, 0.5), (9, 0.1)])
+        service = HybridSearchService(vectors, FakeCache())
+
+        results = await service.search("показ на Арбате", user_id=3, limit=5)
+
+        assert len(session.queries) == 1
+        assert session.params[0]["vector_ids"] == [5, 7]
+        assert results[0]["id"] == 5
+        assert (results[0]["text_rank"], results[0]["vector_rank"]) == (1, 2)
+
+    @pytest.mark.asyncio
+    async def test_pgvector_params(self, session):
+        """С pgvector запрос получает эмбеддинг вместо списка кандидатов"""
+        service = HybridSearchService(FakeVectorService("pgvector"), FakeCache())
+
+        await service.search("показ", user_id=3)
+
+        assert "query_embedding" in session.params[0]
+        assert "vector_ids" not in session.params[0]
+
+    @pytest.mark.asyncio
+    async def test_text_only_without_embedding(self, session):
+        """Без модели эмбеддингов работает полнотекстовый поиск"""
+        service = HybridSearchService(FakeVectorService("faiss", embedding=None), FakeCache())
+
+        results = await service.search("Арбат", user_id=3)
+
+        assert session.params[0]["vector_ids"] == []
+        assert len(results) == 1
+
+    @pytest.mark.asyncio
+    async def test_cached_until_events_change(self, session):
+        """Повторный запрос берётся из кэша, смена версии пользователя его сбрасывает"""
+        cache = FakeCache()
+        service = HybridSearchService(FakeVectorService("faiss"), cache)
+
+        await service.search("показ на Арбате", user_id=3)
+        await service.search("Показ на арбате", user_id=3)
+        assert len(session.queries) == 1
+
+        cache.data[CacheKeys.EVENT_SEARCH_VERSION.format(user_id=3)] = "changed"
+        await service.search("показ на Арбате", user_id=3)
+        assert len(session.queries) == 2
+
+    @pytest.mark.asyncio
+    async def test_empty_query(self, session):
+        """Пустой запрос не обращается ни к кэшу, ни к базе"""
+        cache = FakeCache()
+        service = HybridSearchService(FakeVectorService(), cache)
+
+        assert await service.search("   ", user_id=3) == []
+        assert cache.reads == 0 and session.queries == []
@@ -0,0 +1,39 @@
+"""
+Тесты декодирования медиа в памяти
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from app.ai.speech.audio import to_audio_array
+from app.ai.vision.image import decode_image_bytes
+
+
+class TestMediaDecoding:
+    """Тесты для декодирования изображений и аудио без временных файлов"""
+
+    def test_decode_image_bytes(self):
+        """PNG из памяти декодируется в BGR массив"""
+        image = np.full((20, 30, 3), 255, dtype=np.uint8)
+        ok, encoded = cv2.imencode(".png", image)
+        assert ok
+
+        decoded = decode_image_bytes(encoded.tobytes())
+
+        assert decoded.shape == (20, 30, 3)
+        assert np.array_equal(decoded, image)
+
+    def test_decode_corrupted_image(self):
+        """Повреждённые данные дают понятную ошибку"""
+        with pytest.raises(ValueError):
+            decode_image_bytes(b"not an image")
+
+    def test_audio_array_passthrough(self):
+        """Готовый сигнал не декодируется повторно"""
+        audio = np.zeros(16000, dtype=np.float64)
+
+        result = to_audio_array(audio)
+
+        assert result.dtype == np.float32
+        assert len(result) == 16000
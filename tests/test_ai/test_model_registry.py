@@ -0,0 +1,145 @@
+"""
+Тесты для реестра AI моделей
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from app.ai.model_registry import ModelRegistry
+from app.core.process_memory import parse_smaps, read_process_memory
+
+
+class TestModelRegistry:
+    """Тесты для ModelRegistry"""
+
+    @pytest.fixture
+    def registry(self):
+        """Реестр с тестовым загрузчиком"""
+        registry = ModelRegistry()
+        registry.loads = []
+
+        def factory(param):
+            registry.loads.append(param)
+            return {"name": param}
+
+        registry.register_loader("fake", factory)
+        return registry
+
+    def test_model_loaded_once(self, registry):
+        """Повторные обращения не загружают модель заново"""
+        first = registry.get("fake:base")
+        second = registry.get("fake:base")
+
+        assert first is second
+        assert registry.loads == ["base"]
+        assert registry.is_loaded("fake:base")
+
+    def test_concurrent_get_loads_once(self, registry):
+        """Параллельные потоки дожидаются единственной загрузки"""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(registry.get("fake:small")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 8
+        assert all(result is results[0] for result in results)
+        assert registry.loads == ["small"]
+
+    def test_unknown_kind(self, registry):
+        """Неизвестный тип модели"""
+        with pytest.raises(KeyError):
+            registry.get("unknown:model")
+
+    def test_warmup_and_unload(self, registry):
+        """Предзагрузка и выгрузка моделей"""
+        results = registry.warmup(["fake:a", "unknown:b"])
+
+        assert results == {"fake:a": True, "unknown:b": False}
+        assert "fake:a" in registry.get_stats()
+        assert registry.get_stats()["fake:a"]["load_time"] >= 0
+
+        registry.unload("fake:a")
+        assert not registry.is_loaded("fake:a")
+
+        registry.get("fake:a")
+        assert registry.loads == ["a", "a"]
+
+
+class TestPreFork:
+    """Тесты загрузки моделей до fork воркеров"""
+
+    @pytest.fixture
+    def registry(self):
+        registry = ModelRegistry()
+        registry.register_loader("ballast", lambda size_mb: np.ones(int(size_mb) * 1024 * 1024 // 8))
+        yield registry
+        gc.unfreeze()
+
+    def test_preload_marks_models(self, registry):
+        """Предзагруженные модели отмечаются в статистике, объекты переносятся в постоянное поколение"""
+        results = registry.preload(["ballast:1", "unknown:b"])
+
+        assert results == {"ballast:1": True, "unknown:b": False}
+        assert registry.preloaded == ["ballast:1"]
+        assert registry.get_stats()["ballast:1"]["preloaded"] is True
+        assert gc.get_freeze_count() > 0
+
+        registry.unload("ballast:1")
+        assert registry.preloaded == []
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="нужен /proc")
+    def test_worker_shares_preloaded_weights(self, registry):
+        """Воркер после fork читает веса из общих страниц, а не из своей копии"""
+        registry.preload(["ballast:64"])
+        context = multiprocessing.get_context("fork")
+        ready = context.Queue()
+        release = context.Event()
+
+        def work():
+            registry.after_fork(1)
+            float(registry.get("ballast:64").sum())
+            ready.put(os.getpid())
+            release.wait()
+
+        process = context.Process(target=work)
+        process.start()
+        try:
+            memory = read_process_memory(ready.get(timeout=60))
+        finally:
+            release.set()
+            process.join()
+
+        assert memory.shared > 64 * 1024 * 1024
+        assert memory.private < 32 * 1024 * 1024
+
+
+class TestProcessMemory:
+    """Тесты разбора smaps"""
+
+    def test_parse_smaps(self):
+        """Поля в kB суммируются по областям и переводятся в байты"""
+        text = (
+            "00400000-00452000 r-xp 00000000 08:02 173521 /usr/bin/python\n"
+            "Rss:                 100 kB\n"
+            "Shared_Clean:         60 kB\n"
+            "Private_Dirty:        40 kB\n"
+            "VmFlags: rd ex mr mw me dw\n"
+            "Rss:                  20 kB\n"
+        )
+
+        fields = parse_smaps(text)
+
+        assert fields["Rss"] == 120 * 1024
+        assert fields["Shared_Clean"] == 60 * 1024
+        assert "VmFlags" not in fields
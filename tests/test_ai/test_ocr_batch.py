@@ -0,0 +1,88 @@
+"""
+Тесты для пакетного OCR альбомов
+"""
+
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+import pytest
+
+from app.ai.vision import ocr_client as ocr_module
+from app.ai.vision.ocr_client import OCRClient
+from app.core.cache import AIResultCache
+
+
+class FakeCache:
+    """Кэш в памяти вместо Redis"""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    async def set_many(self, data: Dict[str, Any], expire: Optional[int] = None) -> bool:
+        self.data.update(data)
+        return True
+
+
+class FakeReader:
+    """EasyOCR reader: возвращает ширину изображения как текст"""
+
+    def __init__(self):
+        self.batches = []
+
+    def readtext(self, image):
+        return [([[0, 0], [1, 0], [1, 1], [0, 1]], f"w{image.shape[1]}", 0.9)]
+
+    def readtext_batched(self, images, batch_size=1):
+        self.batches.append([image.shape for image in images])
+        return [self.readtext(image) for image in images]
+
+
+def _png(width: int, height: int) -> bytes:
+    ok, encoded = cv2.imencode(".png", np.full((height, width, 3), 255, dtype=np.uint8))
+    assert ok
+    return encoded.tobytes()
+
+
+class TestExtractTextBatch:
+    """Тесты для OCRClient.extract_text_batch"""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setattr(ocr_module, "ai_result_cache", AIResultCache(cache=FakeCache(), ttl=60))
+        monkeypatch.setattr(ocr_module.model_registry, "get", lambda key: FakeReader())
+        client = OCRClient()
+        # Без предобработки - размеры изображений доходят до модели как есть
+        client.preprocess = None
+        return client
+
+    @pytest.mark.asyncio
+    async def test_single_pass(self, client):
+        """Изображения разного размера распознаются одним вызовом модели"""
+        results = await client.extract_text_batch([_png(40, 30), _png(60, 20)])
+
+        # Результаты в исходном порядке, все изображения дополнены до общего размера
+        assert [result["text"] for result in results] == ["w60", "w60"]
+        assert client.reader.batches == [[(30, 60, 3), (30, 60, 3)]]
+
+    @pytest.mark.asyncio
+    async def test_cached_images_skipped(self, client):
+        """Уже распознанные изображения не отправляются в модель"""
+        await client.extract_text_batch([_png(40, 30)], ["AQAD1"])
+
+        results = await client.extract_text_batch([_png(40, 30), _png(60, 20)], ["AQAD1", "AQAD2"])
+
+        assert [result["text"] for result in results] == ["w40", "w60"]
+        # Второй вызов - одно изображение, без пакетного режима
+        assert client.reader.batches == []
+
+    @pytest.mark.asyncio
+    async def test_corrupted_image(self, client):
+        """Ошибка одного изображения не ломает остальные"""
+        results = await client.extract_text_batch([b"broken", _png(40, 30)])
+
+        assert "error" in results[0]
+        assert results[1]["text"] == "w40"
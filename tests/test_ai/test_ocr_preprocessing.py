@@ -0,0 +1,76 @@
+"""
+Тесты для предобработки изображений перед OCR
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from app.ai.vision.preprocessing import PreprocessConfig, estimate_skew, preprocess_image, text_region
+
+
+def _screenshot(width: int = 900, height: int = 600) -> np.ndarray:
+    """Белый фон с несколькими строками текста в центре"""
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    for i, line in enumerate(["2 rooms, 54 m2", "Price 12 500 000", "Lenina 10, floor 5/9"]):
+        cv2.putText(image, line, (150, 200 + i * 60), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    return image
+
+
+def _rotate(image: np.ndarray, angle: float) -> np.ndarray:
+    height, width = image.shape[:2]
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(image, rotation, (width, height), borderValue=(255, 255, 255))
+
+
+class TestPreprocessing:
+    """Тесты для preprocess_image"""
+
+    def test_downscale_and_grayscale(self):
+        """Изображение уменьшается по длинной стороне и переводится в серое"""
+        config = PreprocessConfig(max_side=450, deskew=False, crop_text=False)
+
+        result = preprocess_image(_screenshot(), config)
+
+        assert result.image.shape == (300, 450)
+        assert result.to_original([[450, 300]]) == [[900.0, 600.0]]
+
+    @pytest.mark.parametrize("angle", [5.0, -5.0, 10.0])
+    def test_deskew(self, angle):
+        """Наклон текста оценивается и исправляется"""
+        gray = cv2.cvtColor(_rotate(_screenshot(), angle), cv2.COLOR_BGR2GRAY)
+
+        assert estimate_skew(gray) == pytest.approx(-angle, abs=1.0)
+
+        result = preprocess_image(gray, PreprocessConfig(crop_text=False))
+        assert abs(estimate_skew(result.image)) < 1.0
+
+    def test_crop_text_region(self):
+        """Изображение обрезается до текста, координаты пересчитываются в исходные"""
+        image = _screenshot()
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        x, y, w, h = text_region(gray, padding=0)
+
+        result = preprocess_image(image, PreprocessConfig(deskew=False, crop_padding=0))
+
+        assert result.image.shape == (h, w)
+        assert result.to_original([[0, 0]]) == [[float(x), float(y)]]
+        assert 100 < x < 200 and 100 < y < 200
+
+    def test_blank_image_not_cropped(self):
+        """Без текста изображение не обрезается"""
+        image = np.full((100, 200, 3), 255, dtype=np.uint8)
+
+        result = preprocess_image(image, PreprocessConfig())
+
+        assert result.image.shape == (100, 200)
+
+    def test_threshold_is_binary(self):
+        """Бинаризация оставляет только чёрный и белый"""
+        result = preprocess_image(_screenshot(), PreprocessConfig(threshold=True))
+
+        assert set(np.unique(result.image)) <= {0, 255}
+
+    def test_config_key(self):
+        """Ключ конфигурации различает настройки"""
+        assert PreprocessConfig().key() != PreprocessConfig(threshold=True).key()
@@ -0,0 +1,136 @@
+"""
+Тесты для каскада разбора: правила -> локальный классификатор -> GPT
+"""
+
+from datetime import datetime
+from typing import Any, Dict
+
+import pytest
+
+from app.ai.nlp.cascade import ParsingCascade
+from app.ai.nlp.intent_classifier import IntentClassifier
+
+# Понедельник
+NOW = datetime(2024, 3, 4, 9, 30)
+
+
+class FakeGPT:
+    """GPTClient с фиксированным ответом и счётчиком вызовов"""
+
+    def __init__(self, result: Dict[str, Any]):
+        self.result = result
+        self.calls = 0
+
+    async def parse_calendar_event(self, text: str) -> Dict[str, Any]:
+        self.calls += 1
+        return dict(self.result)
+
+
+GPT_EVENT = {
+    "event_type": "call", "title": "Звонок Иванову", "date": "2024-03-04",
+    "time": "12:00", "duration_minutes": 30, "confidence": "0.9",
+}
+
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier(backend="tfidf")
+
+
+class TestIntentClassifier:
+    """Тесты локального классификатора"""
+
+    @pytest.mark.parametrize("text,expected", [
+        ("встреча с клиентом в офисе", "event"),
+        ("перезвонить покупателю", "event"),
+        ("удали все встречи", "command"),
+        ("покажи события на неделю", "command"),
+        ("как проверить юридическую чистоту квартиры", "question"),
+        ("добрый вечер", "question"),
+    ])
+    def test_predict(self, classifier, text, expected):
+        """Намерение определяется по близости к размеченным примерам"""
+        intent, confidence = classifier.predict(text)
+
+        assert intent == expected
+        assert 0.0 < confidence <= 1.0
+
+
+class TestCascade:
+    """Тесты выбора этапа"""
+
+    @pytest.mark.asyncio
+    async def test_rules_stage(self, classifier):
+        """Уверенный разбор правилами не доходит ни до классификатора, ни до GPT"""
+        gpt = FakeGPT(GPT_EVENT)
+        cascade = ParsingCascade(gpt, classifier=classifier)
+
+        result = await cascade.run("звонок завтра в 15", now=NOW)
+
+        assert (result.intent, result.stage) == ("event", "rules")
+        assert result.event["date"] == "2024-03-05"
+        assert set(result.timings) == {"rules"}
+        assert gpt.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_local_stage_for_question(self, classifier):
+        """Вопрос распознаётся локально, GPT не вызывается"""
+        gpt = FakeGPT(GPT_EVENT)
+        cascade = ParsingCascade(gpt, classifier=classifier)
+
+        result = await cascade.run("как оформить налоговый вычет", now=NOW)
+
+        assert (result.intent, result.stage) == ("question", "local")
+        assert set(result.timings) == {"rules", "local"}
+        assert gpt.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_local_stage_for_event(self, classifier):
+        """Классификатор подтверждает событие - поля берутся из правил"""
+        gpt = FakeGPT(GPT_EVENT)
+        cascade = ParsingCascade(gpt, classifier=classifier)
+
+        result = await cascade.run("позвонить Ольге вечером", now=NOW)
+
+        assert (result.intent, result.stage) == ("event", "local")
+        assert result.event["time"] == "18:00"
+        assert result.event["parser"] == "local"
+        assert gpt.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_gpt_stage(self, classifier):
+        """Событие без даты и времени уходит в GPT"""
+        gpt = FakeGPT(GPT_EVENT)
+        cascade = ParsingCascade(gpt, classifier=classifier)
+
+        result = await cascade.run("звонок Иванову", now=NOW)
+
+        assert (result.intent, result.stage, result.provider) == ("event", "gpt", "openai")
+        assert result.confidence == pytest.approx(0.9)
+        assert "gpt" in result.timings
+        assert gpt.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_fallback_without_gpt(self, classifier):
+        """Без GPT используется результат правил"""
+        cascade = ParsingCascade(None, classifier=classifier)
+
+        result = await cascade.run("звонок Иванову", now=NOW)
+
+        assert (result.intent, result.stage) == ("event", "fallback")
+        assert result.event["event_type"] == "call"
+
+    @pytest.mark.asyncio
+    async def test_stats(self, classifier):
+        """Попадания считаются по этапам"""
+        cascade = ParsingCascade(FakeGPT(GPT_EVENT), classifier=classifier)
+
+        await cascade.run("звонок завтра в 15", now=NOW)
+        await cascade.run("привет", now=NOW)
+        await cascade.run("звонок Иванову", now=NOW)
+
+        stats = cascade.get_stats()
+        assert stats["hits"]["rules"] == 1
+        assert stats["hits"]["local"] == 1
+        assert stats["hits"]["gpt"] == 1
+        assert stats["without_gpt"] == pytest.approx(2 / 3)
@@ -0,0 +1,165 @@
+"""
+Тесты для разбора событий правилами
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from app.ai.nlp.rule_parser import RuleBasedEventParser
+from app.config import settings
+
+# Понедельник
+NOW = datetime(2024, 3, 4, 9, 30)
+CORPUS = Path(__file__).resolve().parent.parent / "fixtures" / "rule_parser_corpus.jsonl"
+MIN_CONFIDENCE = 0.85
+
+
+@pytest.fixture
+def parser():
+    return RuleBasedEventParser()
+
+
+class TestDates:
+    """Тесты дат и времени"""
+
+    @pytest.mark.parametrize("text,expected_date,expected_time", [
+        ("звонок завтра в 15", "2024-03-05", "15:00"),
+        ("встреча послезавтра в 10:30", "2024-03-06", "10:30"),
+        ("созвон в пятницу в 5 вечера", "2024-03-08", "17:00"),
+        ("встреча в следующую среду в 10", "2024-03-13", "10:00"),
+        ("показ 15 марта в 11:00", "2024-03-15", "11:00"),
+        ("встреча 12.03 в 18:30", "2024-03-12", "18:30"),
+        ("показ студии послезавтра в 9 утра", "2024-03-06", "09:00"),
+        ("встреча в ТЦ завтра в семь вечера", "2024-03-05", "19:00"),
+    ])
+    def test_absolute_and_relative_dates(self, parser, text, expected_date, expected_time):
+        """Относительные, числовые и словесные даты"""
+        result = parser.parse(text, now=NOW)
+
+        assert result.intent == "event"
+        assert result.date == expected_date
+        assert result.time == expected_time
+
+    def test_relative_to_moment(self, parser):
+        """«Через N часов» отсчитывается от текущего момента"""
+        result = parser.parse("перезвонить Сергею через 2 часа", now=NOW)
+
+        assert (result.date, result.time) == ("2024-03-04", "11:30")
+
+    def test_past_hour_moves_to_tomorrow(self, parser):
+        """Время без даты, которое уже прошло, - на следующий день"""
+        result = parser.parse("звонок Иванову в 8:00", now=NOW)
+
+        assert (result.date, result.time) == ("2024-03-05", "08:00")
+
+    def test_day_part(self, parser):
+        """Время суток без часа - как в промпте GPT"""
+        result = parser.parse("показ завтра утром", now=NOW)
+
+        assert result.time == "10:00"
+
+
+class TestFields:
+    """Тесты типа, клиента и длительности"""
+
+    def test_event_type_and_client(self, parser):
+        """Тип по ключевому слову, имя клиента в именительном падеже"""
+        result = parser.parse("звонок клиенту Иванову в понедельник в 14:30", now=NOW)
+
+        assert result.event_type == "call"
+        assert result.client_name == "Иванов"
+        assert result.date == "2024-03-11"
+
+    def test_reminder_with_call_is_call(self, parser):
+        """«Напомни позвонить» - звонок, а не задача"""
+        result = parser.parse("напомни через полчаса позвонить маме", now=NOW)
+
+        assert result.event_type == "call"
+        assert result.time == "10:00"
+
+    def test_duration(self, parser):
+        """Длительность «на 2 часа» не путается со временем начала"""
+        result = parser.parse("показ 2-комн квартиры 15 марта в 11:00 на 2 часа", now=NOW)
+
+        assert result.time == "11:00"
+        assert result.duration_minutes == 120
+
+    def test_to_event_format(self, parser):
+        """Результат совпадает по формату с ответом GPT"""
+        event = parser.parse("встреча с Петровыми в офисе завтра в 16", now=NOW).to_event()
+
+        assert event["event_type"] == "meeting"
+        assert event["date"] == "2024-03-05"
+        assert event["time"] == "16:00"
+        assert event["parser"] == "rules"
+        assert event["confidence"] >= MIN_CONFIDENCE
+
+
+class TestConfidence:
+    """Тесты уверенности и отказа от разбора"""
+
+    @pytest.mark.parametrize("text", ["удали встречу завтра", "перенеси показ на пятницу", "покажи список событий"])
+    def test_commands(self, parser, text):
+        """Команды управления не превращаются в события"""
+        assert parser.parse(text, now=NOW).intent == "command"
+
+    @pytest.mark.parametrize("text", ["сколько стоит ипотека?", "привет", "какие документы нужны для сделки?"])
+    def test_not_events(self, parser, text):
+        """Вопросы и болтовня не являются событиями"""
+        assert parser.parse(text, now=NOW).intent == "unknown"
+
+    @pytest.mark.parametrize("text", [
+        "встреча через 99999999 дней",
+        "звонок через 999999999999 часов",
+        "показ завтра в 15 на 100000 часов",
+    ])
+    def test_out_of_range_amounts(self, parser, text):
+        """Огромные «через N» и «на N» не роняют разбор, а отдаются следующему этапу"""
+        assert parser.parse(text, now=NOW).intent == "unknown"
+
+    @pytest.mark.parametrize("text", ["встреча 29 февраля в 15:00", "встреча 29.02 в 15:00"])
+    def test_feb_29_rollover(self, parser, text):
+        """29 февраля без года после високосного февраля не роняет разбор - дата не распознана"""
+        result = parser.parse(text, now=datetime(2028, 3, 1, 10))
+
+        assert not {"text_date", "numeric_date"} & set(result.matched)
+        assert result.confidence < settings.RULE_PARSER_MIN_CONFIDENCE
+
+    def test_without_date_goes_to_gpt(self, parser):
+        """Без даты и времени уверенности недостаточно"""
+        result = parser.parse("звонок Иванову", now=NOW)
+
+        assert result.intent == "event"
+        assert result.confidence < MIN_CONFIDENCE
+
+    def test_unparsed_numbers_lower_confidence(self, parser):
+        """Непонятые правилами числа снижают уверенность"""
+        clean = parser.parse("встреча завтра в 15", now=NOW)
+        noisy = parser.parse("встреча завтра в 15 и 17", now=NOW)
+
+        assert noisy.confidence < clean.confidence
+
+
+class TestCorpus:
+    """Точность на размеченном корпусе"""
+
+    def test_absorbed_precision(self, parser):
+        """Сообщения, забранные у GPT, разобраны верно, вопросы и команды не забраны"""
+        items = [json.loads(line) for line in CORPUS.read_text(encoding="utf-8").splitlines() if line.strip()]
+        absorbed = 0
+        for item in items:
+            label = item["label"]
+            result = parser.parse(item["text"], now=datetime.fromisoformat(item["now"]))
+            if result.intent != "event" or result.confidence < MIN_CONFIDENCE:
+                continue
+            absorbed += 1
+            assert label["intent"] == "event", item["text"]
+            assert (result.event_type, result.date, result.time) == (
+                label["event_type"], label["date"], label["time"]
+            ), item["text"]
+
+        # Правила забирают заметную долю трафика
+        assert absorbed / len(items) >= 0.5
@@ -0,0 +1,164 @@
+"""
+Тесты для объединения одинаковых запросов к OpenAI
+"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+import pytest
+
+from app.ai.nlp import gpt_client as gpt_module
+from app.ai.nlp.gpt_client import GPTClient
+from app.ai.nlp.single_flight import SingleFlight
+
+
+class FakeRedisCache:
+    """Общий для «процессов» кэш в памяти вместо Redis"""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+        self.redis_client = object()
+
+    async def add(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        if key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        self.data[key] = value
+        return True
+
+    async def delete(self, key: str) -> bool:
+        self.data.pop(key, None)
+        return True
+
+    async def exists(self, key: str) -> bool:
+        return key in self.data
+
+
+class TestSingleFlight:
+    """Тесты для SingleFlight"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_coalesced(self):
+        """Одновременные одинаковые запросы выполняются один раз"""
+        flight = SingleFlight(use_redis=False, timeout=5)
+        calls = 0
+
+        async def request():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"content": "ok"}
+
+        results = await asyncio.gather(*(flight.do("key", request) for _ in range(5)))
+
+        assert calls == 1
+        assert all(result == {"content": "ok"} for result in results)
+        assert flight.inflight == 0
+
+    @pytest.mark.asyncio
+    async def test_different_keys_not_coalesced(self):
+        """Разные запросы выполняются независимо"""
+        flight = SingleFlight(use_redis=False, timeout=5)
+        calls = []
+
+        async def request(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key
+
+        assert await asyncio.gather(flight.do("a", lambda: request("a")), flight.do("b", lambda: request("b"))) == ["a", "b"]
+        assert sorted(calls) == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_error_shared(self):
+        """Ошибка лидера получают все ожидающие, следующий запрос выполняется заново"""
+        flight = SingleFlight(use_redis=False, timeout=5)
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream")
+
+        results = await asyncio.gather(flight.do("key", failing), flight.do("key", failing), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+        async def succeeding():
+            return "ok"
+
+        assert await flight.do("key", succeeding) == "ok"
+
+    @pytest.mark.asyncio
+    async def test_leader_cancelled(self):
+        """Отмена лидера не отменяет ожидающих - запрос выполняет один из них"""
+        flight = SingleFlight(use_redis=False, timeout=5)
+        calls = 0
+
+        async def request():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        leader = asyncio.create_task(flight.do("key", request))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", request))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await follower == "ok"
+        assert calls == 2
+
+    @pytest.mark.asyncio
+    async def test_coalesced_across_processes(self):
+        """Через Redis запрос выполняет только один из процессов"""
+        redis_cache = FakeRedisCache()
+        first = SingleFlight(cache=redis_cache, use_redis=True, timeout=5, poll_interval=0.01)
+        second = SingleFlight(cache=redis_cache, use_redis=True, timeout=5, poll_interval=0.01)
+        calls = 0
+
+        async def request():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        results = await asyncio.gather(first.do("key", request), second.do("key", request))
+
+        assert results == ["ok", "ok"]
+        assert calls == 1
+
+
+class TestGPTClientSingleFlight:
+    """Тесты объединения запросов в GPTClient"""
+
+    @pytest.mark.asyncio
+    async def test_duplicate_requests_coalesced(self, monkeypatch):
+        """Двойная отправка сообщения - один запрос к OpenAI"""
+        monkeypatch.setattr(gpt_module, "gpt_single_flight", SingleFlight(use_redis=False, timeout=5))
+        calls = 0
+
+        async def create(**kwargs):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="Ответ"))],
+                usage=SimpleNamespace(total_tokens=100)
+            )
+
+        client = GPTClient("sk-test", model="gpt-test")
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        messages = [{"role": "user", "content": "звонок завтра в 15"}]
+
+        first, second = await asyncio.gather(client._complete(messages), client._complete(messages))
+
+        assert calls == 1
+        assert first["content"] == second["content"] == "Ответ"
+        # Токены учитываются только у лидера
+        assert [first.get("coalesced", False), second.get("coalesced", False)].count(True) == 1
@@ -0,0 +1,76 @@
+"""
+Тесты для времени импорта бота и API
+"""
+
+import sys
+import types
+
+import pytest
+
+from app.core.import_profile import (
+    HEAVY_MODULES,
+    STARTUP_IMPORT_BUDGET_MS,
+    STARTUP_MODULES,
+    parse_importtime,
+    profile_import,
+)
+from app.core.lazy_import import lazy_exports
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     numpy._utils
+import time:      3000 |       3120 |   numpy
+import time:       500 |       3620 | app.ai.embeddings.codec
+Traceback (most recent call last):
+"""
+
+
+class TestImportProfile:
+    """Тесты разбора -X importtime"""
+
+    def test_parse_importtime(self):
+        """Строки разбираются во время и вложенность, заголовок и traceback пропускаются"""
+        records = parse_importtime(IMPORTTIME_OUTPUT)
+
+        assert [(record.module, record.depth) for record in records] == [
+            ("numpy._utils", 2), ("numpy", 1), ("app.ai.embeddings.codec", 0)
+        ]
+        assert records[-1].cumulative_us == 3620 and records[1].self_us == 3000
+
+    def test_lazy_exports(self, monkeypatch):
+        """Имя пакета импортирует модуль при первом обращении и кэшируется"""
+        package = types.ModuleType("lazy_package")
+        package.__getattr__ = lazy_exports("lazy_package", {"dumps": "json"})
+        monkeypatch.setitem(sys.modules, "lazy_package", package)
+
+        assert package.dumps is sys.modules["json"].dumps
+        assert "dumps" in vars(package)
+        with pytest.raises(AttributeError):
+            package.missing
+
+
+class TestStartupBudget:
+    """Тесты бюджета запуска"""
+
+    @pytest.mark.parametrize("module", STARTUP_MODULES)
+    def test_startup_within_budget(self, module):
+        """Точка входа импортируется в пределах бюджета и без torch, whisper, easyocr, cv2"""
+        profile = profile_import(module)
+        if not profile.ok:
+            pytest.skip(f"{module} не импортируется в этом окружении: {profile.error}")
+
+        assert profile.heavy_modules() == []
+        assert profile.total_ms <= STARTUP_IMPORT_BUDGET_MS, (
+            f"{module}: {profile.total_ms:.0f} ms > {STARTUP_IMPORT_BUDGET_MS:.0f} ms; "
+            f"scripts/importtime_report.py {module}"
+        )
+
+    @pytest.mark.parametrize("module", ["app.bot.handlers.voice", "app.bot.handlers.photo", "app.services"])
+    def test_ai_clients_loaded_on_use(self, module):
+        """Обработчики голоса и фото не загружают клиентов AI при импорте"""
+        profile = profile_import(module)
+        if not profile.ok:
+            pytest.skip(f"{module} не импортируется в этом окружении: {profile.error}")
+
+        assert not {"app.ai.vision.ocr_client", "app.ai.speech.whisper_client", "openai"} & profile.modules
+        assert not set(HEAVY_MODULES) & profile.modules
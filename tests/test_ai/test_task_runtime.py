@@ -0,0 +1,94 @@
+"""
+Тесты для среды выполнения задач Celery
+"""
+
+import asyncio
+
+import pytest
+
+from app.tasks.runtime import TaskRuntime
+
+
+@pytest.fixture
+def runtime():
+    runtime = TaskRuntime(setup=None, teardown=None)
+    yield runtime
+    runtime.stop()
+
+
+class TestTaskRuntime:
+    """Тесты TaskRuntime"""
+
+    def test_loop_persists_between_tasks(self, runtime):
+        """Задачи процесса выполняются в одном и том же loop"""
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        first = runtime.run(current_loop())
+        second = runtime.run(current_loop())
+
+        assert first is second and first.is_running()
+        assert runtime.tasks == 2
+
+    def test_exception_propagates(self, runtime):
+        """Исключение корутины пробрасывается в задачу"""
+        async def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            runtime.run(fail())
+        assert runtime.run(asyncio.sleep(0, result=42)) == 42
+
+    def test_run_from_loop_thread_rejected(self, runtime):
+        """Вызов run() из самого loop отклоняется, а не блокирует его"""
+        async def nested():
+            coro = asyncio.sleep(0)
+            try:
+                runtime.run(coro)
+            finally:
+                coro.close()
+
+        with pytest.raises(RuntimeError):
+            runtime.run(nested())
+
+    def test_shared_created_once(self, runtime):
+        """Общий объект создаётся один раз на процесс"""
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return object()
+
+        assert runtime.shared("client", factory) is runtime.shared("client", factory)
+        assert len(calls) == 1
+
+    def test_new_loop_after_fork(self, runtime):
+        """В дочернем процессе создаются новый loop и новые общие объекты"""
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        parent_loop = runtime.run(current_loop())
+        parent_client = runtime.shared("client", object)
+        # Как после fork: pid процесса не совпадает с pid запуска
+        runtime._pid = -1
+
+        assert runtime.run(current_loop()) is not parent_loop
+        assert runtime.shared("client", object) is not parent_client
+
+    def test_setup_and_teardown(self):
+        """setup выполняется при запуске, teardown - при остановке, оба в loop среды"""
+        events = []
+
+        async def setup():
+            events.append(("setup", asyncio.get_running_loop()))
+
+        async def teardown():
+            events.append(("teardown", asyncio.get_running_loop()))
+
+        runtime = TaskRuntime(setup=setup, teardown=teardown)
+        runtime.run(asyncio.sleep(0))
+        loop = runtime._loop
+        runtime.stop()
+
+        assert events == [("setup", loop), ("teardown", loop)]
+        assert loop.is_closed() and not runtime.running
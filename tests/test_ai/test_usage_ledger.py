@@ -0,0 +1,238 @@
+"""
+Тесты для журнала расхода AI
+"""
+
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from app.ai.nlp import gpt_client as gpt_module
+from app.ai.nlp.gpt_client import GPTClient
+from app.ai.usage_ledger import AIUsageLedger, ai_usage_context, openai_cost
+from app.models.ai_data import AIProcessingType, AIProvider
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """AsyncSession, запоминающая вставленные строки"""
+
+    def __init__(self, db: "FakeDatabase"):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        if self.db.fail:
+            raise ConnectionError("database is down")
+        if statement.is_insert:
+            self.db.inserts.append(list(params))
+            return FakeResult([])
+        self.db.selects += 1
+        return FakeResult(list(self.db.users.items()))
+
+    async def commit(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, users: Dict[int, int] = None):
+        # users.id -> telegram_id
+        self.users = users or {}
+        self.inserts: List[List[Dict[str, Any]]] = []
+        self.selects = 0
+        self.fail = False
+
+    def session(self):
+        return FakeSession(self)
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        return [row for batch in self.inserts for row in batch]
+
+
+def _ledger(db: FakeDatabase, batch_size: int = 100, flush_interval: float = 3600, max_buffer: int = 1000):
+    ledger = AIUsageLedger(db.session, batch_size=batch_size, flush_interval=flush_interval, max_buffer=max_buffer)
+    ledger.enabled = True
+    return ledger
+
+
+def _record(ledger: AIUsageLedger, **kwargs):
+    ledger.record(AIProcessingType.TEXT_ANALYSIS, AIProvider.OPENAI, **kwargs)
+
+
+class TestLedger:
+    """Тесты буфера и пакетной записи"""
+
+    @pytest.mark.asyncio
+    async def test_record_does_not_touch_database(self):
+        """Запись только кладётся в буфер, сброс - одной вставкой"""
+        db = FakeDatabase()
+        ledger = _ledger(db)
+
+        for _ in range(5):
+            _record(ledger, tokens_used=10, cost=0.001)
+
+        assert ledger.buffered == 5
+        assert db.inserts == []
+
+        assert await ledger.flush() == 5
+        assert len(db.inserts) == 1
+        assert ledger.buffered == 0
+
+    @pytest.mark.asyncio
+    async def test_flush_on_batch_size(self):
+        """Заполненный буфер сбрасывается в фоне"""
+        db = FakeDatabase()
+        ledger = _ledger(db, batch_size=3)
+
+        for _ in range(3):
+            _record(ledger)
+        await asyncio.sleep(0)
+
+        assert len(db.rows) == 3
+
+    @pytest.mark.asyncio
+    async def test_flush_on_interval(self):
+        """Истёкший интервал запускает сброс даже неполного буфера"""
+        db = FakeDatabase()
+        ledger = _ledger(db, flush_interval=0.01)
+
+        await asyncio.sleep(0.02)
+        _record(ledger)
+        await asyncio.sleep(0)
+
+        assert len(db.rows) == 1
+
+    @pytest.mark.asyncio
+    async def test_user_resolved_from_context(self):
+        """telegram_id из контекста превращается в users.id одним запросом на пачку"""
+        db = FakeDatabase(users={7: 555})
+        ledger = _ledger(db)
+
+        with ai_usage_context(telegram_id=555):
+            _record(ledger)
+            _record(ledger)
+        _record(ledger)
+        _record(ledger, user_id=9)
+        await ledger.flush()
+
+        assert [row["user_id"] for row in db.rows] == [7, 7, None, 9]
+        assert db.selects == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_records(self):
+        """При недоступной базе записи остаются в буфере до следующего сброса"""
+        db = FakeDatabase()
+        ledger = _ledger(db)
+        _record(ledger, cost=0.5)
+
+        db.fail = True
+        assert await ledger.flush() == 0
+        assert ledger.buffered == 1
+
+        db.fail = False
+        assert await ledger.flush() == 1
+        assert db.rows[0]["cost"] == 0.5
+
+    def test_bounded_buffer(self):
+        """Буфер ограничен - старые записи отбрасываются"""
+        ledger = _ledger(FakeDatabase(), max_buffer=2)
+
+        for cost in (1.0, 2.0, 3.0):
+            _record(ledger, cost=cost)
+
+        assert ledger.buffered == 2
+        assert [record.cost for record in ledger._buffer] == [2.0, 3.0]
+
+    def test_totals(self):
+        """Итоги процесса считаются без обращения к базе"""
+        ledger = _ledger(FakeDatabase())
+
+        _record(ledger, tokens_used=100, cost=0.01)
+        _record(ledger, is_success=False, error_message="timeout")
+        _record(ledger, cache_hit=True)
+
+        totals = ledger.get_stats()["openai:text_analysis"]
+        assert totals["calls"] == 3
+        assert totals["errors"] == 1
+        assert totals["cache_hits"] == 1
+        assert totals["tokens"] == 100
+
+    def test_openai_cost(self):
+        """Цена берётся по самому длинному префиксу модели"""
+        assert openai_cost("gpt-4o-mini-2024-07-18", 1000, 1000) == pytest.approx(0.00075)
+        assert openai_cost("gpt-4", 1000, 0) == pytest.approx(0.03)
+        assert openai_cost("unknown-model", 1000, 1000) is None
+
+
+class TestGPTUsage:
+    """Тесты записи вызовов GPTClient"""
+
+    @pytest.fixture
+    def ledger(self, monkeypatch):
+        ledger = _ledger(FakeDatabase())
+        monkeypatch.setattr(gpt_module, "ai_usage_ledger", ledger)
+        return ledger
+
+    @pytest.mark.asyncio
+    async def test_request_recorded_with_cost(self, ledger, monkeypatch):
+        """Запрос к API записывается с токенами и стоимостью"""
+        monkeypatch.setattr(gpt_module.settings, "GPT_SINGLE_FLIGHT_ENABLED", False)
+        client = GPTClient("sk-test", model="gpt-4o-mini")
+
+        async def request(messages):
+            return {"content": "ok", "tokens": 300, "prompt_tokens": 200, "completion_tokens": 100, "latency": 0.1}
+
+        client._request = request
+        await client._complete([{"role": "user", "content": "привет"}], AIProcessingType.ENTITY_EXTRACTION)
+
+        record = ledger._buffer[0]
+        assert record.processing_type == AIProcessingType.ENTITY_EXTRACTION
+        assert record.tokens_used == 300
+        assert record.cost == pytest.approx(openai_cost("gpt-4o-mini", 200, 100))
+
+    @pytest.mark.asyncio
+    async def test_coalesced_request_is_free(self, ledger, monkeypatch):
+        """Объединённый запрос записывается без токенов - их потратил лидер"""
+        monkeypatch.setattr(gpt_module.settings, "GPT_SINGLE_FLIGHT_ENABLED", True)
+        client = GPTClient("sk-test", model="gpt-4o-mini")
+
+        async def request(messages):
+            await asyncio.sleep(0.01)
+            return {"content": "ok", "tokens": 300, "prompt_tokens": 200, "completion_tokens": 100, "latency": 0.1}
+
+        client._request = request
+        messages = [{"role": "user", "content": "привет"}]
+        await asyncio.gather(client._complete(messages), client._complete(messages))
+
+        assert sorted(record.tokens_used for record in ledger._buffer) == [0, 300]
+        assert sum(record.cost for record in ledger._buffer) == pytest.approx(openai_cost("gpt-4o-mini", 200, 100))
+
+    @pytest.mark.asyncio
+    async def test_error_recorded(self, ledger, monkeypatch):
+        """Ошибка запроса записывается как неуспешный вызов"""
+        monkeypatch.setattr(gpt_module.settings, "GPT_SINGLE_FLIGHT_ENABLED", False)
+        client = GPTClient("sk-test", model="gpt-4o-mini")
+
+        async def request(messages):
+            raise RuntimeError("boom")
+
+        client._request = request
+        with pytest.raises(RuntimeError):
+            await client._complete([{"role": "user", "content": "привет"}])
+
+        record = ledger._buffer[0]
+        assert record.is_success is False
+        assert record.error_message == "boom"
@@ -0,0 +1,56 @@
+"""
+Тесты для нарезки аудио по паузам
+"""
+
+import numpy as np
+
+from app.ai.speech.vad import split_on_silence
+
+SR = 16000
+
+
+def _tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SR)) / SR
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SR), dtype=np.float32)
+
+
+class TestSplitOnSilence:
+    """Тесты для split_on_silence"""
+
+    def test_split_on_pauses(self):
+        """Речь, разделённая паузами, режется на сегменты"""
+        audio = np.concatenate([_tone(5), _silence(1), _tone(5), _silence(1), _tone(5)])
+
+        segments = split_on_silence(audio)
+
+        assert len(segments) == 3
+        assert segments[0][0] == 0
+        assert segments[-1][1] == len(audio)
+        # Сегменты идут подряд без пропусков
+        for (_, end), (start, _) in zip(segments, segments[1:]):
+            assert end == start
+
+    def test_short_segments_merged(self):
+        """Короткие фразы склеиваются с соседними"""
+        audio = np.concatenate([_tone(1), _silence(0.5), _tone(1), _silence(0.5), _tone(1)])
+
+        segments = split_on_silence(audio, min_segment_s=3.0)
+
+        assert segments == [(0, len(audio))]
+
+    def test_long_segment_split(self):
+        """Сплошная речь режется по максимальной длине окна"""
+        audio = _tone(70)
+
+        segments = split_on_silence(audio, max_segment_s=30.0)
+
+        assert len(segments) == 3
+        assert all(end - start <= 30 * SR for start, end in segments)
+
+    def test_empty_audio(self):
+        """Пустой сигнал"""
+        assert split_on_silence(np.zeros(0, dtype=np.float32)) == []
@@ -0,0 +1,149 @@
+"""
+Тесты для выбора способа поиска похожих событий
+"""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from app.ai.embeddings import vector_service as vector_module
+from app.ai.embeddings.codec import encode_embedding
+from app.ai.embeddings.faiss_index import FaissIndexStore
+from app.ai.embeddings.vector_service import VectorSearchService
+
+
+class FakeBatcher:
+    def __init__(self, vector):
+        self.vector = np.asarray(vector, dtype=np.float32)
+
+    async def embed(self, text: str) -> np.ndarray:
+        return self.vector
+
+
+class FakeSession:
+    """Сессия, запоминающая запросы и возвращающая заданные строки"""
+
+    def __init__(self, rows: List[Any]):
+        self.rows = rows
+        self.queries: List[str] = []
+        self.params: List[Dict[str, Any]] = []
+
+    async def execute(self, statement, params=None):
+        self.queries.append(str(statement))
+        self.params.append(params or {})
+        return SimpleNamespace(fetchall=lambda: self.rows)
+
+    async def commit(self):
+        pass
+
+
+class VersionedSession(FakeSession):
+    """Сессия, отвечающая на запрос версии строк event_embeddings"""
+
+    async def execute(self, statement, params=None):
+        result = await super().execute(statement, params)
+        result.one = lambda: SimpleNamespace(
+            count=len(self.rows), updated_at=max((row.updated_at for row in self.rows), default=None)
+        )
+        return result
+
+
+def _event_row(event_id: int, vector, **extra):
+    return SimpleNamespace(
+        id=event_id, title=f"Событие {event_id}", description=None, start_time=datetime(2024, 3, 4, 12),
+        location=None, content=f"событие {event_id}", embedding=encode_embedding(vector, "float32"), **extra
+    )
+
+
+def _embedding_row(event_id: int, vector, updated_at: datetime):
+    return SimpleNamespace(event_id=event_id, embedding=encode_embedding(vector, "float32"), updated_at=updated_at)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    # Модель эмбеддингов не загружается - запрос кодирует FakeBatcher
+    monkeypatch.setattr(vector_module.model_registry, "get", lambda key: object())
+    service = VectorSearchService()
+    service.batcher = FakeBatcher([1.0, 0.0, 0.0])
+    return service
+
+
+def _use_session(monkeypatch, session: FakeSession) -> None:
+    async def get_async_session():
+        yield session
+
+    monkeypatch.setattr(vector_module, "get_async_session", get_async_session)
+
+
+class TestVectorSearch:
+    """Тесты поиска"""
+
+    @pytest.mark.asyncio
+    async def test_pgvector_single_distance(self, service, monkeypatch):
+        """Запрос pgvector считает расстояние один раз, top-k внутри, порог снаружи"""
+        session = FakeSession([SimpleNamespace(**vars(_event_row(1, [1, 0, 0])), similarity=0.93)])
+        _use_session(monkeypatch, session)
+        service.backend = "pgvector"
+
+        events = await service.search_similar_events("показ квартиры", user_id=7, limit=5)
+
+        search_sql = session.queries[-1]
+        assert search_sql.count("<=>") == 1
+        assert "ORDER BY distance" in search_sql and "LIMIT :limit" in search_sql
+        assert search_sql.index("LIMIT :limit") < search_sql.index("1 - distance > :threshold")
+        assert session.params[-1]["query_embedding"] == "[1,0,0]"
+        assert any("hnsw.ef_search" in query for query in session.queries)
+        assert events[0]["similarity"] == pytest.approx(0.93)
+
+    @pytest.mark.asyncio
+    async def test_numpy_scan(self, service, monkeypatch):
+        """Без индекса эмбеддинги пользователя декодируются в матрицу и сортируются по сходству"""
+        session = FakeSession([
+            _event_row(1, [0.0, 1.0, 0.0]),
+            _event_row(2, [1.0, 0.1, 0.0]),
+            _event_row(3, [1.0, 0.5, 0.0]),
+        ])
+        _use_session(monkeypatch, session)
+        service.backend = "numpy"
+
+        events = await service.search_similar_events("показ", user_id=7, limit=5, similarity_threshold=0.7)
+
+        assert [event["id"] for event in events] == [2, 3]
+        assert events[0]["similarity"] > events[1]["similarity"]
+
+    @pytest.mark.asyncio
+    async def test_without_model(self, service):
+        """Без модели эмбеддингов поиск возвращает пустой список"""
+        service.model = None
+
+        assert await service.search_similar_events("показ", user_id=7) == []
+
+
+class TestFaissFreshness:
+    """Тесты сверки индекса FAISS с базой"""
+
+    @pytest.mark.asyncio
+    async def test_rebuilt_when_database_changes(self, service, monkeypatch, tmp_path):
+        """Индекс перестраивается, когда строки пользователя изменил другой процесс"""
+        pytest.importorskip("faiss")
+        service.index = FaissIndexStore(directory=str(tmp_path), dimension=3, save_interval=3600)
+        session = VersionedSession([
+            _embedding_row(1, [1.0, 0.0, 0.0], datetime(2026, 1, 1, tzinfo=timezone.utc))
+        ])
+        _use_session(monkeypatch, session)
+
+        await service.ensure_user_index(7)
+        await service.ensure_user_index(7)
+        assert len(session.queries) == 3
+
+        # Строка добавлена процессом celery мимо индекса этого процесса
+        session.rows.append(
+            _embedding_row(2, [0.0, 1.0, 0.0], datetime(2026, 1, 2, tzinfo=timezone.utc))
+        )
+        await service.ensure_user_index(7)
+
+        assert len(session.queries) == 5
+        assert service.index.search(7, [0.0, 1.0, 0.0], k=1)[0][0] == 2
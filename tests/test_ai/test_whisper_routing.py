@@ -0,0 +1,158 @@
+"""
+Тесты для выбора модели Whisper по длительности аудио
+"""
+
+import struct
+
+import numpy as np
+import pytest
+
+from app.ai.speech import whisper_client
+from app.ai.speech.routing import WhisperRouter, audio_duration, ogg_duration, word_error_rate
+from app.ai.speech.whisper_client import WhisperClient
+from app.config import settings
+
+
+def _ogg_page(payload: bytes, granule: int, sequence: int) -> bytes:
+    """Страница OGG с одним пакетом (CRC не проверяется)"""
+    lacing = bytes([255] * (len(payload) // 255) + [len(payload) % 255])
+    header = struct.pack("<4sBBqIIIB", b"OggS", 0, 0, granule, 1, sequence, 0, len(lacing))
+    return header + lacing + payload
+
+
+def _opus_file(seconds: float, pre_skip: int = 312, filler_pages: int = 0) -> bytes:
+    opus_head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, 16000, 0, 0)
+    pages = [_ogg_page(opus_head, 0, 0), _ogg_page(b"OpusTags", 0, 1)]
+    pages += [_ogg_page(b"\0" * 60000, 960 * (index + 1), 2 + index) for index in range(filler_pages)]
+    pages.append(_ogg_page(b"\0" * 100, int(seconds * 48000) + pre_skip, 2 + filler_pages))
+    return b"".join(pages)
+
+
+class TestAudioDuration:
+    """Тесты длительности по заголовкам OGG"""
+
+    def test_opus_duration(self):
+        """Длительность Opus - позиция последней страницы минус pre-skip при 48 кГц"""
+        assert ogg_duration(_opus_file(12.5)) == pytest.approx(12.5)
+
+    def test_vorbis_duration(self):
+        """Для Vorbis частота берётся из заголовка"""
+        vorbis_head = b"\x01vorbis" + struct.pack("<IBI", 0, 1, 44100) + b"\0" * 14
+        data = _ogg_page(vorbis_head, 0, 0) + _ogg_page(b"\0" * 10, 44100 * 3, 1)
+
+        assert ogg_duration(data) == pytest.approx(3.0)
+
+    def test_last_page_without_packet_end(self):
+        """Страница с позицией -1 пропускается, берётся предыдущая"""
+        data = _opus_file(4.0) + _ogg_page(b"\0" * 10, -1, 4)
+
+        assert ogg_duration(data) == pytest.approx(4.0)
+
+    def test_not_ogg(self):
+        """Не OGG - длительность неизвестна"""
+        assert ogg_duration(b"ID3" + b"\0" * 100) is None
+        assert audio_duration(b"") is None
+
+    def test_file_reads_head_and_tail(self, tmp_path):
+        """Из файла читаются только начало и конец, середина не нужна"""
+        path = tmp_path / "voice.ogg"
+        path.write_bytes(_opus_file(75.0, filler_pages=4))
+
+        assert audio_duration(str(path)) == pytest.approx(75.0)
+        assert audio_duration(str(tmp_path / "missing.ogg")) is None
+
+    def test_array_duration(self):
+        """Для сигнала - число отсчётов на частоту 16 кГц"""
+        assert audio_duration(np.zeros(16000 * 3, dtype=np.float32)) == pytest.approx(3.0)
+
+
+class TestWhisperRouter:
+    """Тесты WhisperRouter"""
+
+    @pytest.fixture
+    def router(self):
+        return WhisperRouter(models=["small", "base", "tiny"], durations=[15, 60], busy_queue_depth=4)
+
+    @pytest.mark.parametrize("duration, model, reason", [
+        (5.0, "small", "<=15s"),
+        (15.0, "small", "<=15s"),
+        (40.0, "base", "<=60s"),
+        (300.0, "tiny", ">60s"),
+    ])
+    def test_route_by_duration(self, router, duration, model, reason):
+        """Модель выбирается по границам длительности"""
+        route = router.route_duration(duration, "base", queue_depth=0)
+
+        assert (route.model, route.reason) == (model, reason)
+
+    def test_busy_queue_downgrades(self, router):
+        """При очереди модель понижается на ступень, но не ниже самой быстрой"""
+        assert router.route_duration(5.0, "base", queue_depth=4).model == "base"
+        assert router.route_duration(5.0, "base", queue_depth=4).reason == "<=15s,busy"
+        assert router.route_duration(300.0, "base", queue_depth=10).model == "tiny"
+
+    def test_unknown_duration(self, router):
+        """Аудио неизвестной длительности идёт в модель по умолчанию"""
+        route = router.route(b"not ogg", "base", queue_depth=0)
+
+        assert (route.model, route.reason, route.duration) == ("base", "unknown", None)
+
+    def test_invalid_config(self):
+        """Моделей должно быть на одну больше, чем границ"""
+        with pytest.raises(ValueError):
+            WhisperRouter(models=["small", "base"], durations=[15, 60])
+
+
+class TestWordErrorRate:
+    """Тесты WER"""
+
+    def test_word_error_rate(self):
+        """Замена одного слова из четырёх - 25%, регистр, пунктуация и ё не учитываются"""
+        assert word_error_rate("Показ на улице Лёни", "показ, на улице лени!") == 0
+        assert word_error_rate("встреча завтра в 15:00", "встреча завтра на 15:00") == pytest.approx(0.25)
+        assert word_error_rate("показ квартиры", "показ") == pytest.approx(0.5)
+        assert word_error_rate("", "") == 0
+
+
+class TestWhisperClientRouting:
+    """Тесты маршрутизации в WhisperClient"""
+
+    @pytest.fixture
+    def calls(self, monkeypatch):
+        """Пулы-заглушки, записывающие модель и параметры декодирования"""
+        calls = []
+
+        class FakePool:
+            workers = 1
+            queue_depth = 0
+
+            def __init__(self, model_name):
+                self.model_name = model_name
+
+            async def transcribe(self, audio, **options):
+                calls.append((self.model_name, options))
+                return self.model_name
+
+        monkeypatch.setattr(settings, "WHISPER_WORKERS", 1)
+        monkeypatch.setattr(whisper_client, "get_whisper_pool", FakePool)
+        return calls
+
+    @pytest.mark.asyncio
+    async def test_routes_by_duration_with_pinned_language(self, calls):
+        """Короткое голосовое распознаётся моделью его длительности с языком и подсказкой"""
+        client = WhisperClient("base", routing=True)
+        client.router = WhisperRouter(models=["small", "base", "tiny"], durations=[15, 60])
+
+        assert await client.transcribe(np.zeros(16000 * 5, dtype=np.float32)) == "small"
+        assert await client.transcribe(np.zeros(16000 * 30, dtype=np.float32) + 0.1) == "base"
+
+        assert [model for model, _ in calls] == ["small", "base"]
+        assert calls[0][1]["language"] == settings.WHISPER_LANGUAGE
+        assert calls[0][1]["initial_prompt"] == settings.WHISPER_INITIAL_PROMPT
+
+    @pytest.mark.asyncio
+    async def test_routing_disabled(self, calls):
+        """Без маршрутизации используется модель клиента"""
+        client = WhisperClient("base", routing=False)
+
+        assert await client.transcribe(np.ones(16000 * 5, dtype=np.float32)) == "base"
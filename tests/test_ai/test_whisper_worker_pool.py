@@ -0,0 +1,62 @@
+"""
+Тесты для пула процессов Whisper
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.ai.speech import worker_pool
+from app.ai.speech.worker_pool import WhisperWorkerPool
+from app.core.exceptions import AIException
+
+
+class TestWhisperWorkerPool:
+    """Тесты для WhisperWorkerPool"""
+
+    @pytest.fixture
+    def pool(self, monkeypatch):
+        """Пул с потоками вместо процессов и фиктивной транскрипцией"""
+        def fake_transcribe(model_name, audio, options):
+            time.sleep(audio)
+            return f"{model_name}:{audio}"
+
+        monkeypatch.setattr(worker_pool, "_transcribe_in_worker", fake_transcribe)
+
+        pool = WhisperWorkerPool("tiny", workers=1, max_queue_size=1, job_timeout=1)
+        pool._executor = ThreadPoolExecutor(max_workers=1)
+        yield pool
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_transcribe(self, pool):
+        """Успешная транскрипция"""
+        result = await pool.transcribe(0)
+
+        assert result == "tiny:0"
+        assert pool.queue_depth == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_full_rejected(self, pool):
+        """Переполненная очередь отклоняет задание сразу"""
+        running = asyncio.create_task(pool.transcribe(0.2))
+        waiting = asyncio.create_task(pool.transcribe(0))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(AIException):
+            await pool.transcribe(0)
+
+        assert await running == "tiny:0.2"
+        assert await waiting == "tiny:0"
+
+    @pytest.mark.asyncio
+    async def test_job_timeout(self, pool):
+        """Задание дольше таймаута завершается ошибкой"""
+        pool.job_timeout = 0.05
+
+        with pytest.raises(AIException):
+            await pool.transcribe(0.2)
+
+        assert pool.queue_depth == 0